@@ -14,98 +14,293 @@ import sqlite3
 import logging
 import requests
 import hashlib
+import tempfile
 import traceback
+import threading
 from pathlib import Path
 from urllib.parse import quote_plus
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Tuple, Optional, Union, Any
 import urllib3
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from base_module import PROJECT_ROOT
+from tools.http_client import RateLimitedSession, set_host_rate
 
 
 # Añade estas importaciones al principio del archivo
 import io
 from PIL import Image
 import numpy as np
-import cv2
-from functools import lru_cache
 
-# Añade esta función para calcular un hash perceptual de las imágenes
-@lru_cache(maxsize=100)
+# Hash perceptual: DCT de la imagen en 32x32 y bits de las 8x8 frecuencias más bajas
+PHASH_SIZE = 32
+PHASH_LOW = 8
+
+# Distancia de Hamming por debajo de la cual dos imágenes se consideran la misma
+PHASH_DUPLICATE_DISTANCE = 10
+
+# Una imagen casi idéntica a las de tantos artistas distintos es un comodín
+# (p. ej. la estrella gris de Last.fm) y no una foto del artista
+PLACEHOLDER_MIN_OWNERS = 3
+
+
+def _dct_matrix(size, rows):
+    """Primeras filas de la matriz DCT-II ortonormal (la misma escala que cv2.dct)."""
+    n = np.arange(size)
+    k = np.arange(rows)[:, None]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+_DCT_LOW = _dct_matrix(PHASH_SIZE, PHASH_LOW)
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(values):
+        return np.bitwise_count(values)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _load_phash_pixels(image_path):
+    """Imagen en escala de grises reducida a 32x32 como array float32."""
+    with Image.open(image_path) as img:
+        img = img.convert('L').resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS)
+        return np.asarray(img, dtype=np.float32)
+
+
+def _phash_from_pixels(pixels):
+    """
+    Calcula los hashes de un lote de imágenes de una sola vez.
+    
+    Args:
+        pixels: Array (N, 32, 32)
+        
+    Returns:
+        Array uint64 con N hashes; el bit i corresponde al coeficiente i de la
+        DCT 8x8 recorrida por filas
+    """
+    low = (_DCT_LOW @ pixels @ _DCT_LOW.T).reshape(len(pixels), PHASH_LOW * PHASH_LOW)
+    # Media de cada imagen excluyendo la componente DC
+    avg = (low.sum(axis=1) - low[:, 0]) / (PHASH_LOW * PHASH_LOW - 1)
+    bits = low > avg[:, None]
+    packed = np.packbits(bits, axis=1, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8').ravel()
+
+
 def calculate_phash(image_path):
     """
     Calcula un hash perceptual de una imagen para detectar duplicados visuales
     independientemente del formato, tamaño o pequeñas variaciones.
     """
     try:
-        # Abrir la imagen y convertirla a escala de grises
-        img = Image.open(image_path).convert('L')
-        # Redimensionar a un tamaño pequeño (32x32)
-        img = img.resize((32, 32), Image.LANCZOS)
-        
-        # Convertir a array de NumPy
-        img_array = np.array(img)
-        
-        # Aplicar DCT (Transformada de Coseno Discreta)
-        dct = cv2.dct(np.float32(img_array))
-        
-        # Recortar a 8x8 para quedarnos con las frecuencias más bajas
-        dct_low = dct[:8, :8]
-        
-        # Calcular el valor medio (excluyendo la primera componente DC)
-        avg = (dct_low.sum() - dct_low[0, 0]) / 63
-        
-        # Generar hash binario
-        diff = dct_low > avg
-        
-        # Convertir el array booleano a un valor entero
-        hash_value = 0
-        for i, row in enumerate(diff.flatten()):
-            if row:
-                hash_value |= 1 << i
-        
-        return hash_value
+        return int(_phash_from_pixels(_load_phash_pixels(image_path)[None])[0])
     except Exception as e:
         logger.error(f"Error al calcular hash perceptual: {e}")
         # Devolver un valor que no coincidirá con ningún otro
         return None
 
+
+def calculate_phashes(image_paths, max_workers=4):
+    """
+    Calcula los hashes perceptuales de varias imágenes.
+    
+    La decodificación se reparte entre hilos y la DCT se hace en un único
+    producto de matrices para todo el lote.
+    
+    Returns:
+        Lista con el hash de cada ruta (None si no se pudo leer)
+    """
+    def load(path):
+        try:
+            return _load_phash_pixels(path)
+        except Exception as e:
+            logger.warning(f"No se pudo leer la imagen {path}: {e}")
+            return None
+    
+    if not image_paths:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pixels = list(executor.map(load, image_paths))
+    
+    valid = [i for i, p in enumerate(pixels) if p is not None]
+    result = [None] * len(image_paths)
+    if valid:
+        hashes = _phash_from_pixels(np.stack([pixels[i] for i in valid]))
+        for i, value in zip(valid, hashes.tolist()):
+            result[i] = value
+    return result
+
+
 # Función para calcular la similitud entre dos hashes
 def hamming_distance(hash1, hash2):
     """Calcula la distancia de Hamming entre dos hashes perceptuales"""
     if hash1 is None or hash2 is None:
         return float('inf')  # Distancia infinita si algún hash es None
     
-    # XOR para encontrar bits diferentes
-    xor = hash1 ^ hash2
-    # Contar bits diferentes
-    distance = bin(xor).count('1')
-    return distance
+    return (hash1 ^ hash2).bit_count()
 
-# Versión alternativa basada en histogramas si no está disponible OpenCV
-def calculate_histogram_similarity(image_path1, image_path2):
+
+class PhashIndex:
     """
-    Calcula la similitud entre dos imágenes usando histogramas.
-    Útil como alternativa si no está disponible OpenCV.
+    Índice en memoria de hashes perceptuales.
+    
+    Los hashes se guardan en un array uint64 contiguo; una consulta es un XOR
+    y un popcount vectorizados sobre todo el array, sin bucles en Python.
     """
-    try:
-        img1 = Image.open(image_path1).convert('RGB').resize((64, 64))
-        img2 = Image.open(image_path2).convert('RGB').resize((64, 64))
-        
-        hist1 = img1.histogram()
-        hist2 = img2.histogram()
+    def __init__(self, capacity=1024):
+        self._hashes = np.empty(capacity, dtype=np.uint64)
+        self._refs = []
+    
+    def __len__(self):
+        return len(self._refs)
+    
+    def add(self, phash, ref):
+        """Añade un hash con una referencia arbitraria (ruta, índice, etc.)."""
+        size = len(self._refs)
+        if size == len(self._hashes):
+            grown = np.empty(max(1024, size * 2), dtype=np.uint64)
+            grown[:size] = self._hashes
+            self._hashes = grown
+        self._hashes[size] = phash
+        self._refs.append(ref)
+    
+    def nearest(self, phash, max_distance):
+        """
+        Devuelve [(distancia, ref)] de los hashes a distancia <= max_distance,
+        ordenados de más a menos parecido.
+        """
+        size = len(self._refs)
+        if size == 0 or phash is None:
+            return []
+        distances = _popcount(self._hashes[:size] ^ np.uint64(phash))
+        matches = np.flatnonzero(distances <= max_distance)
+        order = matches[np.argsort(distances[matches], kind='stable')]
+        return [(int(distances[i]), self._refs[i]) for i in order]
+
+
+def _hash_to_db(value):
+    """Los INTEGER de SQLite tienen signo: el hash se guarda en complemento a dos."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _hash_from_db(value):
+    return value & 0xFFFFFFFFFFFFFFFF
+
+
+class ImageFingerprints:
+    """
+    Huellas (hash perceptual) de las imágenes guardadas, en la tabla
+    image_fingerprints de la base de datos.
+    
+    Cada fichero se hashea una sola vez: sync() sólo calcula los que son
+    nuevos o han cambiado de tamaño o fecha y lo hace por lotes. Las
+    búsquedas usan un PhashIndex cargado con todas las huellas.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.index = PhashIndex()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS image_fingerprints (
+                path TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                owner_id INTEGER,
+                phash INTEGER NOT NULL,
+                file_size INTEGER,
+                mtime REAL,
+                updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_image_fingerprints_owner ON image_fingerprints(kind, owner_id)")
+        self.conn.commit()
+    
+    def sync(self, files, batch_size=500):
+        """
+        Pone al día la tabla con los ficheros indicados y carga el índice.
+        
+        Args:
+            files: Lista de (ruta, tipo, id del propietario); tipo es 'artist' o 'album'
+        """
+        stored = {
+            row[0]: (row[1], row[2])
+            for row in self.conn.execute("SELECT path, file_size, mtime FROM image_fingerprints")
+        }
         
-        # Calcular la diferencia cuadrática entre histogramas
-        rms = sum((a-b)**2 for a, b in zip(hist1, hist2)) / len(hist1)
-        return rms
-    except Exception as e:
-        logger.error(f"Error al calcular similitud de histogramas: {e}")
-        return float('inf')  # Valor alto para que no coincida
+        pending = []
+        seen = set()
+        for path, kind, owner_id in files:
+            if not path or path in seen:
+                continue
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stored.get(path) != (stat.st_size, stat.st_mtime):
+                pending.append((path, kind, owner_id, stat.st_size, stat.st_mtime))
+        
+        missing = [path for path in stored if path not in seen]
+        if missing:
+            self.conn.executemany("DELETE FROM image_fingerprints WHERE path = ?", [(p,) for p in missing])
+        
+        if pending:
+            logger.info(f"Calculando huellas de {len(pending)} imágenes...")
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            hashes = calculate_phashes([item[0] for item in batch])
+            self.conn.executemany("""
+                INSERT INTO image_fingerprints (path, kind, owner_id, phash, file_size, mtime)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    kind = excluded.kind,
+                    owner_id = excluded.owner_id,
+                    phash = excluded.phash,
+                    file_size = excluded.file_size,
+                    mtime = excluded.mtime,
+                    updated = CURRENT_TIMESTAMP
+            """, [
+                (path, kind, owner_id, _hash_to_db(phash), size, mtime)
+                for (path, kind, owner_id, size, mtime), phash in zip(batch, hashes)
+                if phash is not None
+            ])
+        self.conn.commit()
+        
+        self.index = PhashIndex(capacity=max(1024, len(seen)))
+        for path, kind, owner_id, phash in self.conn.execute(
+                "SELECT path, kind, owner_id, phash FROM image_fingerprints"):
+            self.index.add(_hash_from_db(phash), (path, kind, owner_id))
+        logger.info(f"Índice de huellas cargado con {len(self.index)} imágenes")
+    
+    def record(self, path, kind, owner_id, phash):
+        """Guarda la huella de una imagen nueva y la añade al índice."""
+        if phash is None:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        self.conn.execute("""
+            INSERT INTO image_fingerprints (path, kind, owner_id, phash, file_size, mtime)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                kind = excluded.kind,
+                owner_id = excluded.owner_id,
+                phash = excluded.phash,
+                file_size = excluded.file_size,
+                mtime = excluded.mtime,
+                updated = CURRENT_TIMESTAMP
+        """, (path, kind, owner_id, _hash_to_db(phash), stat.st_size, stat.st_mtime))
+        self.conn.commit()
+        self.index.add(phash, (path, kind, owner_id))
+    
+    def similar(self, phash, max_distance=PHASH_DUPLICATE_DISTANCE - 1):
+        """[(distancia, (ruta, tipo, id del propietario))] de las imágenes parecidas."""
+        return self.index.nearest(phash, max_distance)
+
 
 # Configuración de logging
 logging.basicConfig(
@@ -121,9 +316,12 @@ MUSICBRAINZ_COVER_ART = "https://coverartarchive.org"
 SPOTIFY_API_BASE = "https://api.spotify.com/v1"
 USER_AGENT = "MusicArtworkDownloader/1.0 (https://github.com/yourusername/music-art-downloader)"
 
-# Tiempo de espera entre solicitudes para respetar las limitaciones de las APIs
-MB_RATE_LIMIT = 1.0  # 1 segundo entre solicitudes para MusicBrainz
-SPOTIFY_RATE_LIMIT = 0.2  # 0.2 segundos entre solicitudes para Spotify
+# Los límites de peticiones de cada API se aplican por host en tools/http_client.py
+# (MusicBrainz 1/s, Spotify 5/s, Discogs 1/s, Last.fm 4/s); cada proveedor
+# tiene su propio ritmo y todos pueden trabajar a la vez
+
+# Hilos por proveedor: conexiones keep-alive que mantiene abiertas cada sesión
+PROVIDER_POOL_SIZE = 4
 
 
 
@@ -136,22 +334,10 @@ LASTFM_API_BASE = "https://ws.audioscrobbler.com/2.0"
 class DiscogsAPI:
     def __init__(self, token=None):
         self.token = token
-        self.last_request_time = 0
-    
-    def _rate_limit(self) -> None:
-        """Implementa el límite de tasa para las solicitudes a Discogs"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        
-        if time_since_last_request < 1.0:  # Máximo 60 solicitudes por minuto
-            time.sleep(1.0 - time_since_last_request)
-        
-        self.last_request_time = time.time()
+        self.http = RateLimitedSession(pool_size=PROVIDER_POOL_SIZE)
     
     def _make_request(self, url: str) -> Optional[Dict[str, Any]]:
         """Realiza una solicitud a la API de Discogs"""
-        self._rate_limit()
-        
         headers = {
             'User-Agent': USER_AGENT,
             'Accept': 'application/json'
@@ -161,7 +347,7 @@ class DiscogsAPI:
             headers['Authorization'] = f"Discogs token={self.token}"
         
         try:
-            response = requests.get(url, headers=headers)
+            response = self.http.get(url, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
@@ -213,22 +399,10 @@ class DiscogsAPI:
 class LastfmAPI:
     def __init__(self, api_key=None):
         self.api_key = api_key
-        self.last_request_time = 0
-    
-    def _rate_limit(self) -> None:
-        """Implementa el límite de tasa para las solicitudes a Last.fm"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        
-        if time_since_last_request < 0.25:  # Máximo 5 solicitudes por segundo
-            time.sleep(0.25 - time_since_last_request)
-        
-        self.last_request_time = time.time()
+        self.http = RateLimitedSession(pool_size=PROVIDER_POOL_SIZE, timeout=10)
     
     def _make_request(self, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
         """Realiza una solicitud a la API de Last.fm con mejor manejo de errores"""
-        self._rate_limit()
-        
         if not self.api_key:
             logger.warning("No se proporcionó API key de Last.fm")
             return None
@@ -236,28 +410,16 @@ class LastfmAPI:
         params['api_key'] = self.api_key
         params['format'] = 'json'
         
-        # Configurar sesión con reintentos
-        session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET"]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-        
         try:
             # Intentar con verificación SSL
-            response = session.get(LASTFM_API_BASE, params=params, timeout=10)
+            response = self.http.get(LASTFM_API_BASE, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.SSLError:
             # Si falla por SSL, intentar sin verificación
             logger.warning("Error SSL en solicitud a Last.fm. Reintentando sin verificación SSL.")
             try:
-                response = session.get(LASTFM_API_BASE, params=params, timeout=10, verify=False)
+                response = self.http.get(LASTFM_API_BASE, params=params, verify=False)
                 response.raise_for_status()
                 return response.json()
             except requests.RequestException as e:
@@ -334,29 +496,17 @@ def get_file_hash(file_path):
 
 class MusicBrainzAPI:
     def __init__(self):
-        self.last_request_time = 0
-    
-    def _rate_limit(self) -> None:
-        """Implementa el límite de tasa para las solicitudes a MusicBrainz"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        
-        if time_since_last_request < MB_RATE_LIMIT:
-            time.sleep(MB_RATE_LIMIT - time_since_last_request)
-        
-        self.last_request_time = time.time()
+        self.http = RateLimitedSession(pool_size=PROVIDER_POOL_SIZE)
     
     def _make_request(self, url: str) -> Optional[Dict[str, Any]]:
         """Realiza una solicitud a la API de MusicBrainz"""
-        self._rate_limit()
-        
         headers = {
             'User-Agent': USER_AGENT,
             'Accept': 'application/json'
         }
         
         try:
-            response = requests.get(url, headers=headers)
+            response = self.http.get(url, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
@@ -390,56 +540,50 @@ class SpotifyAPI:
         self.client_secret = spotify_client_secret
         self.access_token = None
         self.token_expiry = 0
-        self.last_request_time = 0
-    
-    def _rate_limit(self) -> None:
-        """Implementa el límite de tasa para las solicitudes a Spotify"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        
-        if time_since_last_request < SPOTIFY_RATE_LIMIT:
-            time.sleep(SPOTIFY_RATE_LIMIT - time_since_last_request)
-        
-        self.last_request_time = time.time()
+        self.http = RateLimitedSession(pool_size=PROVIDER_POOL_SIZE)
+        self._token_lock = threading.Lock()
     
     def _get_token(self) -> bool:
         """Obtiene un token de acceso para la API de Spotify"""
-        if self.access_token and time.time() < self.token_expiry:
+        with self._token_lock:
+            if self.access_token and time.time() < self.token_expiry:
+                return True
+            
+            if not self.client_id or not self.client_secret:
+                logger.warning("No se proporcionaron credenciales de Spotify")
+                return False
+            
+            auth_url = "https://accounts.spotify.com/api/token"
+            try:
+                auth_response = self.http.post(auth_url, data={
+                    'grant_type': 'client_credentials',
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                })
+            except requests.RequestException as e:
+                logger.error(f"Error al obtener token de Spotify: {e}")
+                return False
+            
+            if auth_response.status_code != 200:
+                logger.error(f"Error al obtener token de Spotify: {auth_response.text}")
+                return False
+            
+            auth_data = auth_response.json()
+            self.access_token = auth_data['access_token']
+            self.token_expiry = time.time() + auth_data['expires_in'] - 60  # Restar 60 segundos por seguridad
             return True
-        
-        if not self.client_id or not self.client_secret:
-            logger.warning("No se proporcionaron credenciales de Spotify")
-            return False
-        
-        auth_url = "https://accounts.spotify.com/api/token"
-        auth_response = requests.post(auth_url, {
-            'grant_type': 'client_credentials',
-            'client_id': self.client_id,
-            'client_secret': self.client_secret,
-        })
-        
-        if auth_response.status_code != 200:
-            logger.error(f"Error al obtener token de Spotify: {auth_response.text}")
-            return False
-        
-        auth_data = auth_response.json()
-        self.access_token = auth_data['access_token']
-        self.token_expiry = time.time() + auth_data['expires_in'] - 60  # Restar 60 segundos por seguridad
-        return True
     
     def _make_request(self, url: str) -> Optional[Dict[str, Any]]:
         """Realiza una solicitud a la API de Spotify"""
         if not self._get_token():
             return None
         
-        self._rate_limit()
-        
         headers = {
             'Authorization': f"Bearer {self.access_token}"
         }
         
         try:
-            response = requests.get(url, headers=headers)
+            response = self.http.get(url, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
@@ -471,7 +615,7 @@ class SpotifyAPI:
 
 
 class ArtistasImagenes:
-    def __init__(self, db_path=None, force_update=False, project_root=None, images_folder=None, albums_folder=None):
+    def __init__(self, db_path=None, force_update=False, project_root=None, images_folder=None, albums_folder=None, max_workers=4):
         self.db_path = db_path
         self.project_root = PROJECT_ROOT
         self.force_update = force_update  # Nueva opción para forzar actualización
@@ -513,6 +657,17 @@ class ArtistasImagenes:
         self.conn = None
         self.cursor = None
         
+        # Huellas de las imágenes ya guardadas (se cargan en run)
+        self.fingerprints = None
+        
+        # Artistas o álbumes procesados a la vez. Cada uno consulta todos los
+        # proveedores en paralelo; el ritmo lo marca el límite de cada host
+        self.max_workers = max(1, int(max_workers))
+        self.provider_executor = ThreadPoolExecutor(max_workers=self.max_workers * 4)
+        self.download_session = RateLimitedSession(pool_size=self.max_workers * 4)
+        self.db_lock = threading.RLock()
+        self.stats_lock = threading.Lock()
+        
         # Estadísticas
         self.stats = {
             'total_artists': 0,
@@ -550,7 +705,36 @@ class ArtistasImagenes:
         self.discogs_album = DiscogsAlbumAPI(discogs_token)
         self.lastfm_album = LastfmAlbumAPI(lastfm_api_key)
         
+        # Discogs permite 60 peticiones por minuto con token y 25 sin él
+        set_host_rate("api.discogs.com", 1.0 if discogs_token else 25 / 60)
+        
         logger.info("APIs configuradas")
+    
+    def _count_stat(self, key, amount=1):
+        """Incrementa un contador de estadísticas (llamado desde varios hilos)"""
+        with self.stats_lock:
+            self.stats[key] += amount
+    
+    def _count_source(self, source):
+        with self.stats_lock:
+            self.stats['sources'][source] = self.stats['sources'].get(source, 0) + 1
+    
+    def _query_providers(self, calls):
+        """
+        Lanza a la vez las consultas a cada proveedor y junta los resultados
+        en el orden de calls.
+        
+        Args:
+            calls: Lista de (función, argumentos)
+        """
+        futures = [self.provider_executor.submit(func, *args) for func, args in calls]
+        images = []
+        for future in futures:
+            try:
+                images.extend(future.result() or [])
+            except Exception as e:
+                logger.error(f"Error consultando proveedor de imágenes: {e}")
+        return images
 
     def get_discogs_images(self, artist_name):
         """Obtiene imágenes de artista desde Discogs"""
@@ -571,7 +755,8 @@ class ArtistasImagenes:
     def connect_db(self):
         """Conecta a la base de datos"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # La conexión se comparte entre hilos; las escrituras van con db_lock
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
             self.conn.row_factory = sqlite3.Row
             self.cursor = self.conn.cursor()
             logger.info(f"Conectado a la base de datos: {self.db_path}")
@@ -607,6 +792,47 @@ class ArtistasImagenes:
             logger.error(f"Error al obtener artistas: {e}")
             return []
     
+    def get_existing_image_files(self):
+        """Devuelve (ruta, tipo, id) de las imágenes de artistas y carátulas guardadas"""
+        files = []
+        try:
+            self.cursor.execute("SELECT id, img, img_paths FROM artists WHERE img IS NOT NULL OR img_paths IS NOT NULL")
+            for row in self.cursor.fetchall():
+                paths = []
+                if row['img_paths']:
+                    try:
+                        paths = json.loads(row['img_paths'])
+                    except (TypeError, ValueError):
+                        paths = []
+                if row['img']:
+                    paths.append(row['img'])
+                files.extend((path, 'artist', row['id']) for path in paths if isinstance(path, str))
+            
+            self.cursor.execute("SELECT id, album_art_path FROM albums WHERE album_art_path IS NOT NULL")
+            files.extend((row['album_art_path'], 'album', row['id']) for row in self.cursor.fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"Error al obtener las imágenes guardadas: {e}")
+        return files
+    
+    def is_placeholder_image(self, phash, artist_id):
+        """True si la imagen es casi idéntica a las de varios artistas distintos"""
+        if not self.fingerprints:
+            return False
+        with self.db_lock:
+            matches = self.fingerprints.similar(phash)
+        owners = {
+            owner_id for _, (_, kind, owner_id) in matches
+            if kind == 'artist' and owner_id != artist_id
+        }
+        return len(owners) >= PLACEHOLDER_MIN_OWNERS
+    
+    def record_fingerprint(self, path, kind, owner_id, phash):
+        """Guarda la huella de una imagen descargada"""
+        if not self.fingerprints:
+            return
+        with self.db_lock:
+            self.fingerprints.record(path, kind, owner_id, phash)
+    
     def get_artist_image_path(self, artist_name, index=1):
         """Determina la ruta donde se guardará la imagen del artista"""
         # Sanitizar el nombre del artista para usarlo como carpeta
@@ -624,17 +850,8 @@ class ArtistasImagenes:
             if not url:
                 return False
             
-            # Configurar sesión con reintentos y manejo de certificados SSL
-            session = requests.Session()
-            retry_strategy = Retry(
-                total=3,
-                backoff_factor=0.5,
-                status_forcelist=[429, 500, 502, 503, 504],
-                allowed_methods=["GET"]
-            )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
-            session.mount("http://", adapter)
-            session.mount("https://", adapter)
+            # Sesión compartida con reintentos, conexiones keep-alive y límite por host
+            session = self.download_session
             
             # Verificar si es una URL de Last.fm que está fallando con SSL
             verify_ssl = True
@@ -648,13 +865,13 @@ class ArtistasImagenes:
                 'Referer': 'https://www.google.com/'
             }
             
-            response = session.get(url, stream=True, timeout=15, headers=headers, verify=verify_ssl)
+            response = session.get(url, stream=True, headers=headers, verify=verify_ssl)
             
             # Si la respuesta tiene código 403, intentamos con otro User-Agent
             if response.status_code == 403:
                 logger.info(f"Reintentando con User-Agent alternativo: {url}")
                 headers['User-Agent'] = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Safari/605.1.15'
-                response = session.get(url, stream=True, timeout=15, headers=headers, verify=verify_ssl)
+                response = session.get(url, stream=True, headers=headers, verify=verify_ssl)
             
             if response.status_code != 200:
                 logger.warning(f"Error al descargar imagen: {response.status_code} - URL: {url}")
@@ -684,7 +901,7 @@ class ArtistasImagenes:
             try:
                 if 'certificate verify failed' in str(e):
                     logger.info(f"Reintentando sin verificación SSL: {url}")
-                    response = requests.get(url, stream=True, timeout=15, headers=headers, verify=False)
+                    response = session.get(url, stream=True, headers=headers, verify=False)
                     if response.status_code == 200:
                         with open(output_path, 'wb') as f:
                             for chunk in response.iter_content(chunk_size=8192):
@@ -731,29 +948,30 @@ class ArtistasImagenes:
     
     def update_artist_image(self, artist_id, image_paths, img_urls=None):
         """Actualiza las imágenes del artista en la base de datos"""
-        try:
-            if image_paths:
-                # Actualizar la columna img con la primera imagen (para compatibilidad)
-                self.cursor.execute("UPDATE artists SET img = ? WHERE id = ?", 
-                                (image_paths[0], artist_id))
+        with self.db_lock:
+            try:
+                if image_paths:
+                    # Actualizar la columna img con la primera imagen (para compatibilidad)
+                    self.cursor.execute("UPDATE artists SET img = ? WHERE id = ?", 
+                                    (image_paths[0], artist_id))
                 
-                # Guardar todas las rutas en la columna img_paths
-                img_paths_json = json.dumps(image_paths)
-                self.cursor.execute("UPDATE artists SET img_paths = ? WHERE id = ?", 
-                                (img_paths_json, artist_id))
-            
-            # Si tenemos URLs de imágenes, actualizarlas en img_urls
-            if img_urls:
-                # Convertir a formato JSON
-                img_urls_json = json.dumps(img_urls)
-                self.cursor.execute("UPDATE artists SET img_urls = ? WHERE id = ?", 
-                                (img_urls_json, artist_id))
+                    # Guardar todas las rutas en la columna img_paths
+                    img_paths_json = json.dumps(image_paths)
+                    self.cursor.execute("UPDATE artists SET img_paths = ? WHERE id = ?", 
+                                    (img_paths_json, artist_id))
             
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            logger.error(f"Error al actualizar imagen de artista: {e}")
-            return False
+                # Si tenemos URLs de imágenes, actualizarlas en img_urls
+                if img_urls:
+                    # Convertir a formato JSON
+                    img_urls_json = json.dumps(img_urls)
+                    self.cursor.execute("UPDATE artists SET img_urls = ? WHERE id = ?", 
+                                    (img_urls_json, artist_id))
+            
+                self.conn.commit()
+                return True
+            except sqlite3.Error as e:
+                logger.error(f"Error al actualizar imagen de artista: {e}")
+                return False
     
     def process_artist(self, artist, descargar_img=True, guardar_url=True):
         """Procesa un artista para descargar imágenes y/o guardar URLs"""
@@ -781,25 +999,24 @@ class ArtistasImagenes:
         
         logger.info(f"Procesando artista: {artist_name}")
         
-        # Obtener imágenes de todas las fuentes
-        spotify_images = self.get_spotify_images(artist_name, artist_id, spotify_url)
-        mb_images = self.get_musicbrainz_images(artist_name, mbid)
-        discogs_images = self.get_discogs_images(artist_name)
-        lastfm_images = self.get_lastfm_images(artist_name)
-        
-        # Combinar todas las imágenes
-        all_images = spotify_images + mb_images + discogs_images + lastfm_images
+        # Obtener imágenes de todas las fuentes a la vez
+        all_images = self._query_providers([
+            (self.get_spotify_images, (artist_name, artist_id, spotify_url)),
+            (self.get_musicbrainz_images, (artist_name, mbid)),
+            (self.get_discogs_images, (artist_name,)),
+            (self.get_lastfm_images, (artist_name,)),
+        ])
         
         if not all_images:
             logger.warning(f"No se encontraron imágenes para {artist_name}")
-            self.stats['sources']['none'] = self.stats['sources'].get('none', 0) + 1
-            self.stats['artists_failed'] += 1
+            self._count_source('none')
+            self._count_stat('artists_failed')
             return False
         
         # Registrar las fuentes
         for img in all_images:
             source = img.get('source', 'unknown')
-            self.stats['sources'][source] = self.stats['sources'].get(source, 0) + 1
+            self._count_source(source)
         
         # Si solo necesitamos guardar URLs
         if guardar_url and not descargar_img:
@@ -814,7 +1031,7 @@ class ArtistasImagenes:
             
             if self.update_artist_image(artist_id, None, img_urls):
                 logger.info(f"URLs de imágenes guardadas para {artist_name}")
-                self.stats['artists_urls_saved'] += 1
+                self._count_stat('artists_urls_saved')
                 return True
         
         # Si necesitamos descargar imágenes
@@ -836,9 +1053,9 @@ class ArtistasImagenes:
             artist_dir = os.path.join(self.images_folder, safe_name)
             os.makedirs(artist_dir, exist_ok=True)
             
-            # Carpeta temporal para verificar duplicados
-            temp_dir = os.path.join(artist_dir, "temp")
-            os.makedirs(temp_dir, exist_ok=True)
+            # Carpeta temporal para verificar duplicados, propia de este artista: dos
+            # nombres que se limpian igual comparten artist_dir y se procesan a la vez
+            temp_dir = tempfile.mkdtemp(prefix=f"temp_{artist_id}_", dir=artist_dir)
             
             # Descargar imágenes a carpeta temporal
             downloaded_temp_paths = []
@@ -846,89 +1063,77 @@ class ArtistasImagenes:
             # Primera pasada: descargar todas las imágenes a carpeta temporal
             max_attempts = min(15, len(all_images))  # Intentar con más imágenes disponibles
             
-            for i, img in enumerate(all_images[:max_attempts]):
+            def download_candidate(i, img):
                 temp_path = os.path.join(temp_dir, f"temp_{i+1}.jpg")
                 
-                if self.download_image(img['url'], temp_path):
-                    # Verificar que la imagen es válida
+                if not self.download_image(img['url'], temp_path):
+                    return None
+                
+                # Verificar que la imagen es válida
+                try:
+                    with Image.open(temp_path) as im:
+                        width, height = im.size
+                    # Descartar imágenes muy pequeñas
+                    if width < 50 or height < 50:
+                        logger.warning(f"Imagen demasiado pequeña descartada: {width}x{height}")
+                        os.remove(temp_path)
+                        return None
+                    return (temp_path, img)
+                except Exception as e:
+                    logger.warning(f"No es una imagen válida: {e}")
                     try:
-                        with Image.open(temp_path) as im:
-                            width, height = im.size
-                            # Descartar imágenes muy pequeñas
-                            if width < 50 or height < 50:
-                                logger.warning(f"Imagen demasiado pequeña descartada: {width}x{height}")
-                                os.remove(temp_path)
-                                continue
-                        
-                        downloaded_temp_paths.append((temp_path, img))
-                    except Exception as e:
-                        logger.warning(f"No es una imagen válida: {e}")
-                        try:
-                            os.remove(temp_path)
-                        except:
-                            pass
+                        os.remove(temp_path)
+                    except:
+                        pass
+                    return None
+            
+            # Las descargas van a hosts distintos, así que se hacen en paralelo
+            candidates = list(self.provider_executor.map(
+                download_candidate, range(max_attempts), all_images[:max_attempts]
+            ))
+            downloaded_temp_paths = [c for c in candidates if c is not None]
             
             # Segunda pasada: detectar duplicados visuales
             unique_images = []
-            phashes = []
+            unique_hashes = []
+            local_index = PhashIndex()
             
-            # Intentar usar hash perceptual primero
-            try:
-                import cv2  # Verificar que OpenCV está disponible
+            temp_hashes = calculate_phashes([temp_path for temp_path, _ in downloaded_temp_paths])
+            
+            for i, ((temp_path, img), phash) in enumerate(zip(downloaded_temp_paths, temp_hashes)):
+                # Si no pudimos calcular el hash, continuar con la siguiente
+                if phash is None:
+                    continue
                 
-                for i, (temp_path, img) in enumerate(downloaded_temp_paths):
-                    phash = calculate_phash(temp_path)
-                    
-                    # Si no pudimos calcular el hash, continuar con la siguiente
-                    if phash is None:
-                        continue
-                    
-                    # Verificar si es un duplicado visual
-                    is_duplicate = False
-                    for j, existing_hash in enumerate(phashes):
-                        # Umbral para considerar imágenes similares (ajustable)
-                        if hamming_distance(phash, existing_hash) < 10:  # Umbral bajo = más estricto
-                            is_duplicate = True
-                            logger.info(f"Imagen {i+1} es duplicado visual de imagen {j+1}")
-                            
-                            # Verificar cuál tiene mejor calidad (tamaño de archivo)
-                            current_size = os.path.getsize(temp_path)
-                            existing_size = os.path.getsize(unique_images[j][0])
-                            
-                            if current_size > existing_size * 1.2:  # 20% más grande
-                                # Reemplazar la existente con esta de mejor calidad
-                                logger.info(f"Reemplazando imagen {j+1} con versión de mayor calidad")
-                                unique_images[j] = (temp_path, img)
-                            break
-                    
-                    if not is_duplicate:
-                        phashes.append(phash)
-                        unique_images.append((temp_path, img))
-                        
-                        # Limitamos a 5 imágenes únicas
-                        if len(unique_images) >= 5:
-                            break
-                            
-            except (ImportError, NameError):
-                logger.warning("OpenCV no disponible, usando comparación de histogramas")
+                # Descartar imágenes genéricas que ya tienen otros artistas
+                if self.is_placeholder_image(phash, artist_id):
+                    logger.info(f"Imagen {i+1} descartada: coincide con imágenes de otros artistas")
+                    continue
                 
-                # Si OpenCV no está disponible, usar comparación de histogramas
-                for temp_path, img in downloaded_temp_paths:
-                    is_duplicate = False
+                # Verificar si es un duplicado visual de las ya elegidas
+                matches = local_index.nearest(phash, PHASH_DUPLICATE_DISTANCE - 1)
+                if matches:
+                    j = matches[0][1]
+                    logger.info(f"Imagen {i+1} es duplicado visual de imagen {j+1}")
                     
-                    for existing_path, _ in unique_images:
-                        similarity = calculate_histogram_similarity(temp_path, existing_path)
-                        # Umbral para considerar duplicados (menor = más similar)
-                        if similarity < 5000:  # Ajustar según resultados
-                            is_duplicate = True
-                            break
+                    # Verificar cuál tiene mejor calidad (tamaño de archivo)
+                    current_size = os.path.getsize(temp_path)
+                    existing_size = os.path.getsize(unique_images[j][0])
                     
-                    if not is_duplicate:
-                        unique_images.append((temp_path, img))
-                        
-                        # Limitamos a 5 imágenes únicas
-                        if len(unique_images) >= 5:
-                            break
+                    if current_size > existing_size * 1.2:  # 20% más grande
+                        # Reemplazar la existente con esta de mejor calidad
+                        logger.info(f"Reemplazando imagen {j+1} con versión de mayor calidad")
+                        unique_images[j] = (temp_path, img)
+                        unique_hashes[j] = phash
+                    continue
+                
+                local_index.add(phash, len(unique_images))
+                unique_images.append((temp_path, img))
+                unique_hashes.append(phash)
+                
+                # Limitamos a 5 imágenes únicas
+                if len(unique_images) >= 5:
+                    break
             
             # Tercera pasada: mover archivos únicos a su ubicación final
             downloaded_paths = []
@@ -943,6 +1148,7 @@ class ArtistasImagenes:
                     import shutil
                     shutil.copy2(temp_path, final_path)
                     downloaded_paths.append(final_path)
+                    self.record_fingerprint(final_path, 'artist', artist_id, unique_hashes[i])
                     
                     # Guardar información de la imagen
                     img_info = {
@@ -965,11 +1171,11 @@ class ArtistasImagenes:
                 # Actualizar la base de datos con todas las rutas y las URLs
                 if self.update_artist_image(artist_id, downloaded_paths, saved_img_info if guardar_url else None):
                     logger.info(f"Imágenes y URLs actualizadas para {artist_name}. Imágenes únicas: {len(downloaded_paths)}")
-                    self.stats['artists_downloaded'] += 1
+                    self._count_stat('artists_downloaded')
                     return True
             
         logger.warning(f"No se pudo procesar completamente {artist_name}")
-        self.stats['artists_failed'] += 1
+        self._count_stat('artists_failed')
         return False
     
     def run(self, descargar_img_artistas=True, guardar_url_artistas=True, 
@@ -984,26 +1190,21 @@ class ArtistasImagenes:
                 logger.error("No se pudo verificar/crear la estructura de la base de datos")
                 return self.stats
             
+            # Huellas de las imágenes existentes: sólo se calculan las nuevas o cambiadas
+            self.fingerprints = ImageFingerprints(self.conn)
+            self.fingerprints.sync(self.get_existing_image_files())
+            
             # Procesar artistas si se solicita
             if descargar_img_artistas or guardar_url_artistas:
                 artists = self.get_artists()
                 self.stats['total_artists'] = len(artists)
                 
                 logger.info(f"Procesando {len(artists)} artistas...")
-                
-                for i, artist in enumerate(artists):
-                    self.stats['processed_artists'] = i + 1
-                    
-                    # Mostrar progreso
-                    if i % 10 == 0 or i == len(artists) - 1:
-                        progress = (i + 1) / len(artists) * 100
-                        logger.info(f"Progreso artistas: {progress:.1f}% ({i+1}/{len(artists)})")
-                    
-                    if not self.process_artist(artist, descargar_img_artistas, guardar_url_artistas):
-                        logger.debug(f"No se pudo procesar el artista {artist['name']}")
-                    
-                    # Pequeña pausa para no sobrecargar la base de datos y APIs
-                    time.sleep(0.1)
+                self._process_items(
+                    'artist', artists,
+                    lambda artist: self.process_artist(artist, descargar_img_artistas, guardar_url_artistas),
+                    "artistas"
+                )
             
             # Procesar álbumes si se solicita
             if descargar_img_albums or guardar_url_albums:
@@ -1011,20 +1212,11 @@ class ArtistasImagenes:
                 self.stats['total_albums'] = len(albums)
                 
                 logger.info(f"Procesando {len(albums)} álbumes...")
-                
-                for i, album in enumerate(albums):
-                    self.stats['processed_albums'] = i + 1
-                    
-                    # Mostrar progreso
-                    if i % 10 == 0 or i == len(albums) - 1:
-                        progress = (i + 1) / len(albums) * 100
-                        logger.info(f"Progreso álbumes: {progress:.1f}% ({i+1}/{len(albums)})")
-                    
-                    if not self.process_album(album, descargar_img_albums, guardar_url_albums):
-                        logger.debug(f"No se pudo procesar el álbum {album['name']}")
-                    
-                    # Pequeña pausa para no sobrecargar la base de datos y APIs
-                    time.sleep(0.1)
+                self._process_items(
+                    'album', albums,
+                    lambda album: self.process_album(album, descargar_img_albums, guardar_url_albums),
+                    "álbumes"
+                )
             
             logger.info("Proceso completado.")
             logger.info(f"Resultados artistas: {self.stats['artists_downloaded']} imágenes descargadas, " +
@@ -1043,6 +1235,92 @@ class ArtistasImagenes:
         return self.stats
 
 
+    def _process_items(self, kind, items, process, label):
+        """
+        Procesa artistas o álbumes en paralelo, max_workers a la vez.
+        
+        Cada elemento terminado se anota en artwork_refresh_progress; si el
+        proceso se interrumpe, la siguiente ejecución continúa donde lo dejó.
+        
+        Args:
+            kind: 'artist' o 'album'
+            items: Filas con 'id' y 'name'
+            process: Función que procesa un elemento y devuelve True/False
+            label: Nombre para los mensajes de progreso
+        """
+        done = self.start_refresh(kind)
+        pending = [item for item in items if item['id'] not in done]
+        if done:
+            logger.info(f"Reanudando {label}: {len(done)} ya procesados, {len(pending)} pendientes")
+        
+        total = len(items)
+        processed = total - len(pending)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(process, item): item for item in pending}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    success = future.result()
+                except Exception as e:
+                    logger.error(f"Error procesando {item['name']}: {e}")
+                    success = False
+                
+                if not success:
+                    logger.debug(f"No se pudo procesar {item['name']}")
+                self.mark_refreshed(kind, item['id'], success)
+                
+                processed += 1
+                self.stats[f'processed_{kind}s'] = processed
+                
+                # Mostrar progreso
+                if processed % 10 == 0 or processed == total:
+                    progress = processed / total * 100
+                    logger.info(f"Progreso {label}: {progress:.1f}% ({processed}/{total})")
+        
+        self.finish_refresh(kind)
+    
+    def start_refresh(self, kind):
+        """
+        Empieza o reanuda una pasada completa sobre artistas o álbumes.
+        
+        Returns:
+            set: Ids ya procesados en una pasada anterior sin terminar
+        """
+        with self.db_lock:
+            row = self.cursor.execute(
+                "SELECT force_update FROM artwork_refresh_runs WHERE kind = ?", (kind,)
+            ).fetchone()
+            
+            # Una pasada forzada no se mezcla con otra normal, ni al revés
+            if row and bool(row['force_update']) == bool(self.force_update):
+                self.cursor.execute("SELECT item_id FROM artwork_refresh_progress WHERE kind = ?", (kind,))
+                return {r['item_id'] for r in self.cursor.fetchall()}
+            
+            self.cursor.execute("DELETE FROM artwork_refresh_progress WHERE kind = ?", (kind,))
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO artwork_refresh_runs (kind, force_update) VALUES (?, ?)",
+                (kind, int(bool(self.force_update)))
+            )
+            self.conn.commit()
+            return set()
+    
+    def mark_refreshed(self, kind, item_id, success):
+        """Anota un artista o álbum como procesado en la pasada actual"""
+        with self.db_lock:
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO artwork_refresh_progress (kind, item_id, success) VALUES (?, ?, ?)",
+                (kind, item_id, int(bool(success)))
+            )
+            self.conn.commit()
+    
+    def finish_refresh(self, kind):
+        """Cierra la pasada: la siguiente ejecución empezará de cero"""
+        with self.db_lock:
+            self.cursor.execute("DELETE FROM artwork_refresh_progress WHERE kind = ?", (kind,))
+            self.cursor.execute("DELETE FROM artwork_refresh_runs WHERE kind = ?", (kind,))
+            self.conn.commit()
+
     def get_album_image_path(self, artist_name, album_name, index=1):
         """Determina la ruta donde se guardará la imagen del álbum"""
         # Sanitizar nombres para usarlos como carpeta
@@ -1075,32 +1353,34 @@ class ArtistasImagenes:
     
     def update_album_cover(self, album_id, image_path, img_urls=None):
         """Actualiza la carátula del álbum en la base de datos"""
-        try:
-            # Actualizar la columna album_art_path en la tabla albums
-            self.cursor.execute("UPDATE albums SET album_art_path = ? WHERE id = ?", 
-                            (image_path, album_id))
+        with self.db_lock:
+            try:
+                # Actualizar la columna album_art_path en la tabla albums
+                self.cursor.execute("UPDATE albums SET album_art_path = ? WHERE id = ?", 
+                                (image_path, album_id))
             
-            # Si tenemos URLs de imágenes, actualizarlas en album_art_urls
-            if img_urls:
-                # Convertir a formato JSON
-                img_urls_json = json.dumps(img_urls)
-                self.cursor.execute("UPDATE albums SET album_art_urls = ? WHERE id = ?", 
-                                (img_urls_json, album_id))
+                # Si tenemos URLs de imágenes, actualizarlas en album_art_urls
+                if img_urls:
+                    # Convertir a formato JSON
+                    img_urls_json = json.dumps(img_urls)
+                    self.cursor.execute("UPDATE albums SET album_art_urls = ? WHERE id = ?", 
+                                    (img_urls_json, album_id))
             
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            logger.error(f"Error al actualizar carátula de álbum: {e}")
-            return False
+                self.conn.commit()
+                return True
+            except sqlite3.Error as e:
+                logger.error(f"Error al actualizar carátula de álbum: {e}")
+                return False
     
     def get_album_covers(self, artist_name, album_name, album_mbid=None):
-        """Obtiene carátulas de un álbum desde todas las fuentes"""
-        spotify_images = self.spotify_album.get_album_cover(artist_name, album_name, album_mbid)
-        mb_images = self.musicbrainz_album.get_album_cover(artist_name, album_name, album_mbid)
-        discogs_images = self.discogs_album.get_album_cover(artist_name, album_name, album_mbid)
-        lastfm_images = self.lastfm_album.get_album_cover(artist_name, album_name, album_mbid)
-        
-        return spotify_images + mb_images + discogs_images + lastfm_images
+        """Obtiene carátulas de un álbum desde todas las fuentes a la vez"""
+        args = (artist_name, album_name, album_mbid)
+        return self._query_providers([
+            (self.spotify_album.get_album_cover, args),
+            (self.musicbrainz_album.get_album_cover, args),
+            (self.discogs_album.get_album_cover, args),
+            (self.lastfm_album.get_album_cover, args),
+        ])
     
     def process_album(self, album, descargar_img=True, guardar_url=True):
         """Procesa un álbum para descargar carátula y/o guardar URLs"""
@@ -1138,14 +1418,14 @@ class ArtistasImagenes:
         
         if not all_images:
             logger.warning(f"No se encontraron carátulas para {album_name} de {artist_name}")
-            self.stats['sources']['none'] = self.stats['sources'].get('none', 0) + 1
-            self.stats['albums_failed'] += 1
+            self._count_source('none')
+            self._count_stat('albums_failed')
             return False
         
         # Registrar las fuentes
         for img in all_images:
             source = img.get('source', 'unknown')
-            self.stats['sources'][source] = self.stats['sources'].get(source, 0) + 1
+            self._count_source(source)
         
         # Si solo necesitamos guardar URLs
         if guardar_url and not descargar_img:
@@ -1160,7 +1440,7 @@ class ArtistasImagenes:
             
             if self.update_album_cover(album_id, existing_cover, img_urls):
                 logger.info(f"URLs de carátulas guardadas para {album_name}")
-                self.stats['albums_urls_saved'] += 1
+                self._count_stat('albums_urls_saved')
                 return True
         
         # Si necesitamos descargar imágenes
@@ -1200,7 +1480,8 @@ class ArtistasImagenes:
                 if downloaded_path:
                     break  # Ya hemos encontrado una buena imagen
                 
-                temp_path = os.path.join(temp_dir, f"temp_album_{i+1}.jpg")
+                # El id en el nombre evita choques entre álbumes procesados a la vez
+                temp_path = os.path.join(temp_dir, f"temp_album_{album_id}_{i+1}.jpg")
                 
                 if self.download_image(img['url'], temp_path):
                     # Verificar calidad mínima
@@ -1219,6 +1500,7 @@ class ArtistasImagenes:
                         shutil.copy2(temp_path, final_path)
                         
                         downloaded_path = final_path
+                        self.record_fingerprint(final_path, 'album', album_id, calculate_phash(final_path))
                         saved_img_info = [{
                             'url': img['url'],
                             'path': final_path,
@@ -1229,11 +1511,12 @@ class ArtistasImagenes:
                     except Exception as e:
                         logger.warning(f"Error procesando imagen: {e}")
             
-            # Limpieza de archivos temporales
+            # Limpieza de archivos temporales de este álbum
             try:
-                import shutil
+                prefix = f"temp_album_{album_id}_"
                 for file in os.listdir(temp_dir):
-                    os.remove(os.path.join(temp_dir, file))
+                    if file.startswith(prefix):
+                        os.remove(os.path.join(temp_dir, file))
             except Exception as e:
                 logger.warning(f"Error al limpiar archivos temporales: {e}")
             
@@ -1241,7 +1524,7 @@ class ArtistasImagenes:
             if downloaded_path:
                 if self.update_album_cover(album_id, downloaded_path, saved_img_info if guardar_url else None):
                     logger.info(f"Carátula y URLs actualizadas para {album_name}")
-                    self.stats['albums_downloaded'] += 1
+                    self._count_stat('albums_downloaded')
                     return True
                 
             # Si no pudimos descargar pero queremos guardar URLs
@@ -1256,11 +1539,11 @@ class ArtistasImagenes:
                 
                 if self.update_album_cover(album_id, existing_cover, img_urls):
                     logger.info(f"No se descargó carátula pero se guardaron URLs para {album_name}")
-                    self.stats['albums_urls_saved'] += 1
+                    self._count_stat('albums_urls_saved')
                     return True
         
         logger.warning(f"No se pudo procesar completamente el álbum {album_name}")
-        self.stats['albums_failed'] += 1
+        self._count_stat('albums_failed')
         return False
 
 
@@ -1292,6 +1575,24 @@ class ArtistasImagenes:
             if 'album_art_urls' not in album_columns:
                 logger.info("Creando columna 'album_art_urls' en la tabla albums")
                 self.cursor.execute("ALTER TABLE albums ADD COLUMN album_art_urls TEXT")
+            
+            # Estado de la pasada en curso, para reanudarla si se interrumpe
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS artwork_refresh_runs (
+                    kind TEXT PRIMARY KEY,
+                    force_update INTEGER NOT NULL DEFAULT 0,
+                    started TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS artwork_refresh_progress (
+                    kind TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    success INTEGER NOT NULL,
+                    updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (kind, item_id)
+                ) WITHOUT ROWID
+            """)
                 
             self.conn.commit()
             logger.info("Estructura de la base de datos verificada y actualizada")
@@ -1405,7 +1706,7 @@ class MusicBrainzAlbumAPI(MusicBrainzAPI):
             url = f"{MUSICBRAINZ_COVER_ART}/release/{album_mbid}"
             
             try:
-                response = requests.get(url, headers={'Accept': 'application/json'})
+                response = self.http.get(url, headers={'Accept': 'application/json'})
                 if response.status_code == 200:
                     data = response.json()
                     if 'images' in data:
@@ -1535,13 +1836,6 @@ def main(config=None):
         logger.error("No se proporcionó configuración")
         return 1
     
-    # Verificar dependencias opcionales
-    try:
-        import cv2
-        logger.info("OpenCV disponible para detección avanzada de duplicados")
-    except ImportError:
-        logger.warning("OpenCV no disponible. Se usará detección básica de duplicados.")
-    
     try:
         from PIL import Image
         logger.info("PIL disponible para procesamiento de imágenes")
@@ -1568,6 +1862,9 @@ def main(config=None):
     # Opción para forzar actualización
     force_update = config.get('force_update', False)
     
+    # Artistas/álbumes procesados en paralelo
+    max_workers = int(config.get('max_workers', 4))
+    
     # Manejo de valores booleanos en forma de string
     if isinstance(descargar_img_artistas, str):
         descargar_img_artistas = descargar_img_artistas.lower() == 'true'
@@ -1587,7 +1884,12 @@ def main(config=None):
     lastfm_api_key = config.get('lastfm_api_key', '')
     
     # Iniciar el proceso
-    gestor = ArtistasImagenes(db_path, project_root, force_update)
+    gestor = ArtistasImagenes(
+        db_path,
+        force_update=force_update,
+        project_root=project_root,
+        max_workers=max_workers
+    )
     gestor.setup_apis(
         spotify_client_id=spotify_client_id,
         spotify_client_secret=spotify_client_secret,
@@ -1635,6 +1937,8 @@ if __name__ == "__main__":
     # Opción para forzar actualización
     parser.add_argument('--force_update', choices=['true', 'false'], default='false',
                        help='Forzar actualización incluso si ya existen datos (true/false)')
+    parser.add_argument('--max_workers', type=int, default=4,
+                       help='Artistas/álbumes procesados en paralelo')
     
     # Configuración de APIs
     parser.add_argument('--spotify_client_id', help='ID de cliente de Spotify')
@@ -1656,6 +1960,7 @@ if __name__ == "__main__":
         'descargar_img_albums': args.descargar_img_albums,
         'guardar_url_albums': args.guardar_url_albums,
         'force_update': args.force_update,
+        'max_workers': args.max_workers,
         'spotify_client_id': args.spotify_client_id,
         'spotify_client_secret': args.spotify_client_secret,
         'discogs_token': args.discogs_token,
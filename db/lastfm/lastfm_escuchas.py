@@ -5,8 +5,15 @@ import time
 import sqlite3
 import datetime
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from tools.stats.listen_cube import update_listen_cube, parse_lastfm_date
+from tools.api_cache import get_api_cache, import_legacy_json
+from tools.http_client import TokenBucket
+
 def crear_tabla_scrobbles(conn, lastfm_user):
     """
     Crea la tabla para almacenar los scrobbles del usuario si no existe.
@@ -48,6 +55,29 @@ def crear_tabla_scrobbles(conn, lastfm_user):
     )
     """)
     
+    # Tablas de control para reanudar importaciones interrumpidas
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS lastfm_import_runs (
+        lastfm_username TEXT PRIMARY KEY,
+        desde_timestamp INTEGER NOT NULL,
+        hasta_timestamp INTEGER NOT NULL,
+        limite INTEGER NOT NULL,
+        total_paginas INTEGER NOT NULL,
+        iniciada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS lastfm_import_pages (
+        lastfm_username TEXT NOT NULL,
+        pagina INTEGER NOT NULL,
+        scrobbles INTEGER NOT NULL,
+        max_timestamp INTEGER DEFAULT 0,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (lastfm_username, pagina)
+    )
+    """)
+    
     # Crear índices para búsquedas eficientes
     cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla_scrobbles}_artist ON {tabla_scrobbles}(artist_name)")
     cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla_scrobbles}_name ON {tabla_scrobbles}(name)")
@@ -57,9 +87,122 @@ def crear_tabla_scrobbles(conn, lastfm_user):
     cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla_scrobbles}_artist_name ON {tabla_scrobbles}(artist_name, name)")
     cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla_scrobbles}_artist_album_name ON {tabla_scrobbles}(artist_name, album_name, name)")
     
+    # Clave normalizada y tabla de reproducciones para la carga masiva
+    crear_tabla_reproducciones(conn, lastfm_user)
+    
     conn.commit()
     print(f"Tabla {tabla_scrobbles} creada o verificada correctamente.")
 
+def normalizar_clave(texto):
+    """Clave de comparación: sin espacios sobrantes y sin distinguir mayúsculas."""
+    return " ".join((texto or "").split()).casefold()
+
+def crear_tabla_reproducciones(conn, lastfm_user):
+    """
+    Prepara la tabla de scrobbles para la carga masiva.
+    
+    Añade las columnas artist_key y name_key con un índice único, y crea
+    lastfm_plays_<usuario> con una fila por reproducción. Las filas antiguas
+    (o insertadas por otros módulos) se migran con normalizar_claves_pendientes.
+    
+    Args:
+        conn: Conexión a la base de datos SQLite
+        lastfm_user: Nombre de usuario de Last.fm
+    """
+    cursor = conn.cursor()
+    tabla_scrobbles = f"scrobbles_{lastfm_user}"
+    tabla_plays = f"lastfm_plays_{lastfm_user}"
+    
+    cursor.execute(f"PRAGMA table_info({tabla_scrobbles})")
+    columnas = {col[1] for col in cursor.fetchall()}
+    for columna in ('artist_key', 'name_key'):
+        if columna not in columnas:
+            cursor.execute(f"ALTER TABLE {tabla_scrobbles} ADD COLUMN {columna} TEXT")
+    
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabla_scrobbles}_key ON {tabla_scrobbles}(artist_key, name_key)")
+    
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {tabla_plays} (
+        scrobble_id INTEGER NOT NULL,
+        fecha TEXT NOT NULL,
+        timestamp INTEGER,
+        PRIMARY KEY (scrobble_id, fecha)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla_plays}_timestamp ON {tabla_plays}(timestamp)")
+    conn.commit()
+    
+    normalizar_claves_pendientes(conn, lastfm_user)
+
+def normalizar_claves_pendientes(conn, lastfm_user):
+    """
+    Rellena la clave normalizada de las filas que no la tienen.
+    
+    Las fechas guardadas en fecha_reproducciones pasan a lastfm_plays_<usuario>
+    y, si otra fila ya tenía la misma clave, ambas se fusionan en ella.
+    
+    Returns:
+        Número de filas normalizadas
+    """
+    cursor = conn.cursor()
+    tabla_scrobbles = f"scrobbles_{lastfm_user}"
+    tabla_plays = f"lastfm_plays_{lastfm_user}"
+    
+    cursor.execute(f"""
+    SELECT id, artist_name, name, timestamp, fecha_scrobble, fecha_reproducciones
+    FROM {tabla_scrobbles}
+    WHERE artist_key IS NULL
+    """)
+    pendientes = cursor.fetchall()
+    if not pendientes:
+        return 0
+    
+    print(f"Normalizando {len(pendientes)} scrobbles de {tabla_scrobbles}...")
+    afectados = set()
+    
+    for id_fila, artista, cancion, timestamp, fecha_scrobble, fechas_json in pendientes:
+        clave = (normalizar_clave(artista), normalizar_clave(cancion))
+        cursor.execute(f"SELECT id FROM {tabla_scrobbles} WHERE artist_key = ? AND name_key = ?", clave)
+        existente = cursor.fetchone()
+        
+        if existente:
+            destino = existente[0]
+            cursor.execute(f"""
+            UPDATE {tabla_scrobbles}
+            SET fecha_scrobble = CASE WHEN ? > timestamp THEN ? ELSE fecha_scrobble END,
+                timestamp = MAX(timestamp, ?)
+            WHERE id = ?
+            """, (timestamp, fecha_scrobble, timestamp, destino))
+            cursor.execute(f"DELETE FROM {tabla_scrobbles} WHERE id = ?", (id_fila,))
+        else:
+            destino = id_fila
+            cursor.execute(f"UPDATE {tabla_scrobbles} SET artist_key = ?, name_key = ? WHERE id = ?",
+                           (*clave, id_fila))
+        
+        try:
+            fechas = json.loads(fechas_json) if fechas_json else []
+        except (ValueError, TypeError):
+            fechas = []
+        if not fechas and fecha_scrobble:
+            fechas = [fecha_scrobble]
+        
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {tabla_plays} (scrobble_id, fecha, timestamp) VALUES (?, ?, ?)",
+            [(destino, fecha, parse_lastfm_date(fecha) or timestamp) for fecha in fechas]
+        )
+        afectados.add(destino)
+    
+    # La lista JSON ya no se mantiene: las fechas viven en la tabla de reproducciones
+    cursor.executemany(f"""
+    UPDATE {tabla_scrobbles}
+    SET fecha_reproducciones = NULL,
+        reproducciones = (SELECT COUNT(*) FROM {tabla_plays} WHERE scrobble_id = ?)
+    WHERE id = ?
+    """, [(id_fila, id_fila) for id_fila in afectados])
+    
+    conn.commit()
+    return len(pendientes)
+
 def obtener_ultimo_timestamp(conn, lastfm_user):
     """
     Obtiene el timestamp del último scrobble procesado.
@@ -125,59 +268,35 @@ def guardar_ultimo_timestamp(conn, timestamp, lastfm_user):
 
 class CacheJSON:
     """
-    Clase para manejar la caché de peticiones a Last.fm mediante archivos JSON.
+    Caché de peticiones a Last.fm.
+    
+    Las entradas se guardan en la caché compartida (tools/api_cache.py) bajo el
+    espacio de nombres 'lastfm': cada consulta lee sólo su clave y el
+    tamaño total en disco está acotado.
     """
+    NAMESPACE = "lastfm"
+    
     def __init__(self, cache_dir=None, duracion_cache=7):
         """
         Inicializa la caché.
         
         Args:
-            cache_dir: Directorio para almacenar los archivos de caché
+            cache_dir: Directorio de la caché JSON antigua; si se indica se
+                       activa la caché y se importa lastfm_cache.json si existe
             duracion_cache: Duración en días de la validez de la caché
         """
-        self.cache = {}
-        self.cache_file = None
+        self.cache = None
         self.duracion_cache = duracion_cache  # en días
         
         if cache_dir:
-            os.makedirs(cache_dir, exist_ok=True)
-            self.cache_file = os.path.join(cache_dir, "lastfm_cache.json")
-            self.cargar_cache()
-    
-    def cargar_cache(self):
-        """Carga la caché desde el archivo si existe."""
-        if not self.cache_file or not os.path.exists(self.cache_file):
-            return
-        
-        try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                try:
-                    self.cache = json.load(f)
-                    # Filtrar entradas caducadas
-                    ahora = time.time()
-                    self.cache = {
-                        k: v for k, v in self.cache.items()
-                        if 'timestamp' in v and 
-                        (ahora - v['timestamp']) / (60 * 60 * 24) <= self.duracion_cache
-                    }
-                    print(f"Caché cargada con {len(self.cache)} entradas válidas")
-                except json.JSONDecodeError:
-                    print("Error al decodificar el archivo de caché. Usando caché vacía.")
-                    self.cache = {}
-        except Exception as e:
-            print(f"Error al cargar la caché: {e}")
-            self.cache = {}
-    
-    def guardar_cache(self):
-        """Guarda la caché en el archivo."""
-        if not self.cache_file:
-            return
-        
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error al guardar la caché: {e}")
+            self.cache = get_api_cache()
+            import_legacy_json(
+                self.cache, self.NAMESPACE,
+                os.path.join(cache_dir, "lastfm_cache.json"),
+                lambda datos: ((k, v.get('datos'), v.get('timestamp'))
+                               for k, v in datos.items() if isinstance(v, dict)),
+                ttl=self.duracion_cache * 24 * 60 * 60
+            )
     
     def obtener(self, clave):
         """
@@ -189,21 +308,11 @@ class CacheJSON:
         Returns:
             Datos almacenados o None si no existe o ha caducado
         """
-        clave_str = self._normalizar_clave(clave)
-        entrada = self.cache.get(clave_str)
-        
-        if not entrada:
+        if self.cache is None:
             return None
-            
-        # Verificar si ha caducado
-        if 'timestamp' in entrada:
-            edad_dias = (time.time() - entrada['timestamp']) / (60 * 60 * 24)
-            if edad_dias > self.duracion_cache:
-                # Eliminar entrada caducada
-                del self.cache[clave_str]
-                return None
         
-        return entrada.get('datos')
+        return self.cache.get(self.NAMESPACE, self._normalizar_clave(clave),
+                              max_age=self.duracion_cache * 24 * 60 * 60)
     
     def almacenar(self, clave, datos):
         """
@@ -213,19 +322,11 @@ class CacheJSON:
             clave: Clave única para identificar la entrada
             datos: Datos a almacenar
         """
-        if datos is None:
+        if datos is None or self.cache is None:
             return
-            
-        clave_str = self._normalizar_clave(clave)
-        
-        # Almacenar con timestamp para verificar caducidad
-        self.cache[clave_str] = {
-            'datos': datos,
-            'timestamp': time.time()
-        }
         
-        # Guardar en archivo
-        self.guardar_cache()
+        self.cache.set(self.NAMESPACE, self._normalizar_clave(clave), datos,
+                       ttl=self.duracion_cache * 24 * 60 * 60)
     
     def _normalizar_clave(self, clave):
         """
@@ -259,7 +360,7 @@ def setup_cache(cache_dir=None):
     cache_lastfm = CacheJSON(cache_dir)
     return cache_lastfm
 
-def obtener_con_reintentos(url, params, max_reintentos=3, tiempo_espera=1, timeout=10):
+def obtener_con_reintentos(url, params, max_reintentos=3, tiempo_espera=1, timeout=10, limitador=None):
     """
     Realiza una petición HTTP con reintentos en caso de error.
     
@@ -269,11 +370,14 @@ def obtener_con_reintentos(url, params, max_reintentos=3, tiempo_espera=1, timeo
         max_reintentos: Número máximo de reintentos
         tiempo_espera: Tiempo base de espera entre reintentos
         timeout: Tiempo máximo de espera para la petición
+        limitador: TokenBucket opcional que regula el ritmo de peticiones
         
     Returns:
         Respuesta HTTP o None si fallan todos los intentos
     """
     for intento in range(max_reintentos):
+        if limitador:
+            limitador.adquirir()
         try:
             respuesta = requests.get(url, params=params, timeout=timeout)
             
@@ -296,127 +400,6 @@ def obtener_con_reintentos(url, params, max_reintentos=3, tiempo_espera=1, timeo
     
     return None
 
-def obtener_scrobbles_lastfm(lastfm_username, lastfm_api_key, desde_timestamp=0, limite=200):
-    """
-    Obtiene todos los scrobbles de Last.fm para un usuario.
-    
-    Args:
-        lastfm_username: Nombre de usuario de Last.fm
-        lastfm_api_key: API key de Last.fm
-        desde_timestamp: Timestamp desde el que obtener scrobbles
-        limite: Número máximo de scrobbles por página
-        
-    Returns:
-        Lista de scrobbles obtenidos
-    """
-    global cache_lastfm
-    
-    todos_scrobbles = []
-    pagina = 1
-    total_paginas = 1
-    
-    # Mensaje inicial
-    if desde_timestamp > 0:
-        fecha = datetime.datetime.fromtimestamp(desde_timestamp).strftime('%Y-%m-%d %H:%M:%S')
-        print(f"Obteniendo scrobbles desde {fecha}")
-    else:
-        print("Obteniendo todos los scrobbles (esto puede tardar bastante)")
-    
-    while pagina <= total_paginas:
-        print(f"Obteniendo página {pagina} de {total_paginas}...")
-        
-        params = {
-            'method': 'user.getrecenttracks',
-            'user': lastfm_username,
-            'api_key': lastfm_api_key,
-            'format': 'json',
-            'limit': limite,
-            'page': pagina,
-            'from': desde_timestamp
-        }
-        
-        # Verificar en caché primero
-        datos_cache = None
-        if cache_lastfm:
-            # Nunca cachear la primera página para siempre obtener los más recientes
-            if pagina != 1:
-                clave_cache = {
-                    'method': 'user.getrecenttracks',
-                    'user': lastfm_username,
-                    'page': pagina,
-                    'from': desde_timestamp,
-                    'limit': limite
-                }
-                datos_cache = cache_lastfm.obtener(clave_cache)
-                if datos_cache:
-                    print(f"Usando datos en caché para página {pagina}")
-        
-        if datos_cache:
-            datos = datos_cache
-        else:
-            try:
-                respuesta = obtener_con_reintentos('http://ws.audioscrobbler.com/2.0/', params)
-                
-                if not respuesta or respuesta.status_code != 200:
-                    error_msg = f"Error al obtener scrobbles: {respuesta.status_code if respuesta else 'Sin respuesta'}"
-                    print(error_msg)
-                    
-                    if pagina > 1:  # Si hemos obtenido algunas páginas, devolvemos lo que tenemos
-                        break
-                    else:
-                        return []
-                
-                datos = respuesta.json()
-                
-                # Guardar en caché todas las páginas excepto la primera
-                # para asegurar que siempre obtenemos los scrobbles más recientes
-                if cache_lastfm and pagina != 1:
-                    clave_cache = {
-                        'method': 'user.getrecenttracks',
-                        'user': lastfm_username,
-                        'page': pagina,
-                        'from': desde_timestamp,
-                        'limit': limite
-                    }
-                    cache_lastfm.almacenar(clave_cache, datos)
-                    print(f"Guardando en caché página {pagina}")
-                
-            except Exception as e:
-                print(f"Error al procesar página {pagina}: {str(e)}")
-                
-                if pagina > 1:  # Si hemos obtenido algunas páginas, devolvemos lo que tenemos
-                    break
-                else:
-                    return []
-        
-        # Comprobar si hay tracks
-        if 'recenttracks' not in datos or 'track' not in datos['recenttracks']:
-            break
-        
-        # Actualizar total_paginas
-        total_paginas = int(datos['recenttracks']['@attr']['totalPages'])
-        
-        # Añadir tracks a la lista
-        tracks = datos['recenttracks']['track']
-        if not isinstance(tracks, list):
-            tracks = [tracks]
-        
-        # Filtrar tracks que están siendo escuchados actualmente (no tienen date)
-        filtrados = [track for track in tracks if 'date' in track]
-        todos_scrobbles.extend(filtrados)
-        
-        # Reportar progreso
-        print(f"Obtenidos {len(filtrados)} scrobbles en página {pagina}")
-        
-        pagina += 1
-        # Pequeña pausa para no saturar la API
-        time.sleep(0.25)
-    
-    print(f"Obtenidos {len(todos_scrobbles)} scrobbles en total")
-    return todos_scrobbles
-
-
-
 def procesar_scrobbles(scrobbles):
     """
     Procesa y deduplica scrobbles basándose en la misma canción y artista.
@@ -462,13 +445,15 @@ def procesar_scrobbles(scrobbles):
                 'fecha_scrobble': fecha,
                 'lastfm_url': lastfm_url,
                 'reproducciones': 1,
-                'fecha_reproducciones': [fecha]
+                'fecha_reproducciones': [fecha],
+                'escuchas': [(timestamp, fecha)]
             }
         else:
             # Si ya existe, actualizar la entrada
             entrada = scrobbles_agrupados[clave]
             entrada['reproducciones'] += 1
             entrada['fecha_reproducciones'].append(fecha)
+            entrada['escuchas'].append((timestamp, fecha))
             
             # Actualizar timestamp si este es más reciente
             if timestamp > entrada['timestamp']:
@@ -502,6 +487,12 @@ def guardar_scrobbles_en_db(conn, scrobbles, lastfm_user):
     """
     Guarda los scrobbles en la base de datos, actualizando las entradas existentes.
     
+    El lote se copia a tablas temporales y se cruza con los scrobbles guardados
+    mediante la clave normalizada (artist_key, name_key), que tiene índice único.
+    Las entradas se insertan o actualizan con un único INSERT ... ON CONFLICT y
+    las fechas se añaden a lastfm_plays_<usuario> sin repetir, de modo que el
+    coste depende del tamaño del lote y no del historial acumulado.
+    
     Args:
         conn: Conexión a la base de datos
         scrobbles: Lista de scrobbles procesados
@@ -515,78 +506,136 @@ def guardar_scrobbles_en_db(conn, scrobbles, lastfm_user):
     
     cursor = conn.cursor()
     tabla_scrobbles = f"scrobbles_{lastfm_user}"
-    nuevos = 0
-    actualizados = 0
+    tabla_plays = f"lastfm_plays_{lastfm_user}"
     
     print(f"Guardando {len(scrobbles)} scrobbles en la base de datos...")
     
+    # Filas añadidas por otras vías todavía sin clave normalizada
+    normalizar_claves_pendientes(conn, lastfm_user)
+    
+    cursor.execute("DROP TABLE IF EXISTS temp.scrobbles_lote")
+    cursor.execute("""
+    CREATE TEMP TABLE scrobbles_lote (
+        artist_key TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        artist_name TEXT,
+        artist_mbid TEXT,
+        name TEXT,
+        album_name TEXT,
+        album_mbid TEXT,
+        timestamp INTEGER,
+        fecha_scrobble TEXT,
+        lastfm_url TEXT
+    )
+    """)
+    cursor.execute("DROP TABLE IF EXISTS temp.scrobbles_lote_plays")
+    cursor.execute("""
+    CREATE TEMP TABLE scrobbles_lote_plays (
+        artist_key TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        timestamp INTEGER
+    )
+    """)
+    
+    filas = []
+    reproducciones = []
     for scrobble in scrobbles:
-        # Verificar si ya existe este scrobble (mismo artista y canción)
-        cursor.execute(f"""
-        SELECT id, reproducciones, fecha_reproducciones 
-        FROM {tabla_scrobbles} 
-        WHERE LOWER(artist_name) = LOWER(?) AND LOWER(name) = LOWER(?)
-        """, (scrobble['artist_name'], scrobble['name']))
-        
-        resultado = cursor.fetchone()
-        
-        if resultado:
-            # Actualizar scrobble existente
-            id_existente, reproducciones_existentes, fechas_existentes = resultado
-            
-            # Combinar fechas de reproducción
-            fechas_actuales = json.loads(fechas_existentes) if fechas_existentes else []
-            nuevas_fechas = json.loads(scrobble['fecha_reproducciones'])
-            todas_fechas = list(set(fechas_actuales + nuevas_fechas))
-            
-            # Actualizar con la información más completa
-            cursor.execute(f"""
-            UPDATE {tabla_scrobbles}
-            SET artist_mbid = COALESCE(artist_mbid, ?),
-                album_name = COALESCE(album_name, ?),
-                album_mbid = COALESCE(album_mbid, ?),
-                lastfm_url = COALESCE(lastfm_url, ?),
-                reproducciones = ?,
-                fecha_reproducciones = ?
-            WHERE id = ?
-            """, (
-                scrobble['artist_mbid'],
-                scrobble['album_name'],
-                scrobble['album_mbid'],
-                scrobble['lastfm_url'],
-                len(todas_fechas),
-                json.dumps(todas_fechas),
-                id_existente
-            ))
-            
-            actualizados += 1
-        else:
-            # Insertar nuevo scrobble
-            cursor.execute(f"""
-            INSERT INTO {tabla_scrobbles} (
-                artist_name, artist_mbid, name, album_name, album_mbid, 
-                timestamp, fecha_scrobble, lastfm_url, reproducciones, fecha_reproducciones
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                scrobble['artist_name'],
-                scrobble['artist_mbid'],
-                scrobble['name'],
-                scrobble['album_name'],
-                scrobble['album_mbid'],
-                scrobble['timestamp'],
-                scrobble['fecha_scrobble'],
-                scrobble['lastfm_url'],
-                scrobble['reproducciones'],
-                scrobble['fecha_reproducciones']
-            ))
-            
-            nuevos += 1
+        clave = (normalizar_clave(scrobble['artist_name']), normalizar_clave(scrobble['name']))
+        filas.append((
+            *clave,
+            scrobble['artist_name'],
+            scrobble['artist_mbid'],
+            scrobble['name'],
+            scrobble['album_name'],
+            scrobble['album_mbid'],
+            scrobble['timestamp'],
+            scrobble['fecha_scrobble'],
+            scrobble['lastfm_url']
+        ))
+        escuchas = scrobble.get('escuchas')
+        if escuchas is None:
+            escuchas = [(parse_lastfm_date(fecha) or scrobble['timestamp'], fecha)
+                        for fecha in json.loads(scrobble['fecha_reproducciones'] or '[]')]
+        reproducciones.extend((*clave, fecha, timestamp) for timestamp, fecha in escuchas)
+    
+    cursor.executemany("INSERT INTO temp.scrobbles_lote VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", filas)
+    cursor.executemany("INSERT INTO temp.scrobbles_lote_plays VALUES (?, ?, ?, ?)", reproducciones)
     
+    cursor.execute(f"""
+    SELECT COUNT(DISTINCT s.id)
+    FROM temp.scrobbles_lote l
+    JOIN {tabla_scrobbles} s ON s.artist_key = l.artist_key AND s.name_key = l.name_key
+    """)
+    actualizados = cursor.fetchone()[0]
+    
+    # Insertar o completar las entradas artista+canción
+    cursor.execute(f"""
+    INSERT INTO {tabla_scrobbles} (
+        artist_key, name_key, artist_name, artist_mbid, name, album_name, album_mbid,
+        timestamp, fecha_scrobble, lastfm_url, reproducciones
+    )
+    SELECT artist_key, name_key, artist_name, artist_mbid, name, album_name, album_mbid,
+           timestamp, fecha_scrobble, lastfm_url, 0
+    FROM temp.scrobbles_lote
+    WHERE 1
+    ON CONFLICT(artist_key, name_key) DO UPDATE SET
+        artist_mbid = COALESCE(NULLIF(artist_mbid, ''), excluded.artist_mbid),
+        album_name = COALESCE(NULLIF(album_name, ''), excluded.album_name),
+        album_mbid = COALESCE(NULLIF(album_mbid, ''), excluded.album_mbid),
+        lastfm_url = COALESCE(NULLIF(lastfm_url, ''), excluded.lastfm_url),
+        fecha_scrobble = CASE WHEN excluded.timestamp > timestamp
+                              THEN excluded.fecha_scrobble ELSE fecha_scrobble END,
+        timestamp = MAX(timestamp, excluded.timestamp)
+    """)
+    
+    # Añadir las fechas nuevas y recalcular el número de reproducciones
+    cursor.execute(f"""
+    INSERT OR IGNORE INTO {tabla_plays} (scrobble_id, fecha, timestamp)
+    SELECT s.id, p.fecha, p.timestamp
+    FROM temp.scrobbles_lote_plays p
+    JOIN {tabla_scrobbles} s ON s.artist_key = p.artist_key AND s.name_key = p.name_key
+    """)
+    cursor.execute(f"""
+    UPDATE {tabla_scrobbles}
+    SET reproducciones = (SELECT COUNT(*) FROM {tabla_plays} WHERE scrobble_id = {tabla_scrobbles}.id)
+    WHERE id IN (
+        SELECT s.id FROM temp.scrobbles_lote l
+        JOIN {tabla_scrobbles} s ON s.artist_key = l.artist_key AND s.name_key = l.name_key
+    )
+    """)
+    
+    cursor.execute("DROP TABLE temp.scrobbles_lote")
+    cursor.execute("DROP TABLE temp.scrobbles_lote_plays")
     conn.commit()
+    
+    nuevos = len({(fila[0], fila[1]) for fila in filas}) - actualizados
     print(f"Guardados en base de datos: {nuevos} nuevos, {actualizados} actualizados")
     return nuevos + actualizados
 
+def leer_scrobbles_db(conn, lastfm_user):
+    """
+    Lee los scrobbles guardados del usuario (una entrada por artista+canción).
+    
+    Args:
+        conn: Conexión a la base de datos
+        lastfm_user: Nombre de usuario de Last.fm
+        
+    Returns:
+        Lista de scrobbles como diccionarios
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+    SELECT s.artist_name, s.artist_mbid, s.name, s.album_name, s.album_mbid, s.timestamp,
+           s.fecha_scrobble, s.lastfm_url, s.reproducciones,
+           (SELECT json_group_array(p.fecha) FROM lastfm_plays_{lastfm_user} p
+            WHERE p.scrobble_id = s.id) AS fecha_reproducciones
+    FROM scrobbles_{lastfm_user} s
+    ORDER BY s.timestamp DESC
+    """)
+    columnas = [columna[0] for columna in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
 def guardar_scrobbles_json(scrobbles, ruta_json, lastfm_user):
     """
     Guarda los scrobbles en un archivo JSON.
@@ -652,124 +701,237 @@ def verificar_api_key(lastfm_api_key):
         print(f"Error al verificar API key: {e}")
         return False
 
-def obtener_scrobbles_lastfm(lastfm_username, lastfm_api_key, desde_timestamp=0, limite=200):
+def importar_scrobbles_lastfm(conn, lastfm_username, lastfm_api_key, desde_timestamp=0, limite=200,
+                              paginas_concurrentes=4, peticiones_por_segundo=4):
     """
-    Obtiene todos los scrobbles de Last.fm para un usuario.
+    Descarga los scrobbles de Last.fm por páginas concurrentes y los guarda según llegan.
+    
+    La importación fija un intervalo [desde, hasta] al empezar, de modo que las
+    páginas no se desplazan aunque el usuario siga escuchando música. Las páginas
+    se descargan en paralelo bajo un limitador de peticiones, pero se escriben en
+    orden, de la más antigua a la más reciente, y cada una queda registrada en
+    lastfm_import_pages. Si la importación se interrumpe, la siguiente ejecución
+    reanuda el mismo intervalo saltando las páginas ya guardadas.
     
     Args:
+        conn: Conexión a la base de datos
         lastfm_username: Nombre de usuario de Last.fm
         lastfm_api_key: API key de Last.fm
         desde_timestamp: Timestamp desde el que obtener scrobbles
         limite: Número máximo de scrobbles por página
+        paginas_concurrentes: Número de páginas descargándose a la vez
+        peticiones_por_segundo: Límite de peticiones a la API
         
     Returns:
-        Lista de scrobbles obtenidos
+        Diccionario con totales de la importación, el timestamp más reciente y
+        si se completó
     """
-    global cache_lastfm
+    limitador = TokenBucket(peticiones_por_segundo)
+    resumen = {'scrobbles': 0, 'unicos': 0, 'guardados': 0, 'max_timestamp': 0, 'completada': False}
     
-    todos_scrobbles = []
-    pagina = 1
-    total_paginas = 1
-    
-    # Mensaje inicial
-    if desde_timestamp > 0:
-        fecha = datetime.datetime.fromtimestamp(desde_timestamp).strftime('%Y-%m-%d %H:%M:%S')
-        print(f"Obteniendo scrobbles desde {fecha}")
-    else:
-        print("Obteniendo todos los scrobbles (esto puede tardar bastante)")
-    
-    while pagina <= total_paginas:
-        print(f"Obteniendo página {pagina} de {total_paginas}...")
-        
-        params = {
-            'method': 'user.getrecenttracks',
-            'user': lastfm_username,
-            'api_key': lastfm_api_key,
-            'format': 'json',
-            'limit': limite,
-            'page': pagina,
-            'from': desde_timestamp
-        }
-        
-        # Verificar en caché primero
-        datos_cache = None
-        if cache_lastfm:
-            # Nunca cachear la primera página para siempre obtener los más recientes
-            if pagina != 1:
-                clave_cache = {
-                    'method': 'user.getrecenttracks',
-                    'user': lastfm_username,
-                    'page': pagina,
-                    'from': desde_timestamp,
-                    'limit': limite
-                }
-                datos_cache = cache_lastfm.obtener(clave_cache)
-                if datos_cache:
-                    print(f"Usando datos en caché para página {pagina}")
-        
-        if datos_cache:
-            datos = datos_cache
-        else:
-            try:
-                respuesta = obtener_con_reintentos('http://ws.audioscrobbler.com/2.0/', params)
-                
-                if not respuesta or respuesta.status_code != 200:
-                    error_msg = f"Error al obtener scrobbles: {respuesta.status_code if respuesta else 'Sin respuesta'}"
-                    print(error_msg)
-                    
-                    if pagina > 1:  # Si hemos obtenido algunas páginas, devolvemos lo que tenemos
+    importacion, primera_pagina = iniciar_importacion(
+        conn, lastfm_username, lastfm_api_key, desde_timestamp, limite, limitador
+    )
+    if importacion is None:
+        return resumen
+    
+    total_paginas = importacion['total_paginas']
+    paginas_hechas = paginas_importadas(conn, lastfm_username)
+    # De la más antigua a la más reciente para que el resumen de escuchas avance en orden
+    pendientes = [p for p in range(total_paginas, 0, -1) if p not in paginas_hechas]
+    print(f"Páginas pendientes: {len(pendientes)} de {total_paginas}")
+    
+    def descargar(pagina):
+        if pagina == 1 and primera_pagina is not None:
+            return primera_pagina
+        return obtener_pagina_scrobbles(
+            lastfm_username, lastfm_api_key, importacion['desde_timestamp'],
+            importacion['hasta_timestamp'], importacion['limite'], pagina, limitador
+        )
+    
+    # Como mucho el doble de páginas que hilos en memoria esperando a escribirse
+    ventana = max(1, paginas_concurrentes) * 2
+    en_curso = deque()
+    siguientes = iter(pendientes)
+    
+    with ThreadPoolExecutor(max_workers=max(1, paginas_concurrentes)) as executor:
+        try:
+            while True:
+                while len(en_curso) < ventana:
+                    pagina = next(siguientes, None)
+                    if pagina is None:
                         break
-                    else:
-                        return []
+                    en_curso.append((pagina, executor.submit(descargar, pagina)))
                 
-                datos = respuesta.json()
-                
-                # Guardar en caché todas las páginas excepto la primera
-                # para asegurar que siempre obtenemos los scrobbles más recientes
-                if cache_lastfm and pagina != 1:
-                    clave_cache = {
-                        'method': 'user.getrecenttracks',
-                        'user': lastfm_username,
-                        'page': pagina,
-                        'from': desde_timestamp,
-                        'limit': limite
-                    }
-                    cache_lastfm.almacenar(clave_cache, datos)
-                    print(f"Guardando en caché página {pagina}")
+                if not en_curso:
+                    break
                 
-            except Exception as e:
-                print(f"Error al procesar página {pagina}: {str(e)}")
+                pagina, futuro = en_curso.popleft()
+                datos = futuro.result()
+                if datos is None:
+                    print(f"No se pudo obtener la página {pagina}. La importación se reanudará en la próxima ejecución")
+                    return resumen
                 
-                if pagina > 1:  # Si hemos obtenido algunas páginas, devolvemos lo que tenemos
-                    break
-                else:
-                    return []
-        
-        # Comprobar si hay tracks
-        if 'recenttracks' not in datos or 'track' not in datos['recenttracks']:
-            break
-        
-        # Actualizar total_paginas
-        total_paginas = int(datos['recenttracks']['@attr']['totalPages'])
-        
-        # Añadir tracks a la lista
-        tracks = datos['recenttracks']['track']
-        if not isinstance(tracks, list):
-            tracks = [tracks]
-        
-        # Filtrar tracks que están siendo escuchados actualmente (no tienen date)
-        filtrados = [track for track in tracks if 'date' in track]
-        todos_scrobbles.extend(filtrados)
-        
-        # Reportar progreso
-        print(f"Obtenidos {len(filtrados)} scrobbles en página {pagina}")
+                tracks = extraer_tracks(datos)
+                unicos, guardados, max_ts = guardar_pagina_scrobbles(conn, lastfm_username, pagina, tracks)
+                resumen['scrobbles'] += len(tracks)
+                resumen['unicos'] += unicos
+                resumen['guardados'] += guardados
+                print(f"Página {pagina} de {total_paginas} guardada ({len(tracks)} scrobbles)")
+        finally:
+            for _, futuro in en_curso:
+                futuro.cancel()
+    
+    resumen['max_timestamp'] = finalizar_importacion(conn, lastfm_username)
+    resumen['completada'] = True
+    print(f"Obtenidos {resumen['scrobbles']} scrobbles en total")
+    return resumen
+
+def obtener_pagina_scrobbles(lastfm_username, lastfm_api_key, desde_timestamp, hasta_timestamp,
+                             limite, pagina, limitador=None):
+    """
+    Obtiene una página de user.getrecenttracks dentro del intervalo indicado.
+    
+    Returns:
+        Datos JSON de la página o None si falla
+    """
+    params = {
+        'method': 'user.getrecenttracks',
+        'user': lastfm_username,
+        'api_key': lastfm_api_key,
+        'format': 'json',
+        'limit': limite,
+        'page': pagina,
+        'from': desde_timestamp,
+        'to': hasta_timestamp
+    }
+    
+    try:
+        respuesta = obtener_con_reintentos('http://ws.audioscrobbler.com/2.0/', params, limitador=limitador)
+        if not respuesta or respuesta.status_code != 200:
+            print(f"Error al obtener la página {pagina}: {respuesta.status_code if respuesta else 'Sin respuesta'}")
+            return None
         
-        pagina += 1
-        # Pequeña pausa para no saturar la API
-        time.sleep(0.25)
+        datos = respuesta.json()
+        if 'recenttracks' not in datos:
+            print(f"Respuesta inesperada para la página {pagina}: {datos.get('message', '')}")
+            return None
+        return datos
+    except Exception as e:
+        print(f"Error al procesar página {pagina}: {str(e)}")
+        return None
+
+def extraer_tracks(datos):
+    """Devuelve los scrobbles de una página, sin la canción que suena ahora (no tiene date)."""
+    tracks = datos.get('recenttracks', {}).get('track', [])
+    if not isinstance(tracks, list):
+        tracks = [tracks]
+    return [track for track in tracks if 'date' in track]
+
+def iniciar_importacion(conn, lastfm_username, lastfm_api_key, desde_timestamp, limite, limitador):
+    """
+    Reanuda la importación pendiente del usuario o registra una nueva.
+    
+    Returns:
+        Tuple: (importación, datos de la primera página). La primera página sólo
+        se devuelve en importaciones nuevas, porque se ha descargado para conocer
+        el total. (None, None) si no hay nada que importar.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT desde_timestamp, hasta_timestamp, limite, total_paginas
+    FROM lastfm_import_runs WHERE lastfm_username = ?
+    """, (lastfm_username,))
+    fila = cursor.fetchone()
+    
+    if fila:
+        importacion = dict(zip(('desde_timestamp', 'hasta_timestamp', 'limite', 'total_paginas'), fila))
+        hasta = datetime.datetime.fromtimestamp(importacion['hasta_timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"Reanudando importación interrumpida ({importacion['total_paginas']} páginas hasta {hasta})")
+        return importacion, None
+    
+    # Fijar el final del intervalo para que la paginación sea estable
+    hasta_timestamp = int(time.time())
+    primera_pagina = obtener_pagina_scrobbles(
+        lastfm_username, lastfm_api_key, desde_timestamp, hasta_timestamp, limite, 1, limitador
+    )
+    if primera_pagina is None:
+        return None, None
+    
+    total_paginas = int(primera_pagina['recenttracks'].get('@attr', {}).get('totalPages', 0) or 0)
+    if total_paginas == 0:
+        print("No se encontraron scrobbles en el intervalo")
+        return None, None
+    
+    importacion = {
+        'desde_timestamp': desde_timestamp,
+        'hasta_timestamp': hasta_timestamp,
+        'limite': limite,
+        'total_paginas': total_paginas
+    }
+    cursor.execute("""
+    INSERT INTO lastfm_import_runs (lastfm_username, desde_timestamp, hasta_timestamp, limite, total_paginas)
+    VALUES (?, ?, ?, ?, ?)
+    """, (lastfm_username, desde_timestamp, hasta_timestamp, limite, total_paginas))
+    cursor.execute("DELETE FROM lastfm_import_pages WHERE lastfm_username = ?", (lastfm_username,))
+    conn.commit()
     
-    print(f"Obtenidos {len(todos_scrobbles)} scrobbles en total")
-    return todos_scrobbles
+    print(f"Nueva importación: {total_paginas} páginas")
+    return importacion, primera_pagina
+
+def paginas_importadas(conn, lastfm_username):
+    """Conjunto de páginas ya guardadas de la importación en curso."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT pagina FROM lastfm_import_pages WHERE lastfm_username = ?", (lastfm_username,))
+    return {fila[0] for fila in cursor.fetchall()}
+
+def guardar_pagina_scrobbles(conn, lastfm_username, pagina, tracks):
+    """
+    Guarda una página de scrobbles, la añade al resumen de escuchas y la marca como hecha.
+    
+    Reescribir una página ya guardada no duplica reproducciones: las fechas se
+    combinan sin repetir y el resumen ignora escuchas anteriores a su marca.
+    
+    Returns:
+        Tuple: (scrobbles únicos, scrobbles guardados, timestamp más reciente)
+    """
+    procesados = procesar_scrobbles(tracks)
+    guardados = guardar_scrobbles_en_db(conn, procesados, lastfm_username)
+    
+    escuchas = [
+        (int(t['date']['uts']), t['artist']['#text'], t.get('album', {}).get('#text', ''), t['name'])
+        for t in tracks
+    ]
+    try:
+        update_listen_cube(conn, 'lastfm', lastfm_username, escuchas)
+    except sqlite3.Error as e:
+        print(f"Error al actualizar el resumen de escuchas: {e}")
+    
+    max_ts = max((escucha[0] for escucha in escuchas), default=0)
+    cursor = conn.cursor()
+    cursor.execute("""
+    INSERT OR REPLACE INTO lastfm_import_pages (lastfm_username, pagina, scrobbles, max_timestamp)
+    VALUES (?, ?, ?, ?)
+    """, (lastfm_username, pagina, len(tracks), max_ts))
+    conn.commit()
+    
+    return len(procesados), guardados, max_ts
+
+def finalizar_importacion(conn, lastfm_username):
+    """
+    Borra el registro de la importación terminada.
+    
+    Returns:
+        Timestamp del scrobble más reciente importado
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(max_timestamp), 0) FROM lastfm_import_pages WHERE lastfm_username = ?",
+                   (lastfm_username,))
+    max_ts = cursor.fetchone()[0]
+    cursor.execute("DELETE FROM lastfm_import_pages WHERE lastfm_username = ?", (lastfm_username,))
+    cursor.execute("DELETE FROM lastfm_import_runs WHERE lastfm_username = ?", (lastfm_username,))
+    conn.commit()
+    return max_ts
 
 
 def guardar_ultimo_timestamp(conn, timestamp, lastfm_user):
@@ -843,6 +1005,11 @@ def main(config):
         print("Modo force_update activado: Se ignorará el último timestamp")
         ultimo_timestamp = 0
     
+    # Una importación interrumpida se reanuda aunque no haya scrobbles nuevos
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM lastfm_import_runs WHERE lastfm_username = ?", (lastfm_user,))
+    importacion_pendiente = cursor.fetchone() is not None
+    
     # Realizar una comprobación inicial para ver si hay nuevos scrobbles
     print("Comprobando si hay nuevos scrobbles...")
     params = {
@@ -872,38 +1039,34 @@ def main(config):
                         print(f"Se encontraron nuevos scrobbles desde el último procesado")
                     else:
                         print("No hay nuevos scrobbles desde la última actualización")
-                        if not config.get('force_update', False):
+                        if not config.get('force_update', False) and not importacion_pendiente:
                             conn.close()
                             return 0, 0, 0
     except Exception as e:
         print(f"Error al comprobar nuevos scrobbles: {e}")
     
-    # Obtener scrobbles de Last.fm
-    todos_scrobbles = obtener_scrobbles_lastfm(lastfm_user, lastfm_api_key, ultimo_timestamp)
+    # Obtener y guardar los scrobbles de Last.fm página a página
+    resumen = importar_scrobbles_lastfm(
+        conn, lastfm_user, lastfm_api_key, ultimo_timestamp,
+        paginas_concurrentes=config.get('concurrent_pages', 4),
+        peticiones_por_segundo=config.get('requests_per_second', 4)
+    )
     
-    if not todos_scrobbles:
+    if resumen['scrobbles'] == 0 and resumen['completada']:
         print("No se encontraron nuevos scrobbles para procesar")
-        conn.close()
-        return 0, 0, 0
-    
-    # Procesar scrobbles para agrupar y deduplicar
-    scrobbles_procesados = procesar_scrobbles(todos_scrobbles)
-    
-    # Guardar en la base de datos
-    guardados = guardar_scrobbles_en_db(conn, scrobbles_procesados, lastfm_user)
     
-    # Actualizar el último timestamp procesado
-    if scrobbles_procesados:
-        ultimo_ts = max(scrobble['timestamp'] for scrobble in scrobbles_procesados)
-        guardar_ultimo_timestamp(conn, ultimo_ts, lastfm_user)
+    # Actualizar el último timestamp procesado sólo si la importación terminó;
+    # si no, la próxima ejecución reanuda las páginas pendientes
+    if resumen['completada'] and resumen['max_timestamp'] > 0:
+        guardar_ultimo_timestamp(conn, resumen['max_timestamp'], lastfm_user)
     
     # Guardar en JSON si se especificó
-    if output_json:
-        guardar_scrobbles_json(scrobbles_procesados, output_json, lastfm_user)
+    if output_json and resumen['guardados']:
+        guardar_scrobbles_json(leer_scrobbles_db(conn, lastfm_user), output_json, lastfm_user)
     
     conn.close()
     
-    return len(todos_scrobbles), len(scrobbles_procesados), guardados
+    return resumen['scrobbles'], resumen['unicos'], resumen['guardados']
 
 
 if __name__ == "__main__":
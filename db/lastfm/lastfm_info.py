@@ -8,62 +8,41 @@ import requests
 import argparse
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from tools.api_cache import get_api_cache, import_legacy_json
+
 # Reutilizaremos la clase de caché del script anterior
 class CacheJSON:
     """
-    Clase para manejar la caché de peticiones a Last.fm mediante archivos JSON.
+    Caché de peticiones de metadatos a Last.fm (mayor duración).
+    
+    Las entradas se guardan en la caché compartida (tools/api_cache.py) bajo el
+    espacio de nombres 'lastfm_metadata': cada consulta lee sólo su clave y el
+    tamaño total en disco está acotado.
     """
-    def __init__(self, cache_dir=None, duracion_cache=30):  # Mayor duración para metadatos
+    NAMESPACE = "lastfm_metadata"
+    
+    def __init__(self, cache_dir=None, duracion_cache=30):
         """
         Inicializa la caché.
         
         Args:
-            cache_dir: Directorio para almacenar los archivos de caché
+            cache_dir: Directorio de la caché JSON antigua; si se indica se
+                       activa la caché y se importa lastfm_metadata_cache.json si existe
             duracion_cache: Duración en días de la validez de la caché
         """
-        self.cache = {}
-        self.cache_file = None
+        self.cache = None
         self.duracion_cache = duracion_cache  # en días
         
         if cache_dir:
-            os.makedirs(cache_dir, exist_ok=True)
-            self.cache_file = os.path.join(cache_dir, "lastfm_metadata_cache.json")
-            self.cargar_cache()
-    
-    def cargar_cache(self):
-        """Carga la caché desde el archivo si existe."""
-        if not self.cache_file or not os.path.exists(self.cache_file):
-            return
-        
-        try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                try:
-                    self.cache = json.load(f)
-                    # Filtrar entradas caducadas
-                    ahora = time.time()
-                    self.cache = {
-                        k: v for k, v in self.cache.items()
-                        if 'timestamp' in v and 
-                        (ahora - v['timestamp']) / (60 * 60 * 24) <= self.duracion_cache
-                    }
-                    print(f"Caché cargada con {len(self.cache)} entradas válidas")
-                except json.JSONDecodeError:
-                    print("Error al decodificar el archivo de caché. Usando caché vacía.")
-                    self.cache = {}
-        except Exception as e:
-            print(f"Error al cargar la caché: {e}")
-            self.cache = {}
-    
-    def guardar_cache(self):
-        """Guarda la caché en el archivo."""
-        if not self.cache_file:
-            return
-        
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Error al guardar la caché: {e}")
+            self.cache = get_api_cache()
+            import_legacy_json(
+                self.cache, self.NAMESPACE,
+                os.path.join(cache_dir, "lastfm_metadata_cache.json"),
+                lambda datos: ((k, v.get('datos'), v.get('timestamp'))
+                               for k, v in datos.items() if isinstance(v, dict)),
+                ttl=self.duracion_cache * 24 * 60 * 60
+            )
     
     def obtener(self, clave):
         """
@@ -75,21 +54,11 @@ class CacheJSON:
         Returns:
             Datos almacenados o None si no existe o ha caducado
         """
-        clave_str = self._normalizar_clave(clave)
-        entrada = self.cache.get(clave_str)
-        
-        if not entrada:
+        if self.cache is None:
             return None
-            
-        # Verificar si ha caducado
-        if 'timestamp' in entrada:
-            edad_dias = (time.time() - entrada['timestamp']) / (60 * 60 * 24)
-            if edad_dias > self.duracion_cache:
-                # Eliminar entrada caducada
-                del self.cache[clave_str]
-                return None
         
-        return entrada.get('datos')
+        return self.cache.get(self.NAMESPACE, self._normalizar_clave(clave),
+                              max_age=self.duracion_cache * 24 * 60 * 60)
     
     def almacenar(self, clave, datos):
         """
@@ -99,19 +68,11 @@ class CacheJSON:
             clave: Clave única para identificar la entrada
             datos: Datos a almacenar
         """
-        if datos is None:
+        if datos is None or self.cache is None:
             return
-            
-        clave_str = self._normalizar_clave(clave)
-        
-        # Almacenar con timestamp para verificar caducidad
-        self.cache[clave_str] = {
-            'datos': datos,
-            'timestamp': time.time()
-        }
         
-        # Guardar en archivo
-        self.guardar_cache()
+        self.cache.set(self.NAMESPACE, self._normalizar_clave(clave), datos,
+                       ttl=self.duracion_cache * 24 * 60 * 60)
     
     def _normalizar_clave(self, clave):
         """
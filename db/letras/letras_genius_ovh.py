@@ -12,6 +12,14 @@ import lyricsgenius
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from base_module import PROJECT_ROOT
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from tools.work_queue import WorkQueue
+
+# Cola de trabajo: entidad, canciones reclamadas por consulta y esperas entre reintentos
+QUEUE_ENTITY = "song"
+QUEUE_CLAIM_SIZE = 100
+LYRICS_RETRY_DELAY = 24 * 60 * 60  # letra no encontrada: 1 día, 2, 4...
+ERROR_RETRY_DELAY = 60 * 60  # error de red o de base de datos: 1 hora, 2, 4...
 
 # Adaptador personalizado para datetime
 def adapt_datetime(dt):
@@ -45,9 +53,6 @@ class MultiLyricsManager:
             self.logger.warning("genius_access_token no encontrado en configuración. Genius no estará disponible como fuente de respaldo.")
         
         
-        # Archivo de estado para pausar/continuar
-        self.state_file = PROJECT_ROOT / '.content' / 'logs' / 'db' / 'lyrics_update_state.json'
-        
         # Retry y backoff settings
         self.max_retries = 3
         self.retry_delay = 2  # segundos
@@ -262,43 +267,10 @@ class MultiLyricsManager:
         
         return None, None
     
-    def save_state(self, song_ids, current_index, processed, success, force_update=False):
-        """Guarda el estado actual del proceso para continuar más tarde."""
-        state = {
-            "song_ids": song_ids,
-            "current_index": current_index,
-            "processed": processed,
-            "success": success,
-            "force_update": force_update,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Usar un archivo diferente según el modo
-        state_file = self.state_file
-        if force_update:
-            state_file = "lyrics_update_state_force.json"
-        else:
-            state_file = f"{PROJECT_ROOT}/.content/logs/db/letras/lyrics_update_state_normal.json"
-        
-        with open(state_file, 'w', encoding='utf-8') as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-        
-        self.logger.info(f"Estado guardado en {state_file}: procesadas {processed} canciones, {success} actualizadas correctamente")
-    
-    def load_state(self, force_update=False):
-        """Carga el estado anterior si existe."""
-        # Determinar qué archivo de estado cargar
-        state_file = f"{PROJECT_ROOT}/.content/logs/db/letras/lyrics_update_state_force.json" if force_update else f"{PROJECT_ROOT}/.content/logs/db/letras/lyrics_update_state_normal.json"
-        
-        if os.path.exists(state_file):
-            try:
-                with open(state_file, 'r', encoding='utf-8') as f:
-                    state = json.load(f)
-                self.logger.info(f"Estado cargado desde {state_file}: continuando desde canción {state['current_index']} de {len(state['song_ids'])}")
-                return state
-            except Exception as e:
-                self.logger.error(f"Error cargando estado desde {state_file}: {str(e)}")
-        return None
+    def get_work_queue(self, force_update=False):
+        """Cola de trabajo de este script (una distinta para el modo force_update)."""
+        script = "letras/letras_genius_ovh_force" if force_update else "letras/letras_genius_ovh"
+        return WorkQueue(self.db_path, script, retry_delay=LYRICS_RETRY_DELAY)
     
     def get_songs_to_update(self, force_update=False):
         """Obtiene la lista de canciones para actualizar."""
@@ -336,67 +308,34 @@ class MultiLyricsManager:
         return songs
     
     def update_lyrics(self, resume=True, force_update=False):
-        """Actualiza las letras de las canciones en la base de datos, con soporte para pausar/continuar."""
-        # Verificar si hay un estado guardado para continuar
-        state = None
-        
-        # Si estamos en modo force_update, ignoramos el archivo de estado anterior
-        # porque probablemente contenga canciones de una ejecución normal
-        if resume and not force_update:
-            state = self.load_state(force_update)  # Pasar el modo a load_state        
-
-        if state:
-            # Continuamos desde el estado guardado
-            song_ids = state["song_ids"]
-            current_index = state["current_index"]
-            processed = state["processed"]
-            success = state["success"]
-            
-            # Logging más detallado
-            self.logger.info(f"Reanudando desde estado guardado. Posición: {current_index}/{len(song_ids)}")
-        else:
-            # Comenzamos un nuevo proceso - aquí está el cambio clave
-            if force_update:
-                self.logger.info("MODO FORCE UPDATE: Procesando TODAS las canciones (incluso las que ya tienen letras)")
-                # Usamos los datos directos de la tabla songs
-                conn = sqlite3.connect(self.db_path)
-                c = conn.cursor()
-                c.execute("""
-                    SELECT s.id, s.artist, s.title 
-                    FROM songs s
-                    LEFT JOIN artists a ON s.artist = a.name
-                    WHERE s.artist IS NOT NULL AND s.title IS NOT NULL
-                    ORDER BY a.total_albums DESC, s.added_timestamp DESC
-                """)
-            else:
-                self.logger.info("MODO NORMAL: Procesando SOLO canciones SIN letras")
-                # Obtener solo canciones sin letras
-                conn = sqlite3.connect(self.db_path)
-                c = conn.cursor()
-                c.execute("""
-                    SELECT s.id, s.artist, s.title 
-                    FROM songs s 
-                    LEFT JOIN lyrics l ON s.id = l.track_id 
-                    LEFT JOIN artists a ON s.artist = a.name
-                    WHERE (l.id IS NULL OR s.has_lyrics = 0) 
-                    AND s.artist IS NOT NULL AND s.title IS NOT NULL
-                    ORDER BY a.total_albums DESC, s.added_timestamp DESC
-                """)
-            
-            songs_to_update = c.fetchall()
-            conn.close()
-            
-            # Logging más detallado
-            self.logger.info(f"Se encontraron {len(songs_to_update)} canciones para procesar")
-            
-            song_ids = [(song_id, artist, title) for song_id, artist, title in songs_to_update]
-            current_index = 0
-            processed = 0
-            success = 0
-            self.logger.info(f"Iniciando nuevo proceso (force_update={force_update})")
-        
-        total_songs = len(song_ids)
-        self.logger.info(f"Total de canciones para procesar: {total_songs}")
+        """
+        Actualiza las letras de las canciones en la base de datos.
+        
+        El progreso se guarda en la cola de trabajo compartida (tools/work_queue.py):
+        cada ejecución reclama hasta batch_size canciones, las que ya tienen letra
+        no se vuelven a buscar y las que fallan se reintentan con espera creciente.
+        Si la ejecución se interrumpe, la siguiente continúa donde se quedó.
+        """
+        queue = self.get_work_queue(force_update)
+        
+        if not resume:
+            self.logger.info("Reiniciando la cola de trabajo (--no-resume)")
+            queue.reset(QUEUE_ENTITY)
+        elif force_update and not queue.has_pending(QUEUE_ENTITY):
+            # La pasada forzada anterior terminó: empezar una nueva
+            self.logger.info("MODO FORCE UPDATE: iniciando una nueva pasada sobre TODAS las canciones")
+            queue.reset(QUEUE_ENTITY)
+        
+        # Encolar las canciones que aún no estén en la cola, en orden de prioridad
+        songs_to_update = self.get_songs_to_update(force_update)
+        new_songs = queue.enqueue(QUEUE_ENTITY, (song_id for song_id, _, _ in songs_to_update))
+        self.logger.info(f"{new_songs} canciones nuevas añadidas a la cola")
+        
+        queue_stats = queue.stats(QUEUE_ENTITY)
+        self.logger.info(f"Estado de la cola: {queue_stats}")
+        
+        processed = 0
+        success = 0
         
         # Estadísticas de fuentes
         sources_stats = {}
@@ -412,97 +351,110 @@ class MultiLyricsManager:
         error_handler.setFormatter(error_formatter)
         error_logger.addHandler(error_handler)
         
+        pending_ids = []
         try:
-            batch_start = current_index
-            
-            for i in range(current_index, total_songs):
-                song_id, artist, title = song_ids[i]
+            while processed < self.batch_size:
+                claimed = queue.claim(QUEUE_ENTITY, min(QUEUE_CLAIM_SIZE, self.batch_size - processed))
+                if not claimed:
+                    break
                 
-                try:
-                    processed += 1
-                    
-                    # Si el artista principal no está disponible, intentamos usar album_artist
-                    if not artist:
-                        c.execute("SELECT album_artist FROM songs WHERE id = ?", (song_id,))
-                        album_artist_result = c.fetchone()
-                        if album_artist_result and album_artist_result[0]:
-                            artist = album_artist_result[0]
-                    
-                    if not title or not artist:
-                        error_logger.error(f"Falta información para song_id {song_id}: artist={artist}, title={title}")
-                        continue
+                # Datos de todas las canciones reclamadas en una sola consulta
+                placeholders = ",".join("?" * len(claimed))
+                c.execute(f"""
+                    SELECT id, COALESCE(NULLIF(artist, ''), album_artist), title, has_lyrics
+                    FROM songs WHERE id IN ({placeholders})
+                """, claimed)
+                songs = {str(row[0]): row[1:] for row in c.fetchall()}
+                
+                for index, song_id in enumerate(claimed):
+                    # Las que queden sin procesar se devuelven a la cola si se interrumpe
+                    pending_ids = claimed[index:]
+                    artist, title, has_lyrics = songs.get(song_id, (None, None, None))
                     
-                    lyrics, source = self.get_song_lyrics(artist, title)
-                    if lyrics:
-                        # Actualizar estadísticas
-                        sources_stats[source] = sources_stats.get(source, 0) + 1
+                    try:
+                        processed += 1
                         
-                        # Insertar o actualizar letra usando track_id
-                        c.execute("""
-                            INSERT OR REPLACE INTO lyrics (track_id, lyrics, source, last_updated) 
-                            VALUES (?, ?, ?, ?)
-                        """, (song_id, lyrics, source, datetime.now()))
+                        if not force_update and has_lyrics:
+                            # Ya tiene letra (de otra ejecución o de otro script)
+                            queue.complete(QUEUE_ENTITY, [song_id])
+                            continue
                         
-                        # Obtener el ID de la letra insertada
-                        c.execute("SELECT id FROM lyrics WHERE track_id = ?", (song_id,))
-                        lyrics_id_result = c.fetchone()
-                        if lyrics_id_result:
-                            lyrics_id = lyrics_id_result[0]
+                        if not title or not artist:
+                            error_logger.error(f"Falta información para song_id {song_id}: artist={artist}, title={title}")
+                            # Sin datos no hay nada que reintentar
+                            queue.complete(QUEUE_ENTITY, [song_id])
+                            continue
+                        
+                        lyrics, source = self.get_song_lyrics(artist, title)
+                        if lyrics:
+                            # Actualizar estadísticas
+                            sources_stats[source] = sources_stats.get(source, 0) + 1
                             
-                            # Actualizar referencia en songs y marcar que tiene letras
+                            # Insertar o actualizar letra usando track_id
                             c.execute("""
-                                UPDATE songs SET lyrics_id = ?, has_lyrics = 1
-                                WHERE id = ?
-                            """, (lyrics_id, song_id))
-                        
-                        # Actualizar índice FTS de lyrics si existe
-                        try:
-                            c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='lyrics_fts'")
-                            if c.fetchone():
-                                c.execute("INSERT OR REPLACE INTO lyrics_fts(rowid, lyrics) VALUES(?, ?)",
-                                    (lyrics_id, lyrics))  # Note: using lyrics_id instead of song_id
-                        except sqlite3.Error as e:
-                            self.logger.warning(f"Error actualizando FTS: {str(e)}")        
-                        
-                        conn.commit()
-                        success += 1
-                    else:
-                        error_logger.error(f"No se encontró letra para: {artist} - {title}")
-                
-                except Exception as e:
-                    error_logger.error(f"Error procesando {artist} - {title}: {str(e)}")
-                    conn.rollback()
-                
-                # Mostrar progreso y guardar estado cada cierto número de canciones
-                if processed % 10 == 0 or (i - batch_start) == self.batch_size:
-                    self.logger.info(f"Progreso: {processed}/{total_songs} canciones procesadas ({success} actualizadas)")
-                    if sources_stats:
-                        sources_log = ", ".join([f"{src}: {count}" for src, count in sources_stats.items()])
-                        self.logger.info(f"Fuentes utilizadas: {sources_log}")
-                
-                # Guardar estado y salir después de cada lote
-                if (i - batch_start + 1) >= self.batch_size:
-                    self.save_state(song_ids, i + 1, processed, success, force_update)
-                    self.logger.info(f"Lote completado. Procesando siguiente lote en la próxima ejecución.")
-                    break
+                                INSERT OR REPLACE INTO lyrics (track_id, lyrics, source, last_updated) 
+                                VALUES (?, ?, ?, ?)
+                            """, (song_id, lyrics, source, datetime.now()))
+                            
+                            # Obtener el ID de la letra insertada
+                            c.execute("SELECT id FROM lyrics WHERE track_id = ?", (song_id,))
+                            lyrics_id_result = c.fetchone()
+                            if lyrics_id_result:
+                                lyrics_id = lyrics_id_result[0]
+                                
+                                # Actualizar referencia en songs y marcar que tiene letras
+                                c.execute("""
+                                    UPDATE songs SET lyrics_id = ?, has_lyrics = 1
+                                    WHERE id = ?
+                                """, (lyrics_id, song_id))
+                            
+                            # Actualizar índice FTS de lyrics si existe
+                            try:
+                                c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='lyrics_fts'")
+                                if c.fetchone():
+                                    c.execute("INSERT OR REPLACE INTO lyrics_fts(rowid, lyrics) VALUES(?, ?)",
+                                        (lyrics_id, lyrics))  # Note: using lyrics_id instead of song_id
+                            except sqlite3.Error as e:
+                                self.logger.warning(f"Error actualizando FTS: {str(e)}")        
+                            
+                            conn.commit()
+                            queue.complete(QUEUE_ENTITY, [song_id])
+                            success += 1
+                        else:
+                            error_logger.error(f"No se encontró letra para: {artist} - {title}")
+                            queue.fail(QUEUE_ENTITY, song_id, "Letra no encontrada")
+                    
+                    except Exception as e:
+                        error_logger.error(f"Error procesando {artist} - {title}: {str(e)}")
+                        conn.rollback()
+                        queue.fail(QUEUE_ENTITY, song_id, e, retry_delay=ERROR_RETRY_DELAY)
+                    
+                    # Mostrar progreso cada cierto número de canciones
+                    if processed % 10 == 0:
+                        self.logger.info(f"Progreso: {processed}/{self.batch_size} canciones procesadas ({success} actualizadas)")
+                        if sources_stats:
+                            sources_log = ", ".join([f"{src}: {count}" for src, count in sources_stats.items()])
+                            self.logger.info(f"Fuentes utilizadas: {sources_log}")
+                pending_ids = []
         
         except KeyboardInterrupt:
-            self.logger.info("Proceso interrumpido por el usuario. Guardando estado...")
-            self.save_state(song_ids, i, processed, success)
+            self.logger.info("Proceso interrumpido por el usuario. Devolviendo a la cola las canciones sin procesar...")
+            queue.release(QUEUE_ENTITY, pending_ids)
         
         finally:
-            # Si hemos terminado todo el proceso, eliminar el archivo de estado
-            if current_index + self.batch_size >= total_songs:
-                if os.path.exists(self.state_file):
-                    os.remove(self.state_file)
-                self.logger.info(f"Proceso completo: {processed} canciones procesadas, {success} actualizadas correctamente")
-                if sources_stats:
-                    sources_log = ", ".join([f"{src}: {count}" for src, count in sources_stats.items()])
-                    self.logger.info(f"Resumen de fuentes utilizadas: {sources_log}")
+            queue_stats = queue.stats(QUEUE_ENTITY)
+            if queue.has_pending(QUEUE_ENTITY):
+                self.logger.info("Lote completado. Quedan canciones pendientes para la próxima ejecución.")
+            self.logger.info(f"Ejecución terminada: {processed} canciones procesadas, {success} actualizadas correctamente")
+            self.logger.info(f"Estado de la cola: {queue_stats}")
+            if sources_stats:
+                sources_log = ", ".join([f"{src}: {count}" for src, count in sources_stats.items()])
+                self.logger.info(f"Resumen de fuentes utilizadas: {sources_log}")
             
             error_logger.removeHandler(error_handler)
             error_handler.close()
             conn.close()
+            queue.close()
 
 def main(config=None):
     # Si el script se ejecuta directamente (no desde el padre)
@@ -511,7 +463,7 @@ def main(config=None):
         parser.add_argument('--db_path', help='Ruta a la base de datos SQLite')
         parser.add_argument('--force-update', action='store_true', help='Forzar actualización de todas las letras')
         parser.add_argument('--batch-size', type=int, default=1000, help='Número de canciones a procesar por lote')
-        parser.add_argument('--no-resume', action='store_true', help='No continuar desde el último punto guardado')
+        parser.add_argument('--no-resume', action='store_true', help='Reiniciar la cola de trabajo en lugar de continuar donde se quedó')
         parser.add_argument('--config', help='Archivo de configuración JSON')
         
         args = parser.parse_args()
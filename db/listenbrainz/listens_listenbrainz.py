@@ -6,8 +6,13 @@ import argparse
 import datetime
 import time
 import os
+import re
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from tools.stats.listen_cube import update_listen_cube, rebuild_listen_cube
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Obtener listens de ListenBrainz y añadirlos a la base de datos')
     parser.add_argument('--config',  help='Archivo de configuración')
@@ -23,7 +28,7 @@ def parse_args():
 
     # Nuevas opciones para las mejoras de coincidencia
     parser.add_argument('--normalize-strings', default=False, help='Usar normalización de strings para mejorar coincidencias')
-    parser.add_argument('--enhanced-matching', default=False, help='Crear y usar tablas normalizadas para buscar coincidencias')
+    parser.add_argument('--enhanced-matching', default=False, help='Sin efecto: el índice normalizado de coincidencias se usa siempre')
     parser.add_argument('--mbid-matching', default=False, help='Intentar coincidencia por MusicBrainz IDs')
     parser.add_argument('--fuzzy-matching', default=False, help='Usar coincidencia difusa para encontrar canciones')
     parser.add_argument('--analyze-mismatches', default=False, help='Analizar razones de discrepancias')
@@ -278,7 +283,14 @@ def process_listens_with_id(conn, listens, existing_artists, existing_albums, ex
         cursor.execute(f"CREATE INDEX idx_{table_name}_listen_id ON {table_name}(listen_id)")
         conn.commit()
     
-    for listen in listens:
+    # Resolver las canciones de todo el lote con unas pocas consultas. La
+    # búsqueda difusa sustituye a la búsqueda LIKE que se hacía por cada listen
+    resolved_song_ids = resolve_song_ids(
+        conn, [_listen_match_query(listen) for listen in listens],
+        use_mbid=use_mbid, use_fuzzy=True
+    )
+    
+    for index, listen in enumerate(listens):
         # En ListenBrainz, la estructura es diferente a Last.fm
         track_metadata = listen.get('track_metadata', {})
         
@@ -369,82 +381,26 @@ def process_listens_with_id(conn, listens, existing_artists, existing_albums, ex
             continue
         
         # Inicializar IDs
-        song_id = None
         artist_id = None
         album_id = None
         
-        # Estrategias de coincidencia en orden de prioridad:
-        
-        # 1. Intentar coincidencia por MusicBrainz IDs si está habilitado
-        if use_mbid:
-            song_id = find_song_by_mbid(conn, listen)
-        
-        # 2. Intentar coincidencia difusa si está habilitada y no se encontró por MBID
-        if not song_id and use_fuzzy:
-            # Si se debe normalizar strings, aplicar normalización
-            if normalize_strings:
-                norm_track = normalize_string(track_name)
-                norm_artist = normalize_string(artist_name)
-                norm_album = normalize_string(album_name) if album_name else None
-                
-                song_id = fuzzy_match_song(conn, norm_track, norm_artist, norm_album)
-            else:
-                song_id = fuzzy_match_song(conn, track_name, artist_name, album_name)
+        # Canción resuelta por lotes antes del bucle
+        song_id = resolved_song_ids[index]
         
-        # 3. Si no se encontró con métodos avanzados, intentar coincidencia exacta
+        # Si no hay canción, intentar al menos el artista y el álbum
         if not song_id:
-            # 3.1 Intentar coincidencia exacta por nombre de artista
             if artist_name:
                 artist_name_key = artist_name.lower()
                 if normalize_strings:
                     artist_name_key = normalize_string(artist_name)
                 artist_id = existing_artists.get(artist_name_key)
             
-            # 3.2 Intentar coincidencia de álbum
             if album_name and artist_name:
                 album_key = (album_name.lower(), artist_name.lower())
                 if normalize_strings:
                     album_key = (normalize_string(album_name), normalize_string(artist_name))
                 if album_key in existing_albums:
                     album_id, _ = existing_albums.get(album_key)
-            
-            # 3.3 Intentar coincidencia exacta por título, artista y álbum
-            if track_name and artist_name:
-                # Con álbum si está disponible
-                if album_name:
-                    song_key = (track_name.lower(), artist_name.lower(), album_name.lower())
-                    if normalize_strings:
-                        song_key = (normalize_string(track_name), normalize_string(artist_name), normalize_string(album_name))
-                    if song_key in existing_songs:
-                        song_id = existing_songs.get(song_key)
-                
-                # Sin álbum si no se encontró o no está disponible
-                if not song_id:
-                    song_key = (track_name.lower(), artist_name.lower(), None)
-                    if normalize_strings:
-                        song_key = (normalize_string(track_name), normalize_string(artist_name), None)
-                    if song_key in existing_songs:
-                        song_id = existing_songs.get(song_key)
-            
-            # 3.4 Buscar en la base de datos directamente con LIKE para ser más flexible
-            if not song_id and track_name and artist_name:
-                # Normalizar nombres para búsqueda
-                track_search = track_name.replace("'", "''").lower()
-                artist_search = artist_name.replace("'", "''").lower()
-                
-                if normalize_strings:
-                    track_search = normalize_string(track_search)
-                    artist_search = normalize_string(artist_search)
-                
-                cursor.execute("""
-                    SELECT id FROM songs 
-                    WHERE LOWER(title) LIKE ? AND LOWER(artist) LIKE ?
-                    LIMIT 1
-                """, (f"%{track_search}%", f"%{artist_search}%"))
-                
-                result = cursor.fetchone()
-                if result:
-                    song_id = result[0]
         
         # Si encontramos la canción, usar su información de texto
         if song_id:
@@ -1121,6 +1077,18 @@ def process_listens(conn, listens, existing_artists, existing_albums, existing_s
     return processed_count, linked_count, unlinked_count, newest_timestamp
 
 # Lo encontramos por cohones
+_NORMALIZE_SPECIAL_RE = re.compile(r'[^\w\s]')
+_NORMALIZE_SPACES_RE = re.compile(r'\s+')
+_NORMALIZE_WORDS_RE = re.compile(r'\b(?:feat|ft|featuring|prod|remix|remaster|remastered)\b')
+
+# Tokens que aparecen en más canciones que esto no sirven para buscar candidatas
+MATCH_TOKEN_MAX_DF = 500
+# Listens que se resuelven por consulta en resolve_song_ids
+MATCH_BATCH_SIZE = 5000
+# Proporción mínima de palabras del título compartidas en la búsqueda difusa
+MATCH_FUZZY_MIN_SCORE = 0.5
+
+
 def normalize_string(text):
     """Normaliza un string para mejorar las coincidencias"""
     if not text:
@@ -1129,155 +1097,294 @@ def normalize_string(text):
     # Convertir a minúsculas
     text = text.lower()
     
-    # Eliminar caracteres especiales y espacios extras
-    import re
-    text = re.sub(r'[^\w\s]', ' ', text)  # Reemplazar caracteres especiales con espacios
-    text = re.sub(r'\s+', ' ', text).strip()  # Normalizar espacios
-    
-    # Eliminar palabras comunes que pueden variar entre fuentes
-    words_to_remove = ['feat', 'ft', 'featuring', 'prod', 'remix', 'remaster', 'remastered']
-    for word in words_to_remove:
-        text = re.sub(r'\b' + word + r'\b', '', text)
+    # Eliminar caracteres especiales y palabras comunes que pueden variar entre fuentes
+    text = _NORMALIZE_SPECIAL_RE.sub(' ', text)
+    text = _NORMALIZE_WORDS_RE.sub(' ', text)
     
-    return text.strip()
+    # Normalizar espacios
+    return _NORMALIZE_SPACES_RE.sub(' ', text).strip()
+
+
+def enhance_matching(conn, existing_artists=None, existing_albums=None, existing_songs=None):
+    """Pone al día el índice normalizado de canciones (ver sync_match_index)"""
+    sync_match_index(conn)
+    return conn
 
 
-def enhance_matching(conn, existing_artists, existing_albums, existing_songs):
-    """Crea tablas de búsqueda normalizadas para mejorar las coincidencias"""
+def sync_match_index(conn):
+    """
+    Mantiene el índice persistente de coincidencias de canciones.
+    
+    normalized_songs guarda título, artista y álbum normalizados de cada canción
+    junto con los valores originales, de modo que en cada ejecución sólo se
+    recalculan las canciones nuevas o modificadas y se borran las eliminadas.
+    normalized_song_tokens guarda las palabras del título para la búsqueda
+    difusa de resolve_song_ids.
+    
+    Returns:
+        Número de canciones añadidas o actualizadas en el índice
+    """
     cursor = conn.cursor()
     
-    # Crear tablas temporales para búsqueda normalizada
-    cursor.execute("DROP TABLE IF EXISTS normalized_songs")
+    # Las versiones anteriores reconstruían la tabla sin los valores originales
+    cursor.execute("PRAGMA table_info(normalized_songs)")
+    columns = {col[1] for col in cursor.fetchall()}
+    if columns and 'title' not in columns:
+        cursor.execute("DROP TABLE normalized_songs")
+    
     cursor.execute("""
-        CREATE TABLE normalized_songs (
+        CREATE TABLE IF NOT EXISTS normalized_songs (
             song_id INTEGER PRIMARY KEY,
+            title TEXT,
+            artist TEXT,
+            album TEXT,
             normalized_title TEXT,
             normalized_artist TEXT,
             normalized_album TEXT
         )
     """)
-    
-    # Llenar la tabla normalizada de canciones
     cursor.execute("""
-        SELECT id, title, artist, album FROM songs
+        CREATE TABLE IF NOT EXISTS normalized_song_tokens (
+            field TEXT NOT NULL,
+            token TEXT NOT NULL,
+            song_id INTEGER NOT NULL,
+            PRIMARY KEY (field, token, song_id)
+        ) WITHOUT ROWID
     """)
-    songs = cursor.fetchall()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_norm_title_artist ON normalized_songs(normalized_title, normalized_artist, normalized_album)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_norm_artist ON normalized_songs(normalized_artist)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_norm_tokens_song ON normalized_song_tokens(song_id)")
     
-    for song in songs:
-        song_id, title, artist, album = song
-        cursor.execute("""
-            INSERT INTO normalized_songs 
-            (song_id, normalized_title, normalized_artist, normalized_album)
-            VALUES (?, ?, ?, ?)
-        """, (song_id, normalize_string(title), normalize_string(artist), normalize_string(album)))
+    # Canciones eliminadas
+    cursor.execute("DELETE FROM normalized_songs WHERE song_id NOT IN (SELECT id FROM songs)")
+    removed = cursor.rowcount
+    cursor.execute("DELETE FROM normalized_song_tokens WHERE song_id NOT IN (SELECT song_id FROM normalized_songs)")
     
-    # Crear índices para búsqueda rápida
-    cursor.execute("CREATE INDEX idx_norm_title ON normalized_songs(normalized_title)")
-    cursor.execute("CREATE INDEX idx_norm_artist ON normalized_songs(normalized_artist)")
+    # Canciones nuevas o con título, artista o álbum cambiados
+    cursor.execute("""
+        SELECT s.id, s.title, s.artist, s.album
+        FROM songs s
+        LEFT JOIN normalized_songs n ON n.song_id = s.id
+        WHERE n.song_id IS NULL
+           OR n.title IS NOT s.title OR n.artist IS NOT s.artist OR n.album IS NOT s.album
+    """)
+    changed = cursor.fetchall()
+    
+    rows = []
+    tokens = []
+    for song_id, title, artist, album in changed:
+        normalized_title = normalize_string(title)
+        rows.append((song_id, title, artist, album, normalized_title,
+                     normalize_string(artist), normalize_string(album)))
+        tokens.extend(('t', token, song_id) for token in set(normalized_title.split()))
+    
+    if rows:
+        cursor.executemany("DELETE FROM normalized_song_tokens WHERE song_id = ?", [(row[0],) for row in rows])
+        cursor.executemany("""
+            INSERT OR REPLACE INTO normalized_songs
+            (song_id, title, artist, album, normalized_title, normalized_artist, normalized_album)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        cursor.executemany("INSERT OR IGNORE INTO normalized_song_tokens (field, token, song_id) VALUES (?, ?, ?)", tokens)
     
     conn.commit()
-    print("Tablas de normalización creadas para mejorar las coincidencias")
-    
-    return conn
+    print(f"Índice de coincidencias actualizado: {len(rows)} canciones nuevas o modificadas, {removed} eliminadas")
+    return len(rows)
 
 
-def find_song_by_mbid(conn, listen):
-    """Intenta encontrar una canción por su MusicBrainz ID"""
-    cursor = conn.cursor()
+def _listen_match_query(listen):
+    """Extrae de un listen (formato de ListenBrainz) los datos para resolver su canción"""
+    track_metadata = listen.get('track_metadata', {})
+    additional_info = track_metadata.get('additional_info', {}) or {}
+    album_name = additional_info.get('release_name') or track_metadata.get('release_name', '')
+    return {
+        'track': track_metadata.get('track_name', ''),
+        'artist': track_metadata.get('artist_name', ''),
+        'album': album_name,
+        'recording_mbid': additional_info.get('recording_mbid'),
+        'release_mbid': additional_info.get('release_mbid'),
+        'artist_mbids': additional_info.get('artist_mbids') or [],
+    }
+
+
+def _table_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {col[1] for col in cursor.fetchall()}
+
+
+def resolve_song_ids(conn, queries, use_mbid=True, use_fuzzy=True):
+    """
+    Resuelve por lotes la canción de cada consulta con unas pocas consultas SQL.
     
-    # Extraer MBIDs del listen si están disponibles
-    additional_info = listen.get('track_metadata', {}).get('additional_info', {})
+    Estrategias, en orden de prioridad:
+        1. MBID de grabación (songs.mbid y song_links), y MBID de artista + lanzamiento
+        2. Título, artista y álbum normalizados
+        3. Título y artista normalizados
+        4. Difusa: canciones que comparten palabras del título, con artista
+           igual o contenido uno en otro
     
-    recording_mbid = additional_info.get('recording_mbid')
-    release_mbid = additional_info.get('release_mbid')
-    artist_mbids = additional_info.get('artist_mbids', [])
+    Args:
+        conn: Conexión a la base de datos
+        queries: Lista de dicts con track, artist, album y opcionalmente
+            recording_mbid, release_mbid y artist_mbids
+        use_mbid: Usar la estrategia 1
+        use_fuzzy: Usar la estrategia 4
+        
+    Returns:
+        Lista de song_id (o None) en el mismo orden que queries
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='normalized_song_tokens'")
+    if not cursor.fetchone():
+        sync_match_index(conn)
+    
+    results = [None] * len(queries)
+    for start in range(0, len(queries), MATCH_BATCH_SIZE):
+        chunk = queries[start:start + MATCH_BATCH_SIZE]
+        for offset, song_id in _resolve_chunk(cursor, chunk, use_mbid, use_fuzzy).items():
+            results[start + offset] = song_id
+    return results
+
+
+def _resolve_chunk(cursor, queries, use_mbid, use_fuzzy):
+    resolved = {}
     
-    song_id = None
+    def collect(sql, params=()):
+        for qid, song_id in cursor.execute(sql, params).fetchall():
+            if song_id is not None:
+                resolved.setdefault(qid, song_id)
     
-    # Buscar por recording_mbid (más específico)
-    if recording_mbid:
-        cursor.execute("SELECT id FROM songs WHERE mbid = ?", (recording_mbid,))
-        result = cursor.fetchone()
-        if result:
-            return result[0]
-        
-        # También buscar en song_links
-        cursor.execute("SELECT song_id FROM song_links WHERE musicbrainz_recording_id = ?", (recording_mbid,))
-        result = cursor.fetchone()
-        if result:
-            return result[0]
+    cursor.execute("DROP TABLE IF EXISTS temp.match_queries")
+    cursor.execute("""
+        CREATE TEMP TABLE match_queries (
+            qid INTEGER PRIMARY KEY,
+            nt TEXT, na TEXT, nalb TEXT,
+            recording_mbid TEXT, release_mbid TEXT
+        )
+    """)
+    cursor.execute("DROP TABLE IF EXISTS temp.match_artist_mbids")
+    cursor.execute("CREATE TEMP TABLE match_artist_mbids (qid INTEGER, artist_mbid TEXT)")
+    
+    normalized = []
+    query_rows = []
+    artist_mbid_rows = []
+    for qid, query in enumerate(queries):
+        nt = normalize_string(query.get('track'))
+        na = normalize_string(query.get('artist'))
+        nalb = normalize_string(query.get('album'))
+        normalized.append((nt, na))
+        query_rows.append((qid, nt, na, nalb, query.get('recording_mbid') or None, query.get('release_mbid') or None))
+        artist_mbid_rows.extend((qid, mbid) for mbid in query.get('artist_mbids') or [] if mbid)
+    
+    cursor.executemany("INSERT INTO temp.match_queries VALUES (?, ?, ?, ?, ?, ?)", query_rows)
+    cursor.executemany("INSERT INTO temp.match_artist_mbids VALUES (?, ?)", artist_mbid_rows)
+    
+    # 1. MusicBrainz IDs
+    if use_mbid:
+        if 'mbid' in _table_columns(cursor, 'songs'):
+            collect("""
+                SELECT q.qid, MIN(s.id) FROM temp.match_queries q
+                JOIN songs s ON s.mbid = q.recording_mbid
+                WHERE q.recording_mbid IS NOT NULL
+                GROUP BY q.qid
+            """)
+        if 'musicbrainz_recording_id' in _table_columns(cursor, 'song_links'):
+            collect("""
+                SELECT q.qid, MIN(sl.song_id) FROM temp.match_queries q
+                JOIN song_links sl ON sl.musicbrainz_recording_id = q.recording_mbid
+                WHERE q.recording_mbid IS NOT NULL
+                GROUP BY q.qid
+            """)
+        if artist_mbid_rows:
+            collect("""
+                SELECT q.qid, MIN(s.id) FROM temp.match_queries q
+                JOIN temp.match_artist_mbids am ON am.qid = q.qid
+                JOIN artists ar ON ar.mbid = am.artist_mbid
+                JOIN albums a ON a.mbid = q.release_mbid
+                JOIN songs s ON s.album = a.name AND s.artist = ar.name
+                WHERE q.release_mbid IS NOT NULL
+                GROUP BY q.qid
+            """)
+    
+    # 2 y 3. Coincidencia exacta sobre el índice normalizado
+    collect("""
+        SELECT q.qid, MIN(n.song_id) FROM temp.match_queries q
+        JOIN normalized_songs n
+          ON n.normalized_title = q.nt AND n.normalized_artist = q.na AND n.normalized_album = q.nalb
+        WHERE q.nt != '' AND q.nalb != ''
+        GROUP BY q.qid
+    """)
+    collect("""
+        SELECT q.qid, MIN(n.song_id) FROM temp.match_queries q
+        JOIN normalized_songs n ON n.normalized_title = q.nt AND n.normalized_artist = q.na
+        WHERE q.nt != ''
+        GROUP BY q.qid
+    """)
     
-    # Buscar por combinación de artist_mbid y release_mbid
-    if artist_mbids and release_mbid:
-        for artist_mbid in artist_mbids:
+    # 4. Búsqueda difusa por palabras del título
+    if use_fuzzy:
+        pending = [qid for qid in range(len(queries)) if qid not in resolved and all(normalized[qid])]
+        if pending:
+            cursor.execute("DROP TABLE IF EXISTS temp.match_tokens")
+            cursor.execute("CREATE TEMP TABLE match_tokens (qid INTEGER, token TEXT)")
+            cursor.executemany("INSERT INTO temp.match_tokens VALUES (?, ?)", [
+                (qid, token) for qid in pending for token in set(normalized[qid][0].split())
+            ])
             cursor.execute("""
-                SELECT s.id
-                FROM songs s
-                JOIN albums a ON s.album = a.name
-                JOIN artists ar ON s.artist = ar.name
-                WHERE ar.mbid = ? AND a.mbid = ?
-            """, (artist_mbid, release_mbid))
-            result = cursor.fetchone()
-            if result:
-                return result[0]
+                WITH df AS (
+                    SELECT st.token, COUNT(*) AS n
+                    FROM normalized_song_tokens st
+                    WHERE st.field = 't' AND st.token IN (SELECT token FROM temp.match_tokens)
+                    GROUP BY st.token
+                )
+                SELECT mt.qid, n.song_id, n.normalized_title, n.normalized_artist, COUNT(*) AS shared
+                FROM temp.match_tokens mt
+                JOIN df ON df.token = mt.token AND df.n <= ?
+                JOIN normalized_song_tokens st ON st.field = 't' AND st.token = mt.token
+                JOIN normalized_songs n ON n.song_id = st.song_id
+                JOIN temp.match_queries q ON q.qid = mt.qid
+                WHERE n.normalized_artist = q.na
+                   OR instr(n.normalized_artist, q.na) > 0
+                   OR instr(q.na, n.normalized_artist) > 0
+                GROUP BY mt.qid, n.song_id
+            """, (MATCH_TOKEN_MAX_DF,))
+            
+            best = {}
+            for qid, song_id, title, artist, shared in cursor.fetchall():
+                query_title, query_artist = normalized[qid]
+                if query_title in title or title in query_title:
+                    score = 1.0
+                else:
+                    score = shared / max(len(query_title.split()), len(title.split()))
+                if score < MATCH_FUZZY_MIN_SCORE:
+                    continue
+                rank = (score, artist == query_artist, -song_id)
+                if qid not in best or rank > best[qid][0]:
+                    best[qid] = (rank, song_id)
+            
+            for qid, (_, song_id) in best.items():
+                resolved.setdefault(qid, song_id)
+            cursor.execute("DROP TABLE temp.match_tokens")
     
-    return None
+    cursor.execute("DROP TABLE temp.match_queries")
+    cursor.execute("DROP TABLE temp.match_artist_mbids")
+    return resolved
+
+
+def find_song_by_mbid(conn, listen):
+    """Intenta encontrar una canción por su MusicBrainz ID"""
+    query = _listen_match_query(listen)
+    if not query['recording_mbid'] and not (query['artist_mbids'] and query['release_mbid']):
+        return None
+    # Sin título ni artista sólo pueden coincidir los MBID
+    query.update(track='', artist='', album='')
+    return resolve_song_ids(conn, [query], use_mbid=True, use_fuzzy=False)[0]
 
 
 def fuzzy_match_song(conn, track_name, artist_name, album_name=None):
     """Usa coincidencia difusa para encontrar canciones similares"""
-    cursor = conn.cursor()
-    
-    # Normalizar los términos de búsqueda
-    normalized_track = normalize_string(track_name)
-    normalized_artist = normalize_string(artist_name)
-    normalized_album = normalize_string(album_name) if album_name else None
-    
-    # Estrategia 1: Buscar en la tabla normalizada (más rápido)
-    if normalized_album:
-        cursor.execute("""
-            SELECT song_id FROM normalized_songs
-            WHERE normalized_title = ? AND normalized_artist = ? AND normalized_album = ?
-            LIMIT 1
-        """, (normalized_track, normalized_artist, normalized_album))
-        result = cursor.fetchone()
-        if result:
-            return result[0]
-    
-    # Estrategia 2: Solo por título y artista
-    cursor.execute("""
-        SELECT song_id FROM normalized_songs
-        WHERE normalized_title = ? AND normalized_artist = ?
-        LIMIT 1
-    """, (normalized_track, normalized_artist))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    
-    # Estrategia 3: Usar LIKE para coincidencia parcial
-    track_search = f"%{normalized_track}%"
-    artist_search = f"%{normalized_artist}%"
-    
-    cursor.execute("""
-        SELECT song_id FROM normalized_songs
-        WHERE normalized_title LIKE ? AND normalized_artist LIKE ?
-        LIMIT 1
-    """, (track_search, artist_search))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    
-    # Estrategia 4: Solo buscar por artista exacto y título parcial
-    cursor.execute("""
-        SELECT song_id FROM normalized_songs
-        WHERE normalized_artist = ? AND normalized_title LIKE ?
-        LIMIT 1
-    """, (normalized_artist, track_search))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    
-    return None
+    query = {'track': track_name, 'artist': artist_name, 'album': album_name}
+    return resolve_song_ids(conn, [query], use_mbid=False, use_fuzzy=True)[0]
 
 def improve_process_listens(conn, listens, existing_artists, existing_albums, existing_songs, limit=None, username=None):
     """Versión mejorada de process_listens con mejor coincidencia"""
@@ -1645,38 +1752,24 @@ def reprocess_existing_listens(conn, existing_artists, existing_albums, existing
         conn.commit()
         print(f"Añadida columna additional_data a la tabla {table_name}")
     
-    # Ahora obtener los listens sin depender de la columna additional_data primero
+    sql = f"""
+        SELECT id, track_name, album_name, artist_name, additional_data
+        FROM {table_name}
+        ORDER BY id
+    """
     if limit:
-        cursor.execute(f"""
-            SELECT id, track_name, album_name, artist_name, timestamp, listen_date, listenbrainz_url
-            FROM {table_name}
-            ORDER BY id
-            LIMIT ?
-        """, (limit,))
+        cursor.execute(sql + " LIMIT ?", (limit,))
     else:
-        cursor.execute(f"""
-            SELECT id, track_name, album_name, artist_name, timestamp, listen_date, listenbrainz_url
-            FROM {table_name}
-        """)
+        cursor.execute(sql)
     
     rows = cursor.fetchall()
     total = len(rows)
-    updated = 0
     
     print(f"Reprocesando {total} listens existentes...")
     
-    for i, row in enumerate(rows):
-        if i % 100 == 0 and i > 0:
-            print(f"Procesados {i}/{total} listens...")
-        
-        listen_id, track_name, album_name, artist_name, timestamp, listen_date, listenbrainz_url = row
-        
-        # Inicializar IDs
-        song_id = None
-        artist_id = None
-        album_id = None
-        
-        # Crear un objeto similar a un listen para usar con find_song_by_mbid
+    # Consultas de coincidencia: metadatos completos si se guardaron, si no las columnas
+    queries = []
+    for listen_id, track_name, album_name, artist_name, additional_data in rows:
         listen_obj = {
             'track_metadata': {
                 'artist_name': artist_name,
@@ -1686,82 +1779,67 @@ def reprocess_existing_listens(conn, existing_artists, existing_albums, existing
                 }
             }
         }
-        
-        # Intentar obtener metadata adicional si existe
-        cursor.execute(f"SELECT additional_data FROM {table_name} WHERE id = ?", (listen_id,))
-        additional_data_row = cursor.fetchone()
-        if additional_data_row and additional_data_row[0]:
+        if additional_data:
             try:
-                import json
-                metadata = json.loads(additional_data_row[0])
+                metadata = json.loads(additional_data)
                 if 'track_metadata' in metadata:
                     listen_obj['track_metadata'] = metadata['track_metadata']
             except (json.JSONDecodeError, TypeError):
                 pass
+        query = _listen_match_query(listen_obj)
+        # El texto de las columnas manda sobre el de los metadatos, como antes
+        query.update(track=track_name, artist=artist_name, album=album_name)
+        queries.append(query)
+    
+    song_ids = resolve_song_ids(conn, queries, use_mbid=use_mbid, use_fuzzy=use_fuzzy)
+    
+    # Artista y álbum de las canciones encontradas
+    song_info = {}
+    found_ids = sorted({song_id for song_id in song_ids if song_id})
+    for start in range(0, len(found_ids), 900):
+        chunk = found_ids[start:start + 900]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"SELECT id, artist, album FROM songs WHERE id IN ({placeholders})", chunk)
+        song_info.update({row[0]: (row[1], row[2]) for row in cursor.fetchall()})
+    
+    updates = []
+    for (listen_id, track_name, album_name, artist_name, _), song_id in zip(rows, song_ids):
+        artist_id = None
+        album_id = None
         
-        # Aplicar estrategias de coincidencia según los parámetros
-        if use_mbid:
-            song_id = find_song_by_mbid(conn, listen_obj)
-        
-        if not song_id and use_fuzzy:
-            song_id = fuzzy_match_song(conn, track_name, artist_name, album_name)
-        
-        # Si no se encontró con las técnicas avanzadas, intentar con la estrategia estándar
-        if not song_id:
+        if song_id and song_id in song_info:
+            artist_name_db, album_name_db = song_info[song_id]
+            if artist_name_db:
+                artist_id = existing_artists.get(artist_name_db.lower())
+            if album_name_db and artist_name_db:
+                album_key = (album_name_db.lower(), artist_name_db.lower())
+                if album_key in existing_albums:
+                    album_id, _ = existing_albums.get(album_key)
+        elif not song_id:
             if artist_name:
                 artist_id = existing_artists.get(artist_name.lower())
-            
             if album_name and artist_name:
                 album_key = (album_name.lower(), artist_name.lower())
                 if album_key in existing_albums:
                     album_id, artist_id = existing_albums.get(album_key)
-            
-            if track_name and artist_name:
-                song_key = (track_name.lower(), artist_name.lower(), album_name.lower() if album_name else None)
-                if song_key in existing_songs:
-                    song_id = existing_songs.get(song_key)
-                else:
-                    song_key = (track_name.lower(), artist_name.lower(), None)
-                    if song_key in existing_songs:
-                        song_id = existing_songs.get(song_key)
-        
-        # Si se encontró la canción, buscar información relacionada en la tabla songs
-        if song_id:
-            # Buscar información relacionada con la canción en la estructura existente
-            cursor.execute("""
-                SELECT artist, album FROM songs 
-                WHERE id = ?
-            """, (song_id,))
-            result = cursor.fetchone()
-            if result:
-                artist_name_db, album_name_db = result
-                
-                # Ahora buscar los IDs correspondientes
-                if artist_name_db:
-                    artist_id = existing_artists.get(artist_name_db.lower())
-                
-                if album_name_db and artist_name_db:
-                    album_key = (album_name_db.lower(), artist_name_db.lower())
-                    if album_key in existing_albums:
-                        album_id, _ = existing_albums.get(album_key)
-        
-        # Actualizar el listen solo si hay cambios
-        cursor.execute(f"""
-            UPDATE {table_name} 
-            SET song_id = ?, album_id = ?, artist_id = ?
-            WHERE id = ?
-        """, (song_id, album_id, artist_id, listen_id))
-        
-        if cursor.rowcount > 0:
-            updated += 1
         
-        # Actualizar song_links si el song_id existe
-        if song_id:
-            cursor.execute("""
-                UPDATE song_links 
-                SET links_updated = datetime('now')
-                WHERE song_id = ?
-            """, (song_id,))
+        updates.append((song_id, album_id, artist_id, listen_id))
+    
+    # Actualizar sólo las filas que cambian
+    cursor.executemany(f"""
+        UPDATE {table_name} 
+        SET song_id = ?, album_id = ?, artist_id = ?
+        WHERE id = ?
+          AND (song_id IS NOT ?1 OR album_id IS NOT ?2 OR artist_id IS NOT ?3)
+    """, updates)
+    updated = cursor.rowcount
+    
+    # Actualizar song_links de las canciones enlazadas
+    cursor.executemany("""
+        UPDATE song_links 
+        SET links_updated = datetime('now')
+        WHERE song_id = ?
+    """, [(song_id,) for song_id in found_ids])
     
     conn.commit()
     print(f"Reprocesamiento completado. Actualizados {updated} de {total} listens.")
@@ -2148,7 +2226,6 @@ def main():
     fuzzy_matching = str(args.fuzzy_matching).lower() == 'true' or config.get('fuzzy_matching', False) == True
     use_all_matching = str(args.use_all_matching).lower() == 'true' or config.get('use_all_matching', False) == True
     analyze_mismatches = str(args.analyze_mismatches).lower() == 'true' or config.get('analyze_mismatches', False) == True
-    enhanced_matching = str(args.enhanced_matching).lower() == 'true' or config.get('enhanced_matching', False) == True
 
     print(f"Parámetros de ejecución:")
     print(f"- Usuario: {user}")
@@ -2174,10 +2251,8 @@ def main():
         existing_artists, existing_albums, existing_songs = get_existing_items(conn)
         print(f"Elementos existentes: {len(existing_artists)} artistas, {len(existing_albums)} álbumes, {len(existing_songs)} canciones")
         
-        # Crear tablas normalizadas si se solicita
-        if enhanced_matching or use_all_matching:
-            print("Creando tablas normalizadas para mejorar búsquedas")
-            conn = enhance_matching(conn, existing_artists, existing_albums, existing_songs)
+        # Poner al día el índice de coincidencias (sólo procesa canciones nuevas o modificadas)
+        sync_match_index(conn)
         
         # Reprocesar listens existentes si se solicita
         if reprocess_existing:
@@ -2243,6 +2318,14 @@ def main():
                 save_last_timestamp(conn, newest_timestamp, user)
                 print(f"Guardado último timestamp global: {datetime.datetime.fromtimestamp(newest_timestamp).strftime('%Y-%m-%d %H:%M:%S')}")
         
+        # Actualizar las tablas de resumen de estadísticas. Si se han
+        # reprocesado escuchas pueden cambiar sus canciones, géneros y sellos
+        if reprocess_existing:
+            added = rebuild_listen_cube(conn, 'listenbrainz', user)
+        else:
+            added = update_listen_cube(conn, 'listenbrainz', user)
+        print(f"Resumen de escuchas actualizado: {added} escuchas añadidas")
+        
         # Analizar discrepancias si se solicita
         if analyze_mismatches:
             analyze_mismatch_reasons(conn, user)
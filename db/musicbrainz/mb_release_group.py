@@ -3,17 +3,17 @@ import argparse
 import json
 import os
 import sqlite3
-import time
-import requests
 from datetime import datetime
 import traceback
 from typing import Dict, List, Optional, Tuple, Any
 import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from tools.musicbrainz_client import get_musicbrainz_client
 
 # MusicBrainz API constants
-MUSICBRAINZ_API_URL = "https://musicbrainz.org/ws/2"
 USER_AGENT = "MyMusicApp/1.0 (your-email@example.com)"
-RATE_LIMIT = 1.1  # seconds between requests
 
 class MusicBrainzReleaseGroups:
     def __init__(self, db_path: str, config: Dict = None):
@@ -23,6 +23,9 @@ class MusicBrainzReleaseGroups:
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
         
+        # Cliente compartido: límite de peticiones, almacén de respuestas y revalidación
+        self.mb_client = get_musicbrainz_client(USER_AGENT)
+        
         # Modo de operación: 'auto', 'manual', o 'schema-only'
         self.mode = self.config.get('mode', 'auto')
         self.cache_file = self.config.get('cache_file', 'mb_release_groups_cache.json')
@@ -237,24 +240,8 @@ class MusicBrainzReleaseGroups:
     
     def fetch_release_group(self, release_mbid: str) -> Optional[Dict]:
         """Fetch release group data for a release from MusicBrainz API."""
-        url = f"{MUSICBRAINZ_API_URL}/release/{release_mbid}"
-        params = {
-            "inc": "release-groups+url-rels+genres",
-            "fmt": "json"
-        }
-        
-        headers = {
-            "User-Agent": USER_AGENT
-        }
-        
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=30)
-            response.raise_for_status()
-            time.sleep(RATE_LIMIT)  # Respect rate limit
-            
-            if response.status_code == 200:
-                return response.json()
-            return None
+            return self.mb_client.get_entity("release", release_mbid, inc="release-groups+url-rels+genres")
         except Exception as e:
             print(f"Error fetching release {release_mbid}: {str(e)}")
             self.stats["failed_fetch"] += 1
@@ -262,24 +249,9 @@ class MusicBrainzReleaseGroups:
     
     def fetch_release_group_details(self, group_mbid: str) -> Optional[Dict]:
         """Fetch detailed information about a release group."""
-        url = f"{MUSICBRAINZ_API_URL}/release-group/{group_mbid}"
-        params = {
-            "inc": "url-rels+artist-credits+releases+genres",
-            "fmt": "json"
-        }
-        
-        headers = {
-            "User-Agent": USER_AGENT
-        }
-        
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=30)
-            response.raise_for_status()
-            time.sleep(RATE_LIMIT)  # Respect rate limit
-            
-            if response.status_code == 200:
-                return response.json()
-            return None
+            return self.mb_client.get_entity("release-group", group_mbid,
+                                             inc="url-rels+artist-credits+releases+genres")
         except Exception as e:
             print(f"Error fetching release group {group_mbid}: {str(e)}")
             return None
@@ -771,141 +743,55 @@ class MusicBrainzReleaseGroups:
         """Fetch entity data from Wikidata with property labels and claim URLs."""
         if not wikidata_id:
             return None
-            
-        # Primera solicitud para obtener los claims y labels
-        url = "https://www.wikidata.org/w/api.php"
-        params = {
-            "action": "wbgetentities",
-            "ids": wikidata_id,
-            "format": "json",
-            "languages": "en|es",  # Preferencia por español e inglés
-            "props": "claims|labels|sitelinks"
-        }
         
         try:
-            response = requests.get(url, params=params, timeout=30)
-            time.sleep(1)  # Be nice to Wikidata API
-            
-            if response.status_code != 200:
-                print(f"Error fetching Wikidata entity {wikidata_id}: {response.status_code}")
+            entity = self.mb_client.get_wikidata_entity(wikidata_id, props="claims|labels|sitelinks")
+            if entity is None:
+                print(f"Wikidata entity {wikidata_id} not found")
                 return None
-                
-            entity_data = response.json()
+            
+            entity_data = {'entities': {wikidata_id: entity}}
             
             # Obtener IDs de todas las propiedades para consultar sus etiquetas
-            property_ids = set()
+            claims = entity.get('claims', {})
+            property_ids = set(claims.keys())
             entity_ids = set()  # Para obtener información sobre entidades relacionadas
             
-            if ('entities' in entity_data and wikidata_id in entity_data['entities'] and
-                'claims' in entity_data['entities'][wikidata_id]):
-                
-                claims = entity_data['entities'][wikidata_id]['claims']
-                property_ids = set(claims.keys())
-                
-                # Recolectar IDs de entidades relacionadas
-                for prop_id, claim_list in claims.items():
-                    for claim in claim_list:
-                        if 'mainsnak' in claim and 'datavalue' in claim['mainsnak']:
-                            datavalue = claim['mainsnak']['datavalue']
-                            if datavalue.get('type') == 'wikibase-entityid':
-                                entity_id = datavalue['value'].get('id')
-                                if entity_id:
-                                    entity_ids.add(entity_id)
+            # Recolectar IDs de entidades relacionadas
+            for prop_id, claim_list in claims.items():
+                for claim in claim_list:
+                    if 'mainsnak' in claim and 'datavalue' in claim['mainsnak']:
+                        datavalue = claim['mainsnak']['datavalue']
+                        if datavalue.get('type') == 'wikibase-entityid':
+                            entity_id = datavalue['value'].get('id')
+                            if entity_id:
+                                entity_ids.add(entity_id)
             
             # Si no hay propiedades, no necesitamos hacer más consultas
             if not property_ids:
                 return entity_data
             
-            # Segunda solicitud para obtener etiquetas de propiedades
+            # Etiquetas de propiedades y entidades relacionadas: el cliente las pide
+            # en lotes de 50 y sólo las que no tiene ya guardadas
             property_data = {}
-            # Procesamos las propiedades en lotes de 50 para no sobrecargar la API
-            property_chunks = [list(property_ids)[i:i + 50] for i in range(0, len(property_ids), 50)]
-            
-            for chunk in property_chunks:
-                prop_params = {
-                    "action": "wbgetentities",
-                    "ids": "|".join(chunk),
-                    "format": "json",
-                    "languages": "en|es",
-                    "props": "labels"
-                }
-                
-                try:
-                    prop_response = requests.get(url, params=prop_params, timeout=30)
-                    time.sleep(1)  # Be nice to Wikidata API
-                    
-                    if prop_response.status_code == 200:
-                        prop_data = prop_response.json()
-                        if 'entities' in prop_data:
-                            property_data.update(prop_data['entities'])
-                except Exception as e:
-                    print(f"Error fetching property labels: {str(e)}")
+            try:
+                property_data = self.mb_client.get_wikidata_entities(sorted(property_ids), props="labels")
+            except Exception as e:
+                print(f"Error fetching property labels: {str(e)}")
             
-            # Tercera solicitud: obtener información sobre entidades relacionadas
             entity_data_related = {}
             if entity_ids:
-                entity_chunks = [list(entity_ids)[i:i + 50] for i in range(0, len(entity_ids), 50)]
-                
-                for chunk in entity_chunks:
-                    entity_params = {
-                        "action": "wbgetentities",
-                        "ids": "|".join(chunk),
-                        "format": "json",
-                        "languages": "en|es",
-                        "props": "labels|claims|sitelinks"
-                    }
-                    
-                    try:
-                        entity_response = requests.get(url, params=entity_params, timeout=30)
-                        time.sleep(1)  # Be nice to Wikidata API
-                        
-                        if entity_response.status_code == 200:
-                            entity_resp_data = entity_response.json()
-                            if 'entities' in entity_resp_data:
-                                entity_data_related.update(entity_resp_data['entities'])
-                    except Exception as e:
-                        print(f"Error fetching related entities: {str(e)}")
+                try:
+                    entity_data_related = self.mb_client.get_wikidata_entities(
+                        sorted(entity_ids), props="labels|claims|sitelinks")
+                except Exception as e:
+                    print(f"Error fetching related entities: {str(e)}")
             
-            # Cuarta solicitud: consultar los formatter URLs para las propiedades
-            # Esto ayuda a obtener las URLs completas para los identificadores
+            # Formatter URLs de las propiedades, para obtener las URLs completas
+            # de los identificadores
             formatter_urls = {}
             try:
-                # SPARQL query para obtener los formatter URLs
-                sparql_query = """
-                SELECT ?property ?formatterURL WHERE {
-                ?property wdt:P1630 ?formatterURL.
-                VALUES ?property { %s }
-                }
-                """ % " ".join(f"wd:{pid}" for pid in property_ids)
-                
-                sparql_url = "https://query.wikidata.org/sparql"
-                sparql_params = {
-                    "query": sparql_query,
-                    "format": "json"
-                }
-                
-                sparql_headers = {
-                    "Accept": "application/json",
-                    "User-Agent": "MusicLibraryWikidataFetcher/1.0"
-                }
-                
-                sparql_response = requests.get(
-                    sparql_url, 
-                    params=sparql_params, 
-                    headers=sparql_headers,
-                    timeout=30
-                )
-                time.sleep(1)  # Be nice to Wikidata API
-                
-                if sparql_response.status_code == 200:
-                    sparql_data = sparql_response.json()
-                    if 'results' in sparql_data and 'bindings' in sparql_data['results']:
-                        for binding in sparql_data['results']['bindings']:
-                            if 'property' in binding and 'formatterURL' in binding:
-                                prop_uri = binding['property']['value']
-                                prop_id = prop_uri.split('/')[-1]
-                                formatter_url = binding['formatterURL']['value']
-                                formatter_urls[prop_id] = formatter_url
+                formatter_urls = self.mb_client.get_wikidata_formatter_urls(sorted(property_ids))
             except Exception as e:
                 print(f"Error fetching formatter URLs: {str(e)}")
             
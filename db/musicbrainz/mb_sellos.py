@@ -10,6 +10,10 @@ from bs4 import BeautifulSoup
 from urllib.parse import quote
 import sys
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from tools.work_queue import WorkQueue
+from tools.musicbrainz_client import get_musicbrainz_client
+
 # MusicBrainz API base URL
 MUSICBRAINZ_API_URL = "https://musicbrainz.org/ws/2"
 
@@ -20,6 +24,10 @@ USER_AGENT = "MyMusicApp/1.0 (frodobolson@disroot.org)"
 # For non-authenticated users, it's best to keep it lower, like 1 request per 2 seconds
 RATE_LIMIT = 1.1  # seconds between requests
 
+# Work queue used by update_all_albums_with_labels
+LABEL_QUEUE_ENTITY = "album"
+LABEL_QUEUE_CLAIM_SIZE = 100
+
 
 
 def create_label_tables(db_path):
@@ -373,28 +381,14 @@ def fetch_label_data(label_mbid):
     Returns:
         dict: Label data
     """
-    # Define the URL with all needed includes
-    url = f"{MUSICBRAINZ_API_URL}/label/{label_mbid}"
-    
-    # Include all relevant relationships
-    params = {
-        "inc": "url-rels+label-rels+release-rels+artist-rels",
-        "fmt": "json"
-    }
-    
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    
-    # Make the request
+    # Include all relevant relationships (the shared client handles rate
+    # limiting and serves repeated lookups from its response store)
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Respect the rate limit
-        time.sleep(RATE_LIMIT)
-        
-        data = response.json()
+        data = get_musicbrainz_client(USER_AGENT).get_entity(
+            "label", label_mbid, inc="url-rels+label-rels+release-rels+artist-rels")
+        if data is None:
+            print(f"Label {label_mbid} not found in MusicBrainz")
+            return None
         
         # Explicitly check for and extract the Wikipedia URL 
         # This is a more reliable approach than depending on the relations parsing later
@@ -831,22 +825,9 @@ def extract_wikipedia_url_from_musicbrainz(label_mbid):
     if not label_mbid:
         return None
     
-    # Endpoint de la API de MusicBrainz para sellos
-    endpoint = f"{MUSICBRAINZ_API_URL}/label/{label_mbid}?inc=url-rels&fmt=json"
-    
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    
     try:
         print(f"Consultando MusicBrainz para obtener URL de Wikipedia para sello ID: {label_mbid}")
-        response = requests.get(endpoint, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Respetar el límite de tasa de MusicBrainz
-        time.sleep(RATE_LIMIT)
-        
-        data = response.json()
+        data = get_musicbrainz_client(USER_AGENT).get_entity("label", label_mbid, inc="url-rels") or {}
         
         # Buscar específicamente la relación con Wikipedia
         if 'relations' in data:
@@ -950,9 +931,6 @@ def update_wikipedia_urls(db_path, label_mbid=None):
                     traceback.print_exc()
             else:
                 print(f"No se encontró URL de Wikipedia para {name} (MBID: {mbid})")
-            
-            # Esperar un poco para respetar los límites de tasa
-            time.sleep(RATE_LIMIT)
         
         print(f"Actualización completada. {updated_count}/{total} URLs de Wikipedia actualizadas.")
         return updated_count
@@ -1059,23 +1037,10 @@ def find_catalog_relationships(db_path, label_id, label_mbid, artist_relationshi
                 artist_name = artist_result[0] if artist_result else "Unknown Artist"
                     
                 # Check with MusicBrainz API
-                url = f"{MUSICBRAINZ_API_URL}/release/{album_mbid}"
-                params = {
-                    "inc": "labels",
-                    "fmt": "json"
-                }
-                
-                headers = {
-                    "User-Agent": USER_AGENT
-                }
-                
                 try:
-                    response = requests.get(url, params=params, headers=headers)
-                    time.sleep(RATE_LIMIT)
+                    data = get_musicbrainz_client(USER_AGENT).get_entity("release", album_mbid, inc="labels")
                     
-                    if response.status_code == 200:
-                        data = response.json()
-                        
+                    if data:
                         # Check for label information
                         if 'label-info' in data:
                             for label_info in data['label-info']:
@@ -1485,26 +1450,8 @@ def search_labels(query, limit=10):
     Returns:
         list: Label search results
     """
-    url = f"{MUSICBRAINZ_API_URL}/label"
-    
-    params = {
-        "query": query,
-        "limit": limit,
-        "fmt": "json"
-    }
-    
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Respect the rate limit
-        time.sleep(RATE_LIMIT)
-        
-        data = response.json()
+        data = get_musicbrainz_client(USER_AGENT).search("label", query, limit=limit)
         results = []
         
         if 'labels' in data:
@@ -1547,28 +1494,13 @@ def fetch_label_by_album(db_path, album_mbid, conn=None):
         
         print(f"Fetching label information for album: {album_mbid}")
         
-        # Rate limiting
-        time.sleep(1.1)
-        
         # Fetch release information from MusicBrainz
-        url = f"https://musicbrainz.org/ws/2/release/{album_mbid}?inc=labels+label-rels&fmt=json"
-        headers = {
-            'User-Agent': 'YourMusicApp/1.0 (frodobolson@disroot.org)'
-        }
-        
         try:
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
+            data = get_musicbrainz_client(USER_AGENT).get_entity("release", album_mbid, inc="labels+label-rels")
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error fetching album data from MusicBrainz: {e}")
             return False
         
-        try:
-            data = response.json()
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
-            return False
-        
         # Check if we have valid data
         if not data or 'error' in data:
             print(f"No valid data returned for album {album_mbid}")
@@ -1716,28 +1648,13 @@ def fetch_label_by_mbid(db_path, label_mbid, conn=None):
                 except ValueError:
                     pass  # Continue with update if date parsing fails
         
-        # Rate limiting
-        time.sleep(1.1)
-        
         # Fetch basic label information
-        url = f"https://musicbrainz.org/ws/2/label/{label_mbid}?inc=url-rels+aliases&fmt=json"
-        headers = {
-            'User-Agent': 'YourMusicApp/1.0 (frodobolson@disroot.org)'
-        }
-        
         try:
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
+            data = get_musicbrainz_client(USER_AGENT).get_entity("label", label_mbid, inc="url-rels+aliases")
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error fetching label data from MusicBrainz: {e}")
             return False
         
-        try:
-            data = response.json()
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
-            return False
-        
         # Check if we have valid data
         if not data or 'error' in data:
             print(f"No valid data returned for label {label_mbid}")
@@ -2186,73 +2103,103 @@ def update_all_albums_with_labels(db_path, skip_existing=True):
     """
     Update all albums in the database with label information
     
+    Progress is kept in the shared work queue (tools/work_queue.py): an
+    interrupted run resumes with the albums it had not finished, failed
+    albums are retried with exponential backoff and albums already done
+    are not requested again.
+    
     Args:
         db_path (str): Path to SQLite database
         skip_existing (bool): Skip albums that already have label relationships
     """
     # Enable WAL mode for better concurrency
     conn = sqlite3.connect(db_path, timeout=60)
+    queue = None
+    pending_ids = []
     try:
         conn.execute("PRAGMA journal_mode=WAL")
         conn.execute("PRAGMA busy_timeout=60000")  # 60 second timeout
         
+        queue = WorkQueue(db_path, "musicbrainz/mb_sellos" if skip_existing else "musicbrainz/mb_sellos_all")
+        
         if skip_existing:
             print("Buscando álbumes sin información de sello...")
             albums = get_albums_without_labels(conn)
         else:
+            if not queue.has_pending(LABEL_QUEUE_ENTITY):
+                # The previous full pass finished: start a new one
+                queue.reset(LABEL_QUEUE_ENTITY)
             print("Buscando todos los álbumes con MusicBrainz ID...")
             albums = safe_db_query(conn, "SELECT id, mbid, name FROM albums WHERE mbid IS NOT NULL")
         
-        if not albums:
-            print("No albums found to process")
-            return
-        
-        total = len(albums)
-        print(f"Found {total} albums {'without label information' if skip_existing else 'with MusicBrainz IDs'}")
+        added = queue.enqueue(LABEL_QUEUE_ENTITY, (album_data[0] for album_data in albums or []))
+        print(f"Found {len(albums or [])} albums {'without label information' if skip_existing else 'with MusicBrainz IDs'} "
+              f"({added} new in the work queue)")
+        print(f"Work queue: {queue.stats(LABEL_QUEUE_ENTITY)}")
         
         processed = 0
         errors = 0
         skipped = 0
+        done = 0
         
-        for i, album_data in enumerate(albums):
-            if len(album_data) >= 3:
-                album_id, album_mbid, album_name = album_data[:3]
-            else:
-                album_id, album_mbid = album_data
-                album_name = "Unknown"
+        while True:
+            claimed = queue.claim(LABEL_QUEUE_ENTITY, LABEL_QUEUE_CLAIM_SIZE)
+            if not claimed:
+                break
             
-            print(f"Processing album {i+1}/{total}: {album_name} ({album_mbid})")
+            placeholders = ",".join("?" * len(claimed))
+            rows = safe_db_query(conn, f"SELECT id, mbid, name FROM albums WHERE id IN ({placeholders})", claimed)
+            albums_by_id = {str(row[0]): row for row in rows or []}
             
-            # Validate album data
-            if not album_mbid or album_mbid.strip() == '':
-                print(f"Skipping album with empty MBID: {album_name}")
-                skipped += 1
-                continue
-            
-            try:
-                success = fetch_label_by_album(db_path, album_mbid, conn)
-                if success:
-                    processed += 1
-                elif success is False:  # Explicitly False (not None)
-                    errors += 1
-                    print(f"Failed to process album {album_mbid}")
-                else:
+            for index, album_id in enumerate(claimed):
+                pending_ids = claimed[index:]
+                done += 1
+                _, album_mbid, album_name = albums_by_id.get(album_id, (album_id, None, "Unknown"))
+                
+                print(f"Processing album {done}: {album_name} ({album_mbid})")
+                
+                # Validate album data
+                if not album_mbid or album_mbid.strip() == '':
+                    print(f"Skipping album with empty MBID: {album_name}")
                     skipped += 1
-                    print(f"Skipped album {album_mbid}")
-                    
-            except Exception as e:
-                errors += 1
-                print(f"Error processing album {album_mbid}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                # Continue with next album
+                    queue.complete(LABEL_QUEUE_ENTITY, [album_id])
+                    continue
+                
+                try:
+                    success = fetch_label_by_album(db_path, album_mbid, conn)
+                    if success:
+                        processed += 1
+                        queue.complete(LABEL_QUEUE_ENTITY, [album_id])
+                    elif success is False:  # Explicitly False (not None)
+                        errors += 1
+                        print(f"Failed to process album {album_mbid}")
+                        queue.fail(LABEL_QUEUE_ENTITY, album_id, "fetch_label_by_album failed")
+                    else:
+                        skipped += 1
+                        print(f"Skipped album {album_mbid}")
+                        queue.complete(LABEL_QUEUE_ENTITY, [album_id])
+                        
+                except Exception as e:
+                    errors += 1
+                    print(f"Error processing album {album_mbid}: {str(e)}")
+                    import traceback
+                    traceback.print_exc()
+                    queue.fail(LABEL_QUEUE_ENTITY, album_id, e)
+                    # Continue with next album
+            pending_ids = []
         
         print(f"\nProcessing completed:")
-        print(f"  Total albums: {total}")
+        print(f"  Total albums: {done}")
         print(f"  Successfully processed: {processed}")
         print(f"  Errors: {errors}")
         print(f"  Skipped: {skipped}")
+        print(f"  Work queue: {queue.stats(LABEL_QUEUE_ENTITY)}")
         
+    except KeyboardInterrupt:
+        print("\nInterrupted: returning unprocessed albums to the work queue")
+        if queue is not None:
+            queue.release(LABEL_QUEUE_ENTITY, pending_ids)
+        raise
     except Exception as e:
         print(f"Critical error in update_all_albums_with_labels: {e}")
         import traceback
@@ -2262,6 +2209,8 @@ def update_all_albums_with_labels(db_path, skip_existing=True):
             conn.close()
         except:
             pass
+        if queue is not None:
+            queue.close()
 
     # Print summary statistics
     try:
@@ -32,6 +32,8 @@ from mutagen.flac import FLAC
 import sqlite3
 from datetime import datetime, timedelta
 import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from base_module import PROJECT_ROOT
@@ -279,8 +281,16 @@ class MusicLibraryManager:
             # Verificar y añadir columnas faltantes
             self._add_missing_columns_to_song_links(c)
         
+        # Manifiesto para el escaneo incremental
+        self._create_scan_manifest_tables(c)
+        
         # Create FTS tables if they don't exist
         self._create_fts_tables(c, existing_tables)
+        self._create_fts_triggers(c)
+        
+        # El buscador cruza songs con albums y artists por nombre; también en
+        # bases ya existentes, que no vuelven a pasar por los índices básicos
+        c.execute("CREATE INDEX IF NOT EXISTS idx_songs_album_artist_name ON songs(album, artist)")
         
         # Create indices if requested or if it's a new database
         if create_indices or not db_exists:
@@ -454,6 +464,31 @@ class MusicLibraryManager:
                     self.logger.warning(f"No se pudo añadir columna {col_name}: {e}")
 
 
+    def _create_scan_manifest_tables(self, cursor):
+        """Crea las tablas del manifiesto usado por incremental_scan_library."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_manifest_dirs (
+                path TEXT PRIMARY KEY,
+                parent_path TEXT,
+                mtime_ns INTEGER,
+                child_dirs INTEGER,
+                child_files INTEGER,
+                last_scanned TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_manifest_files (
+                file_path TEXT PRIMARY KEY,
+                dir_path TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                last_scanned TIMESTAMP
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_manifest_dirs_parent ON scan_manifest_dirs(parent_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_manifest_files_dir ON scan_manifest_files(dir_path)")
+
     def _create_fts_tables(self, cursor, existing_tables):
         """Crear tablas FTS si no existen"""
         if 'songs_fts' not in existing_tables:
@@ -489,9 +524,143 @@ class MusicLibraryManager:
         if 'album_fts' not in existing_tables:
             cursor.execute('''
                 CREATE VIRTUAL TABLE album_fts USING fts5(
-                    id, name, genre
+                    id, name, genre, label
+                )
+            ''')
+
+    def _create_fts_triggers(self, cursor):
+        """
+        Crea los triggers que mantienen sincronizados songs_fts, artist_fts y album_fts.
+        Si faltaba alguno, se reconstruye el índice correspondiente para partir de un estado coherente.
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        existing_tables = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='trigger'")
+        existing_triggers = {row[0] for row in cursor.fetchall()}
+        
+        # album_fts se amplía con la columna label para las búsquedas por sello
+        if 'album_fts' in existing_tables:
+            cursor.execute("PRAGMA table_info(album_fts)")
+            if 'label' not in {col[1] for col in cursor.fetchall()}:
+                cursor.execute("DROP TABLE album_fts")
+                existing_tables.discard('album_fts')
+                existing_triggers -= {'album_fts_ai', 'album_fts_ad', 'album_fts_au'}
+        if 'album_fts' not in existing_tables:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE album_fts USING fts5(
+                    id, name, genre, label
                 )
             ''')
+        
+        fts_triggers = {
+            'songs_fts': {
+                'songs_fts_ai': '''
+                    CREATE TRIGGER IF NOT EXISTS songs_fts_ai AFTER INSERT ON songs BEGIN
+                        INSERT INTO songs_fts(rowid, title, artist, album, genre)
+                        VALUES (new.id, new.title, new.artist, new.album, new.genre);
+                    END
+                ''',
+                'songs_fts_ad': '''
+                    CREATE TRIGGER IF NOT EXISTS songs_fts_ad AFTER DELETE ON songs BEGIN
+                        INSERT INTO songs_fts(songs_fts, rowid, title, artist, album, genre)
+                        VALUES ('delete', old.id, old.title, old.artist, old.album, old.genre);
+                    END
+                ''',
+                'songs_fts_au': '''
+                    CREATE TRIGGER IF NOT EXISTS songs_fts_au AFTER UPDATE OF title, artist, album, genre ON songs BEGIN
+                        INSERT INTO songs_fts(songs_fts, rowid, title, artist, album, genre)
+                        VALUES ('delete', old.id, old.title, old.artist, old.album, old.genre);
+                        INSERT INTO songs_fts(rowid, title, artist, album, genre)
+                        VALUES (new.id, new.title, new.artist, new.album, new.genre);
+                    END
+                '''
+            },
+            'artist_fts': {
+                'artist_fts_ai': '''
+                    CREATE TRIGGER IF NOT EXISTS artist_fts_ai AFTER INSERT ON artists BEGIN
+                        INSERT INTO artist_fts(rowid, id, name, bio, tags)
+                        VALUES (new.id, new.id, new.name, new.bio, new.tags);
+                    END
+                ''',
+                'artist_fts_ad': '''
+                    CREATE TRIGGER IF NOT EXISTS artist_fts_ad AFTER DELETE ON artists BEGIN
+                        DELETE FROM artist_fts WHERE rowid = old.id;
+                    END
+                ''',
+                'artist_fts_au': '''
+                    CREATE TRIGGER IF NOT EXISTS artist_fts_au AFTER UPDATE OF name, bio, tags ON artists BEGIN
+                        DELETE FROM artist_fts WHERE rowid = old.id;
+                        INSERT INTO artist_fts(rowid, id, name, bio, tags)
+                        VALUES (new.id, new.id, new.name, new.bio, new.tags);
+                    END
+                '''
+            },
+            'album_fts': {
+                'album_fts_ai': '''
+                    CREATE TRIGGER IF NOT EXISTS album_fts_ai AFTER INSERT ON albums BEGIN
+                        INSERT INTO album_fts(rowid, id, name, genre, label)
+                        VALUES (new.id, new.id, new.name, new.genre, new.label);
+                    END
+                ''',
+                'album_fts_ad': '''
+                    CREATE TRIGGER IF NOT EXISTS album_fts_ad AFTER DELETE ON albums BEGIN
+                        DELETE FROM album_fts WHERE rowid = old.id;
+                    END
+                ''',
+                'album_fts_au': '''
+                    CREATE TRIGGER IF NOT EXISTS album_fts_au AFTER UPDATE OF name, genre, label ON albums BEGIN
+                        DELETE FROM album_fts WHERE rowid = old.id;
+                        INSERT INTO album_fts(rowid, id, name, genre, label)
+                        VALUES (new.id, new.id, new.name, new.genre, new.label);
+                    END
+                '''
+            }
+        }
+        
+        for fts_table, triggers in fts_triggers.items():
+            if set(triggers) <= existing_triggers:
+                continue
+            self.logger.info(f"Creando triggers de sincronización para '{fts_table}'...")
+            for trigger_sql in triggers.values():
+                cursor.execute(trigger_sql)
+            self._rebuild_fts_table(cursor, fts_table)
+
+    def _rebuild_fts_table(self, cursor, fts_table):
+        """Reconstruye un índice FTS a partir de su tabla de origen."""
+        if fts_table == 'songs_fts':
+            cursor.execute("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+        elif fts_table == 'artist_fts':
+            cursor.execute("DELETE FROM artist_fts")
+            cursor.execute('''
+                INSERT INTO artist_fts(rowid, id, name, bio, tags)
+                SELECT id, id, name, bio, tags FROM artists
+            ''')
+        elif fts_table == 'album_fts':
+            cursor.execute("DELETE FROM album_fts")
+            cursor.execute('''
+                INSERT INTO album_fts(rowid, id, name, genre, label)
+                SELECT id, id, name, genre, label FROM albums
+            ''')
+
+    def rebuild_fts_indices(self):
+        """Reconstruye los índices FTS de canciones, artistas y álbumes."""
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        
+        try:
+            start_time = datetime.now()
+            for fts_table in ('songs_fts', 'artist_fts', 'album_fts'):
+                self._rebuild_fts_table(c, fts_table)
+                c.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
+            conn.commit()
+            self.logger.info(f"Índices FTS reconstruidos en {(datetime.now() - start_time).total_seconds():.2f} segundos")
+        
+        except Exception as e:
+            self.logger.error(f"Error al reconstruir los índices FTS: {str(e)}")
+            conn.rollback()
+        
+        finally:
+            conn.close()
 
     def _create_basic_indices(self, cursor):
         """Crear índices básicos necesarios"""
@@ -754,34 +923,31 @@ class MusicLibraryManager:
             c = conn.cursor()
             
             try:
-                # Marcar los álbumes como eliminados o eliminarlos
-                # Opción 1: Eliminar los álbumes ausentes
-                for album_id in missing_album_ids:
-                    # También puedes eliminar las canciones relacionadas
-                    c.execute("SELECT id FROM songs WHERE album IN (SELECT name FROM albums WHERE id = ?)", (album_id,))
-                    song_ids = [row[0] for row in c.fetchall()]
-                    
-                    for song_id in song_ids:
-                        c.execute("DELETE FROM song_links WHERE song_id = ?", (song_id,))
-                        c.execute("DELETE FROM lyrics WHERE track_id = ?", (song_id,))
-                    
-                    c.execute("DELETE FROM songs WHERE album IN (SELECT name FROM albums WHERE id = ?)", (album_id,))
-                    c.execute("DELETE FROM albums WHERE id = ?", (album_id,))
-                
-                # Opción 2: Alternativamente, puedes marcarlos como eliminados sin eliminarlos
-                # c.execute("UPDATE albums SET is_deleted = 1 WHERE id IN ({})".format(','.join('?' * len(missing_album_ids))), missing_album_ids)
+                # Eliminar los álbumes ausentes y sus canciones con consultas sobre conjuntos
+                c.execute("CREATE TEMP TABLE missing_albums (id INTEGER PRIMARY KEY)")
+                c.executemany("INSERT OR IGNORE INTO missing_albums (id) VALUES (?)",
+                              [(album_id,) for album_id in missing_album_ids])
+                c.execute("""
+                    CREATE TEMP TABLE missing_songs AS
+                    SELECT id FROM songs
+                    WHERE album IN (SELECT name FROM albums WHERE id IN (SELECT id FROM missing_albums))
+                """)
+                c.execute("DELETE FROM song_links WHERE song_id IN (SELECT id FROM missing_songs)")
+                c.execute("DELETE FROM lyrics WHERE track_id IN (SELECT id FROM missing_songs)")
+                c.execute("DELETE FROM songs WHERE id IN (SELECT id FROM missing_songs)")
+                c.execute("DELETE FROM albums WHERE id IN (SELECT id FROM missing_albums)")
                 
                 conn.commit()
                 self.logger.info(f"Se han eliminado {len(missing_album_ids)} álbumes ausentes de la base de datos")
                 
             except Exception as e:
                 self.logger.error(f"Error al actualizar álbumes ausentes: {str(e)}")
+                conn.rollback()
             
             finally:
                 conn.close()
         
-        # Posiblemente escanear solo las carpetas nuevas
-        # Esta sería una mejora futura para solo procesar carpetas que no están en la DB
+        # Para procesar solo las carpetas nuevas o modificadas usar incremental_scan_library
         
         self.logger.info(f"Escaneo rápido completado en {(datetime.now() - start_time).total_seconds():.2f} segundos")
 
@@ -1182,11 +1348,8 @@ class MusicLibraryManager:
             conn.close()
 
 
-    def scan_library(self, force_update=False):
-        """Comprehensive library scanning with selective updates."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
+    def _setup_error_logger(self):
+        """Configura el log de errores del escaneo y devuelve (logger, handler)."""
         error_log_path = PROJECT_ROOT / '.content' / 'logs' / 'db' / 'db_musica_path_error.log'
         if not error_log_path.exists():
             error_log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -1198,6 +1361,14 @@ class MusicLibraryManager:
         error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         error_handler.setFormatter(error_formatter)
         error_logger.addHandler(error_handler)
+        return error_logger, error_handler
+
+    def scan_library(self, force_update=False):
+        """Comprehensive library scanning with selective updates."""
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        
+        error_logger, error_handler = self._setup_error_logger()
         
         processed_files = 0
         error_files = 0
@@ -1395,6 +1566,10 @@ class MusicLibraryManager:
             
             # Commit final para asegurar que todos los cambios se guarden
             conn.commit()
+            
+            # INSERT OR REPLACE no dispara el trigger de borrado: reconstruir el índice de canciones
+            self._rebuild_fts_table(c, 'songs_fts')
+            conn.commit()
         
         except Exception as scan_error:
             self.logger.error(f"Library scan error: {str(scan_error)}")
@@ -1409,6 +1584,490 @@ class MusicLibraryManager:
             self.logger.info(f"Files with errors: {error_files}")
 
 
+    def _iter_audio_folders(self):
+        """
+        Recorre la biblioteca una sola vez con os.scandir.
+
+        Yields:
+            tuple: (ruta_carpeta, [(ruta_archivo, stat), ...]) para cada carpeta con audio soportado
+        """
+        pending_dirs = [str(self.root_path)]
+        while pending_dirs:
+            folder = pending_dirs.pop()
+            audio_files = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending_dirs.append(entry.path)
+                            elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in self.supported_formats:
+                                audio_files.append((entry.path, entry.stat()))
+                        except OSError as e:
+                            self.logger.warning(f"No se pudo leer {entry.path}: {e}")
+            except OSError as e:
+                self.logger.warning(f"No se pudo abrir la carpeta {folder}: {e}")
+                continue
+
+            if audio_files:
+                audio_files.sort()
+                yield folder, audio_files
+
+    def _extract_folder_metadata(self, folder_path, file_paths):
+        """
+        Extrae los metadatos de todos los archivos de una carpeta.
+        Se ejecuta dentro de los procesos del pool de parallel_scan_library.
+
+        Returns:
+            tuple: (ruta_carpeta, [metadata, ...], [rutas_con_error])
+        """
+        results = []
+        failed = []
+        for file_path in file_paths:
+            metadata = self.get_audio_metadata(Path(file_path))
+            if metadata:
+                results.append(metadata)
+            else:
+                failed.append(file_path)
+        return folder_path, results, failed
+
+    def _write_folder_batch(self, cursor, folder_results, pending_paths, existing_songs):
+        """
+        Guarda en la base de datos los metadatos de una carpeta con executemany.
+        La primera canción de la carpeta fija los metadatos del álbum, igual que en scan_library.
+
+        Returns:
+            int: Número de canciones escritas
+        """
+        if not folder_results:
+            return 0
+
+        first = folder_results[0]
+        primary_artist = first['album_artist'] or first['artist'].split('feat.')[0].split('with')[0].split('&')[0].strip()
+        folder_metadata = {
+            'album': first['album'],
+            'primary_artist': primary_artist,
+            'year': first['date'],
+            'genre': first['genre'],
+            'label': first['label']
+        }
+
+        rows = []
+        for metadata in folder_results:
+            if metadata['file_path'] not in pending_paths:
+                continue
+
+            # Conservar el added_timestamp original si la canción ya existía
+            existing = existing_songs.get(metadata['file_path'])
+            original_added_timestamp = self._parse_optional_db_datetime(existing[1]) if existing else None
+            if original_added_timestamp:
+                metadata['added_timestamp'] = original_added_timestamp
+                metadata['added_day'] = original_added_timestamp.day
+                metadata['added_week'] = int(original_added_timestamp.strftime('%V'))
+                metadata['added_month'] = original_added_timestamp.month
+                metadata['added_year'] = original_added_timestamp.year
+
+            rows.append((
+                metadata['file_path'], metadata['folder_path'], metadata['title'], metadata['track_number'],
+                metadata['artist'], folder_metadata['primary_artist'], folder_metadata['album'],
+                folder_metadata['year'], folder_metadata['genre'], folder_metadata['label'],
+                metadata['mbid'], metadata.get('bitrate'), metadata.get('bit_depth'),
+                metadata.get('sample_rate'), metadata['last_modified'],
+                metadata.get('duration'), metadata['added_timestamp'],
+                metadata.get('added_day'), metadata['added_week'],
+                metadata['added_month'], metadata['added_year'],
+                metadata.get('replay_gain_track_gain'), metadata.get('replay_gain_track_peak'),
+                metadata.get('replay_gain_album_gain'), metadata.get('replay_gain_album_peak'),
+                'local',
+                metadata.get('musicbrainz_artistid', ''),
+                metadata.get('musicbrainz_recordingid', ''),
+                metadata.get('musicbrainz_albumartistid', ''),
+                metadata.get('musicbrainz_releasegroupid', '')
+            ))
+
+        if not rows:
+            return 0
+
+        # Upsert: a diferencia de INSERT OR REPLACE mantiene el id de la canción
+        cursor.executemany('''
+            INSERT INTO songs
+            (file_path, folder_path, title, track_number, artist, album_artist,
+            album, date, genre, label, mbid, bitrate,
+            bit_depth, sample_rate, last_modified, duration,
+            added_timestamp, added_day, added_week, added_month, added_year,
+            replay_gain_track_gain, replay_gain_track_peak,
+            replay_gain_album_gain, replay_gain_album_peak, origen,
+            musicbrainz_artistid, musicbrainz_recordingid,
+            musicbrainz_albumartistid, musicbrainz_releasegroupid)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(file_path) DO UPDATE SET
+                folder_path = excluded.folder_path,
+                title = excluded.title,
+                track_number = excluded.track_number,
+                artist = excluded.artist,
+                album_artist = excluded.album_artist,
+                album = excluded.album,
+                date = excluded.date,
+                genre = excluded.genre,
+                label = excluded.label,
+                mbid = excluded.mbid,
+                bitrate = excluded.bitrate,
+                bit_depth = excluded.bit_depth,
+                sample_rate = excluded.sample_rate,
+                last_modified = excluded.last_modified,
+                duration = excluded.duration,
+                added_timestamp = excluded.added_timestamp,
+                added_day = excluded.added_day,
+                added_week = excluded.added_week,
+                added_month = excluded.added_month,
+                added_year = excluded.added_year,
+                replay_gain_track_gain = excluded.replay_gain_track_gain,
+                replay_gain_track_peak = excluded.replay_gain_track_peak,
+                replay_gain_album_gain = excluded.replay_gain_album_gain,
+                replay_gain_album_peak = excluded.replay_gain_album_peak,
+                origen = excluded.origen,
+                musicbrainz_artistid = excluded.musicbrainz_artistid,
+                musicbrainz_recordingid = excluded.musicbrainz_recordingid,
+                musicbrainz_albumartistid = excluded.musicbrainz_albumartistid,
+                musicbrainz_releasegroupid = excluded.musicbrainz_releasegroupid
+        ''', rows)
+
+        # Entradas vacías en song_links para las canciones nuevas
+        links_time = datetime.now()
+        cursor.executemany('''
+            INSERT INTO song_links (song_id, links_updated)
+            SELECT s.id, ? FROM songs s
+            WHERE s.file_path = ?
+            AND NOT EXISTS (SELECT 1 FROM song_links sl WHERE sl.song_id = s.id)
+        ''', [(links_time, row[0]) for row in rows])
+
+        # Artista, álbum y género se actualizan una vez por carpeta
+        self._update_artist_info(cursor, folder_metadata['primary_artist'])
+        self._update_album_info(cursor, {
+            'artist': folder_metadata['primary_artist'],
+            'album': folder_metadata['album'],
+            'date': folder_metadata['year'],
+            'label': folder_metadata['label'],
+            'genre': folder_metadata['genre']
+        })
+        self._update_genre_info(cursor, folder_metadata['genre'])
+
+        return len(rows)
+
+    def _run_folder_pipeline(self, conn, folder_jobs, workers, commit_interval, error_logger):
+        """
+        Ejecuta la extracción de metadatos en un pool de procesos acotado y
+        escribe los resultados desde un único escritor.
+
+        Args:
+            conn: Conexión usada por el escritor
+            folder_jobs: Iterable de (carpeta, [rutas], rutas_a_escribir, {ruta: (last_modified, added_timestamp)})
+            workers: Número de procesos
+            commit_interval: Número de canciones escritas entre commits
+            error_logger: Logger de errores del escaneo
+
+        Returns:
+            dict: Contadores 'processed' y 'errors', y las carpetas con fallos en 'failed_folders'
+        """
+        c = conn.cursor()
+        max_pending = workers * 4
+        stats = {'processed': 0, 'errors': 0, 'failed_folders': set()}
+        uncommitted = 0
+        start_time = time.monotonic()
+        last_report = start_time
+        pending = {}
+
+        def handle_result(future):
+            nonlocal uncommitted, last_report
+            folder_path, pending_paths, existing_songs = pending.pop(future)
+            try:
+                _, folder_results, failed = future.result()
+            except Exception as e:
+                stats['errors'] += len(pending_paths)
+                stats['failed_folders'].add(folder_path)
+                error_logger.error(f"Folder processing error {folder_path}: {str(e)}")
+                return
+
+            for failed_path in failed:
+                if failed_path in pending_paths:
+                    stats['errors'] += 1
+                    stats['failed_folders'].add(folder_path)
+                    error_logger.error(f"Metadata extraction failed: {failed_path}")
+
+            try:
+                written = self._write_folder_batch(c, folder_results, pending_paths, existing_songs)
+            except sqlite3.Error as e:
+                stats['errors'] += len(pending_paths)
+                stats['failed_folders'].add(folder_path)
+                error_logger.error(f"Folder write error {folder_path}: {str(e)}")
+                return
+
+            stats['processed'] += written
+            uncommitted += written
+            if uncommitted >= commit_interval:
+                conn.commit()
+                uncommitted = 0
+
+            now = time.monotonic()
+            if now - last_report >= 10:
+                last_report = now
+                rate = stats['processed'] / (now - start_time)
+                self.logger.info(f"Procesados {stats['processed']} archivos ({rate:.1f} archivos/s)")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for folder_path, file_paths, pending_paths, existing_songs in folder_jobs:
+                # Se procesa la carpeta completa para mantener la coherencia del álbum
+                future = executor.submit(self._extract_folder_metadata, folder_path, file_paths)
+                pending[future] = (folder_path, pending_paths, existing_songs)
+
+                if len(pending) >= max_pending:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle_result(future)
+
+            for future in as_completed(list(pending)):
+                handle_result(future)
+
+        conn.commit()
+        return stats
+
+    def parallel_scan_library(self, force_update=False, workers=None, commit_interval=500):
+        """
+        Escaneo de la biblioteca en paralelo.
+
+        Recorre el árbol una sola vez, extrae los metadatos con mutagen en un pool
+        de procesos acotado y un único escritor guarda los resultados por lotes
+        con commits periódicos.
+
+        Args:
+            force_update: Reprocesar todos los archivos aunque no hayan cambiado
+            workers: Número de procesos (por defecto, todos los núcleos)
+            commit_interval: Número de canciones escritas entre commits
+        """
+        workers = workers or os.cpu_count() or 1
+
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        error_logger, error_handler = self._setup_error_logger()
+
+        stats = {'processed': 0, 'errors': 0}
+        skipped_files = 0
+        start_time = time.monotonic()
+
+        try:
+            # Estado actual de la base de datos en una sola consulta
+            c.execute("SELECT file_path, last_modified, added_timestamp FROM songs WHERE file_path IS NOT NULL")
+            existing_songs = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+            self.logger.info(f"Escaneo paralelo con {workers} procesos ({len(existing_songs)} canciones en la base de datos)")
+
+            def folder_jobs():
+                nonlocal skipped_files
+                for folder_path, audio_files in self._iter_audio_folders():
+                    pending_paths = set()
+                    for file_path, stat in audio_files:
+                        existing = existing_songs.get(file_path)
+                        db_last_modified = self._parse_optional_db_datetime(existing[0]) if existing else None
+                        if (force_update or not db_last_modified
+                                or datetime.fromtimestamp(stat.st_mtime) > db_last_modified):
+                            pending_paths.add(file_path)
+                        else:
+                            skipped_files += 1
+
+                    if pending_paths:
+                        yield folder_path, [p for p, _ in audio_files], pending_paths, existing_songs
+
+            stats = self._run_folder_pipeline(conn, folder_jobs(), workers, commit_interval, error_logger)
+
+        except Exception as scan_error:
+            self.logger.error(f"Parallel library scan error: {str(scan_error)}")
+
+        finally:
+            conn.close()
+            error_logger.removeHandler(error_handler)
+            error_handler.close()
+
+            elapsed = time.monotonic() - start_time
+            rate = stats['processed'] / elapsed if elapsed > 0 else 0
+            self.logger.info("Parallel library scan completed")
+            self.logger.info(f"Files processed: {stats['processed']}")
+            self.logger.info(f"Files unchanged: {skipped_files}")
+            self.logger.info(f"Files with errors: {stats['errors']}")
+            self.logger.info(f"Elapsed: {elapsed:.2f} s ({rate:.1f} files/s)")
+
+    def incremental_scan_library(self, workers=None, verify_files=False, commit_interval=500):
+        """
+        Escaneo incremental basado en el manifiesto del sistema de archivos.
+
+        Guarda por carpeta su mtime y número de hijos, y por archivo (tamaño, mtime, inodo).
+        Las carpetas cuyo mtime no ha cambiado no se listan: se desciende directamente
+        a sus subcarpetas conocidas. Solo se extraen los metadatos de archivos nuevos o
+        modificados, usando el mismo pool que parallel_scan_library.
+
+        Args:
+            workers: Número de procesos (por defecto, todos los núcleos)
+            verify_files: Listar también las carpetas sin cambios para detectar
+                archivos editados en el sitio (que no cambian el mtime de la carpeta)
+            commit_interval: Número de canciones escritas entre commits
+
+        Returns:
+            int: Número de canciones escritas
+        """
+        workers = workers or os.cpu_count() or 1
+
+        conn = sqlite3.connect(self.db_path)
+        c = conn.cursor()
+        error_logger, error_handler = self._setup_error_logger()
+
+        stats = {'processed': 0, 'errors': 0, 'failed_folders': set()}
+        walk_stats = {'dirs_skipped': 0, 'dirs_listed': 0, 'files_unchanged': 0, 'files_removed': 0}
+        start_time = time.monotonic()
+
+        try:
+            self._create_scan_manifest_tables(c)
+
+            # Solo se cargan las carpetas; los archivos se consultan por carpeta modificada
+            c.execute("SELECT path, parent_path, mtime_ns FROM scan_manifest_dirs")
+            dir_manifest = {}
+            known_children = {}
+            for path, parent_path, mtime_ns in c.fetchall():
+                dir_manifest[path] = mtime_ns
+                known_children.setdefault(parent_path, []).append(path)
+
+            dir_rows = []
+            file_rows = {}
+            removed_dirs = []
+            removed_files = []
+            scan_time = datetime.now()
+
+            def folder_jobs():
+                stack = [str(self.root_path)]
+                while stack:
+                    folder = stack.pop()
+                    try:
+                        folder_stat = os.stat(folder)
+                    except OSError:
+                        removed_dirs.append(folder)
+                        continue
+
+                    if not verify_files and dir_manifest.get(folder) == folder_stat.st_mtime_ns:
+                        walk_stats['dirs_skipped'] += 1
+                        stack.extend(known_children.get(folder, ()))
+                        continue
+
+                    walk_stats['dirs_listed'] += 1
+                    child_dirs = []
+                    audio_files = []
+                    try:
+                        with os.scandir(folder) as entries:
+                            for entry in entries:
+                                try:
+                                    if entry.is_dir(follow_symlinks=False):
+                                        child_dirs.append(entry.path)
+                                    elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in self.supported_formats:
+                                        audio_files.append((entry.path, entry.stat()))
+                                except OSError as e:
+                                    self.logger.warning(f"No se pudo leer {entry.path}: {e}")
+                    except OSError as e:
+                        self.logger.warning(f"No se pudo abrir la carpeta {folder}: {e}")
+                        continue
+
+                    stack.extend(child_dirs)
+                    removed_dirs.extend(set(known_children.get(folder, ())) - set(child_dirs))
+                    parent_path = str(Path(folder).parent) if folder != str(self.root_path) else None
+                    dir_rows.append((folder, parent_path, folder_stat.st_mtime_ns,
+                                     len(child_dirs), len(audio_files), scan_time))
+
+                    c.execute("SELECT file_path, size, mtime_ns, inode FROM scan_manifest_files WHERE dir_path = ?", (folder,))
+                    known_files = {row[0]: row[1:] for row in c.fetchall()}
+                    current_paths = {file_path for file_path, _ in audio_files}
+                    removed = [path for path in known_files if path not in current_paths]
+                    removed_files.extend(removed)
+                    walk_stats['files_removed'] += len(removed)
+
+                    if not audio_files:
+                        continue
+
+                    audio_files.sort()
+                    placeholders = ','.join('?' * len(audio_files))
+                    c.execute(f"SELECT file_path, last_modified, added_timestamp FROM songs WHERE file_path IN ({placeholders})",
+                              [file_path for file_path, _ in audio_files])
+                    existing_songs = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+
+                    pending_paths = set()
+                    for file_path, stat in audio_files:
+                        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+                        file_rows[file_path] = (file_path, folder) + signature + (scan_time,)
+                        if file_path in known_files:
+                            if tuple(known_files[file_path]) == signature:
+                                walk_stats['files_unchanged'] += 1
+                                continue
+                        elif file_path in existing_songs:
+                            # Sin manifiesto todavía: usar la fecha guardada en songs
+                            db_last_modified = self._parse_optional_db_datetime(existing_songs[file_path][0])
+                            if db_last_modified and datetime.fromtimestamp(stat.st_mtime) <= db_last_modified:
+                                walk_stats['files_unchanged'] += 1
+                                continue
+                        pending_paths.add(file_path)
+
+                    if pending_paths:
+                        yield folder, [p for p, _ in audio_files], pending_paths, existing_songs
+
+            stats = self._run_folder_pipeline(conn, folder_jobs(), workers, commit_interval, error_logger)
+
+            # Actualizar el manifiesto solo al final, para que una ejecución interrumpida se repita
+            failed_folders = stats['failed_folders']
+            c.executemany('''
+                INSERT OR REPLACE INTO scan_manifest_dirs
+                (path, parent_path, mtime_ns, child_dirs, child_files, last_scanned)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [row if row[0] not in failed_folders else row[:2] + (None,) + row[3:] for row in dir_rows])
+            c.executemany('''
+                INSERT OR REPLACE INTO scan_manifest_files
+                (file_path, dir_path, size, mtime_ns, inode, last_scanned)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [row for row in file_rows.values() if row[1] not in failed_folders])
+            c.executemany("DELETE FROM scan_manifest_files WHERE file_path = ?", [(path,) for path in removed_files])
+            for removed_dir in removed_dirs:
+                c.execute("DELETE FROM scan_manifest_dirs WHERE path = ? OR path LIKE ?",
+                          (removed_dir, removed_dir.rstrip(os.sep) + os.sep + '%'))
+                c.execute("DELETE FROM scan_manifest_files WHERE dir_path = ? OR dir_path LIKE ?",
+                          (removed_dir, removed_dir.rstrip(os.sep) + os.sep + '%'))
+            conn.commit()
+
+            if removed_files or removed_dirs:
+                self.logger.info("Hay archivos o carpetas eliminados; ejecuta sync_filesystem para limpiar la base de datos")
+
+        except Exception as scan_error:
+            self.logger.error(f"Incremental library scan error: {str(scan_error)}")
+
+        finally:
+            conn.close()
+            error_logger.removeHandler(error_handler)
+            error_handler.close()
+
+            elapsed = time.monotonic() - start_time
+            self.logger.info("Incremental library scan completed")
+            self.logger.info(f"Directories skipped: {walk_stats['dirs_skipped']}")
+            self.logger.info(f"Directories listed: {walk_stats['dirs_listed']}")
+            self.logger.info(f"Files processed: {stats['processed']}")
+            self.logger.info(f"Files unchanged: {walk_stats['files_unchanged']}")
+            self.logger.info(f"Files removed: {walk_stats['files_removed']}")
+            self.logger.info(f"Files with errors: {stats['errors']}")
+            self.logger.info(f"Elapsed: {elapsed:.2f} s")
+
+        return stats['processed']
+
+    def _parse_optional_db_datetime(self, datetime_str):
+        """Convierte una fecha de la base de datos, devolviendo None si no es válida."""
+        if not datetime_str:
+            return None
+        for date_format in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S'):
+            try:
+                return datetime.strptime(datetime_str, date_format)
+            except ValueError:
+                continue
+        return None
+
     def _ensure_song_links_entry(self, cursor, file_path):
         """Asegurarse de que existe una entrada en song_links para esta canción"""
         # Primero, verificar si la tabla song_links existe
@@ -1700,280 +2359,258 @@ class MusicLibraryManager:
         finally:
             conn.close()
 
-    def sync_database_with_filesystem(self):
+    def sync_database_with_filesystem(self, dry_run=False):
         """
         Sincroniza la base de datos con el sistema de archivos:
         - Elimina registros de archivos que ya no existen
-        - Actualiza rutas de archivos que se han movido
+        - Actualiza rutas de archivos que se han movido (mismo nombre y tamaño)
         - Elimina rutas de imágenes que ya no existen
         - Marca como 'antiguo_local' artistas/álbumes cuyos archivos ya no existen
+
+        Imágenes, álbumes y artistas sólo se revisan si alguna de sus canciones
+        se ha movido o eliminado.
+
+        El listado del sistema de archivos se carga en una tabla temporal y los cambios
+        se calculan con consultas sobre conjuntos y se aplican en una única transacción.
+
+        Args:
+            dry_run: Calcular y mostrar el informe sin modificar la base de datos
+
+        Returns:
+            dict: Informe con el número de cambios de cada tipo
         """
         conn = sqlite3.connect(self.db_path)
+        conn.create_function('basename', 1, lambda path: os.path.basename(path) if path else None, deterministic=True)
+        conn.create_function('dirname', 1, lambda path: os.path.dirname(path) if path else None, deterministic=True)
         c = conn.cursor()
+        report = {}
         
         try:
             self.logger.info("Iniciando sincronización de la base de datos con el sistema de archivos...")
             start_time = datetime.now()
+            self._create_scan_manifest_tables(c)
             
-            # 1. Obtener todos los archivos de la base de datos
-            c.execute("SELECT id, file_path FROM songs WHERE file_path IS NOT NULL")
-            db_files = c.fetchall()
-            
-            # 2. Crear un mapeo de todos los archivos existentes en el sistema
+            # 1. Cargar el listado del sistema de archivos en una tabla temporal
             self.logger.info("Escaneando archivos en el sistema de archivos...")
-            existing_files = {}  # {filename: [full_paths]} - puede haber múltiples archivos con el mismo nombre
-            files_by_path = {}   # {full_path: True}
-            
-            for file_path in self.root_path.rglob('*'):
-                if file_path.suffix.lower() in self.supported_formats and file_path.is_file():
-                    full_path = str(file_path.absolute())
-                    filename = file_path.name
-                    
-                    # Manejar múltiples archivos con el mismo nombre
-                    if filename not in existing_files:
-                        existing_files[filename] = []
-                    existing_files[filename].append(full_path)
-                    files_by_path[full_path] = True
+            c.execute("CREATE TEMP TABLE sync_fs_files (file_path TEXT PRIMARY KEY, filename TEXT, size INTEGER)")
+            for _, audio_files in self._iter_audio_folders():
+                c.executemany(
+                    "INSERT OR IGNORE INTO sync_fs_files (file_path, filename, size) VALUES (?, ?, ?)",
+                    [(file_path, os.path.basename(file_path), stat.st_size) for file_path, stat in audio_files]
+                )
+            c.execute("CREATE INDEX temp.idx_sync_fs_files_name ON sync_fs_files(filename, size)")
             
-            # Contadores para el reporte
-            deleted_songs = 0
-            moved_songs = 0
-            orphaned_albums = 0
-            orphaned_artists = 0
-            cleaned_images = 0
+            # 2. Canciones cuyo archivo ya no está en su ruta (el tamaño sale del manifiesto)
+            c.execute("""
+                CREATE TEMP TABLE sync_missing AS
+                SELECT s.id AS song_id, s.file_path, basename(s.file_path) AS filename, mf.size AS size,
+                       s.artist, s.album_artist, s.album
+                FROM songs s
+                LEFT JOIN scan_manifest_files mf ON mf.file_path = s.file_path
+                WHERE s.file_path IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM sync_fs_files f WHERE f.file_path = s.file_path)
+            """)
             
-            # 3. Procesar cada archivo en la base de datos
-            songs_to_delete = []
-            songs_to_update = []
+            # 3. Candidatos a archivo movido: mismo nombre y tamaño, en una ruta que no está en la base de datos.
+            # Sin tamaño conocido no se acepta una coincidencia sólo por nombre: la canción se elimina
+            # y el siguiente escaneo la añade en su nueva ruta
+            c.execute("""
+                CREATE TEMP TABLE sync_candidates AS
+                SELECT m.song_id, m.file_path AS old_path, f.file_path AS new_path
+                FROM sync_missing m
+                JOIN sync_fs_files f ON f.filename = m.filename AND f.size = m.size
+                WHERE NOT EXISTS (SELECT 1 FROM songs s WHERE s.file_path = f.file_path)
+            """)
+            c.execute("""
+                CREATE TEMP TABLE sync_moves AS
+                SELECT song_id, new_path FROM sync_candidates
+                WHERE song_id IN (SELECT song_id FROM sync_candidates GROUP BY song_id HAVING COUNT(*) = 1)
+                AND new_path IN (SELECT new_path FROM sync_candidates GROUP BY new_path HAVING COUNT(*) = 1)
+            """)
             
-            for song_id, db_file_path in db_files:
-                if not db_file_path:
-                    continue
-                    
-                db_path_obj = Path(db_file_path)
-                
-                # Verificar si el archivo existe en la ruta original
-                if db_file_path in files_by_path:
-                    continue  # El archivo está en su lugar correcto
-                
-                # El archivo no está en su lugar original
-                filename = db_path_obj.name
-                
-                # Buscar si el archivo se ha movido a otra ubicación
-                if filename in existing_files:
-                    # Buscar la mejor coincidencia para archivos con el mismo nombre
-                    possible_paths = existing_files[filename]
-                    
-                    # Si solo hay una posibilidad, usarla
-                    if len(possible_paths) == 1:
-                        new_path = possible_paths[0]
-                        if new_path != db_file_path:
-                            # Verificar que esta nueva ruta no esté ya en la base de datos
-                            c.execute("SELECT id FROM songs WHERE file_path = ?", (new_path,))
-                            if not c.fetchone():
-                                songs_to_update.append((song_id, new_path, db_file_path))
-                                moved_songs += 1
-                                self.logger.debug(f"Archivo movido: {db_file_path} -> {new_path}")
-                            else:
-                                # La nueva ruta ya existe, eliminar este registro duplicado
-                                songs_to_delete.append(song_id)
-                                deleted_songs += 1
-                                self.logger.debug(f"Archivo duplicado eliminado: {db_file_path}")
-                    else:
-                        # Múltiples archivos con el mismo nombre - usar heurística para encontrar el mejor match
-                        best_match = None
-                        best_score = 0
-                        
-                        for potential_path in possible_paths:
-                            # Verificar que esta ruta no esté ya en la base de datos
-                            c.execute("SELECT id FROM songs WHERE file_path = ?", (potential_path,))
-                            if c.fetchone():
-                                continue  # Esta ruta ya está ocupada
-                            
-                            # Calcular similitud basada en estructura de carpetas
-                            old_parts = Path(db_file_path).parts
-                            new_parts = Path(potential_path).parts
-                            
-                            # Contar partes comunes desde el final (artista/album son más importantes)
-                            common_parts = 0
-                            for i in range(1, min(len(old_parts), len(new_parts))):
-                                if old_parts[-i] == new_parts[-i]:
-                                    common_parts += 1
-                                else:
-                                    break
-                            
-                            if common_parts > best_score:
-                                best_score = common_parts
-                                best_match = potential_path
-                        
-                        if best_match and best_match != db_file_path:
-                            songs_to_update.append((song_id, best_match, db_file_path))
-                            moved_songs += 1
-                            self.logger.debug(f"Archivo movido (mejor coincidencia): {db_file_path} -> {best_match}")
+            # Coincidencias ambiguas: elegir la ruta con más carpetas en común desde el final
+            c.execute("""
+                SELECT song_id, old_path, new_path FROM sync_candidates
+                WHERE song_id NOT IN (SELECT song_id FROM sync_moves)
+                ORDER BY song_id
+            """)
+            ambiguous = {}
+            for song_id, old_path, new_path in c.fetchall():
+                ambiguous.setdefault(song_id, (old_path, []))[1].append(new_path)
+            c.execute("SELECT new_path FROM sync_moves")
+            claimed_paths = {row[0] for row in c.fetchall()}
+            ambiguous_moves = []
+            for song_id, (old_path, possible_paths) in ambiguous.items():
+                old_parts = Path(old_path).parts
+                best_match = None
+                best_score = 0
+                for potential_path in possible_paths:
+                    if potential_path in claimed_paths:
+                        continue
+                    new_parts = Path(potential_path).parts
+                    common_parts = 0
+                    for i in range(1, min(len(old_parts), len(new_parts))):
+                        if old_parts[-i] == new_parts[-i]:
+                            common_parts += 1
                         else:
-                            # No se encontró una buena coincidencia
-                            songs_to_delete.append(song_id)
-                            deleted_songs += 1
-                            self.logger.debug(f"Archivo sin coincidencia eliminado: {db_file_path}")
-                else:
-                    # El archivo ya no existe
-                    songs_to_delete.append(song_id)
-                    deleted_songs += 1
-                    self.logger.debug(f"Archivo eliminado: {db_file_path}")
+                            break
+                    if common_parts > best_score:
+                        best_score = common_parts
+                        best_match = potential_path
+                if best_match:
+                    claimed_paths.add(best_match)
+                    ambiguous_moves.append((song_id, best_match))
+            c.executemany("INSERT INTO sync_moves (song_id, new_path) VALUES (?, ?)", ambiguous_moves)
             
-            # 4. Actualizar rutas de archivos movidos
-            if songs_to_update:
-                self.logger.info(f"Actualizando rutas de {len(songs_to_update)} archivos movidos...")
-                for song_id, new_path, old_path in songs_to_update:
-                    # Verificar si la nueva ruta ya existe en la base de datos
-                    c.execute("SELECT id FROM songs WHERE file_path = ? AND id != ?", (new_path, song_id))
-                    existing_song = c.fetchone()
-                    
-                    if existing_song:
-                        # Ya existe una canción con esa ruta, eliminar la duplicada
-                        self.logger.warning(f"Ruta duplicada encontrada: {new_path}. Eliminando registro duplicado (ID: {song_id})")
-                        # Eliminar de song_links
-                        c.execute("DELETE FROM song_links WHERE song_id = ?", (song_id,))
-                        # Eliminar de lyrics
-                        c.execute("DELETE FROM lyrics WHERE track_id = ?", (song_id,))
-                        # Eliminar la canción duplicada
-                        c.execute("DELETE FROM songs WHERE id = ?", (song_id,))
-                        deleted_songs += 1
-                    else:
-                        # CORRECCIÓN: Actualizar solo la ruta del archivo
-                        c.execute("UPDATE songs SET file_path = ? WHERE id = ?", (new_path, song_id))
-                        
-                        # CORRECCIÓN: Si necesitas actualizar folder_path, hazlo en una consulta separada
-                        # Pero primero verifica si la tabla tiene esa columna
-                        c.execute("PRAGMA table_info(songs)")
-                        columns = {col[1] for col in c.fetchall()}
-                        
-                        if 'folder_path' in columns:
-                            new_folder = str(Path(new_path).parent)
-                            c.execute("UPDATE songs SET folder_path = ? WHERE id = ?", (new_folder, song_id))
+            c.execute("""
+                CREATE TEMP TABLE sync_deletes AS
+                SELECT song_id FROM sync_missing
+                WHERE song_id NOT IN (SELECT song_id FROM sync_moves)
+            """)
             
-            # 5. Eliminar canciones que ya no existen
-            if songs_to_delete:
-                self.logger.info(f"Eliminando {len(songs_to_delete)} canciones que ya no existen...")
-                for song_id in songs_to_delete:
-                    # Eliminar de song_links
-                    c.execute("DELETE FROM song_links WHERE song_id = ?", (song_id,))
-                    # Eliminar de lyrics
-                    c.execute("DELETE FROM lyrics WHERE track_id = ?", (song_id,))
-                    # Eliminar la canción
-                    c.execute("DELETE FROM songs WHERE id = ?", (song_id,))
+            c.execute("SELECT COUNT(*) FROM sync_moves")
+            report['moved_songs'] = c.fetchone()[0]
+            c.execute("SELECT COUNT(*) FROM sync_deletes")
+            report['deleted_songs'] = c.fetchone()[0]
             
-            # 6. Limpiar álbumes huérfanos y actualizar origen
-            self.logger.info("Limpiando álbumes huérfanos...")
-            
-            # Encontrar álbumes sin canciones
+            # 4. Actualizar rutas de archivos movidos
             c.execute("""
-                SELECT a.id, a.name, a.artist_id, a.folder_path, a.album_art_path
-                FROM albums a
-                LEFT JOIN songs s ON (s.album = a.name AND s.artist = (SELECT name FROM artists WHERE id = a.artist_id))
-                WHERE s.id IS NULL
+                UPDATE songs
+                SET file_path = (SELECT new_path FROM sync_moves m WHERE m.song_id = songs.id),
+                    folder_path = dirname((SELECT new_path FROM sync_moves m WHERE m.song_id = songs.id))
+                WHERE id IN (SELECT song_id FROM sync_moves)
             """)
-            orphaned_albums_data = c.fetchall()
             
-            for album_id, album_name, artist_id, folder_path, album_art_path in orphaned_albums_data:
-                # Marcar como antiguo_local
-                c.execute("UPDATE albums SET origen = 'antiguo_local' WHERE id = ?", (album_id,))
-                orphaned_albums += 1
-                
-                # Limpiar folder_path y album_art_path
-                c.execute("UPDATE albums SET folder_path = NULL, album_art_path = NULL WHERE id = ?", (album_id,))
+            # 5. Eliminar canciones que ya no existen junto con sus enlaces y letras
+            c.execute("DELETE FROM song_links WHERE song_id IN (SELECT song_id FROM sync_deletes)")
+            c.execute("DELETE FROM lyrics WHERE track_id IN (SELECT song_id FROM sync_deletes)")
+            c.execute("DELETE FROM songs WHERE id IN (SELECT song_id FROM sync_deletes)")
             
-            # 7. Limpiar artistas huérfanos y actualizar origen
-            self.logger.info("Limpiando artistas huérfanos...")
-            
-            # Encontrar artistas que no tienen canciones pero tienen álbumes con origen 'antiguo_local'
+            # Los pasos siguientes sólo revisan los álbumes y artistas de las canciones movidas o eliminadas
             c.execute("""
-                SELECT ar.id, ar.name
+                CREATE TEMP TABLE sync_touched_artists AS
+                SELECT ar.id AS artist_id, ar.name
                 FROM artists ar
-                LEFT JOIN songs s ON s.artist = ar.name OR s.album_artist = ar.name
-                WHERE s.id IS NULL
-                AND EXISTS (
-                    SELECT 1 FROM albums al 
-                    WHERE al.artist_id = ar.id AND al.origen = 'antiguo_local'
+                WHERE ar.name IN (SELECT artist FROM sync_missing UNION SELECT album_artist FROM sync_missing)
+            """)
+            c.execute("""
+                CREATE TEMP TABLE sync_touched_albums AS
+                SELECT DISTINCT al.id AS album_id, al.name, t.name AS artist_name
+                FROM sync_missing m
+                JOIN sync_touched_artists t ON t.name IN (m.artist, m.album_artist)
+                JOIN albums al ON al.artist_id = t.artist_id AND al.name = m.album
+            """)
+            
+            # 6. Álbumes sin canciones: marcar como antiguo_local y limpiar rutas
+            self.logger.info("Limpiando álbumes huérfanos...")
+            c.execute("""
+                UPDATE albums
+                SET origen = 'antiguo_local', folder_path = NULL, album_art_path = NULL
+                WHERE id IN (
+                    SELECT t.album_id FROM sync_touched_albums t
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM songs s
+                        WHERE s.album = t.name AND s.artist = t.artist_name
+                    )
                 )
             """)
-            orphaned_artists_data = c.fetchall()
+            report['orphaned_albums'] = c.rowcount
             
-            for artist_id, artist_name in orphaned_artists_data:
-                # Solo marcar como antiguo_local si NO tiene canciones activas
-                c.execute("""
-                    SELECT COUNT(*) FROM songs 
-                    WHERE artist = ? OR album_artist = ?
-                """, (artist_name, artist_name))
-                active_songs = c.fetchone()[0]
-                
-                if active_songs == 0:
-                    c.execute("UPDATE artists SET origen = 'antiguo_local' WHERE id = ?", (artist_id,))
-                    orphaned_artists += 1
+            # 7. Artistas sin canciones y con álbumes antiguos
+            self.logger.info("Limpiando artistas huérfanos...")
+            c.execute("""
+                UPDATE artists
+                SET origen = 'antiguo_local'
+                WHERE id IN (
+                    SELECT t.artist_id FROM sync_touched_artists t
+                    WHERE NOT EXISTS (SELECT 1 FROM songs s WHERE s.artist = t.name)
+                    AND NOT EXISTS (SELECT 1 FROM songs s WHERE s.album_artist = t.name)
+                    AND EXISTS (
+                        SELECT 1 FROM albums al
+                        WHERE al.artist_id = t.artist_id AND al.origen = 'antiguo_local'
+                    )
+                )
+            """)
+            report['orphaned_artists'] = c.rowcount
             
-            # 8. Limpiar rutas de imágenes que ya no existen
+            # 8. Limpiar rutas de imágenes que ya no existen en los álbumes afectados
+            # (cada ruta distinta se comprueba una vez)
             self.logger.info("Limpiando rutas de imágenes inexistentes...")
+            c.execute("""
+                CREATE TEMP TABLE sync_touched_songs AS
+                SELECT s.id AS song_id, s.album_art_path_denorm
+                FROM sync_touched_albums t
+                JOIN songs s ON s.album = t.name AND (s.artist = t.artist_name OR s.album_artist = t.artist_name)
+            """)
+            c.execute("""
+                SELECT album_art_path FROM albums
+                WHERE id IN (SELECT album_id FROM sync_touched_albums) AND album_art_path IS NOT NULL
+                UNION
+                SELECT album_art_path_denorm FROM sync_touched_songs WHERE album_art_path_denorm IS NOT NULL
+            """)
+            missing_images = [(row[0],) for row in c.fetchall() if row[0] and not os.path.exists(row[0])]
+            c.execute("CREATE TEMP TABLE sync_missing_images (path TEXT PRIMARY KEY)")
+            c.executemany("INSERT OR IGNORE INTO sync_missing_images (path) VALUES (?)", missing_images)
+            c.execute("""
+                UPDATE albums SET album_art_path = NULL
+                WHERE id IN (SELECT album_id FROM sync_touched_albums)
+                AND album_art_path IN (SELECT path FROM sync_missing_images)
+            """)
+            report['cleaned_images'] = c.rowcount
+            c.execute("""
+                UPDATE songs SET album_art_path_denorm = NULL
+                WHERE id IN (
+                    SELECT song_id FROM sync_touched_songs
+                    WHERE album_art_path_denorm IN (SELECT path FROM sync_missing_images)
+                )
+            """)
+            report['cleaned_images'] += c.rowcount
             
-            # Limpiar album_art_path en albums
-            c.execute("SELECT id, album_art_path FROM albums WHERE album_art_path IS NOT NULL")
-            albums_with_art = c.fetchall()
-            
-            for album_id, art_path in albums_with_art:
-                if art_path and not Path(art_path).exists():
-                    c.execute("UPDATE albums SET album_art_path = NULL WHERE id = ?", (album_id,))
-                    cleaned_images += 1
-            
-            # Limpiar album_art_path_denorm en songs
-            c.execute("SELECT id, album_art_path_denorm FROM songs WHERE album_art_path_denorm IS NOT NULL")
-            songs_with_art = c.fetchall()
-            
-            for song_id, art_path in songs_with_art:
-                if art_path and not Path(art_path).exists():
-                    c.execute("UPDATE songs SET album_art_path_denorm = NULL WHERE id = ?", (song_id,))
-                    cleaned_images += 1
-            
-            # 9. Actualizar folder_path en albums basado en las canciones existentes
+            # 9. Actualizar folder_path de los álbumes afectados basado en las canciones existentes
             self.logger.info("Actualizando folder_path en álbumes...")
             c.execute("""
-                SELECT a.id, a.name, ar.name as artist_name
-                FROM albums a
-                JOIN artists ar ON a.artist_id = ar.id
-                WHERE a.origen != 'antiguo_local'
+                UPDATE albums
+                SET folder_path = (
+                    SELECT group_concat(folder, ';') FROM (
+                        SELECT DISTINCT dirname(s.file_path) AS folder
+                        FROM songs s, artists ar
+                        WHERE ar.id = albums.artist_id
+                        AND s.album = albums.name
+                        AND (s.artist = ar.name OR s.album_artist = ar.name)
+                        AND s.file_path IS NOT NULL
+                    )
+                )
+                WHERE id IN (SELECT album_id FROM sync_touched_albums)
+                AND origen != 'antiguo_local'
+                AND EXISTS (
+                    SELECT 1 FROM songs s, artists ar
+                    WHERE ar.id = albums.artist_id
+                    AND s.album = albums.name
+                    AND (s.artist = ar.name OR s.album_artist = ar.name)
+                    AND s.file_path IS NOT NULL
+                )
             """)
-            active_albums = c.fetchall()
             
-            for album_id, album_name, artist_name in active_albums:
-                # Obtener las rutas de carpetas actuales para este álbum
-                c.execute("""
-                    SELECT DISTINCT file_path FROM songs 
-                    WHERE album = ? AND (artist = ? OR album_artist = ?)
-                """, (album_name, artist_name, artist_name))
-                
-                song_paths = c.fetchall()
-                if song_paths:
-                    folder_paths = set()
-                    for path_tuple in song_paths:
-                        if path_tuple[0]:
-                            folder_path = str(Path(path_tuple[0]).parent)
-                            folder_paths.add(folder_path)
-                    
-                    if folder_paths:
-                        folder_paths_str = ";".join(folder_paths)
-                        c.execute("UPDATE albums SET folder_path = ? WHERE id = ?", 
-                                (folder_paths_str, album_id))
-            
-            # Commit todos los cambios
-            conn.commit()
+            if dry_run:
+                c.execute("SELECT song_id, new_path FROM sync_moves LIMIT 20")
+                for song_id, new_path in c.fetchall():
+                    self.logger.info(f"[dry-run] Movida canción {song_id} -> {new_path}")
+                c.execute("SELECT file_path FROM sync_missing WHERE song_id IN (SELECT song_id FROM sync_deletes) LIMIT 20")
+                for (file_path,) in c.fetchall():
+                    self.logger.info(f"[dry-run] Eliminada: {file_path}")
+                conn.rollback()
+            else:
+                conn.commit()
             
             # Reporte final
             duration = (datetime.now() - start_time).total_seconds()
-            self.logger.info("=== Reporte de sincronización ===")
+            self.logger.info("=== Reporte de sincronización ===" + (" (dry-run, sin cambios)" if dry_run else ""))
             self.logger.info(f"Tiempo transcurrido: {duration:.2f} segundos")
-            self.logger.info(f"Canciones eliminadas: {deleted_songs}")
-            self.logger.info(f"Canciones con rutas actualizadas: {moved_songs}")
-            self.logger.info(f"Álbumes marcados como 'antiguo_local': {orphaned_albums}")
-            self.logger.info(f"Artistas marcados como 'antiguo_local': {orphaned_artists}")
-            self.logger.info(f"Rutas de imágenes limpiadas: {cleaned_images}")
+            self.logger.info(f"Canciones eliminadas: {report['deleted_songs']}")
+            self.logger.info(f"Canciones con rutas actualizadas: {report['moved_songs']}")
+            self.logger.info(f"Álbumes marcados como 'antiguo_local': {report['orphaned_albums']}")
+            self.logger.info(f"Artistas marcados como 'antiguo_local': {report['orphaned_artists']}")
+            self.logger.info(f"Rutas de imágenes limpiadas: {report['cleaned_images']}")
             self.logger.info("Sincronización completada exitosamente")
             
         except Exception as e:
@@ -1983,6 +2620,8 @@ class MusicLibraryManager:
         
         finally:
             conn.close()
+        
+        return report
 
 
 
@@ -2025,11 +2664,14 @@ def main(config=None):
         manager.update_schema()
 
     if config.get('sync_filesystem', False):
-        manager.sync_database_with_filesystem()
+        manager.sync_database_with_filesystem(dry_run=config.get('dry_run', False))
     
     if config.get('optimize', False):
         manager.optimize_database()
         manager.create_indices()
+
+    if config.get('rebuild_fts', False):
+        manager.rebuild_fts_indices()
         
     if config.get('update_replay_gain', False):
         manager.update_replay_gain_only()
@@ -2042,8 +2684,25 @@ def main(config=None):
     
     # Escanear la biblioteca siempre como último paso
     if not config.get('update_replay_gain', False) and not config.get('optimize', False) and not config.get('update_schema', False) and not config.get('quick_scan', False) and not config.get('update_bitrates', False):
-        manager.scan_library(force_update=config.get('force_update', False))
-        manager.update_album_artwork_and_paths()
+        if config.get('incremental_scan', False):
+            changed = manager.incremental_scan_library(
+                workers=config.get('scan_workers'),
+                verify_files=config.get('verify_files', False),
+                commit_interval=config.get('commit_interval', 500)
+            )
+            # Sin cambios no hace falta recorrer los álbumes
+            if changed:
+                manager.update_album_artwork_and_paths()
+        elif config.get('parallel_scan', False):
+            manager.parallel_scan_library(
+                force_update=config.get('force_update', False),
+                workers=config.get('scan_workers'),
+                commit_interval=config.get('commit_interval', 500)
+            )
+            manager.update_album_artwork_and_paths()
+        else:
+            manager.scan_library(force_update=config.get('force_update', False))
+            manager.update_album_artwork_and_paths()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
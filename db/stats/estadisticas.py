@@ -1,7 +1,11 @@
 
 """
 Script para generar estadísticas pre-calculadas de la base de datos musical
-Uso: python generate_stats.py <database_path> <username>
+Uso: python estadisticas.py <database_path> <username> [--full] [--workers N]
+
+Por defecto sólo se regeneran las tablas afectadas por las canciones y
+escuchas nuevas desde la última ejecución (estado en stats_generator_state).
+--full regenera todas, necesario tras editar metadatos de canciones existentes.
 
 TABLAS GENERADAS (35 total):
 
@@ -52,8 +56,13 @@ TABLAS GENERADAS (35 total):
 - _stats_listening_addiction_patterns: Patrones de adicción a canciones
 """
 
+import argparse
+import json
 import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import logging
 
@@ -61,15 +70,105 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DEFAULT_WORKERS = 4
+BUSY_TIMEOUT = 120
+
+# Tablas de estadísticas: método que la genera, datos de los que depende y,
+# si sus filas son independientes por clave, cómo refrescar sólo las claves
+# afectadas: (tipo de partición, columna de la tabla con la clave).
+#   songs:   filas de songs (canciones nuevas) y su campo reproducciones
+#   listens: escuchas del usuario
+#   artists / albums: tablas artists y albums
+STATS_TABLES = {
+    '_stats_basic_listening': ('create_stats_basic_listening', {'songs', 'listens'}, None),
+    '_stats_artists_popularity': ('create_stats_artists_popularity', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_albums_analysis': ('create_stats_albums_analysis', {'songs', 'listens'}, ('artist', 'album_artist')),
+    '_stats_genres_trends': ('create_stats_genres_trends', {'songs', 'listens'}, None),
+    '_stats_decade_analysis': ('create_stats_decade_analysis', {'songs', 'listens'}, None),
+    '_stats_quality_analysis': ('create_stats_quality_analysis', {'songs', 'listens'}, None),
+    '_stats_discovery_time': ('create_stats_discovery_time', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_listening_patterns': ('create_stats_listening_patterns', {'listens'}, ('month', "año || '-' || mes")),
+    '_stats_lyrics_analysis': ('create_stats_lyrics_analysis', {'songs', 'listens'}, None),
+    '_stats_rare_genres': ('create_stats_rare_genres', {'songs', 'listens'}, ('genre', 'genre')),
+    '_stats_album_completeness': ('create_stats_album_completeness', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_top_tracks_all_time': ('create_stats_top_tracks_all_time', {'songs', 'listens'}, None),
+    '_stats_label_influence': ('create_stats_label_influence', {'songs', 'listens'}, None),
+    '_stats_duration_preferences': ('create_stats_duration_preferences', {'songs', 'listens'}, None),
+    '_stats_similar_artists_network': ('create_stats_similar_artists_network', {'songs', 'listens', 'artists'}, None),
+    '_stats_genre_evolution_monthly': ('create_stats_genre_evolution_monthly', {'songs', 'listens'}, ('genre', 'genre')),
+    '_stats_artist_collaboration_density': ('create_stats_artist_collaboration_density', {'songs', 'listens', 'albums'}, ('artist', 'artist')),
+    '_stats_time_to_milestones': ('create_stats_time_to_milestones', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_album_discovery_patterns': ('create_stats_album_discovery_patterns', {'songs', 'listens'}, None),
+    '_stats_bitrate_quality_preference': ('create_stats_bitrate_quality_preference', {'songs', 'listens'}, None),
+    '_stats_orphan_gems': ('create_stats_orphan_gems', {'songs', 'listens'}, None),
+    '_stats_replay_gain_listening_preference': ('create_stats_replay_gain_listening_preference', {'songs', 'listens'}, None),
+    '_stats_multi_genre_albums': ('create_stats_multi_genre_albums', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_listening_velocity': ('create_stats_listening_velocity', {'songs', 'listens'}, None),
+    '_stats_label_artist_success_correlation': ('create_stats_label_artist_success_correlation', {'songs', 'listens'}, None),
+    '_stats_temporal_listening_clusters': ('create_stats_temporal_listening_clusters', {'songs', 'listens'}, ('month', 'mes_año')),
+    '_stats_artist_genre_flexibility': ('create_stats_artist_genre_flexibility', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_listening_addiction_patterns': ('create_stats_listening_addiction_patterns', {'songs', 'listens'}, None),
+    '_stats_mood_based_duration_analysis': ('create_stats_mood_based_duration_analysis', {'songs', 'listens'}, None),
+    '_stats_artist_loyalty_index': ('create_stats_artist_loyalty_index', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_decade_cross_pollination': ('create_stats_decade_cross_pollination', {'songs', 'listens'}, None),
+    '_stats_weekend_vs_weekday_preferences': ('create_stats_weekend_vs_weekday_preferences', {'songs', 'listens'}, ('artist', 'artist')),
+    '_stats_rediscovery_cycles': ('create_stats_rediscovery_cycles', {'songs', 'listens'}, ('artist', 'artist')),
+}
+
+# Para refrescar una partición, la tabla de origen se sustituye en la conexión
+# del hilo por una vista temporal con el mismo nombre filtrada a las claves
+# afectadas: la consulta de la tabla no cambia y sólo ve esas filas.
+PARTITION_SOURCES = {
+    'artist': ('songs', "artist IN (SELECT value FROM temp.stats_partition_keys)"),
+    'genre': ('songs', "genre IN (SELECT value FROM temp.stats_partition_keys)"),
+    'month': ('listens_{username}', "strftime('%Y-%m', listen_date) IN (SELECT value FROM temp.stats_partition_keys)"),
+}
+
+
 class MusicStatsGenerator:
-    def __init__(self, db_path, username):
+    def __init__(self, db_path, username, max_workers=DEFAULT_WORKERS):
         self.db_path = db_path
         self.username = username
-        self.conn = sqlite3.connect(db_path)
-        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.timings = {}
+        
+        # WAL: los hilos leen mientras otro sustituye su tabla
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats_generator_state (
+                username TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                PRIMARY KEY (username, key)
+            )
+        """)
+        # Bases de datos creadas sólo por el escáner aún no tienen el conteo
+        if 'reproducciones' not in self._table_columns('songs'):
+            self.conn.execute("ALTER TABLE songs ADD COLUMN reproducciones INTEGER DEFAULT 1")
+        self.conn.commit()
+    
+    @property
+    def conn(self):
+        """Conexión del hilo actual: cada hilo de generación usa la suya."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
         
     def close(self):
-        self.conn.close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
     
     def drop_existing_stats_tables(self):
         """Elimina todas las tablas que empiecen con _stats_"""
@@ -85,82 +184,281 @@ class MusicStatsGenerator:
         
         self.conn.commit()
     
-    def update_song_reproducciones(self):
-        """Corrige el conteo de reproducciones en la tabla songs"""
-        logger.info("Actualizando conteo de reproducciones en tabla songs...")
+    # --- Estado entre ejecuciones ---
+    
+    def _table_exists(self, table):
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table,)
+        ).fetchone()
+        return row is not None
+    
+    def _table_columns(self, table):
+        return {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+    
+    def load_state(self):
+        rows = self.conn.execute(
+            "SELECT key, value FROM stats_generator_state WHERE username = ?", (self.username,)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+    
+    def save_state(self, state):
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO stats_generator_state (username, key, value) VALUES (?, ?, ?)
+                ON CONFLICT (username, key) DO UPDATE SET value = excluded.value
+            """, [(self.username, key, json.dumps(value)) for key, value in state.items()])
+    
+    def listens_source(self):
+        """Tabla de escuchas de la que salen las reproducciones (None si no hay)."""
+        for table in (f"listens_{self.username}", f"scrobbles_{self.username}", "listens"):
+            if self._table_exists(table):
+                return table
+        return None
+    
+    def _fingerprint(self, table):
+        if not self._table_exists(table):
+            return None
+        return list(self.conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {table}").fetchone())
+    
+    def detect_changes(self, state):
+        """
+        Compara la base de datos con el estado de la última ejecución.
         
-        # Primero resetear el campo a 1 (valor por defecto)
-        self.conn.execute("UPDATE songs SET reproducciones = 1")
+        Las canciones nuevas se detectan por added_timestamp y las escuchas
+        nuevas por rowid (se añaden siempre al final). Si faltan filas que ya
+        se habían procesado (borrados, resincronizaciones) el cambio es 'full'.
         
-        # Intentar contar desde tabla listens del usuario
-        try:
-            query = f"""
-            UPDATE songs 
-            SET reproducciones = (
-                SELECT COUNT(*) 
-                FROM listens_{self.username} l 
-                WHERE l.song_id = songs.id
-            )
-            WHERE EXISTS (
-                SELECT 1 FROM listens_{self.username} l2 
-                WHERE l2.song_id = songs.id
-            )
-            """
-            self.conn.execute(query)
-            self.conn.commit()
-            logger.info("Reproducciones actualizadas desde listens")
-            return
-        except sqlite3.Error as e:
-            logger.warning(f"Tabla listens_{self.username} no encontrada: {e}")
+        Returns:
+            tuple: (cambios, nuevo estado)
+        """
+        changes = {
+            'songs': None,       # None, 'append' o 'full'
+            'listens': None,     # None, 'append' o 'full'
+            'artists': False,
+            'albums': False,
+            'song_ids': set(),   # canciones cuyas reproducciones hay que recalcular
+            'months': set(),     # meses ('%Y-%m') con escuchas nuevas
+        }
+        new_state = {}
+        
+        # Canciones
+        count, max_added = self.conn.execute("SELECT COUNT(*), MAX(added_timestamp) FROM songs").fetchone()
+        new_state['songs'] = {'count': count, 'max_added': max_added}
+        previous = state.get('songs')
+        if previous is None:
+            changes['songs'] = 'full'
+        elif previous != new_state['songs']:
+            new_ids = []
+            if previous['max_added'] is not None:
+                new_ids = [row[0] for row in self.conn.execute(
+                    "SELECT id FROM songs WHERE added_timestamp > ? AND added_timestamp <= ?",
+                    (previous['max_added'], max_added)
+                )]
+            if new_ids and previous['count'] + len(new_ids) == count:
+                changes['songs'] = 'append'
+                changes['song_ids'].update(new_ids)
+            else:
+                changes['songs'] = 'full'
+        
+        # Escuchas
+        source = self.listens_source()
+        if source is not None:
+            count, last_rowid = self.conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {source}").fetchone()
+            listens_state = {'table': source, 'count': count, 'last_rowid': last_rowid or 0}
+            previous = state.get('listens')
+            has_date = 'listen_date' in self._table_columns(source)
             
-        # Intentar con tabla scrobbles si listens no existe
-        try:
-            query_scrobbles = f"""
-            UPDATE songs 
-            SET reproducciones = (
-                SELECT COUNT(*) 
-                FROM scrobbles_{self.username} s 
-                WHERE s.song_id = songs.id
-            )
-            WHERE EXISTS (
-                SELECT 1 FROM scrobbles_{self.username} s2 
-                WHERE s2.song_id = songs.id
-            )
-            """
-            self.conn.execute(query_scrobbles)
-            self.conn.commit()
-            logger.info("Reproducciones actualizadas desde scrobbles")
-            return
-        except sqlite3.Error as e2:
-            logger.warning(f"Tabla scrobbles_{self.username} no encontrada: {e2}")
+            if previous is None or previous.get('table') != source:
+                changes['listens'] = 'full'
+            elif previous['last_rowid'] != listens_state['last_rowid'] or previous['count'] != count:
+                kept = self.conn.execute(
+                    f"SELECT COUNT(*) FROM {source} WHERE rowid <= ?", (previous['last_rowid'],)
+                ).fetchone()[0]
+                if kept != previous['count']:
+                    changes['listens'] = 'full'
+                else:
+                    changes['listens'] = 'append'
+                    month_sql = "strftime('%Y-%m', listen_date)" if has_date else "NULL"
+                    for song_id, month in self.conn.execute(f"""
+                        SELECT DISTINCT song_id, {month_sql} FROM {source}
+                        WHERE rowid > ? AND rowid <= ?
+                    """, (previous['last_rowid'], listens_state['last_rowid'])):
+                        if song_id is not None:
+                            changes['song_ids'].add(song_id)
+                        changes['months'].add(month)
             
-        # Si no hay tablas específicas, intentar con tablas genéricas
-        try:
-            query_generic = """
-            UPDATE songs 
-            SET reproducciones = (
-                SELECT COUNT(*) 
-                FROM listens l 
-                WHERE l.song_id = songs.id
-            )
-            WHERE EXISTS (
-                SELECT 1 FROM listens l2 
-                WHERE l2.song_id = songs.id
-            )
-            """
-            self.conn.execute(query_generic)
-            self.conn.commit()
-            logger.info("Reproducciones actualizadas desde tabla genérica listens")
-        except sqlite3.Error as e3:
-            logger.warning(f"No se pudieron actualizar reproducciones: {e3}")
+            if has_date:
+                listens_state['last_listen_date'] = self.conn.execute(
+                    f"SELECT MAX(listen_date) FROM {source}"
+                ).fetchone()[0]
+            new_state['listens'] = listens_state
+        
+        # Tablas auxiliares
+        for table in ('artists', 'albums'):
+            new_state[table] = self._fingerprint(table)
+            changes[table] = state.get(table) != new_state[table]
+        
+        return changes, new_state
+    
+    def update_song_reproducciones(self, song_ids=None):
+        """
+        Corrige el conteo de reproducciones en la tabla songs.
+        
+        Las canciones sin escuchas quedan con 1 (valor por defecto) y el resto
+        con su número de escuchas. Con song_ids sólo se recalculan esas canciones.
+        """
+        source = self.listens_source()
+        if source is None:
+            logger.warning("No se pudieron actualizar reproducciones: no hay tabla de escuchas")
             logger.info("Usando valores por defecto de reproducciones")
+            return
+        
+        if song_ids is None:
+            logger.info(f"Actualizando conteo de reproducciones en tabla songs desde {source}...")
+            scope = ""
+        else:
+            logger.info(f"Actualizando reproducciones de {len(song_ids)} canciones desde {source}...")
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS stats_affected_songs (id INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM temp.stats_affected_songs")
+            self.conn.executemany("INSERT OR IGNORE INTO temp.stats_affected_songs VALUES (?)",
+                                  ((song_id,) for song_id in song_ids))
+            scope = "WHERE song_id IN (SELECT id FROM temp.stats_affected_songs)"
+        
+        # Un único recorrido agrupado de las escuchas en lugar de una subconsulta por canción
+        with self.conn:
+            self.conn.execute(f"""
+                CREATE TEMP TABLE stats_play_counts AS
+                SELECT song_id, COUNT(*) AS n FROM {source} {scope} GROUP BY song_id
+            """)
+            self.conn.execute(f"""
+                UPDATE songs SET reproducciones = 1
+                WHERE reproducciones IS NOT 1
+                {"AND id IN (SELECT id FROM temp.stats_affected_songs)" if song_ids is not None else ""}
+                AND id NOT IN (SELECT song_id FROM temp.stats_play_counts WHERE song_id IS NOT NULL)
+            """)
+            self.conn.execute("""
+                UPDATE songs SET reproducciones = c.n
+                FROM temp.stats_play_counts c
+                WHERE c.song_id = songs.id AND songs.reproducciones IS NOT c.n
+            """)
+            self.conn.execute("DROP TABLE temp.stats_play_counts")
+        logger.info(f"Reproducciones actualizadas desde {source}")
+    
+    # --- Generación de tablas ---
+    
+    def _build_table(self, table, select_sql, params=()):
+        """
+        Genera una tabla de estadísticas.
+        
+        La consulta se materializa primero en una tabla temporal de la conexión
+        del hilo, sin bloquear la base de datos para los demás hilos, y después
+        se sustituye la tabla real en una transacción corta. En un refresco por
+        partición sólo se sustituyen las filas de las claves afectadas.
+        """
+        conn = self.conn
+        partition_column = getattr(self._local, 'partition_column', None)
+        conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+        conn.execute(f"CREATE TEMP TABLE {table} AS {select_sql}", params)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if partition_column:
+                conn.execute(f"""
+                    DELETE FROM main.{table}
+                    WHERE {partition_column} IN (SELECT value FROM temp.stats_partition_keys)
+                """)
+                conn.execute(f"INSERT INTO main.{table} SELECT * FROM temp.{table}")
+            else:
+                conn.execute(f"DROP TABLE IF EXISTS main.{table}")
+                conn.execute(f"CREATE TABLE main.{table} AS SELECT * FROM temp.{table}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+    
+    def _run_table(self, table, partition=None, keys=None):
+        """Genera una tabla (completa o sólo las claves afectadas) y devuelve el tiempo empleado."""
+        method_name = STATS_TABLES[table][0]
+        conn = self.conn
+        start = time.perf_counter()
+        shadow = None
+        
+        if partition is not None:
+            kind, column = partition
+            source, condition = PARTITION_SOURCES[kind]
+            shadow = source.format(username=self.username)
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS stats_partition_keys (value PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.stats_partition_keys")
+            conn.executemany("INSERT OR IGNORE INTO temp.stats_partition_keys VALUES (?)", ((key,) for key in keys))
+            conn.execute(f"CREATE TEMP VIEW {shadow} AS SELECT * FROM main.{shadow} WHERE {condition}")
+            conn.commit()
+            self._local.partition_column = column
+        
+        try:
+            getattr(self, method_name)()
+        finally:
+            if shadow is not None:
+                self._local.partition_column = None
+                conn.execute(f"DROP VIEW IF EXISTS temp.{shadow}")
+                conn.commit()
+        
+        return time.perf_counter() - start
+    
+    def _partition_keys(self, kind, changes):
+        """Claves afectadas por los cambios, o None si hay que regenerar la tabla entera."""
+        if kind == 'month':
+            # Las escuchas sólo se pueden filtrar por mes en listens_{usuario}
+            if self.listens_source() != f"listens_{self.username}":
+                return None
+            months = changes['months']
+            return None if None in months else months
+        
+        column = 'artist' if kind == 'artist' else 'genre'
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS stats_affected_songs (id INTEGER PRIMARY KEY)")
+        self.conn.execute("DELETE FROM temp.stats_affected_songs")
+        self.conn.executemany("INSERT OR IGNORE INTO temp.stats_affected_songs VALUES (?)",
+                              ((song_id,) for song_id in changes['song_ids']))
+        keys = {row[0] for row in self.conn.execute(
+            f"SELECT DISTINCT {column} FROM songs WHERE id IN (SELECT id FROM temp.stats_affected_songs)"
+        )}
+        self.conn.commit()
+        # Las filas con clave NULL no se pueden sustituir por partición
+        return None if None in keys else keys
+    
+    def plan_tables(self, changes, full=False, dirty=()):
+        """
+        Decide qué hacer con cada tabla.
+        
+        Returns:
+            dict: {tabla: (partición, claves)} con partición None para regenerarla entera;
+                  las tablas que no aparecen no han cambiado
+        """
+        plan = {}
+        for table, (method_name, deps, partition) in STATS_TABLES.items():
+            if full or table in dirty or not self._table_exists(table):
+                plan[table] = (None, None)
+                continue
+            
+            changed = {dep for dep in deps if changes.get(dep)}
+            if not changed:
+                continue
+            
+            only_appends = all(changes[dep] == 'append' for dep in changed if dep in ('songs', 'listens'))
+            if partition is not None and only_appends and not changed & {'artists', 'albums'}:
+                keys = self._partition_keys(partition[0], changes)
+                if keys is not None:
+                    if keys:
+                        plan[table] = (partition, keys)
+                    continue
+            plan[table] = (None, None)
+        return plan
     
     def create_stats_basic_listening(self):
         """Estadísticas básicas de escucha"""
         logger.info("Creando _stats_basic_listening...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_basic_listening AS
+        self._build_table("_stats_basic_listening", """
         SELECT 
             COUNT(DISTINCT s.id) as total_canciones_escuchadas,
             COUNT(DISTINCT s.artist) as total_artistas_escuchados,
@@ -179,8 +477,7 @@ class MusicStatsGenerator:
         """Popularidad de artistas"""
         logger.info("Creando _stats_artists_popularity...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_artists_popularity AS
+        self._build_table("_stats_artists_popularity", """
         SELECT 
             s.artist,
             COUNT(DISTINCT s.id) as canciones_en_biblioteca,
@@ -201,8 +498,7 @@ class MusicStatsGenerator:
         """Análisis de álbumes"""
         logger.info("Creando _stats_albums_analysis...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_albums_analysis AS
+        self._build_table("_stats_albums_analysis", """
         SELECT 
             s.album,
             s.artist as album_artist,
@@ -224,8 +520,7 @@ class MusicStatsGenerator:
         """Tendencias de géneros"""
         logger.info("Creando _stats_genres_trends...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_genres_trends AS
+        self._build_table("_stats_genres_trends", """
         SELECT 
             s.genre,
             COUNT(DISTINCT s.id) as canciones_total,
@@ -246,8 +541,7 @@ class MusicStatsGenerator:
         """Análisis por décadas"""
         logger.info("Creando _stats_decade_analysis...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_decade_analysis AS
+        self._build_table("_stats_decade_analysis", """
         SELECT 
             CASE 
                 WHEN CAST(s.date as INTEGER) BETWEEN 1950 AND 1959 THEN '1950s'
@@ -286,8 +580,7 @@ class MusicStatsGenerator:
         """Análisis de calidad de audio"""
         logger.info("Creando _stats_quality_analysis...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_quality_analysis AS
+        self._build_table("_stats_quality_analysis", """
         SELECT 
             s.bitrate,
             s.sample_rate,
@@ -308,8 +601,7 @@ class MusicStatsGenerator:
         
         # Esta tabla necesita datos de scrobbles/listens para calcular correctamente
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_discovery_time AS
+            self._build_table("_stats_discovery_time", f"""
             SELECT 
                 s.id as song_id,
                 s.title,
@@ -333,8 +625,7 @@ class MusicStatsGenerator:
         logger.info("Creando _stats_listening_patterns...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_listening_patterns AS
+            self._build_table("_stats_listening_patterns", f"""
             SELECT 
                 strftime('%Y', l.listen_date) as año,
                 strftime('%m', l.listen_date) as mes,
@@ -355,8 +646,7 @@ class MusicStatsGenerator:
         """Análisis de letras"""
         logger.info("Creando _stats_lyrics_analysis...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_lyrics_analysis AS
+        self._build_table("_stats_lyrics_analysis", """
         SELECT 
             s.has_lyrics,
             COUNT(s.id) as canciones_total,
@@ -374,8 +664,7 @@ class MusicStatsGenerator:
         """Géneros raros con pocas canciones pero reproducciones"""
         logger.info("Creando _stats_rare_genres...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_rare_genres AS
+        self._build_table("_stats_rare_genres", """
         SELECT 
             s.genre,
             COUNT(s.id) as canciones_total,
@@ -393,8 +682,7 @@ class MusicStatsGenerator:
         """Top tracks de todos los tiempos"""
         logger.info("Creando _stats_top_tracks_all_time...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_top_tracks_all_time AS
+        self._build_table("_stats_top_tracks_all_time", """
         SELECT 
             ROW_NUMBER() OVER (ORDER BY s.reproducciones DESC) as ranking,
             s.title,
@@ -415,8 +703,7 @@ class MusicStatsGenerator:
         """Influencia de sellos discográficos"""
         logger.info("Creando _stats_label_influence...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_label_influence AS
+        self._build_table("_stats_label_influence", """
         SELECT 
             s.label,
             COUNT(DISTINCT s.id) as canciones_total,
@@ -435,8 +722,7 @@ class MusicStatsGenerator:
         """Preferencias de duración de canciones"""
         logger.info("Creando _stats_duration_preferences...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_duration_preferences AS
+        self._build_table("_stats_duration_preferences", """
         SELECT 
             CASE 
                 WHEN s.duration < 120 THEN 'Muy corta (<2min)'
@@ -460,8 +746,7 @@ class MusicStatsGenerator:
         """Preferencias detalladas de calidad de audio"""
         logger.info("Creando _stats_bitrate_quality_preference...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_bitrate_quality_preference AS
+        self._build_table("_stats_bitrate_quality_preference", """
         SELECT 
             CASE 
                 WHEN s.bitrate >= 320 THEN 'Alta (>=320kbps)'
@@ -491,8 +776,7 @@ class MusicStatsGenerator:
         """Joyas huérfanas - géneros/artistas poco representados pero populares"""
         logger.info("Creando _stats_orphan_gems...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_orphan_gems AS
+        self._build_table("_stats_orphan_gems", """
         WITH genre_stats AS (
             SELECT 
                 s.genre,
@@ -540,8 +824,7 @@ class MusicStatsGenerator:
         """Preferencias de volumen según replay gain"""
         logger.info("Creando _stats_replay_gain_listening_preference...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_replay_gain_listening_preference AS
+        self._build_table("_stats_replay_gain_listening_preference", """
         SELECT 
             CASE 
                 WHEN s.replay_gain_track_gain > 3 THEN 'Muy_Fuerte (>3dB)'
@@ -565,8 +848,7 @@ class MusicStatsGenerator:
         """Análisis de álbumes multi-género vs mono-género"""
         logger.info("Creando _stats_multi_genre_albums...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_multi_genre_albums AS
+        self._build_table("_stats_multi_genre_albums", """
         WITH album_genre_diversity AS (
             SELECT 
                 s.album,
@@ -603,8 +885,7 @@ class MusicStatsGenerator:
         """Flexibilidad de géneros por artista"""
         logger.info("Creando _stats_artist_genre_flexibility...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_artist_genre_flexibility AS
+        self._build_table("_stats_artist_genre_flexibility", """
         SELECT 
             s.artist,
             COUNT(DISTINCT s.genre) as generos_explorados,
@@ -631,8 +912,7 @@ class MusicStatsGenerator:
         """Índice de lealtad a artistas"""
         logger.info("Creando _stats_artist_loyalty_index...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_artist_loyalty_index AS
+        self._build_table("_stats_artist_loyalty_index", """
         WITH artist_metrics AS (
             SELECT 
                 s.artist,
@@ -671,18 +951,29 @@ class MusicStatsGenerator:
         """Correlación éxito de sellos con artistas"""
         logger.info("Creando _stats_label_artist_success_correlation...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_label_artist_success_correlation AS
+        # Los totales de cada sello se calculan una sola vez y no con tres
+        # subconsultas por grupo
+        self._build_table("_stats_label_artist_success_correlation", """
+        WITH totales_sello AS (
+            SELECT 
+                label,
+                SUM(reproducciones) as reproducciones_totales_sello,
+                COUNT(DISTINCT artist) as artistas_totales_sello
+            FROM songs
+            WHERE reproducciones > 1 AND label IS NOT NULL AND label != ''
+            GROUP BY label
+        )
         SELECT 
             s.label,
             s.artist,
             COUNT(DISTINCT s.id) as canciones_artista_sello,
             SUM(s.reproducciones) as reproducciones_artista_sello,
             AVG(s.reproducciones) as promedio_reproducciones_artista_sello,
-            (SELECT SUM(reproducciones) FROM songs WHERE label = s.label AND reproducciones > 1) as reproducciones_totales_sello,
-            (SELECT COUNT(DISTINCT artist) FROM songs WHERE label = s.label AND reproducciones > 1) as artistas_totales_sello,
-            ROUND((SUM(s.reproducciones) * 100.0 / (SELECT SUM(reproducciones) FROM songs WHERE label = s.label AND reproducciones > 1)), 2) as porcentaje_contribucion_sello
+            ts.reproducciones_totales_sello,
+            ts.artistas_totales_sello,
+            ROUND((SUM(s.reproducciones) * 100.0 / ts.reproducciones_totales_sello), 2) as porcentaje_contribucion_sello
         FROM songs s
+        JOIN totales_sello ts ON ts.label = s.label
         WHERE s.reproducciones > 1 AND s.label IS NOT NULL AND s.label != ''
         GROUP BY s.label, s.artist
         HAVING reproducciones_artista_sello > 1
@@ -693,8 +984,7 @@ class MusicStatsGenerator:
         """Completitud de álbumes escuchados"""
         logger.info("Creando _stats_album_completeness...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_album_completeness AS
+        self._build_table("_stats_album_completeness", """
         SELECT 
             s.album,
             s.artist,
@@ -710,73 +1000,6 @@ class MusicStatsGenerator:
         ORDER BY porcentaje_completitud DESC, SUM(s.reproducciones) DESC
         """)
     
-    def create_stats_top_tracks_all_time(self):
-        """Top tracks de todos los tiempos"""
-        logger.info("Creando _stats_top_tracks_all_time...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_top_tracks_all_time AS
-        SELECT 
-            ROW_NUMBER() OVER (ORDER BY s.reproducciones DESC) as ranking,
-            s.title,
-            s.artist,
-            s.album,
-            s.genre,
-            s.date as year,
-            s.reproducciones,
-            s.duration,
-            (s.duration * s.reproducciones) as tiempo_total_escuchado
-        FROM songs s
-        WHERE s.reproducciones > 0
-        ORDER BY s.reproducciones DESC
-        LIMIT 1000
-        """)
-    
-    def create_stats_label_influence(self):
-        """Influencia de sellos discográficos"""
-        logger.info("Creando _stats_label_influence...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_label_influence AS
-        SELECT 
-            s.label,
-            COUNT(DISTINCT s.id) as canciones_total,
-            SUM(s.reproducciones) as reproducciones_totales,
-            AVG(s.reproducciones) as promedio_reproducciones,
-            COUNT(DISTINCT s.artist) as artistas_diferentes,
-            COUNT(DISTINCT s.album) as albums_diferentes,
-            COUNT(DISTINCT s.genre) as generos_diferentes
-        FROM songs s
-        WHERE s.reproducciones > 0 AND s.label IS NOT NULL AND s.label != ''
-        GROUP BY s.label
-        ORDER BY reproducciones_totales DESC
-        """)
-    
-    def create_stats_duration_preferences(self):
-        """Preferencias de duración de canciones"""
-        logger.info("Creando _stats_duration_preferences...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_duration_preferences AS
-        SELECT 
-            CASE 
-                WHEN s.duration < 120 THEN 'Muy corta (<2min)'
-                WHEN s.duration < 180 THEN 'Corta (2-3min)'
-                WHEN s.duration < 240 THEN 'Normal (3-4min)'
-                WHEN s.duration < 300 THEN 'Larga (4-5min)'
-                WHEN s.duration < 420 THEN 'Muy larga (5-7min)'
-                ELSE 'Épica (>7min)'
-            END as categoria_duracion,
-            AVG(s.duration) as duracion_promedio,
-            COUNT(s.id) as canciones_total,
-            SUM(s.reproducciones) as reproducciones_totales,
-            AVG(s.reproducciones) as promedio_reproducciones
-        FROM songs s
-        WHERE s.reproducciones > 0 AND s.duration IS NOT NULL
-        GROUP BY categoria_duracion
-        ORDER BY promedio_reproducciones DESC
-        """)
-    
     def create_stats_similar_artists_network(self):
         """Red de artistas similares y flujo de reproducciones"""
         logger.info("Creando _stats_similar_artists_network...")
@@ -786,8 +1009,7 @@ class MusicStatsGenerator:
             cursor = self.conn.execute("SELECT similar_artists FROM artists LIMIT 1")
             cursor.fetchone()
             
-            self.conn.execute("""
-            CREATE TABLE _stats_similar_artists_network AS
+            self._build_table("_stats_similar_artists_network", """
             SELECT 
                 a.name as artista_principal,
                 TRIM(SUBSTR(a.similar_artists, 
@@ -811,8 +1033,7 @@ class MusicStatsGenerator:
         except sqlite3.Error as e:
             logger.warning(f"No se pudo crear _stats_similar_artists_network: {e}")
             # Crear tabla vacía como fallback
-            self.conn.execute("""
-            CREATE TABLE _stats_similar_artists_network AS
+            self._build_table("_stats_similar_artists_network", """
             SELECT 
                 'No disponible' as artista_principal,
                 'No disponible' as artista_similar,
@@ -827,8 +1048,7 @@ class MusicStatsGenerator:
         logger.info("Creando _stats_genre_evolution_monthly...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_genre_evolution_monthly AS
+            self._build_table("_stats_genre_evolution_monthly", f"""
             SELECT 
                 s.genre,
                 strftime('%Y-%m', l.listen_date) as mes_año,
@@ -860,8 +1080,7 @@ class MusicStatsGenerator:
             cursor = self.conn.execute("SELECT credits FROM albums LIMIT 1")
             cursor.fetchone()
             
-            self.conn.execute("""
-            CREATE TABLE _stats_artist_collaboration_density AS
+            self._build_table("_stats_artist_collaboration_density", """
             SELECT 
                 s.artist,
                 COUNT(DISTINCT s.album) as albums_totales,
@@ -883,8 +1102,7 @@ class MusicStatsGenerator:
         except sqlite3.Error as e:
             logger.warning(f"No se pudo crear _stats_artist_collaboration_density: {e}")
             # Crear versión simplificada
-            self.conn.execute("""
-            CREATE TABLE _stats_artist_collaboration_density AS
+            self._build_table("_stats_artist_collaboration_density", """
             SELECT 
                 s.artist,
                 COUNT(DISTINCT s.album) as albums_totales,
@@ -903,8 +1121,7 @@ class MusicStatsGenerator:
         logger.info("Creando _stats_time_to_milestones...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_time_to_milestones AS
+            self._build_table("_stats_time_to_milestones", f"""
             WITH milestone_dates AS (
                 SELECT 
                     s.id,
@@ -942,8 +1159,7 @@ class MusicStatsGenerator:
         """Patrones de descubrimiento de álbumes"""
         logger.info("Creando _stats_album_discovery_patterns...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_album_discovery_patterns AS
+        self._build_table("_stats_album_discovery_patterns", """
         SELECT 
             s.album,
             s.artist,
@@ -965,156 +1181,12 @@ class MusicStatsGenerator:
         ORDER BY SUM(s.reproducciones) DESC
         """)
     
-    def create_stats_bitrate_quality_preference(self):
-        """Preferencias detalladas de calidad de audio"""
-        logger.info("Creando _stats_bitrate_quality_preference...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_bitrate_quality_preference AS
-        SELECT 
-            CASE 
-                WHEN s.bitrate >= 320 THEN 'Alta (>=320kbps)'
-                WHEN s.bitrate >= 256 THEN 'Media-Alta (256-319kbps)'
-                WHEN s.bitrate >= 192 THEN 'Media (192-255kbps)'
-                WHEN s.bitrate >= 128 THEN 'Baja (128-191kbps)'
-                ELSE 'Muy_Baja (<128kbps)'
-            END as categoria_bitrate,
-            CASE 
-                WHEN s.sample_rate >= 48000 THEN 'Hi-Res (>=48kHz)'
-                WHEN s.sample_rate >= 44100 THEN 'CD (44.1kHz)'
-                ELSE 'Baja (<44.1kHz)'
-            END as categoria_sample_rate,
-            COUNT(s.id) as canciones_total,
-            SUM(s.reproducciones) as reproducciones_totales,
-            AVG(s.reproducciones) as promedio_reproducciones,
-            COUNT(DISTINCT s.artist) as artistas_diferentes,
-            COUNT(DISTINCT s.genre) as generos_diferentes,
-            SUM(s.duration * s.reproducciones) as tiempo_total_escuchado
-        FROM songs s
-        WHERE s.reproducciones > 0 AND s.bitrate IS NOT NULL AND s.sample_rate IS NOT NULL
-        GROUP BY categoria_bitrate, categoria_sample_rate
-        ORDER BY promedio_reproducciones DESC
-        """)
-    
-    def create_stats_orphan_gems(self):
-        """Joyas huérfanas - géneros/artistas poco representados pero populares"""
-        logger.info("Creando _stats_orphan_gems...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_orphan_gems AS
-        WITH genre_stats AS (
-            SELECT 
-                s.genre,
-                COUNT(s.id) as canciones_en_genero,
-                AVG(s.reproducciones) as promedio_reproducciones_genero
-            FROM songs s
-            WHERE s.reproducciones > 0 AND s.genre IS NOT NULL
-            GROUP BY s.genre
-        ),
-        artist_stats AS (
-            SELECT 
-                s.artist,
-                COUNT(s.id) as canciones_en_artista,
-                AVG(s.reproducciones) as promedio_reproducciones_artista
-            FROM songs s
-            WHERE s.reproducciones > 0
-            GROUP BY s.artist
-        )
-        SELECT 
-            'Género' as tipo,
-            gs.genre as nombre,
-            gs.canciones_en_genero as canciones_total,
-            gs.promedio_reproducciones_genero as promedio_reproducciones,
-            'Nicho_Popular' as categoria
-        FROM genre_stats gs
-        WHERE gs.canciones_en_genero <= 5 AND gs.promedio_reproducciones_genero > 
-              (SELECT AVG(promedio_reproducciones_genero) FROM genre_stats)
-        
-        UNION ALL
-        
-        SELECT 
-            'Artista' as tipo,
-            asi.artist as nombre,
-            asi.canciones_en_artista as canciones_total,
-            asi.promedio_reproducciones_artista as promedio_reproducciones,
-            'Artista_Nicho' as categoria
-        FROM artist_stats asi
-        WHERE asi.canciones_en_artista <= 3 AND asi.promedio_reproducciones_artista > 
-              (SELECT AVG(promedio_reproducciones_artista) FROM artist_stats)
-        
-        ORDER BY promedio_reproducciones DESC
-        """)
-    
-    def create_stats_replay_gain_listening_preference(self):
-        """Preferencias de volumen según replay gain"""
-        logger.info("Creando _stats_replay_gain_listening_preference...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_replay_gain_listening_preference AS
-        SELECT 
-            CASE 
-                WHEN s.replay_gain_track_gain > 3 THEN 'Muy_Fuerte (>3dB)'
-                WHEN s.replay_gain_track_gain > 0 THEN 'Fuerte (0-3dB)'
-                WHEN s.replay_gain_track_gain > -3 THEN 'Normal (0 a -3dB)'
-                WHEN s.replay_gain_track_gain > -6 THEN 'Suave (-3 a -6dB)'
-                ELSE 'Muy_Suave (<-6dB)'
-            END as categoria_volumen,
-            COUNT(s.id) as canciones_total,
-            SUM(s.reproducciones) as reproducciones_totales,
-            AVG(s.reproducciones) as promedio_reproducciones,
-            AVG(s.replay_gain_track_gain) as promedio_gain,
-            COUNT(DISTINCT s.genre) as generos_diferentes
-        FROM songs s
-        WHERE s.reproducciones > 0 AND s.replay_gain_track_gain IS NOT NULL
-        GROUP BY categoria_volumen
-        ORDER BY promedio_reproducciones DESC
-        """)
-    
-    def create_stats_multi_genre_albums(self):
-        """Análisis de álbumes multi-género vs mono-género"""
-        logger.info("Creando _stats_multi_genre_albums...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_multi_genre_albums AS
-        WITH album_genre_diversity AS (
-            SELECT 
-                s.album,
-                s.artist,
-                COUNT(DISTINCT s.genre) as generos_diferentes,
-                COUNT(s.id) as tracks_total,
-                SUM(s.reproducciones) as reproducciones_totales,
-                AVG(s.reproducciones) as promedio_reproducciones,
-                GROUP_CONCAT(DISTINCT s.genre) as lista_generos
-            FROM songs s
-            WHERE s.album IS NOT NULL AND s.genre IS NOT NULL
-            GROUP BY s.album, s.artist
-            HAVING SUM(s.reproducciones) > 0
-        )
-        SELECT 
-            agd.album,
-            agd.artist,
-            agd.generos_diferentes,
-            agd.tracks_total,
-            agd.reproducciones_totales,
-            agd.promedio_reproducciones,
-            agd.lista_generos,
-            CASE 
-                WHEN agd.generos_diferentes = 1 THEN 'Mono-género'
-                WHEN agd.generos_diferentes <= 3 THEN 'Multi-género_Moderado'
-                ELSE 'Multi-género_Ecléctico'
-            END as tipo_diversidad,
-            ROUND(agd.reproducciones_totales * 1.0 / agd.tracks_total, 2) as engagement_por_track
-        FROM album_genre_diversity agd
-        ORDER BY agd.generos_diferentes DESC, agd.reproducciones_totales DESC
-        """)
-    
     def create_stats_listening_velocity(self):
         """Velocidad de escucha y patrones de consumo"""
         logger.info("Creando _stats_listening_velocity...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_listening_velocity AS
+            self._build_table("_stats_listening_velocity", f"""
             WITH listening_sessions AS (
                 SELECT 
                     s.id as song_id,
@@ -1158,8 +1230,7 @@ class MusicStatsGenerator:
         logger.info("Creando _stats_temporal_listening_clusters...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_temporal_listening_clusters AS
+            self._build_table("_stats_temporal_listening_clusters", f"""
             SELECT 
                 strftime('%Y-%m', l.listen_date) as mes_año,
                 strftime('%H', l.listen_date) as hora_dia,
@@ -1191,41 +1262,12 @@ class MusicStatsGenerator:
         except sqlite3.Error:
             logger.warning("No se pudo crear _stats_temporal_listening_clusters - tabla de listens no encontrada")
     
-    def create_stats_artist_genre_flexibility(self):
-        """Flexibilidad de géneros por artista"""
-        logger.info("Creando _stats_artist_genre_flexibility...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_artist_genre_flexibility AS
-        SELECT 
-            s.artist,
-            COUNT(DISTINCT s.genre) as generos_explorados,
-            COUNT(DISTINCT s.album) as albums_diferentes,
-            COUNT(s.id) as canciones_totales,
-            SUM(s.reproducciones) as reproducciones_totales,
-            GROUP_CONCAT(DISTINCT s.genre) as lista_generos,
-            CASE 
-                WHEN COUNT(DISTINCT s.genre) = 1 THEN 'Mono-género'
-                WHEN COUNT(DISTINCT s.genre) <= 3 THEN 'Bi/Tri-género'
-                WHEN COUNT(DISTINCT s.genre) <= 5 THEN 'Multi-género'
-                ELSE 'Ecléctico_Extremo'
-            END as categoria_flexibilidad,
-            ROUND(COUNT(DISTINCT s.genre) * 1.0 / COUNT(DISTINCT s.album), 2) as generos_por_album,
-            AVG(s.reproducciones) as promedio_reproducciones
-        FROM songs s
-        WHERE s.reproducciones > 0 AND s.genre IS NOT NULL
-        GROUP BY s.artist
-        HAVING canciones_totales > 1
-        ORDER BY generos_explorados DESC, reproducciones_totales DESC
-        """)
-    
     def create_stats_listening_addiction_patterns(self):
         """Patrones de adicción a canciones"""
         logger.info("Creando _stats_listening_addiction_patterns...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_listening_addiction_patterns AS
+            self._build_table("_stats_listening_addiction_patterns", f"""
             WITH consecutive_plays AS (
                 SELECT 
                     s.id,
@@ -1273,8 +1315,7 @@ class MusicStatsGenerator:
         logger.info("Creando _stats_mood_based_duration_analysis...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_mood_based_duration_analysis AS
+            self._build_table("_stats_mood_based_duration_analysis", f"""
             WITH hourly_listening AS (
                 SELECT 
                     s.id,
@@ -1312,53 +1353,12 @@ class MusicStatsGenerator:
         except sqlite3.Error:
             logger.warning("No se pudo crear _stats_mood_based_duration_analysis - tabla de listens no encontrada")
     
-    def create_stats_artist_loyalty_index(self):
-        """Índice de lealtad a artistas"""
-        logger.info("Creando _stats_artist_loyalty_index...")
-        
-        self.conn.execute("""
-        CREATE TABLE _stats_artist_loyalty_index AS
-        WITH artist_metrics AS (
-            SELECT 
-                s.artist,
-                COUNT(DISTINCT s.id) as canciones_en_biblioteca,
-                SUM(s.reproducciones) as reproducciones_totales,
-                COUNT(DISTINCT s.album) as albums_diferentes,
-                AVG(s.reproducciones) as promedio_reproducciones,
-                MAX(s.reproducciones) as max_reproducciones_cancion,
-                MIN(s.reproducciones) as min_reproducciones_cancion,
-                (MAX(s.reproducciones) - MIN(s.reproducciones)) as rango_reproducciones
-            FROM songs s
-            WHERE s.reproducciones > 0
-            GROUP BY s.artist
-            HAVING canciones_en_biblioteca > 1
-        )
-        SELECT 
-            am.artist,
-            am.canciones_en_biblioteca,
-            am.reproducciones_totales,
-            am.albums_diferentes,
-            am.promedio_reproducciones,
-            am.rango_reproducciones,
-            ROUND((am.reproducciones_totales * 1.0 / am.canciones_en_biblioteca), 2) as consistencia_escucha,
-            ROUND((am.albums_diferentes * 1.0 / am.canciones_en_biblioteca) * 100, 2) as exploracion_discografia,
-            CASE 
-                WHEN am.promedio_reproducciones > 20 AND am.rango_reproducciones < 10 THEN 'Lealtad_Alta_Consistente'
-                WHEN am.promedio_reproducciones > 20 THEN 'Lealtad_Alta_Variable'
-                WHEN am.promedio_reproducciones > 10 THEN 'Lealtad_Media'
-                ELSE 'Lealtad_Baja'
-            END as categoria_lealtad
-        FROM artist_metrics am
-        ORDER BY am.promedio_reproducciones DESC, am.reproducciones_totales DESC
-        """)
-    
     def create_stats_decade_cross_pollination(self):
         """Polinización cruzada entre décadas"""
         logger.info("Creando _stats_decade_cross_pollination...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_decade_cross_pollination AS
+            self._build_table("_stats_decade_cross_pollination", f"""
             WITH session_decades AS (
                 SELECT 
                     l.listen_date,
@@ -1408,37 +1408,60 @@ class MusicStatsGenerator:
         logger.info("Creando _stats_weekend_vs_weekday_preferences...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_weekend_vs_weekday_preferences AS
+            # Los totales de cada tipo de día se calculan una sola vez y no
+            # con una subconsulta por grupo
+            self._build_table("_stats_weekend_vs_weekday_preferences", f"""
+            WITH escuchas AS (
+                SELECT 
+                    l.song_id,
+                    CASE 
+                        WHEN CAST(strftime('%w', l.listen_date) AS INTEGER) IN (0, 6) THEN 'Fin_de_Semana'
+                        ELSE 'Día_Laborable'
+                    END as tipo_dia
+                FROM listens_{self.username} l
+            ),
+            totales_tipo_dia AS (
+                SELECT tipo_dia, COUNT(*) as total
+                FROM escuchas
+                GROUP BY tipo_dia
+            )
             SELECT 
-                CASE 
-                    WHEN CAST(strftime('%w', l.listen_date) AS INTEGER) IN (0, 6) THEN 'Fin_de_Semana'
-                    ELSE 'Día_Laborable'
-                END as tipo_dia,
+                e.tipo_dia,
                 s.genre,
                 s.artist,
                 COUNT(*) as escuchas_totales,
                 COUNT(DISTINCT s.id) as canciones_diferentes,
                 AVG(s.duration) as duracion_promedio,
                 SUM(s.duration) as tiempo_total_escuchado,
-                ROUND(COUNT(*) * 100.0 / (
-                    SELECT COUNT(*) 
-                    FROM listens_{self.username} l2 
-                    WHERE CASE 
-                        WHEN CAST(strftime('%w', l2.listen_date) AS INTEGER) IN (0, 6) THEN 'Fin_de_Semana'
-                        ELSE 'Día_Laborable'
-                    END = CASE 
-                        WHEN CAST(strftime('%w', l.listen_date) AS INTEGER) IN (0, 6) THEN 'Fin_de_Semana'
-                        ELSE 'Día_Laborable'
-                    END
-                ), 2) as porcentaje_del_tipo_dia
-            FROM songs s
-            JOIN listens_{self.username} l ON l.song_id = s.id
+                ROUND(COUNT(*) * 100.0 / t.total, 2) as porcentaje_del_tipo_dia
+            FROM escuchas e
+            JOIN songs s ON s.id = e.song_id
+            JOIN totales_tipo_dia t ON t.tipo_dia = e.tipo_dia
             WHERE s.genre IS NOT NULL
-            GROUP BY tipo_dia, s.genre, s.artist
+            GROUP BY e.tipo_dia, s.genre, s.artist
             HAVING escuchas_totales > 2
-            ORDER BY tipo_dia, escuchas_totales DESC
+            ORDER BY e.tipo_dia, escuchas_totales DESC
             """)
+            if getattr(self._local, 'partition_column', None):
+                # Refresco por artistas: los porcentajes del resto de filas
+                # dependen de los totales, que también han cambiado
+                with self.conn:
+                    self.conn.execute(f"""
+                        WITH totales_tipo_dia AS (
+                            SELECT 
+                                CASE 
+                                    WHEN CAST(strftime('%w', listen_date) AS INTEGER) IN (0, 6) THEN 'Fin_de_Semana'
+                                    ELSE 'Día_Laborable'
+                                END as tipo_dia,
+                                COUNT(*) as total
+                            FROM listens_{self.username}
+                            GROUP BY 1
+                        )
+                        UPDATE main._stats_weekend_vs_weekday_preferences
+                        SET porcentaje_del_tipo_dia = ROUND(escuchas_totales * 100.0 / t.total, 2)
+                        FROM totales_tipo_dia t
+                        WHERE t.tipo_dia = _stats_weekend_vs_weekday_preferences.tipo_dia
+                    """)
         except sqlite3.Error:
             logger.warning("No se pudo crear _stats_weekend_vs_weekday_preferences - tabla de listens no encontrada")
     
@@ -1447,8 +1470,7 @@ class MusicStatsGenerator:
         logger.info("Creando _stats_rediscovery_cycles...")
         
         try:
-            self.conn.execute(f"""
-            CREATE TABLE _stats_rediscovery_cycles AS
+            self._build_table("_stats_rediscovery_cycles", f"""
             WITH listening_gaps AS (
                 SELECT 
                     s.id,
@@ -1488,8 +1510,7 @@ class MusicStatsGenerator:
         """Timestamp de cuándo se generaron las estadísticas"""
         logger.info("Creando _stats_metadata...")
         
-        self.conn.execute("""
-        CREATE TABLE _stats_metadata AS
+        self._build_table("_stats_metadata", """
         SELECT 
             datetime('now') as fecha_generacion,
             ? as usuario,
@@ -1498,82 +1519,84 @@ class MusicStatsGenerator:
             (SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name LIKE '_stats_%') as tablas_estadisticas_generadas
         """, (self.username,))
     
-    def generate_all_stats(self):
-        """Genera todas las estadísticas"""
+    def generate_all_stats(self, full=False):
+        """
+        Genera las estadísticas.
+        
+        Sólo se regeneran las tablas cuyos datos de origen han cambiado desde la
+        última ejecución; las que admiten partición sustituyen únicamente las
+        filas de los artistas, géneros o meses afectados. Con full=True se
+        eliminan y regeneran todas.
+        """
         logger.info(f"Iniciando generación de estadísticas para usuario: {self.username}")
+        start = time.perf_counter()
         
-        # Eliminar tablas existentes
-        self.drop_existing_stats_tables()
+        state = {} if full else self.load_state()
+        changes, new_state = self.detect_changes(state)
+        dirty = set(state.get('dirty', []))
         
-        # Actualizar reproducciones
-        self.update_song_reproducciones()
+        if full:
+            # Eliminar tablas existentes
+            self.drop_existing_stats_tables()
         
-        # Actualizar todas las referencias de reproducciones > 0 a reproducciones > 1
-        # ya que 1 es el valor por defecto para canciones no escuchadas
-        try:
-            # Estadísticas básicas (15 originales)
-            self.create_stats_basic_listening()
-            self.create_stats_artists_popularity()
-            self.create_stats_albums_analysis()
-            self.create_stats_genres_trends()
-            self.create_stats_decade_analysis()
-            self.create_stats_quality_analysis()
-            self.create_stats_discovery_time()
-            self.create_stats_listening_patterns()
-            self.create_stats_lyrics_analysis()
-            self.create_stats_rare_genres()
-            self.create_stats_album_completeness()
-            self.create_stats_top_tracks_all_time()
-            self.create_stats_label_influence()
-            self.create_stats_duration_preferences()
-            
-            # Estadísticas avanzadas (20 adicionales)
-            self.create_stats_similar_artists_network()
-            self.create_stats_genre_evolution_monthly()
-            self.create_stats_artist_collaboration_density()
-            self.create_stats_time_to_milestones()
-            self.create_stats_album_discovery_patterns()
-            self.create_stats_bitrate_quality_preference()
-            self.create_stats_orphan_gems()
-            self.create_stats_replay_gain_listening_preference()
-            self.create_stats_multi_genre_albums()
-            self.create_stats_listening_velocity()
-            self.create_stats_label_artist_success_correlation()
-            self.create_stats_temporal_listening_clusters()
-            self.create_stats_artist_genre_flexibility()
-            self.create_stats_listening_addiction_patterns()
-            self.create_stats_mood_based_duration_analysis()
-            self.create_stats_artist_loyalty_index()
-            self.create_stats_decade_cross_pollination()
-            self.create_stats_weekend_vs_weekday_preferences()
-            self.create_stats_rediscovery_cycles()
-            
-            # Metadata (siempre al final)
-            self.create_stats_metadata_timestamp()
-            
-            self.conn.commit()
-            logger.info("Todas las estadísticas generadas correctamente - 35 tablas creadas")
-            
-        except Exception as e:
-            logger.error(f"Error generando estadísticas: {e}")
-            self.conn.rollback()
-            raise
+        # Actualizar reproducciones (1 es el valor por defecto para canciones no
+        # escuchadas, por eso las tablas filtran por reproducciones > 1)
+        if full or 'full' in (changes['songs'], changes['listens']):
+            self.update_song_reproducciones()
+        elif changes['song_ids']:
+            self.update_song_reproducciones(changes['song_ids'])
+        
+        plan = self.plan_tables(changes, full=full, dirty=dirty)
+        logger.info(f"Tablas a regenerar: {len(plan)} de {len(STATS_TABLES)}")
+        
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._run_table, table, partition, keys): table
+                for table, (partition, keys) in plan.items()
+            }
+            for future in as_completed(futures):
+                table = futures[future]
+                partition, keys = plan[table]
+                try:
+                    self.timings[table] = future.result()
+                    mode = f"{len(keys)} {partition[0]}" if partition else "completa"
+                    logger.info(f"{table}: {self.timings[table]:.2f}s ({mode})")
+                except Exception as e:
+                    logger.error(f"Error generando {table}: {e}")
+                    failed.append(table)
+        
+        # Metadata (siempre al final)
+        self.create_stats_metadata_timestamp()
+        
+        # Las tablas que fallaron se regeneran enteras en la próxima ejecución
+        new_state['dirty'] = sorted(failed)
+        self.save_state(new_state)
+        
+        elapsed = time.perf_counter() - start
+        if failed:
+            raise RuntimeError(f"No se pudieron generar {len(failed)} tablas: {', '.join(sorted(failed))}")
+        logger.info(f"Estadísticas generadas en {elapsed:.2f}s - {len(plan)} tablas regeneradas")
+        return plan
 
 def main():
-    if len(sys.argv) != 3:
-        print("Uso: python generate_stats.py <database_path> <username>")
-        print("Ejemplo: python generate_stats.py music.db guevifrito")
-        sys.exit(1)
-    
-    db_path = sys.argv[1]
-    username = sys.argv[2]
+    parser = argparse.ArgumentParser(description="Genera las tablas _stats_* de un usuario")
+    parser.add_argument("db_path", help="Ruta a la base de datos")
+    parser.add_argument("username", help="Usuario cuyas escuchas se analizan")
+    parser.add_argument("--full", action="store_true",
+                        help="Regenerar todas las tablas (p. ej. tras editar metadatos de canciones existentes)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Tablas generadas en paralelo (por defecto {DEFAULT_WORKERS})")
+    args = parser.parse_args()
     
     try:
-        generator = MusicStatsGenerator(db_path, username)
-        generator.generate_all_stats()
-        generator.close()
-        print(f"Estadísticas generadas exitosamente para usuario: {username}")
-        print("📊 Total de tablas generadas: 35 (_stats_*)")
+        generator = MusicStatsGenerator(args.db_path, args.username, max_workers=args.workers)
+        try:
+            plan = generator.generate_all_stats(full=args.full)
+        finally:
+            generator.close()
+        print(f"Estadísticas generadas exitosamente para usuario: {args.username}")
+        print(f"📊 Tablas regeneradas: {len(plan)} de {len(STATS_TABLES)} (_stats_*)")
         print("🎵 Análisis completo de patrones de escucha disponible")
         
     except Exception as e:
@@ -1581,4 +1604,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,10 +1,501 @@
 import sqlite3
 import os
+import re
+import json
+import struct
+import hashlib
 import argparse
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 import shutil
 from datetime import datetime
 
+
+# Patrones que se eliminan del nombre de un álbum antes de compararlo
+ALBUM_NOISE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r'\(\d{4}\)',          # (2023)
+    r'\[\d{4}\]',          # [2023]
+    r'\(\d{4} \w+\)',      # (2023 Remaster)
+    r'\[\d{4} \w+\]',      # [2023 Remaster]
+    r'\(disc \d+\)',       # (Disc 1)
+    r'\[disc \d+\]',       # [Disc 1]
+    r'disc \d+',           # Disc 1
+    r'\(cd \d+\)',         # (CD 1)
+    r'\[cd \d+\]',         # [CD 1]
+    r'cd\s?\d+',           # CD1 o CD 1
+    r'vol\.?\s?\d+',       # Vol.1 o Vol 1
+    r'volume\s?\d+',       # Volume 1
+    r'\(deluxe\)',         # (Deluxe)
+    r'\[deluxe\]',         # [Deluxe]
+    r'deluxe edition',     # Deluxe Edition
+    r'\(remaster(ed)?\)',  # (Remaster) o (Remastered)
+    r'\[remaster(ed)?\]',  # [Remaster] o [Remastered]
+    r'remaster(ed)?',      # Remaster o Remastered
+]]
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+SPACES_PATTERN = re.compile(r'\s+')
+
+
+# --- Firma de contenido de los ficheros de audio ---
+
+# Bytes que se leen de cada muestra del flujo de audio (inicio, centro y final)
+SIGNATURE_CHUNK = 64 * 1024
+SIGNATURE_SAMPLES = 3
+
+# Anchura de los grupos de duración (segundos)
+DURATION_BUCKET_SECONDS = 2
+
+# Peso de cada tipo de coincidencia al ordenar el informe
+EVIDENCE_WEIGHTS = {
+    'same_path': 4,
+    'same_audio': 3,
+    'same_recording': 2,
+    'same_metadata': 1,
+}
+
+
+def _skip_id3v2(f, offset=0):
+    """Salta las cabeceras ID3v2 consecutivas a partir de offset."""
+    while True:
+        f.seek(offset)
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b'ID3':
+            return offset
+        size = 0
+        for byte in header[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        offset += 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+def _trailing_tags_start(f, end):
+    """Devuelve dónde empiezan las etiquetas finales (ID3v1 y APEv2)."""
+    while end >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer[:8] == b'APETAGEX':
+            tag_size, _, flags = struct.unpack('<III', footer[12:24])
+            end -= tag_size + (32 if flags & 0x80000000 else 0)
+            continue
+        if end >= 128:
+            f.seek(end - 128)
+            if f.read(3) == b'TAG':
+                end -= 128
+                continue
+        return max(end, 0)
+    return max(end, 0)
+
+
+def _flac_audio_start(f):
+    """Salta la cabecera 'fLaC' y los bloques de metadatos."""
+    offset = _skip_id3v2(f)
+    f.seek(offset)
+    if f.read(4) != b'fLaC':
+        return None
+    offset += 4
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            return None
+        length = int.from_bytes(header[1:4], 'big')
+        offset += 4 + length
+        if header[0] & 0x80:
+            return offset
+        f.seek(offset)
+
+
+def _mp4_mdat_range(f, file_size):
+    """Busca el átomo 'mdat' entre los átomos de primer nivel de un MP4/M4A."""
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        header = f.read(16)
+        size, kind = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header_size:
+            return None
+        if kind == b'mdat':
+            return offset + header_size, min(offset + size, file_size)
+        offset += size
+    return None
+
+
+def _ogg_audio_start(f):
+    """Salta las páginas Ogg de cabecera (posición de gránulo 0)."""
+    offset = 0
+    while True:
+        f.seek(offset)
+        header = f.read(27)
+        if len(header) < 27 or header[:4] != b'OggS':
+            return None
+        granule = struct.unpack('<q', header[6:14])[0]
+        if granule not in (0, -1) and offset > 0:
+            return offset
+        segments = f.read(header[26])
+        offset += 27 + len(segments) + sum(segments)
+
+
+def audio_payload_range(path, file_size=None):
+    """
+    Rango (inicio, fin) en bytes del flujo de audio de un fichero, sin las
+    etiquetas. Dos copias del mismo audio con etiquetas distintas devuelven
+    el mismo contenido en ese rango.
+
+    MP3 (ID3v2/ID3v1/APE), FLAC, MP4/M4A y Ogg/Opus; para el resto de
+    formatos se usa el fichero completo.
+    """
+    if file_size is None:
+        file_size = os.path.getsize(path)
+    ext = os.path.splitext(path)[1].lower()
+
+    with open(path, 'rb') as f:
+        if ext == '.flac':
+            start = _flac_audio_start(f)
+            if start is not None:
+                return start, _trailing_tags_start(f, file_size)
+        elif ext in ('.m4a', '.mp4', '.aac', '.alac', '.m4b'):
+            mdat = _mp4_mdat_range(f, file_size)
+            if mdat:
+                return mdat
+        elif ext in ('.ogg', '.oga', '.opus'):
+            start = _ogg_audio_start(f)
+            if start is not None:
+                return start, file_size
+        elif ext == '.mp3':
+            start = _skip_id3v2(f)
+            return start, max(start, _trailing_tags_start(f, file_size))
+    return 0, file_size
+
+
+def audio_signature(path, file_size=None):
+    """
+    Firma barata del contenido de audio: blake2b de la longitud del flujo y
+    de SIGNATURE_SAMPLES muestras repartidas a lo largo de él.
+
+    Returns:
+        tuple: (hash hexadecimal, bytes de audio)
+    """
+    start, end = audio_payload_range(path, file_size)
+    length = max(0, end - start)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(length.to_bytes(8, 'little'))
+
+    with open(path, 'rb') as f:
+        if length <= SIGNATURE_CHUNK * SIGNATURE_SAMPLES:
+            f.seek(start)
+            digest.update(f.read(length))
+        else:
+            step = (length - SIGNATURE_CHUNK) // (SIGNATURE_SAMPLES - 1)
+            for i in range(SIGNATURE_SAMPLES):
+                f.seek(start + i * step)
+                digest.update(f.read(SIGNATURE_CHUNK))
+
+    return digest.hexdigest(), length
+
+
+def duration_bucket(duration):
+    if duration is None or duration <= 0:
+        return None
+    return int(duration // DURATION_BUCKET_SECONDS)
+
+
+def normalize_text(text):
+    """Texto en minúsculas sin signos ni espacios repetidos (claves de metadatos)."""
+    if not text:
+        return ""
+    normalized = NON_WORD_PATTERN.sub(' ', text.casefold())
+    return SPACES_PATTERN.sub(' ', normalized).strip()
+
+
+class _UnionFind:
+    """Conjuntos disjuntos sobre ids de canciones."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent
+        root = parent.setdefault(item, item)
+        while parent[root] != root:
+            root = parent[root]
+        while parent[item] != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            self.parent[root_b] = root_a
+        return root_a
+
+
+class DuplicateEngine:
+    """
+    Detección de canciones duplicadas por lotes, sin interacción.
+
+    1. update_signatures(): guarda en song_signatures una firma del flujo de
+       audio de cada fichero (sin etiquetas) y su tamaño. Sólo se recalculan
+       los ficheros cuyo tamaño o fecha de modificación cambian.
+    2. find_clusters(): recorre una sola vez songs + song_signatures y agrupa
+       con claves hash (ruta, firma de audio, MBID de grabación y
+       artista/título normalizados + duración) mediante conjuntos disjuntos,
+       sin comparar pares.
+    3. build_report(): ordena los grupos por la fuerza de la coincidencia y por
+       el espacio recuperable, y sugiere qué fichero conservar.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, conn, max_workers=8):
+        self.conn = conn
+        self.max_workers = max_workers
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS song_signatures (
+                    song_id INTEGER PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    file_size INTEGER,
+                    mtime REAL,
+                    audio_hash TEXT,
+                    audio_bytes INTEGER,
+                    computed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_song_signatures_hash ON song_signatures(audio_hash)")
+
+    def _song_columns(self):
+        return {row[1] for row in self.conn.execute("PRAGMA table_info(songs)")}
+
+    @staticmethod
+    def _compute(item):
+        song_id, file_path = item
+        try:
+            stat = os.stat(file_path)
+            audio_hash, audio_bytes = audio_signature(file_path, stat.st_size)
+        except OSError:
+            return None
+        return (song_id, file_path, stat.st_size, stat.st_mtime, audio_hash, audio_bytes)
+
+    @staticmethod
+    def _is_unchanged(item):
+        song_id, file_path, known_path, known_size, known_mtime = item
+        if known_path != file_path:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # Fichero no disponible: se conserva la firma que hubiera
+            return True
+        return stat.st_size == known_size and stat.st_mtime == known_mtime
+
+    def update_signatures(self, force=False):
+        """
+        Calcula las firmas de los ficheros nuevos o modificados.
+
+        Returns:
+            dict: {'checked', 'computed', 'missing', 'removed'}
+        """
+        columns = self._song_columns()
+        where = "WHERE s.file_path IS NOT NULL"
+        if 'origen' in columns:
+            where += " AND (s.origen IS NULL OR s.origen = 'local')"
+
+        result = {'checked': 0, 'computed': 0, 'missing': 0, 'removed': 0}
+        read_cursor = self.conn.cursor()
+        read_cursor.execute(f"""
+            SELECT s.id, s.file_path, sig.file_path, sig.file_size, sig.mtime
+            FROM songs s
+            LEFT JOIN song_signatures sig ON sig.song_id = s.id
+            {where}
+        """)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                rows = read_cursor.fetchmany(self.BATCH_SIZE)
+                if not rows:
+                    break
+                result['checked'] += len(rows)
+
+                if force:
+                    pending = [row[:2] for row in rows]
+                else:
+                    unchanged = executor.map(self._is_unchanged, rows)
+                    pending = [row[:2] for row, same in zip(rows, unchanged) if not same]
+                if not pending:
+                    continue
+
+                signatures = [sig for sig in executor.map(self._compute, pending) if sig]
+                result['missing'] += len(pending) - len(signatures)
+                result['computed'] += len(signatures)
+                with self.conn:
+                    self.conn.executemany("""
+                        INSERT INTO song_signatures
+                            (song_id, file_path, file_size, mtime, audio_hash, audio_bytes, computed)
+                        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(song_id) DO UPDATE SET
+                            file_path = excluded.file_path,
+                            file_size = excluded.file_size,
+                            mtime = excluded.mtime,
+                            audio_hash = excluded.audio_hash,
+                            audio_bytes = excluded.audio_bytes,
+                            computed = excluded.computed
+                    """, signatures)
+
+        with self.conn:
+            result['removed'] = self.conn.execute(
+                "DELETE FROM song_signatures WHERE song_id NOT IN (SELECT id FROM songs)"
+            ).rowcount
+        return result
+
+    def find_clusters(self):
+        """
+        Agrupa las canciones duplicadas en una sola pasada.
+
+        Returns:
+            list: Grupos {'ids', 'evidence'} con al menos dos canciones
+        """
+        columns = self._song_columns()
+        mbid_column = "s.musicbrainz_recordingid" if 'musicbrainz_recordingid' in columns else "NULL"
+
+        uf = _UnionFind()
+        first_by_key = {}
+        edges = []
+
+        def link(kind, key, song_id):
+            first = first_by_key.setdefault(key, song_id)
+            if first != song_id:
+                uf.union(first, song_id)
+                edges.append((kind, first))
+
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT s.id, s.file_path, s.artist, s.title, s.duration, {mbid_column},
+                   sig.audio_hash
+            FROM songs s
+            LEFT JOIN song_signatures sig ON sig.song_id = s.id
+        """)
+        for row in iter(lambda: cursor.fetchmany(self.BATCH_SIZE), []):
+            for song_id, file_path, artist, title, duration, mbid, audio_hash in row:
+                if file_path:
+                    link('same_path', ('path', file_path), song_id)
+                if audio_hash:
+                    link('same_audio', ('audio', audio_hash), song_id)
+                if mbid:
+                    link('same_recording', ('mbid', mbid), song_id)
+
+                artist_key, title_key = normalize_text(artist), normalize_text(title)
+                dur = duration_bucket(duration)
+                if artist_key and title_key and dur is not None:
+                    # Cada canción entra en su grupo de duración y en el siguiente,
+                    # así dos duraciones contiguas siempre comparten uno
+                    link('same_metadata', ('meta', artist_key, title_key, dur), song_id)
+                    link('same_metadata', ('meta', artist_key, title_key, dur + 1), song_id)
+
+        members = defaultdict(list)
+        for song_id in uf.parent:
+            members[uf.find(song_id)].append(song_id)
+
+        evidence = defaultdict(set)
+        for kind, song_id in edges:
+            evidence[uf.find(song_id)].add(kind)
+
+        return [
+            {'ids': sorted(ids), 'evidence': evidence[root]}
+            for root, ids in members.items() if len(ids) > 1
+        ]
+
+    def build_report(self, clusters):
+        """
+        Completa los grupos con los datos de cada canción, elige cuál conservar
+        y los ordena por fuerza de la coincidencia y espacio recuperable.
+        """
+        details = {}
+        all_ids = [song_id for cluster in clusters for song_id in cluster['ids']]
+        # Lotes por debajo del límite de variables de SQLite
+        for start in range(0, len(all_ids), 900):
+            batch = all_ids[start:start + 900]
+            placeholders = ",".join("?" * len(batch))
+            for row in self.conn.execute(f"""
+                SELECT s.id, s.file_path, s.artist, s.title, s.album, s.duration, s.bitrate,
+                       s.added_timestamp, sig.file_size, sig.audio_hash
+                FROM songs s
+                LEFT JOIN song_signatures sig ON sig.song_id = s.id
+                WHERE s.id IN ({placeholders})
+            """, batch):
+                details[row[0]] = {
+                    'id': row[0], 'file_path': row[1], 'artist': row[2], 'title': row[3],
+                    'album': row[4], 'duration': row[5], 'bitrate': row[6],
+                    'added_timestamp': row[7], 'file_size': row[8], 'audio_hash': row[9],
+                }
+
+        report = []
+        for cluster in clusters:
+            songs = [details[song_id] for song_id in cluster['ids'] if song_id in details]
+            if len(songs) < 2:
+                continue
+
+            # Mejor bitrate, después el fichero más grande y después el más antiguo
+            keep = min(songs, key=lambda s: (-(s['bitrate'] or 0), -(s['file_size'] or 0),
+                                             str(s['added_timestamp'] or ''), s['id']))
+            keep_path = keep['file_path']
+            seen_paths = {keep_path}
+            reclaimable = 0
+            for song in songs:
+                if song['file_path'] not in seen_paths:
+                    seen_paths.add(song['file_path'])
+                    reclaimable += song['file_size'] or 0
+
+            evidence = sorted(cluster['evidence'], key=lambda kind: -EVIDENCE_WEIGHTS[kind])
+            report.append({
+                'evidence': evidence,
+                'score': EVIDENCE_WEIGHTS[evidence[0]] if evidence else 0,
+                'keep_id': keep['id'],
+                'reclaimable_bytes': reclaimable,
+                'songs': songs,
+            })
+
+        report.sort(key=lambda group: (-group['score'], -group['reclaimable_bytes'], group['keep_id']))
+        return report
+
+    def run(self, force=False):
+        """Actualiza firmas y devuelve el informe ordenado."""
+        signature_stats = self.update_signatures(force=force)
+        print(f"  Firmas: {signature_stats['checked']} canciones revisadas, "
+              f"{signature_stats['computed']} calculadas, "
+              f"{signature_stats['missing']} ficheros no encontrados")
+        clusters = self.find_clusters()
+        return self.build_report(clusters)
+
+
+def print_duplicate_report(report, limit=50):
+    """Muestra por pantalla los primeros grupos del informe."""
+    total_bytes = sum(group['reclaimable_bytes'] for group in report)
+    print(f"\n=== INFORME DE DUPLICADOS: {len(report)} grupos, "
+          f"{total_bytes / (1024 * 1024):.1f} MB recuperables ===")
+
+    for index, group in enumerate(report[:limit], 1):
+        print(f"\n  [{index}] {', '.join(group['evidence'])} - "
+              f"{group['reclaimable_bytes'] / (1024 * 1024):.1f} MB")
+        for song in group['songs']:
+            marker = "✅" if song['id'] == group['keep_id'] else "  "
+            bitrate = f"{song['bitrate']}kbps" if song['bitrate'] else "?"
+            print(f"    {marker} {song['id']}: {song['artist']} - {song['title']} "
+                  f"[{song['album']}] {bitrate} {song['file_path']}")
+
+    if len(report) > limit:
+        print(f"\n  ... y {len(report) - limit} grupos más")
+
+
 class DuplicateManager:
 
     def __init__(self, db_path):
@@ -45,29 +536,23 @@ class DuplicateManager:
         
         # 1. Duplicados por ruta de archivo
         print("\n1. Canciones con rutas de archivo duplicadas:")
+        # Una sola consulta con todas las filas duplicadas, agrupadas después en Python
         self.cursor.execute("""
-            SELECT file_path, COUNT(*) as count 
-            FROM songs 
-            GROUP BY file_path 
-            HAVING count > 1
+            SELECT file_path, id, title, artist, album, last_modified, added_timestamp
+            FROM songs
+            WHERE file_path IN (
+                SELECT file_path FROM songs GROUP BY file_path HAVING COUNT(*) > 1
+            )
+            ORDER BY file_path, added_timestamp DESC
         """)
         
-        file_path_dupes = self.cursor.fetchall()
+        file_path_dupes = [(file_path, [row[1:] for row in rows])
+                           for file_path, rows in groupby(self.cursor.fetchall(), key=lambda row: row[0])]
         if file_path_dupes:
             print(f"  ¡Encontrados {len(file_path_dupes)} archivos duplicados!")
             
-            for file_path, count in file_path_dupes:
-                print(f"\n  📂 Archivo: {file_path} ({count} entradas)")
-                
-                # Obtener los duplicados específicos
-                self.cursor.execute("""
-                    SELECT id, title, artist, album, last_modified, added_timestamp 
-                    FROM songs 
-                    WHERE file_path = ?
-                    ORDER BY added_timestamp DESC
-                """, (file_path,))
-                
-                duplicates = self.cursor.fetchall()
+            for file_path, duplicates in file_path_dupes:
+                print(f"\n  📂 Archivo: {file_path} ({len(duplicates)} entradas)")
                 
                 self._handle_duplicate_selection(
                     duplicates,
@@ -81,29 +566,26 @@ class DuplicateManager:
         # 2. Canciones con misma combinación título-artista-álbum
         print("\n2. Canciones con la misma combinación título-artista-álbum:")
         self.cursor.execute("""
-            SELECT title, artist, album, COUNT(*) as count 
-            FROM songs 
-            WHERE title IS NOT NULL AND artist IS NOT NULL AND album IS NOT NULL
-            GROUP BY title, artist, album 
-            HAVING count > 1
+            SELECT s.title, s.artist, s.album, s.id, s.file_path, s.last_modified,
+                   s.added_timestamp, s.duration, s.bitrate
+            FROM songs s
+            JOIN (
+                SELECT title, artist, album
+                FROM songs
+                WHERE title IS NOT NULL AND artist IS NOT NULL AND album IS NOT NULL
+                GROUP BY title, artist, album
+                HAVING COUNT(*) > 1
+            ) d ON s.title = d.title AND s.artist = d.artist AND s.album = d.album
+            ORDER BY s.title, s.artist, s.album, s.bitrate DESC, s.added_timestamp DESC
         """)
         
-        metadata_dupes = self.cursor.fetchall()
+        metadata_dupes = [(key, [row[3:] for row in rows])
+                          for key, rows in groupby(self.cursor.fetchall(), key=lambda row: row[:3])]
         if metadata_dupes:
             print(f"  ¡Encontrados {len(metadata_dupes)} conjuntos de metadatos duplicados!")
             
-            for title, artist, album, count in metadata_dupes:
-                print(f"\n  🎵 '{title}' por {artist} en '{album}' ({count} entradas)")
-                
-                # Obtener los duplicados específicos
-                self.cursor.execute("""
-                    SELECT id, file_path, last_modified, added_timestamp, duration, bitrate 
-                    FROM songs 
-                    WHERE title = ? AND artist = ? AND album = ?
-                    ORDER BY bitrate DESC, added_timestamp DESC
-                """, (title, artist, album))
-                
-                duplicates = self.cursor.fetchall()
+            for (title, artist, album), duplicates in metadata_dupes:
+                print(f"\n  🎵 '{title}' por {artist} en '{album}' ({len(duplicates)} entradas)")
                 
                 self._handle_duplicate_selection(
                     duplicates,
@@ -788,38 +1270,13 @@ class DuplicateManager:
         if not album_name:
             return ""
         
-        # Convertir a minúsculas
         normalized = album_name.lower().strip()
-        
-        # Patrones comunes a eliminar
-        patterns = [
-            r'\(\d{4}\)',          # (2023)
-            r'\[\d{4}\]',          # [2023]
-            r'\(\d{4} \w+\)',      # (2023 Remaster)
-            r'\[\d{4} \w+\]',      # [2023 Remaster]
-            r'\(disc \d+\)',       # (Disc 1)
-            r'\[disc \d+\]',       # [Disc 1]
-            r'disc \d+',           # Disc 1
-            r'\(cd \d+\)',         # (CD 1)
-            r'\[cd \d+\]',         # [CD 1]
-            r'cd\s?\d+',           # CD1 o CD 1
-            r'vol\.?\s?\d+',       # Vol.1 o Vol 1
-            r'volume\s?\d+',       # Volume 1
-            r'\(deluxe\)',         # (Deluxe)
-            r'\[deluxe\]',         # [Deluxe]
-            r'deluxe edition',     # Deluxe Edition
-            r'\(remaster(ed)?\)',  # (Remaster) o (Remastered)
-            r'\[remaster(ed)?\]',  # [Remaster] o [Remastered]
-            r'remaster(ed)?',      # Remaster o Remastered
-        ]
-        
-        import re
-        for pattern in patterns:
-            normalized = re.sub(pattern, '', normalized, flags=re.IGNORECASE)
+        for pattern in ALBUM_NOISE_PATTERNS:
+            normalized = pattern.sub('', normalized)
         
         # Eliminar caracteres especiales y espacios múltiples
-        normalized = re.sub(r'[^\w\s]', ' ', normalized)  # Reemplazar caracteres especiales con espacios
-        normalized = re.sub(r'\s+', ' ', normalized)      # Reemplazar espacios múltiples con uno solo
+        normalized = NON_WORD_PATTERN.sub(' ', normalized)
+        normalized = SPACES_PATTERN.sub(' ', normalized)
         
         return normalized.strip()
 
@@ -871,10 +1328,31 @@ class DuplicateManager:
 def main():
     parser = argparse.ArgumentParser(description="Gestor interactivo de duplicados para base de datos musical")
     parser.add_argument("--db", required=True, help="Ruta al archivo de la base de datos SQLite")
+    parser.add_argument("--report", action="store_true",
+                        help="Informe de duplicados por firma de audio y metadatos, sin interacción")
+    parser.add_argument("--json", help="Guardar el informe completo en este fichero JSON")
+    parser.add_argument("--workers", type=int, default=8, help="Hilos para calcular las firmas de audio")
+    parser.add_argument("--limit", type=int, default=50, help="Grupos a mostrar en pantalla")
+    parser.add_argument("--force", action="store_true", help="Recalcular todas las firmas")
     args = parser.parse_args()
     
+    if args.report:
+        if not os.path.exists(args.db):
+            raise FileNotFoundError(f"La base de datos no existe en: {args.db}")
+        conn = sqlite3.connect(args.db)
+        try:
+            report = DuplicateEngine(conn, max_workers=args.workers).run(force=args.force)
+        finally:
+            conn.close()
+        print_duplicate_report(report, limit=args.limit)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n📋 Informe guardado en {args.json}")
+        return
+    
     manager = DuplicateManager(args.db)
     manager.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -10,6 +10,10 @@ from bs4 import BeautifulSoup
 import subprocess
 import time
 import traceback
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from tools.musicbrainz_client import get_musicbrainz_client
 
 sqlite3.register_adapter(datetime.datetime, lambda dt: dt.isoformat())
 
@@ -237,42 +241,20 @@ def extract_wikipedia_url_from_musicbrainz(mb_url, user_agent=None):
             
         print(f"  {COLOR_BLUE}ID de MusicBrainz extraído: {mb_id}, Tipo: {entity_type}{COLOR_RESET}")
         
-        # Preparar endpoint y parámetros para la API de MusicBrainz
-        endpoint = f"https://musicbrainz.org/ws/2/{entity_type}/{mb_id}"
-        params = {
-            "inc": "url-rels",
-            "fmt": "json"
-        }
-        
-        headers = {
-            "User-Agent": user_agent or "MusicLibraryWikipediaUpdater/1.0 (your-email@example.com)",
-            "Accept": "application/json"
-        }
-        
-        print(f"  {COLOR_BLUE}Consultando API de MusicBrainz: {endpoint}{COLOR_RESET}")
+        print(f"  {COLOR_BLUE}Consultando API de MusicBrainz: {entity_type}/{mb_id}{COLOR_RESET}")
         
-        import requests
-        import time
-        import json
-        
-        response = requests.get(endpoint, params=params, headers=headers, timeout=30)
-        
-        # Respetar límites de tasa
-        time.sleep(1)
-        
-        if response.status_code != 200:
-            print(f"  {COLOR_RED}Error en API de MusicBrainz: Código {response.status_code}{COLOR_RESET}")
-            if response.text:
-                print(f"  {COLOR_YELLOW}Respuesta: {response.text[:200]}...{COLOR_RESET}")
+        # El cliente compartido respeta el límite de peticiones y reutiliza
+        # las respuestas ya guardadas por otros scripts
+        client = get_musicbrainz_client(user_agent or MUSICBRAINZ_USER_AGENT)
+        try:
+            data = client.get_entity(entity_type, mb_id, inc="url-rels")
+        except requests.exceptions.RequestException as e:
+            print(f"  {COLOR_RED}Error en API de MusicBrainz: {e}{COLOR_RESET}")
             return None
-            
-        # Procesar la respuesta
-        data = response.json()
         
-        # Depuración: guardar respuesta a archivo para análisis
-        with open(f'mb_response_{entity_type}_{mb_id}.json', 'w') as f:
-            json.dump(data, f, indent=2)
-            print(f"  {COLOR_BLUE}Respuesta guardada en mb_response_{entity_type}_{mb_id}.json{COLOR_RESET}")
+        if data is None:
+            print(f"  {COLOR_RED}Error en API de MusicBrainz: la entidad {entity_type}/{mb_id} no existe{COLOR_RESET}")
+            return None
         
         # Verificar que la respuesta contiene relaciones
         if 'relations' not in data:
@@ -351,27 +333,15 @@ def extract_wikipedia_from_wikidata(wikidata_url):
         print(f"  {COLOR_BLUE}Consultando Wikidata para entidad: {entity_id}{COLOR_RESET}")
         
         # Consultar a la API de Wikidata
-        import requests
-        
-        endpoint = "https://www.wikidata.org/w/api.php"
-        params = {
-            "action": "wbgetentities",
-            "ids": entity_id,
-            "format": "json",
-            "props": "sitelinks"
-        }
-        
-        response = requests.get(endpoint, params=params, timeout=10)
-        
-        if response.status_code != 200:
-            print(f"  {COLOR_RED}Error en API de Wikidata: {response.status_code}{COLOR_RESET}")
+        try:
+            entity = get_musicbrainz_client(MUSICBRAINZ_USER_AGENT).get_wikidata_entity(entity_id, props="sitelinks")
+        except requests.exceptions.RequestException as e:
+            print(f"  {COLOR_RED}Error en API de Wikidata: {e}{COLOR_RESET}")
             return None
-            
-        data = response.json()
         
         # Verificar si tenemos sitelinks en la respuesta
-        if 'entities' in data and entity_id in data['entities'] and 'sitelinks' in data['entities'][entity_id]:
-            sitelinks = data['entities'][entity_id]['sitelinks']
+        if entity and 'sitelinks' in entity:
+            sitelinks = entity['sitelinks']
             
             # Intentar obtener enlace de Wikipedia en español primero
             if 'eswiki' in sitelinks:
@@ -2,16 +2,10 @@ import os
 import sys
 import argparse
 import json
-import importlib.util
+import time
 from project_utils import PROJECT_ROOT
 from pathlib import Path
-
-def load_script_module(script_path):
-    """Carga dinámicamente un script Python como módulo"""
-    spec = importlib.util.spec_from_file_location("module.name", script_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return module
+from tools.db_pipeline import run_script_module, run_pipeline, print_pipeline_report
 
 def load_config(config_file):
     """Carga la configuración desde un archivo JSON"""
@@ -43,6 +37,7 @@ def main():
     parser.add_argument('--config', required=True, help='Archivo de configuración JSON')
     parser.add_argument('--scripts', nargs='+', help='Scripts específicos a ejecutar')
     parser.add_argument('--params', nargs='+', help='Parámetros adicionales en formato key=value')
+    parser.add_argument('--jobs', type=int, help='Scripts simultáneos (por defecto pipeline.max_workers de la configuración, o 1)')
     args = parser.parse_args()
 
     # Cargar configuración
@@ -80,61 +75,68 @@ def main():
                 cli_params[key] = value
 
 
-    # Ejecutar cada script
+    # Preparar la configuración de cada script
+    jobs = []
     for script_name in scripts_to_run:
         script_path = Path(PROJECT_ROOT, "db", f"{script_name}.py")
         if not os.path.exists(script_path):
             print(f"Error: No se encontró el script: {script_path}")
             continue
+        jobs.append((script_name, script_path, build_script_config(config, script_name, cli_params)))
 
-        print(f"\n=== Ejecutando {script_name} ===")
-
-        # Extraer configuración específica para este script
-        script_config = {}
-        script_config.update(config.get("common", {}))
-        script_config.update(config.get(script_name, {}))
-
-        # Añadir parámetros de línea de comandos (tienen prioridad)
-        script_config.update(cli_params)
-
-        # Filtrar los parámetros vacíos y false, EXCEPTO parámetros específicos
-        # que necesitan preservar el valor False
-        preserve_false_params = ['headless', 'force_update', 'interactive']
-
-        filtered_config = {}
-        for key, value in script_config.items():
-            # Preservar parámetros específicos incluso si son False
-            if key in preserve_false_params:
-                filtered_config[key] = value
-            # Para otros parámetros, filtrar cadenas vacías y False
-            elif value != "" and value is not False:
-                filtered_config[key] = value
+    # Con varios procesos se ejecutan a la vez los scripts independientes
+    max_workers = args.jobs or config.get('pipeline', {}).get('max_workers', 1)
+    if max_workers > 1:
+        run_pipeline(jobs, config, max_workers)
+        return 0
 
+    # Ejecutar cada script
+    results = []
+    pipeline_start = time.monotonic()
+    for script_name, script_path, filtered_config in jobs:
+        print(f"\n=== Ejecutando {script_name} ===")
+        start = time.monotonic()
+        error = None
         try:
-            # Cargar el script como módulo
-            script_module = load_script_module(script_path)
-
-            if 'interactive' in filtered_config:
-                setattr(script_module, 'INTERACTIVE_MODE', filtered_config['interactive'])
-
-            if 'force_update' in filtered_config:
-                setattr(script_module, 'force_update', filtered_config['force_update'])
-
-            # Llamar a la función main y pasarle la configuración directamente
-            if hasattr(script_module, 'main'):
-                # Verificar si main acepta argumentos
-                import inspect
-                sig = inspect.signature(script_module.main)
-                if len(sig.parameters) > 0:
-                    script_module.main(filtered_config)
-                else:
-                    # Configurar una variable global en el módulo
-                    setattr(script_module, 'CONFIG', filtered_config)
-                    script_module.main()
-            else:
-                print(f"Advertencia: El script {script_name} no tiene función main")
+            run_script_module(script_name, script_path, filtered_config)
         except Exception as e:
+            error = str(e)
             print(f"Error al ejecutar {script_name}: {e}")
+        results.append({
+            'name': script_name,
+            'start': start - pipeline_start,
+            'duration': time.monotonic() - start,
+            'status': 'error' if error else 'ok',
+            'error': error,
+        })
+
+    # En secuencia cada etapa depende de la anterior
+    deps = {result['name']: {results[i - 1]['name']} if i else set() for i, result in enumerate(results)}
+    print_pipeline_report(results, deps, time.monotonic() - pipeline_start)
+
+
+def build_script_config(config, script_name, cli_params):
+    """Configuración de un script: común + específica + línea de comandos, filtrada."""
+    script_config = {}
+    script_config.update(config.get("common", {}))
+    script_config.update(config.get(script_name, {}))
+
+    # Añadir parámetros de línea de comandos (tienen prioridad)
+    script_config.update(cli_params)
+
+    # Filtrar los parámetros vacíos y false, EXCEPTO parámetros específicos
+    # que necesitan preservar el valor False
+    preserve_false_params = ['headless', 'force_update', 'interactive']
+
+    filtered_config = {}
+    for key, value in script_config.items():
+        # Preservar parámetros específicos incluso si son False
+        if key in preserve_false_params:
+            filtered_config[key] = value
+        # Para otros parámetros, filtrar cadenas vacías y False
+        elif value != "" and value is not False:
+            filtered_config[key] = value
+    return filtered_config
 
 if __name__ == "__main__":
     sys.exit(main())
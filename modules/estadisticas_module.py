@@ -2,7 +2,7 @@ from PyQt6.QtWidgets import (QWidget, QHBoxLayout, QVBoxLayout, QStackedWidget,
                             QComboBox, QLabel, QTableWidget, QTableWidgetItem,
                             QProgressBar, QSplitter, QMessageBox, QPushButton,
                             QScrollArea, QTextEdit, QFrame)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6 import uic
 import sqlite3
 import os
@@ -16,6 +16,7 @@ from tools.chart_utils import ChartFactory
 from tools.stats.callbacks_submodule import StatsCallbackHandler
 from tools.stats.feeds_callbacks import FeedsCallbackHandler
 from tools.stats.time_callbacks import TimeCallbackHandler
+from tools.stats.listen_cube import update_listen_cube, get_top_items, get_listen_timeline
 
 # module_path = str(Path(__file__).parent.parent / "tools" / "stats")
 # if module_path not in sys.path:
@@ -40,6 +41,44 @@ except ImportError:
 
 
 
+class ListenCubeWorker(QThread):
+    """Pone al día el cubo de escuchas fuera del hilo de la interfaz.
+
+    La primera construcción recorre todo el historial y puede tardar; el
+    worker usa su propia conexión porque las de sqlite3 no se comparten
+    entre hilos.
+    """
+    cube_updated = pyqtSignal(int)  # escuchas añadidas en total
+
+    def __init__(self, db_path, sources):
+        """
+        Args:
+            db_path: Ruta de la base de datos
+            sources: Lista de (fuente, usuario) a actualizar
+        """
+        super().__init__()
+        self.db_path = db_path
+        self.sources = list(sources)
+
+    def run(self):
+        added = 0
+        try:
+            conn = sqlite3.connect(self.db_path)
+        except sqlite3.Error as e:
+            logging.error(f"Error abriendo la base de datos para el resumen de escuchas: {e}")
+            self.cube_updated.emit(0)
+            return
+        try:
+            for source_type, username in self.sources:
+                try:
+                    added += update_listen_cube(conn, source_type, username)
+                except sqlite3.Error as e:
+                    logging.error(f"Error actualizando el resumen de escuchas de {source_type}: {e}")
+        finally:
+            conn.close()
+        self.cube_updated.emit(added)
+
+
 class StatsModule(BaseModule):
     """Módulo para mostrar estadísticas de la base de datos de música."""
     
@@ -49,6 +88,7 @@ class StatsModule(BaseModule):
         self.musicbrainz_username = musicbrainz_username
         self.conn = None
         self.current_category = None
+        self._cube_worker = None
         
         # Initialize callback handler before super().__init__
         # This ensures it's available when needed during initialization
@@ -2053,6 +2093,16 @@ class StatsModule(BaseModule):
         cursor.execute(query)
         listen_count = cursor.fetchone()[0]
         
+        # Poner al día las tablas de resumen en segundo plano (sólo procesa
+        # escuchas nuevas); al terminar se refrescan las estadísticas visibles
+        sources = [(source_type, self._listen_username(source_type))
+                   for source_type, count in (("lastfm", scrobble_count), ("listenbrainz", listen_count))
+                   if count > 0]
+        if sources and not (self._cube_worker and self._cube_worker.isRunning()):
+            self._cube_worker = ListenCubeWorker(self.db_path, sources)
+            self._cube_worker.cube_updated.connect(self._on_listen_cube_updated)
+            self._cube_worker.start()
+        
         # Añadir fuentes al combo
         if scrobble_count > 0:
             source_combo.addItem(f"LastFM ({scrobble_count} scrobbles)")
@@ -2071,6 +2121,11 @@ class StatsModule(BaseModule):
         # Cargar estadísticas iniciales si hay datos
         self.update_listen_stats()
 
+    def _on_listen_cube_updated(self, added):
+        """Refresca las estadísticas de escuchas cuando el cubo está al día."""
+        if added > 0:
+            self.update_listen_stats()
+
     def update_listen_stats(self):
         """Actualiza las estadísticas de escuchas según la fuente y tipo seleccionados."""
         source_combo = self.findChild(QComboBox, "combo_source")
@@ -2101,6 +2156,10 @@ class StatsModule(BaseModule):
         elif stats_type == 4:  # Tendencias Temporales
             self.load_temporal_listen_stats(source_type)
 
+    def _listen_username(self, source_type):
+        """Usuario de la fuente de escuchas indicada."""
+        return self.lastfm_username if source_type == "lastfm" else self.musicbrainz_username
+
     def load_top_artists_stats(self, source_type):
         """Carga estadísticas de top artistas."""
         # Obtener referencias a los widgets del UI
@@ -2114,29 +2173,9 @@ class StatsModule(BaseModule):
         # Limpiar la tabla
         table.setRowCount(0)
         
-        # Consultar datos
-        cursor = self.conn.cursor()
-        
-        if source_type == "lastfm":
-            query = f"""
-                SELECT artist_name, COUNT(*) as listen_count
-                FROM scrobbles_{self.lastfm_username}
-                GROUP BY artist_name
-                ORDER BY listen_count DESC
-                LIMIT 50;
-            """
-            cursor.execute(query)
-        else:  # listenbrainz
-            query = f"""
-                SELECT artist_name, COUNT(*) as listen_count
-                FROM listens_{self.musicbrainz_username}
-                GROUP BY artist_name
-                ORDER BY listen_count DESC
-                LIMIT 50;
-            """
-            cursor.execute(query)
-        
-        results = cursor.fetchall()
+        # Consultar datos del resumen de escuchas
+        results = [(artist, count) for artist, _, count in get_top_items(
+            self.conn, source_type, self._listen_username(source_type), "artist", limit=50)]
         
         # Llenar la tabla
         table.setRowCount(len(results))
@@ -2233,31 +2272,9 @@ class StatsModule(BaseModule):
             table = existing_table
             chart_container = existing_chart_container
         
-        # Consultar datos
-        cursor = self.conn.cursor()
-        
-        if source_type == "lastfm":
-            query = f"""
-                SELECT album_name, artist_name, COUNT(*) as listen_count
-                FROM scrobbles_{self.lastfm_username}
-                WHERE album_name IS NOT NULL AND album_name != ''
-                GROUP BY album_name, artist_name
-                ORDER BY listen_count DESC
-                LIMIT 50;
-            """
-            cursor.execute(query)
-        else:  # listenbrainz
-            query = f"""
-                SELECT album_name, artist_name, COUNT(*) as listen_count
-                FROM listens_{self.musicbrainz_username}
-                WHERE album_name IS NOT NULL AND album_name != ''
-                GROUP BY album_name, artist_name
-                ORDER BY listen_count DESC
-                LIMIT 50;
-            """
-            cursor.execute(query)
-        
-        results = cursor.fetchall()
+        # Consultar datos del resumen de escuchas
+        results = get_top_items(
+            self.conn, source_type, self._listen_username(source_type), "album", limit=50)
         
         # Llenar la tabla
         table.setRowCount(len(results))
@@ -2321,31 +2338,9 @@ class StatsModule(BaseModule):
         table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         table.horizontalHeader().setStretchLastSection(True)
         
-        # Consultar datos
-        cursor = self.conn.cursor()
-        
-        if source_type == "lastfm":
-            query  = """
-                SELECT s.genre, COUNT(sc.id) as listen_count
-                FROM scrobbles_{self.lastfm_username} sc
-                JOIN songs s ON sc.track_name = s.title AND sc.artist_name = s.artist
-                WHERE s.genre IS NOT NULL AND s.genre != ''
-                GROUP BY s.genre
-                ORDER BY listen_count DESC;
-            """
-            cursor.execute(query)
-        else:  # listenbrainz
-            query = f"""
-                SELECT s.genre, COUNT(l.id) as listen_count
-                FROM listens_{self.musicbrainz_username} l
-                JOIN songs s ON l.track_name = s.title AND l.artist_name = s.artist
-                WHERE s.genre IS NOT NULL AND s.genre != ''
-                GROUP BY s.genre
-                ORDER BY listen_count DESC;
-            """
-            cursor.execute(query)
-        
-        results = cursor.fetchall()
+        # Consultar datos del resumen de escuchas
+        results = [(genre, count) for genre, _, count in get_top_items(
+            self.conn, source_type, self._listen_username(source_type), "genre")]
         
         # Llenar la tabla
         table.setRowCount(len(results))
@@ -2408,33 +2403,9 @@ class StatsModule(BaseModule):
         table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         table.horizontalHeader().setStretchLastSection(True)
         
-        # Consultar datos
-        cursor = self.conn.cursor()
-        
-        if source_type == "lastfm":
-            query = f"""
-                SELECT a.label, COUNT(sc.id) as listen_count
-                FROM scrobbles_{self.lastfm_username} sc
-                JOIN songs s ON sc.track_name = s.title AND sc.artist_name = s.artist
-                JOIN albums a ON s.album = a.name
-                WHERE a.label IS NOT NULL AND a.label != ''
-                GROUP BY a.label
-                ORDER BY listen_count DESC;
-            """
-            cursor.execute(query)
-        else:  # listenbrainz
-            query = f"""
-                SELECT a.label, COUNT(l.id) as listen_count
-                FROM listens_{self.musicbrainz_username} l
-                JOIN songs s ON l.track_name = s.title AND l.artist_name = s.artist
-                JOIN albums a ON s.album = a.name
-                WHERE a.label IS NOT NULL AND a.label != ''
-                GROUP BY a.label
-                ORDER BY listen_count DESC;
-            """
-            cursor.execute(query)
-        
-        results = cursor.fetchall()
+        # Consultar datos del resumen de escuchas
+        results = [(label, count) for label, _, count in get_top_items(
+            self.conn, source_type, self._listen_username(source_type), "label")]
         
         # Llenar la tabla
         table.setRowCount(len(results))
@@ -2482,47 +2453,12 @@ class StatsModule(BaseModule):
         # Limpiar el contenedor
         self.clear_layout(chart_container.layout())
         
-        # Determinar la consulta SQL según la unidad temporal
-        if source_type == "lastfm":
-            date_field = "scrobble_date"
-            table = f"scrobbles_{self.lastfm_username}"
-        else:
-            date_field = "listen_date"
-            table = f"listens_{self.musicbrainz_username}"
-        
-        cursor = self.conn.cursor()
+        # Periodo del resumen de escuchas según la unidad temporal
+        period_types = {"Día": "day", "Semana": "week", "Mes": "month", "Año": "year"}
+        period_type = period_types.get(time_unit, "year")
         
-        if time_unit == "Día":
-            sql = f"""
-                SELECT date({date_field}) as date_group, COUNT(*) as count
-                FROM {table}
-                GROUP BY date_group
-                ORDER BY date_group;
-            """
-        elif time_unit == "Semana":
-            sql = f"""
-                SELECT strftime('%Y-%W', {date_field}) as date_group, COUNT(*) as count
-                FROM {table}
-                GROUP BY date_group
-                ORDER BY date_group;
-            """
-        elif time_unit == "Mes":
-            sql = f"""
-                SELECT strftime('%Y-%m', {date_field}) as date_group, COUNT(*) as count
-                FROM {table}
-                GROUP BY date_group
-                ORDER BY date_group;
-            """
-        else:  # Año
-            sql = f"""
-                SELECT strftime('%Y', {date_field}) as date_group, COUNT(*) as count
-                FROM {table}
-                GROUP BY date_group
-                ORDER BY date_group;
-            """
-        
-        cursor.execute(sql)
-        results = cursor.fetchall()
+        results = get_listen_timeline(
+            self.conn, source_type, self._listen_username(source_type), period_type)
         
         # Crear el gráfico temporal
         chart_view = ChartFactory.create_line_chart(
@@ -4912,6 +4848,8 @@ class StatsModule(BaseModule):
 
     def cleanup(self):
         """Limpieza antes de cerrar el módulo."""
+        if self._cube_worker and self._cube_worker.isRunning():
+            self._cube_worker.wait()
         if self.conn:
             try:
                 self.conn.close()
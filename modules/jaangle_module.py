@@ -19,6 +19,8 @@ from base_module import BaseModule, PROJECT_ROOT
 from modules.submodules.jaangle.spotify_player import SpotifyPlayer
 from modules.submodules.jaangle.listenbrainz_player import ListenBrainzPlayer
 from modules.submodules.jaangle.jaangle_advanced_config import JaangleAdvancedConfig
+from modules.submodules.jaangle.candidate_pool import QuizCandidatePool
+from modules.submodules.jaangle.question_prefetch import QuestionPrefetcher, fetch_quiz_songs, get_song_playable_urls
 
 
 # Configure logging
@@ -78,6 +80,11 @@ class MusicQuiz(BaseModule):
         self.conn = None
         self.cursor = None
         self.advanced_filters = {}
+        # Canciones elegibles precalculadas para el quiz
+        self.candidate_pool = QuizCandidatePool(db_path)
+        # Próximas preguntas preparadas en segundo plano
+        self.question_prefetcher = QuestionPrefetcher(db_path, self.candidate_pool)
+        self.current_preview_url = None
 
         # Configuración por defecto
         self.quiz_duration_minutes = 5
@@ -857,6 +864,10 @@ class MusicQuiz(BaseModule):
         self.total_played = 0
         self.update_stats_display()
         
+        # Recalcular las canciones candidatas al empezar cada partida
+        self.candidate_pool.invalidate()
+        self.question_prefetcher.clear()
+        
         # Inicializar tiempo total del quiz
         self.total_quiz_duration_seconds = self.quiz_duration_minutes * 60
         self.remaining_total_time = self.total_quiz_duration_seconds
@@ -900,6 +911,9 @@ class MusicQuiz(BaseModule):
         """Detiene el juego en curso."""
         self.game_active = False
         
+        # Descartar las preguntas preparadas
+        self.question_prefetcher.clear()
+        
         # Actualizar estados de botones
         if hasattr(self, 'start_button') and hasattr(self, 'stop_button'):
             self.start_button.setEnabled(True)
@@ -1035,7 +1049,7 @@ class MusicQuiz(BaseModule):
 
     def get_random_songs(self, count=4, max_retries=3):
         """Reemplaza el método existente con esta versión que incluye filtros avanzados."""
-        self.get_random_songs_with_advanced_filters(count, max_retries)
+        return self.get_random_songs_with_advanced_filters(count, max_retries)
         
 
     def load_album_art(self, album_art_path):
@@ -1106,18 +1120,42 @@ class MusicQuiz(BaseModule):
         if hasattr(self, 'listenbrainz_player'):
             self.listenbrainz_player.stop()
         
-        # Obtener las canciones aleatorias (ahora con número variable)
-        songs = self.get_random_songs(self.options_count)
+        # Usar una pregunta preparada de antemano si hay alguna con los filtros actuales
+        question = None
+        try:
+            self._ensure_candidate_pool()
+            self.question_prefetcher.configure(self.options_count, self.music_origin)
+            question = self.question_prefetcher.pop()
+        except Exception as e:
+            print(f"Error al obtener pregunta preparada: {e}")
         
-        if not songs or len(songs) < self.options_count:
-            self.show_error_message("Error", f"No hay suficientes canciones en la base de datos para mostrar {self.options_count} opciones.")
-            self.stop_quiz()
-            return
-            
-        # Elegir una canción aleatoria como correcta
-        self.current_correct_option = random.randint(0, self.options_count - 1)
+        if question:
+            songs = question['songs']
+            covers = question['covers']
+            self.current_correct_option = question['correct_index']
+            self.current_preview_url = question['preview_url']
+        else:
+            # Obtener las canciones aleatorias (ahora con número variable)
+            songs = self.get_random_songs(self.options_count)
+            covers = None
+            self.current_preview_url = None
+            
+            if not songs or len(songs) < self.options_count:
+                self.show_error_message("Error", f"No hay suficientes canciones en la base de datos para mostrar {self.options_count} opciones.")
+                self.stop_quiz()
+                return
+                
+            # Elegir una canción aleatoria como correcta
+            self.current_correct_option = random.randint(0, self.options_count - 1)
         self.current_song = songs[self.current_correct_option]
         
+        # Preparar en segundo plano las siguientes preguntas
+        self.question_prefetcher.fill()
+        
+        # Sin pregunta preparada hay que dar tiempo a que cargue el reproductor.
+        # El prefetcher sólo prepara los orígenes local y online: Spotify siempre espera
+        start_delay_factor = 0 if question and self.music_origin in ('local', 'online') else 1
+        
         # Configurar las opciones
         for i, button in enumerate(self.option_buttons):
             song = songs[i]
@@ -1128,8 +1166,11 @@ class MusicQuiz(BaseModule):
             button.artist_label.setText(f"👤 {artist}")
             button.album_label.setText(f"💿 {album}")
             
-            # Cargar imagen del álbum
-            pixmap = self.load_album_art(album_art_path_denorm if album_art_path_denorm else album_art_path)
+            # Cargar imagen del álbum (ya decodificada si la pregunta estaba preparada)
+            if covers is not None:
+                pixmap = QPixmap.fromImage(covers[i]) if covers[i] is not None else None
+            else:
+                pixmap = self.load_album_art(album_art_path_denorm if album_art_path_denorm else album_art_path)
             if pixmap:
                 button.album_image.setPixmap(pixmap)
             else:
@@ -1163,7 +1204,7 @@ class MusicQuiz(BaseModule):
                     self.spotify_container.show()
                     
                 if self.current_song_id is not None:
-                    QTimer.singleShot(2000, lambda: self._play_spotify_track())
+                    QTimer.singleShot(2000 * start_delay_factor, lambda: self._play_spotify_track())
                 else:
                     logger.error("ID de canción no válido para reproducción de Spotify, intentando con otra pregunta")
                     QTimer.singleShot(1000, self.show_next_question)
@@ -1176,7 +1217,7 @@ class MusicQuiz(BaseModule):
                     
                 if self.current_song_id is not None:
                     # Añadir un delay para dar tiempo a la carga del reproductor
-                    QTimer.singleShot(2000, lambda: self._play_online_track())
+                    QTimer.singleShot(2000 * start_delay_factor, lambda: self._play_online_track())
                 else:
                     logger.error("ID de canción no válido para reproducción online, intentando con otra pregunta")
                     QTimer.singleShot(1000, self.show_next_question)
@@ -1194,7 +1235,7 @@ class MusicQuiz(BaseModule):
                     raise FileNotFoundError(f"Archivo de audio no encontrado: {self.current_song_path}")
                     
                 # Añadir un delay para dar tiempo a la carga del reproductor
-                QTimer.singleShot(1500, lambda: self._play_local_track())
+                QTimer.singleShot(1500 * start_delay_factor, lambda: self._play_local_track())
                 
         except Exception as e:
             print(f"Error al reproducir la canción: {e}")
@@ -1218,7 +1259,7 @@ class MusicQuiz(BaseModule):
                 self.progress_bar.setValue(50)
             
             # Intentar reproducir la canción
-            success = self.listenbrainz_player.play(self.current_song_id)
+            success = self.listenbrainz_player.play(self.current_song_id, preview_url=self.current_preview_url)
             
             if success:
                 # Configurar el temporizador para la cuenta regresiva
@@ -1314,37 +1355,7 @@ class MusicQuiz(BaseModule):
     def _get_song_playable_urls(self, song_id):
         """Obtiene URLs reproducibles para una canción desde la tabla song_links."""
         try:
-            if not song_id:
-                return []
-                
-            # Consulta para obtener enlaces reproducibles
-            self.cursor.execute("""
-                SELECT youtube_url, bandcamp_url, soundcloud_url, spotify_url
-                FROM song_links
-                WHERE song_id = ?
-            """, (song_id,))
-            
-            result = self.cursor.fetchone()
-            
-            if not result:
-                return []
-                
-            # Recopilar URLs disponibles en orden de preferencia
-            urls = []
-            youtube_url, bandcamp_url, soundcloud_url, spotify_url = result
-            
-            # Añadir URLs en orden de preferencia (puedes cambiar este orden)
-            if youtube_url:
-                urls.append(youtube_url)
-            if bandcamp_url:
-                urls.append(bandcamp_url)
-            if soundcloud_url:
-                urls.append(soundcloud_url)
-            if spotify_url:
-                urls.append(spotify_url)
-                
-            return urls
-            
+            return get_song_playable_urls(self.cursor, song_id)
         except Exception as e:
             print(f"Error al obtener URLs reproducibles: {e}")
             return []
@@ -5707,188 +5718,166 @@ class MusicQuiz(BaseModule):
             print(f"Error obteniendo resumen de filtros: {e}")
             return "Error al obtener resumen de filtros"
 
+    def _build_quiz_candidate_query(self):
+        """
+        Construye la consulta que devuelve (id, file_path) de todas las canciones
+        elegibles con los filtros actuales (avanzados, origen, exclusiones y sesión).
+        """
+        # Construir la consulta base
+        query = """
+            SELECT s.id, s.file_path
+            FROM songs s
+            WHERE s.duration >= ?
+        """
+        params = [self.min_song_duration]
+
+        # Aplicar filtros avanzados PRIMERO
+        query, params = self.apply_advanced_filters_to_query(query, params)
+
+        # Aplicar filtro por origen de música
+        if self.music_origin == 'local':
+            query += " AND s.origen = 'local' AND s.file_path IS NOT NULL"
+        elif self.music_origin == 'spotify':
+            if self.spotify_user:
+                query += " AND s.origen = ?"
+                params.append(f"spotify_{self.spotify_user}")
+            else:
+                query += " AND s.origen LIKE 'spotify_%'"
+
+            # Asegurarse que hay un enlace de Spotify disponible
+            query += """ 
+            AND EXISTS (
+                SELECT 1 FROM song_links sl 
+                WHERE sl.song_id = s.id 
+                AND sl.spotify_url IS NOT NULL
+            )
+            """
+        elif self.music_origin == 'online':
+            # Cambiar para buscar cualquier enlace online (YouTube, SoundCloud, Bandcamp)
+            query += """ 
+            AND EXISTS (
+                SELECT 1 FROM song_links sl 
+                WHERE sl.song_id = s.id 
+                AND (sl.youtube_url IS NOT NULL 
+                    OR sl.soundcloud_url IS NOT NULL 
+                    OR sl.bandcamp_url IS NOT NULL)
+            )
+            """
+
+        # Verificar si hay artistas excluidos (filtros normales)
+        excluded_artists = self.get_excluded_items("excluded_artists")
+        if excluded_artists:
+            placeholders = ", ".join(["?" for _ in excluded_artists])
+            query += f" AND s.artist NOT IN ({placeholders})"
+            params.extend(excluded_artists)
+
+        # Verificar si hay álbumes excluidos
+        excluded_albums = self.get_excluded_items("excluded_albums")
+        if excluded_albums:
+            placeholders = ", ".join(["?" for _ in excluded_albums])
+            query += f" AND s.album NOT IN ({placeholders})"
+            params.extend(excluded_albums)
+
+        # Verificar si hay géneros excluidos
+        excluded_genres = self.get_excluded_items("excluded_genres")
+        if excluded_genres:
+            placeholders = ", ".join(["?" for _ in excluded_genres])
+            query += f" AND s.genre NOT IN ({placeholders})"
+            params.extend(excluded_genres)
+
+        # Verificar si hay carpetas excluidas
+        excluded_folders = self.get_excluded_items("excluded_folders")
+        if excluded_folders:
+            folder_conditions = []
+            for folder in excluded_folders:
+                folder_conditions.append("s.file_path NOT LIKE ?")
+                params.append(f"{folder}%")
+            if folder_conditions:
+                query += f" AND {' AND '.join(folder_conditions)}"
+
+        # Aplicar filtros de sesión si están activos
+        if hasattr(self, 'session_filters') and self.session_filters:
+            session_filters = self.session_filters.get('filters', {})
+
+            # Filtrar por artistas incluidos
+            included_artists = session_filters.get('Artistas', [])
+            if included_artists:
+                placeholders = ", ".join(["?" for _ in included_artists])
+                query += f" AND s.artist IN ({placeholders})"
+                params.extend(included_artists)
+
+            # Filtrar por álbumes incluidos
+            included_albums = session_filters.get('Álbumes', [])
+            if included_albums:
+                placeholders = ", ".join(["?" for _ in included_albums])
+                query += f" AND s.album IN ({placeholders})"
+                params.extend(included_albums)
+
+            # Filtrar por géneros incluidos
+            included_genres = session_filters.get('Géneros', [])
+            if included_genres:
+                placeholders = ", ".join(["?" for _ in included_genres])
+                query += f" AND s.genre IN ({placeholders})"
+                params.extend(included_genres)
+
+            # Filtrar por carpetas incluidas
+            included_folders = session_filters.get('Carpetas', [])
+            if included_folders:
+                folder_conditions = []
+                for folder in included_folders:
+                    folder_conditions.append("s.file_path LIKE ?")
+                    params.append(f"{folder}%")
+                if folder_conditions:
+                    query += f" AND ({' OR '.join(folder_conditions)})"
+
+        return query, params
+
+    def _ensure_candidate_pool(self):
+        """Reconstruye el pool de candidatas si los filtros han cambiado. Devuelve su tamaño."""
+        query, params = self._build_quiz_candidate_query()
+        signature = (query, tuple(params), self.music_origin)
+        return self.candidate_pool.ensure(
+            signature, query, params,
+            check_files=(self.music_origin == 'local')
+        )
+
     def get_random_songs_with_advanced_filters(self, count=4, max_retries=3):
         """
-        Versión modificada de get_random_songs que incorpora los filtros avanzados.
-        Reemplaza o complementa el método original.
+        Versión de get_random_songs que incorpora los filtros avanzados.
+
+        Las canciones elegibles se materializan una vez en self.candidate_pool
+        cuando cambian los filtros; cada pregunta sólo extrae ids ya barajados
+        y carga sus datos con una consulta por clave primaria.
         """
         retries = 0
         while retries < max_retries:
             try:
-                # Construir la consulta base
-                query = """
-                    SELECT s.id, s.title, s.artist, s.album, s.file_path, s.duration, 
-                        a.album_art_path, s.track_number, s.album_art_path_denorm, s.origen
-                    FROM songs s
-                    LEFT JOIN albums a ON s.album = a.name AND s.artist = (
-                        SELECT name FROM artists WHERE id = a.artist_id
-                    )
-                    WHERE s.duration >= ?
-                """
-                params = [self.min_song_duration]
-                
-                # Aplicar filtros avanzados PRIMERO
-                query, params = self.apply_advanced_filters_to_query(query, params)
-                
-                # Aplicar filtro por origen de música
-                if self.music_origin == 'local':
-                    query += " AND s.origen = 'local' AND s.file_path IS NOT NULL"
-                elif self.music_origin == 'spotify':
-                    if self.spotify_user:
-                        query += " AND s.origen = ?"
-                        params.append(f"spotify_{self.spotify_user}")
-                    else:
-                        query += " AND s.origen LIKE 'spotify_%'"
-                    
-                    # Asegurarse que hay un enlace de Spotify disponible
-                    query += """ 
-                    AND EXISTS (
-                        SELECT 1 FROM song_links sl 
-                        WHERE sl.song_id = s.id 
-                        AND sl.spotify_url IS NOT NULL
-                    )
-                    """
-                elif self.music_origin == 'online':
-                    # Cambiar para buscar cualquier enlace online (YouTube, SoundCloud, Bandcamp)
-                    query += """ 
-                    AND EXISTS (
-                        SELECT 1 FROM song_links sl 
-                        WHERE sl.song_id = s.id 
-                        AND (sl.youtube_url IS NOT NULL 
-                            OR sl.soundcloud_url IS NOT NULL 
-                            OR sl.bandcamp_url IS NOT NULL)
-                    )
-                    """
-                
-                # Verificar si hay artistas excluidos (filtros normales)
-                excluded_artists = self.get_excluded_items("excluded_artists")
-                if excluded_artists:
-                    placeholders = ", ".join(["?" for _ in excluded_artists])
-                    query += f" AND s.artist NOT IN ({placeholders})"
-                    params.extend(excluded_artists)
-                
-                # Verificar si hay álbumes excluidos
-                excluded_albums = self.get_excluded_items("excluded_albums")
-                if excluded_albums:
-                    placeholders = ", ".join(["?" for _ in excluded_albums])
-                    query += f" AND s.album NOT IN ({placeholders})"
-                    params.extend(excluded_albums)
-                
-                # Verificar si hay géneros excluidos
-                excluded_genres = self.get_excluded_items("excluded_genres")
-                if excluded_genres:
-                    placeholders = ", ".join(["?" for _ in excluded_genres])
-                    query += f" AND s.genre NOT IN ({placeholders})"
-                    params.extend(excluded_genres)
-                
-                # Verificar si hay carpetas excluidas
-                excluded_folders = self.get_excluded_items("excluded_folders")
-                if excluded_folders:
-                    folder_conditions = []
-                    for folder in excluded_folders:
-                        folder_conditions.append("s.file_path NOT LIKE ?")
-                        params.append(f"{folder}%")
-                    if folder_conditions:
-                        query += f" AND {' AND '.join(folder_conditions)}"
-                
-                # Aplicar filtros de sesión si están activos
-                if hasattr(self, 'session_filters') and self.session_filters:
-                    session_filters = self.session_filters.get('filters', {})
-                    
-                    # Filtrar por artistas incluidos
-                    included_artists = session_filters.get('Artistas', [])
-                    if included_artists:
-                        placeholders = ", ".join(["?" for _ in included_artists])
-                        query += f" AND s.artist IN ({placeholders})"
-                        params.extend(included_artists)
-                    
-                    # Filtrar por álbumes incluidos
-                    included_albums = session_filters.get('Álbumes', [])
-                    if included_albums:
-                        placeholders = ", ".join(["?" for _ in included_albums])
-                        query += f" AND s.album IN ({placeholders})"
-                        params.extend(included_albums)
-                    
-                    # Filtrar por géneros incluidos
-                    included_genres = session_filters.get('Géneros', [])
-                    if included_genres:
-                        placeholders = ", ".join(["?" for _ in included_genres])
-                        query += f" AND s.genre IN ({placeholders})"
-                        params.extend(included_genres)
-                    
-                    # Filtrar por carpetas incluidas
-                    included_folders = session_filters.get('Carpetas', [])
-                    if included_folders:
-                        folder_conditions = []
-                        for folder in included_folders:
-                            folder_conditions.append("s.file_path LIKE ?")
-                            params.append(f"{folder}%")
-                        if folder_conditions:
-                            query += f" AND ({' OR '.join(folder_conditions)})"
-                
-                # Agregar orden aleatorio y límite
-                query += " ORDER BY RANDOM() LIMIT ?"
-                params.append(count * 4)  # Obtener más canciones para tener margen
-                
-                print(f"Ejecutando consulta con filtros avanzados: {query[:200]}...")
-                self.cursor.execute(query, params)
-                candidates = self.cursor.fetchall()
-                
-                if len(candidates) == 0:
-                    print(f"La consulta no devolvió resultados con filtros avanzados")
-                    print(f"Parámetros: {params}")
-                    retries += 1
-                    continue
-                
-                print(f"Encontradas {len(candidates)} canciones candidatas")
-                
-                # Verificar las canciones según el origen
-                valid_songs = []
-                for song in candidates:
-                    valid = False
-                    
-                    if self.music_origin == 'local':
-                        # Para canciones locales, verificar que el archivo existe
-                        if song[4] and os.path.exists(song[4]):
-                            valid = True
-                    elif self.music_origin == 'spotify':
-                        # Para canciones de Spotify, verificar que tengan un enlace válido
-                        self.cursor.execute("""
-                            SELECT spotify_url FROM song_links 
-                            WHERE song_id = ? AND spotify_url IS NOT NULL
-                        """, (song[0],))
-                        
-                        if self.cursor.fetchone():
-                            valid = True
-                    elif self.music_origin == 'online':
-                        # Para canciones online, verificar que tengan un enlace válido
-                        self.cursor.execute("""
-                            SELECT youtube_url, soundcloud_url, bandcamp_url 
-                            FROM song_links 
-                            WHERE song_id = ? 
-                            AND (youtube_url IS NOT NULL OR soundcloud_url IS NOT NULL OR bandcamp_url IS NOT NULL)
-                        """, (song[0],))
-                        
-                        if self.cursor.fetchone():
-                            valid = True
-                    
-                    if valid:
-                        valid_songs.append(song)
-                        if len(valid_songs) >= count:
-                            break
-                
-                if len(valid_songs) >= count:
-                    print(f"Devolviendo {len(valid_songs[:count])} canciones válidas")
-                    return valid_songs[:count]
-                
-                # Si no hay suficientes canciones válidas, intentar de nuevo
+                total = self._ensure_candidate_pool()
+
+                if total < count:
+                    print(f"Solo hay {total} canciones candidatas con los filtros actuales")
+                    return []
+
+                song_ids = self.candidate_pool.draw(count)
+                if len(song_ids) < count:
+                    print(f"No quedan suficientes canciones reproducibles en el pool ({len(song_ids)})")
+                    return []
+
+                # Mantener el orden barajado del pool
+                songs = fetch_quiz_songs(self.cursor, song_ids)
+                if len(songs) >= count:
+                    return songs
+
+                # Alguna canción desapareció de la base de datos: reconstruir el pool
+                print(f"Faltan canciones del pool en la base de datos. Reintento {retries + 1}/{max_retries}")
+                self.candidate_pool.invalidate()
                 retries += 1
-                print(f"No se encontraron suficientes canciones válidas para {count} opciones. Reintento {retries}/{max_retries}")
-            
+
             except Exception as e:
                 print(f"Error al obtener canciones aleatorias con filtros avanzados: {e}")
                 import traceback
                 traceback.print_exc()
+                self.candidate_pool.invalidate()
                 retries += 1
         
         # Si llegamos aquí, no pudimos obtener suficientes canciones
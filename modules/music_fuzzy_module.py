@@ -12,6 +12,7 @@ import resources_rc
 
 from modules.submodules.fuzzy.search_handler import SearchHandler
 from modules.submodules.fuzzy.database_manager import DatabaseManager
+from modules.submodules.fuzzy.detail_loader import DetailLoader
 from modules.submodules.fuzzy.ui_updater import UIUpdater
 from modules.submodules.fuzzy.link_manager import LinkManager
 from modules.submodules.fuzzy.player_manager import PlayerManager
@@ -47,6 +48,7 @@ class MusicFuzzyModule(BaseModule):
         
         # Inicializar componentes después de cargar la UI
         self.db_manager = DatabaseManager(self.db_path)
+        self.detail_loader = DetailLoader(self.db_manager)
         self.search_handler = SearchHandler(self)
         self.ui_updater = UIUpdater(self)
         self.link_manager = LinkManager(self)
@@ -162,6 +164,7 @@ class MusicFuzzyModule(BaseModule):
         
         if hasattr(self, 'results_tree_widget'):
             self.results_tree_widget.itemClicked.connect(self._handle_item_clicked)
+            self.results_tree_widget.currentItemChanged.connect(self._handle_current_item_changed)
 
         if hasattr(self, 'feeds_button'):
             self.feeds_button.clicked.connect(self._toggle_feeds_view)
@@ -548,6 +551,27 @@ class MusicFuzzyModule(BaseModule):
             import traceback
             traceback.print_exc()
 
+    def _handle_current_item_changed(self, current, previous):
+        """Precarga los detalles de los items vecinos al moverse con el teclado."""
+        if current is None:
+            return
+        
+        neighbours = []
+        for item in (current, self.results_tree_widget.itemBelow(current), self.results_tree_widget.itemAbove(current)):
+            item_data = item.data(0, Qt.ItemDataRole.UserRole) if item else None
+            if item_data and item_data.get('type') and item_data.get('id'):
+                neighbours.append((item_data['type'], item_data['id']))
+        self.detail_loader.prefetch(neighbours)
+        
+        # Si la página de más información está visible, se actualiza con el nuevo item
+        if (hasattr(self, 'info_panel_stacked') and self.info_panel_stacked
+                and self.info_panel_stacked.currentIndex() == 2):
+            self._update_detailed_info()
+
+    def invalidate_details(self, item_type=None, item_id=None):
+        """Descarta los detalles cacheados (para otros módulos que modifican la base de datos)."""
+        self.detail_loader.invalidate(item_type, item_id)
+
 
 
 
@@ -699,68 +723,33 @@ class MusicFuzzyModule(BaseModule):
 
     def _update_song_detailed_info(self, song_id, metadata_group, release_group, label_group):
         """Actualiza la información detallada para una canción."""
-        # Obtener los detalles de la canción
-        song = self.db_manager.get_song_details(song_id)
-        if not song:
+        # Obtener los detalles de la canción (todos los paneles de una vez, cacheados)
+        details = self.detail_loader.get('song', song_id)
+        if not details:
             print(f"No se pudo obtener detalles para la canción con ID {song_id}")
             return
         
         # 1. Actualizar metadata
         if metadata_group:
-            self._add_metadata_info(metadata_group, song, 'song')
+            self._add_metadata_info(metadata_group, details['item'], 'song')
         
         # 2. Actualizar información de release
         if release_group:
-            conn = self.db_manager._get_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    # Consultar información de MusicBrainz para esta canción
-                    cursor.execute("""
-                        SELECT s.musicbrainz_recordingid, s.musicbrainz_releasegroupid,
-                            mr.title as release_title, mr.status, mr.releasedate,
-                            mr.country, mr.annotation, mr.packaging
-                        FROM songs s
-                        LEFT JOIN mb_release_group mr ON s.musicbrainz_releasegroupid = mr.release_group_id
-                        WHERE s.id = ?
-                    """, (song_id,))
-                    release_info = cursor.fetchone()
-                    if release_info:
-                        self._add_release_info(release_group, release_info)
-                    else:
-                        label = QLabel("No hay información de release disponible para esta canción")
-                        release_group.layout().addWidget(label)
-                except Exception as e:
-                    print(f"Error obteniendo información de release: {e}")
-                finally:
-                    conn.close()
+            release_info = details['release']
+            if release_info:
+                self._add_release_info(release_group, release_info)
+            else:
+                label = QLabel("No hay información de release disponible para esta canción")
+                release_group.layout().addWidget(label)
         
         # 3. Actualizar información de sello
         if label_group:
-            conn = self.db_manager._get_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    # Consultar información de sello para esta canción
-                    cursor.execute("""
-                        SELECT l.name as label_name, lr.relationship_type, l.country, lr.begin_date, lr.end_date, l.founded_year,
-                            lr.release_id, lr.catalog_number, lr.release_status, l.wikipedia_url, l.discogs_url, l.bandcamp_url, l.mb_type  
-                        FROM songs s
-                        JOIN albums a ON s.album = a.name
-                        LEFT JOIN label_release_relationships lr ON a.id = lr.release_id
-                        LEFT JOIN labels l ON lr.label_id = l.id
-                        WHERE s.id = ?
-                    """, (song_id,))
-                    label_info = cursor.fetchone()
-                    if label_info:
-                        self._add_label_info(label_group, label_info)
-                    else:
-                        label = QLabel("No hay información de sello disponible para esta canción")
-                        label_group.layout().addWidget(label)
-                except Exception as e:
-                    print(f"Error obteniendo información de sello: {e}")
-                finally:
-                    conn.close()
+            label_info = details['label']
+            if label_info:
+                self._add_label_info(label_group, label_info)
+            else:
+                label = QLabel("No hay información de sello disponible para esta canción")
+                label_group.layout().addWidget(label)
 
     def _add_metadata_info(self, group_box, item, item_type):
         """Añade información de metadata al GroupBox."""
@@ -901,241 +890,137 @@ class MusicFuzzyModule(BaseModule):
 
     def _update_artist_detailed_info(self, artist_id, metadata_group, release_group, label_group):
         """Actualiza la información detallada para un artista."""
-        # Obtener los detalles del artista
-        artist = self.db_manager.get_artist_details(artist_id)
-        if not artist:
+        # Obtener los detalles del artista (todos los paneles de una vez, cacheados)
+        details = self.detail_loader.get('artist', artist_id)
+        if not details:
             print(f"No se pudo obtener detalles para el artista con ID {artist_id}")
             return
         
         # 1. Actualizar metadata
         if metadata_group:
-            self._add_metadata_info(metadata_group, artist, 'artista')
+            self._add_metadata_info(metadata_group, details['item'], 'artista')
         
         # 2. Actualizar información de release
         if release_group:
-            conn = self.db_manager._get_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    # Consultar información de MusicBrainz para este artista
-                    cursor.execute("""
-                        SELECT DISTINCT mr.* 
-                        FROM mb_release_group mr
-                        JOIN albums a ON mr.release_group_id = a.musicbrainz_releasegroupid
-                        WHERE a.artist_id = ?
-                        ORDER BY mr.releasedate DESC
-                        LIMIT 5
-                    """, (artist_id,))
-                    releases = cursor.fetchall()
-                    
-                    if releases and len(releases) > 0:
-                        layout = release_group.layout() or QVBoxLayout(release_group)
-                        header = QLabel("<h3>Últimos releases</h3>")
-                        header.setTextFormat(Qt.TextFormat.RichText)
-                        layout.addWidget(header)
-                        
-                        for release in releases:
-                            self._add_release_item(layout, release)
-                    else:
-                        label = QLabel("No hay información de releases disponible para este artista")
-                        release_layout = release_group.layout() or QVBoxLayout(release_group)
-                        release_layout.addWidget(label)
-                except Exception as e:
-                    print(f"Error obteniendo información de releases: {e}")
-                finally:
-                    conn.close()
+            releases = details['releases']
+            if releases and len(releases) > 0:
+                layout = release_group.layout() or QVBoxLayout(release_group)
+                header = QLabel("<h3>Últimos releases</h3>")
+                header.setTextFormat(Qt.TextFormat.RichText)
+                layout.addWidget(header)
+                
+                for release in releases:
+                    self._add_release_item(layout, release)
+            else:
+                label = QLabel("No hay información de releases disponible para este artista")
+                release_layout = release_group.layout() or QVBoxLayout(release_group)
+                release_layout.addWidget(label)
         
         # 3. Actualizar información de sello
         if label_group:
-            conn = self.db_manager._get_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    # Consultar información de sellos para este artista
-                    cursor.execute("""
-                        SELECT DISTINCT l.name as label_name, l.type, l.country, 
-                            l.begin_date, l.end_date, COUNT(lr.release_id) as release_count
-                        FROM albums a
-                        JOIN label_release_relationships lr ON a.id = lr.release_id
-                        JOIN labels l ON lr.label_id = l.id
-                        WHERE a.artist_id = ?
-                        GROUP BY l.id
-                        ORDER BY release_count DESC
-                    """, (artist_id,))
-                    labels = cursor.fetchall()
-                    
-                    if labels and len(labels) > 0:
-                        layout = label_group.layout() or QVBoxLayout(label_group)
-                        header = QLabel("<h3>Sellos relacionados</h3>")
-                        header.setTextFormat(Qt.TextFormat.RichText)
-                        layout.addWidget(header)
-                        
-                        for label_info in labels:
-                            self._add_label_item(layout, label_info)
-                    else:
-                        label = QLabel("No hay información de sellos disponible para este artista")
-                        label_layout = label_group.layout() or QVBoxLayout(label_group)
-                        label_layout.addWidget(label)
-                except Exception as e:
-                    print(f"Error obteniendo información de sellos: {e}")
-                finally:
-                    conn.close()
+            labels = details['labels']
+            if labels and len(labels) > 0:
+                layout = label_group.layout() or QVBoxLayout(label_group)
+                header = QLabel("<h3>Sellos relacionados</h3>")
+                header.setTextFormat(Qt.TextFormat.RichText)
+                layout.addWidget(header)
+                
+                for label_info in labels:
+                    self._add_label_item(layout, label_info)
+            else:
+                label = QLabel("No hay información de sellos disponible para este artista")
+                label_layout = label_group.layout() or QVBoxLayout(label_group)
+                label_layout.addWidget(label)
 
 
     def _update_album_detailed_info(self, album_id, metadata_group, release_group, label_group):
         """Actualiza la información detallada para un álbum."""
-        # Obtener los detalles del álbum
-        album = self.db_manager.get_album_details(album_id)
-        if not album:
+        # Obtener los detalles del álbum (todos los paneles de una vez, cacheados)
+        details = self.detail_loader.get('album', album_id)
+        if not details:
             print(f"No se pudo obtener detalles para el álbum con ID {album_id}")
             return
         
         # 1. Actualizar metadata
         if metadata_group:
-            self._add_metadata_info(metadata_group, album, 'álbum')
+            self._add_metadata_info(metadata_group, details['item'], 'álbum')
             
             # Información adicional de audio - detalles técnicos
-            conn = self.db_manager._get_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        SELECT AVG(bitrate) as avg_bitrate, 
-                            MIN(bitrate) as min_bitrate, 
-                            MAX(bitrate) as max_bitrate,
-                            AVG(duration) as avg_duration,
-                            SUM(duration) as total_duration,
-                            AVG(sample_rate) as avg_sample_rate
-                        FROM songs
-                        WHERE album_id = ?
-                    """, (album_id,))
-                    audio_stats = cursor.fetchone()
-                    
-                    if audio_stats:
-                        stats_text = "<h3>Estadísticas de Audio</h3>"
-                        
-                        # Formatear duración total
-                        total_minutes = int(audio_stats['total_duration'] or 0) // 60
-                        total_seconds = int(audio_stats['total_duration'] or 0) % 60
-                        total_duration_str = f"{total_minutes}:{total_seconds:02d}"
-                        
-                        # Añadir estadísticas
-                        stats_text += f"<p><b>Duración total:</b> {total_duration_str}</p>"
-                        if audio_stats['avg_bitrate']:
-                            stats_text += f"<p><b>Bitrate promedio:</b> {int(audio_stats['avg_bitrate'])} kbps</p>"
-                        if audio_stats['min_bitrate'] and audio_stats['max_bitrate']:
-                            stats_text += f"<p><b>Rango de bitrate:</b> {int(audio_stats['min_bitrate'])} - {int(audio_stats['max_bitrate'])} kbps</p>"
-                        if audio_stats['avg_sample_rate']:
-                            stats_text += f"<p><b>Sample rate promedio:</b> {int(audio_stats['avg_sample_rate'])} Hz</p>"
-                        
-                        stats_label = QLabel(stats_text)
-                        stats_label.setWordWrap(True)
-                        stats_label.setTextFormat(Qt.TextFormat.RichText)
-                        metadata_group.layout().addWidget(stats_label)
-                except Exception as e:
-                    print(f"Error obteniendo estadísticas de audio: {e}")
-                finally:
-                    conn.close()
+            audio_stats = details['audio_stats']
+            if audio_stats:
+                stats_text = "<h3>Estadísticas de Audio</h3>"
+                
+                # Formatear duración total
+                total_minutes = int(audio_stats['total_duration'] or 0) // 60
+                total_seconds = int(audio_stats['total_duration'] or 0) % 60
+                total_duration_str = f"{total_minutes}:{total_seconds:02d}"
+                
+                # Añadir estadísticas
+                stats_text += f"<p><b>Duración total:</b> {total_duration_str}</p>"
+                if audio_stats['avg_bitrate']:
+                    stats_text += f"<p><b>Bitrate promedio:</b> {int(audio_stats['avg_bitrate'])} kbps</p>"
+                if audio_stats['min_bitrate'] and audio_stats['max_bitrate']:
+                    stats_text += f"<p><b>Rango de bitrate:</b> {int(audio_stats['min_bitrate'])} - {int(audio_stats['max_bitrate'])} kbps</p>"
+                if audio_stats['avg_sample_rate']:
+                    stats_text += f"<p><b>Sample rate promedio:</b> {int(audio_stats['avg_sample_rate'])} Hz</p>"
+                
+                stats_label = QLabel(stats_text)
+                stats_label.setWordWrap(True)
+                stats_label.setTextFormat(Qt.TextFormat.RichText)
+                metadata_group.layout().addWidget(stats_label)
         
         # 2. Actualizar información de release
         if release_group:
-            conn = self.db_manager._get_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    # Consultar información de MusicBrainz para este álbum
-                    cursor.execute("""
-                        SELECT mr.*
-                        FROM mb_release_group mr
-                        JOIN albums a ON mr.release_group_id = a.musicbrainz_releasegroupid
-                        WHERE a.id = ?
-                    """, (album_id,))
-                    release_info = cursor.fetchone()
+            release_info = details['release']
+            if release_info:
+                self._add_release_info(release_group, release_info)
+                
+                # Añadir información de versiones alternativas
+                alt_releases = details['alt_releases']
+                if alt_releases and len(alt_releases) > 0:
+                    alt_header = QLabel("<h3>Versiones alternativas</h3>")
+                    alt_header.setTextFormat(Qt.TextFormat.RichText)
+                    release_group.layout().addWidget(alt_header)
                     
-                    if release_info:
-                        self._add_release_info(release_group, release_info)
-                        
-                        # Añadir información de versiones alternativas
-                        cursor.execute("""
-                            SELECT mr.*
-                            FROM mb_release_group mr
-                            WHERE mr.release_group_id = ? AND mr.id != ?
-                            ORDER BY mr.releasedate
-                        """, (release_info['release_group_id'], release_info['id']))
-                        alt_releases = cursor.fetchall()
+                    for alt_release in alt_releases:
+                        alt_text = f"<p><b>{alt_release['title']}</b> ({alt_release['country'] or 'Unknown'}, {alt_release['releasedate'] or 'Unknown'})</p>"
+                        if alt_release['status']:
+                            alt_text += f"<p>Estado: {alt_release['status']}</p>"
+                        if alt_release['packaging']:
+                            alt_text += f"<p>Packaging: {alt_release['packaging']}</p>"
                         
-                        if alt_releases and len(alt_releases) > 0:
-                            alt_header = QLabel("<h3>Versiones alternativas</h3>")
-                            alt_header.setTextFormat(Qt.TextFormat.RichText)
-                            release_group.layout().addWidget(alt_header)
-                            
-                            for alt_release in alt_releases:
-                                alt_text = f"<p><b>{alt_release['title']}</b> ({alt_release['country'] or 'Unknown'}, {alt_release['releasedate'] or 'Unknown'})</p>"
-                                if alt_release['status']:
-                                    alt_text += f"<p>Estado: {alt_release['status']}</p>"
-                                if alt_release['packaging']:
-                                    alt_text += f"<p>Packaging: {alt_release['packaging']}</p>"
-                                
-                                alt_label = QLabel(alt_text)
-                                alt_label.setWordWrap(True)
-                                alt_label.setTextFormat(Qt.TextFormat.RichText)
-                                release_group.layout().addWidget(alt_label)
-                    else:
-                        label = QLabel("No hay información de release disponible para este álbum")
-                        release_layout = release_group.layout() or QVBoxLayout(release_group)
-                        release_layout.addWidget(label)
-                except Exception as e:
-                    print(f"Error obteniendo información de release: {e}")
-                finally:
-                    conn.close()
+                        alt_label = QLabel(alt_text)
+                        alt_label.setWordWrap(True)
+                        alt_label.setTextFormat(Qt.TextFormat.RichText)
+                        release_group.layout().addWidget(alt_label)
+            else:
+                label = QLabel("No hay información de release disponible para este álbum")
+                release_layout = release_group.layout() or QVBoxLayout(release_group)
+                release_layout.addWidget(label)
         
         # 3. Actualizar información de sello
         if label_group:
-            conn = self.db_manager._get_connection()
-            if conn:
-                try:
-                    cursor = conn.cursor()
-                    # Consultar información de sello para este álbum
-                    cursor.execute("""
-                        SELECT l.name as label_name, l.type, l.country, l.begin_date, l.end_date,
-                            lr.catalog_number, lr.release_status, lr.release_id
-                        FROM label_release_relationships lr
-                        JOIN labels l ON lr.label_id = l.id
-                        WHERE lr.release_id = ?
-                    """, (album_id,))
-                    label_info = cursor.fetchone()
+            label_info = details['label']
+            if label_info:
+                self._add_label_info(label_group, label_info)
+                
+                # Añadir información de relaciones del sello
+                relations = details['label_relations']
+                if relations and len(relations) > 0:
+                    rel_header = QLabel("<h3>Relaciones del sello</h3>")
+                    rel_header.setTextFormat(Qt.TextFormat.RichText)
+                    label_group.layout().addWidget(rel_header)
                     
-                    if label_info:
-                        self._add_label_info(label_group, label_info)
-                        
-                        # Añadir información de relaciones del sello
-                        cursor.execute("""
-                            SELECT lr.relationship_type, lr.entity_type, lr.entity_name
-                            FROM label_relationships lr
-                            JOIN label_release_relationships lrr ON lr.label_id = lrr.label_id
-                            WHERE lrr.release_id = ?
-                        """, (album_id,))
-                        relations = cursor.fetchall()
-                        
-                        if relations and len(relations) > 0:
-                            rel_header = QLabel("<h3>Relaciones del sello</h3>")
-                            rel_header.setTextFormat(Qt.TextFormat.RichText)
-                            label_group.layout().addWidget(rel_header)
-                            
-                            for relation in relations:
-                                rel_text = f"<p><b>{relation['relationship_type']}:</b> {relation['entity_name']} ({relation['entity_type']})</p>"
-                                rel_label = QLabel(rel_text)
-                                rel_label.setWordWrap(True)
-                                rel_label.setTextFormat(Qt.TextFormat.RichText)
-                                label_group.layout().addWidget(rel_label)
-                    else:
-                        label = QLabel("No hay información de sello disponible para este álbum")
-                        label_layout = label_group.layout() or QVBoxLayout(label_group)
-                        label_layout.addWidget(label)
-                except Exception as e:
-                    print(f"Error obteniendo información de sello: {e}")
-                finally:
-                    conn.close()
+                    for relation in relations:
+                        rel_text = f"<p><b>{relation['relationship_type']}:</b> {relation['entity_name']} ({relation['entity_type']})</p>"
+                        rel_label = QLabel(rel_text)
+                        rel_label.setWordWrap(True)
+                        rel_label.setTextFormat(Qt.TextFormat.RichText)
+                        label_group.layout().addWidget(rel_label)
+            else:
+                label = QLabel("No hay información de sello disponible para este álbum")
+                label_layout = label_group.layout() or QVBoxLayout(label_group)
+                label_layout.addWidget(label)
 
 
     def _add_release_item(self, layout, release):
@@ -2512,6 +2397,12 @@ class MusicFuzzyModule(BaseModule):
             self._apply_button_configuration(config)
             print("Loaded saved button configuration")
 
+    def closeEvent(self, event):
+        """Cierra las conexiones del pool de la base de datos."""
+        self.detail_loader.close()
+        self.db_manager.close()
+        super().closeEvent(event)
+
 
 # INTEGRACIONES CON OTROS MODULOS
 
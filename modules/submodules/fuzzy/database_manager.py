@@ -1,22 +1,168 @@
 import sqlite3
+import threading
 from pathlib import Path
 
+
+class PooledConnection:
+    """
+    Thread-bound pooled connection.
+    
+    Delegates everything to the underlying sqlite3 connection; close() only
+    hands it back to the pool so the next caller on this thread reuses it
+    with its statement cache and page cache still warm.
+    """
+    
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+    
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+    
+    def close(self):
+        """Return the connection to the pool (it stays open)."""
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+
+class ConnectionPool:
+    """
+    One read-only connection per thread, opened on first use.
+    
+    The database is already in WAL mode (db_musica_path.py sets it), so any
+    number of these readers can run while the importers write.
+    """
+    
+    # Sentencias preparadas que conserva cada conexión (por defecto 128)
+    CACHED_STATEMENTS = 256
+    
+    PRAGMAS = (
+        "PRAGMA cache_size = -32000",      # 32 MB de caché de páginas por conexión
+        "PRAGMA mmap_size = 268435456",    # 256 MB leídos mediante mmap
+        "PRAGMA temp_store = MEMORY",
+    )
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=self.CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def get(self):
+        """Get this thread's connection, opening it if needed."""
+        pooled = getattr(self._local, 'connection', None)
+        if pooled is None:
+            conn = self._connect()
+            pooled = PooledConnection(conn)
+            self._local.connection = pooled
+            with self._lock:
+                self._connections.append(conn)
+        return pooled
+    
+    def close_all(self):
+        """Close every connection opened by the pool."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
 class DatabaseManager:
     """Manages database interactions for the music browser."""
     
+    # Triggers que mantienen cada índice FTS sincronizado (los crea db_musica_path.py)
+    FTS_TRIGGERS = {
+        'songs_fts': 'songs_fts_ai',
+        'artist_fts': 'artist_fts_ai',
+        'album_fts': 'album_fts_ai',
+    }
+    
     def __init__(self, db_path):
         self.db_path = db_path
+        self._fts_available = None
+        self._pool = ConnectionPool(db_path)
     
     def _get_connection(self):
-        """Get a database connection."""
+        """Get this thread's pooled read-only connection (close() keeps it open)."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+            return self._pool.get()
         except sqlite3.Error as e:
             print(f"Database connection error: {e}")
             return None
     
+    def close(self):
+        """Close all pooled connections."""
+        self._pool.close_all()
+    
+    def has_fts(self, fts_table):
+        """Check whether an FTS index exists and is kept in sync by its triggers."""
+        if self._fts_available is None:
+            self._fts_available = {}
+            conn = self._get_connection()
+            if not conn:
+                return False
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+                names = {row['name'] for row in cursor.fetchall()}
+                for table, trigger in self.FTS_TRIGGERS.items():
+                    self._fts_available[table] = table in names and trigger in names
+                print(f"Índices FTS disponibles: {self._fts_available}")
+            except sqlite3.Error as e:
+                print(f"Error checking FTS indexes: {e}")
+            finally:
+                conn.close()
+        return self._fts_available.get(fts_table, False)
+    
+    def build_fts_query(self, query, column=None):
+        """
+        Build an FTS5 MATCH expression with prefix matching for every term.
+        
+        Each term is quoted so user input can't inject FTS operators.
+        Returns None when the query has no searchable terms.
+        """
+        terms = [term.replace('"', '""') for term in query.split()]
+        terms = [term for term in terms if term]
+        if not terms:
+            return None
+        expression = " ".join(f'"{term}"*' for term in terms)
+        if column:
+            return f"{column} : ({expression})"
+        return expression
+    
+    def text_match_clause(self, fts_table, fts_column, id_ref, column_ref, text):
+        """
+        Return a (sql, param) WHERE fragment matching text.
+        
+        Uses the FTS index when available and falls back to LIKE otherwise.
+        """
+        fts_query = self.build_fts_query(text, fts_column) if self.has_fts(fts_table) else None
+        if fts_query:
+            return f"{id_ref} IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?)", fts_query
+        return f"{column_ref} LIKE ?", f"%{text}%"
+    
     def search_artists(self, query, only_local=False):
         """Search artists matching the query."""
         conn = self._get_connection()
@@ -25,6 +171,31 @@ class DatabaseManager:
             
         try:
             cursor = conn.cursor()
+            fts_query = self.build_fts_query(query, 'name') if self.has_fts('artist_fts') else None
+            
+            if fts_query:
+                # Búsqueda en el índice FTS ordenada por relevancia
+                local_filter = """
+                    AND EXISTS (
+                        SELECT 1 FROM albums
+                        WHERE albums.artist_id = artists.id AND albums.origen = 'local'
+                    )
+                """ if only_local else ""
+                sql = f"""
+                    SELECT artists.id, artists.name, artists.formed_year, artists.origin
+                    FROM artist_fts
+                    JOIN artists ON artists.id = artist_fts.rowid
+                    WHERE artist_fts MATCH ? {local_filter}
+                    ORDER BY bm25(artist_fts), artists.name
+                """
+                try:
+                    cursor.execute(sql, (fts_query,))
+                    results = [self._row_to_dict(row) for row in cursor.fetchall()]
+                    print(f"Encontrados {len(results)} artistas (FTS)")
+                    return results
+                except sqlite3.OperationalError as e:
+                    print(f"Error en búsqueda FTS de artistas, usando LIKE: {e}")
+            
             query_pattern = f"%{query}%"
             
             if only_local:
@@ -67,6 +238,28 @@ class DatabaseManager:
             
         try:
             cursor = conn.cursor()
+            fts_query = self.build_fts_query(query, 'name') if self.has_fts('album_fts') else None
+            
+            if fts_query:
+                # Búsqueda en el índice FTS ordenada por relevancia
+                local_filter = "AND albums.origen = 'local'" if only_local else ""
+                sql = f"""
+                    SELECT albums.id, albums.name, albums.year, albums.genre, 
+                        artists.name as artist_name, artists.id as artist_id
+                    FROM album_fts
+                    JOIN albums ON albums.id = album_fts.rowid
+                    JOIN artists ON albums.artist_id = artists.id
+                    WHERE album_fts MATCH ? {local_filter}
+                    ORDER BY bm25(album_fts), albums.name
+                """
+                try:
+                    cursor.execute(sql, (fts_query,))
+                    results = [self._row_to_dict(row) for row in cursor.fetchall()]
+                    print(f"Encontrados {len(results)} álbumes (FTS)")
+                    return results
+                except sqlite3.OperationalError as e:
+                    print(f"Error en búsqueda FTS de álbumes, usando LIKE: {e}")
+            
             query_pattern = f"%{query}%"
             
             if only_local:
@@ -112,6 +305,30 @@ class DatabaseManager:
             
         try:
             cursor = conn.cursor()
+            fts_query = self.build_fts_query(query, 'title') if self.has_fts('songs_fts') else None
+            
+            if fts_query:
+                # Búsqueda en el índice FTS ordenada por relevancia
+                local_filter = "AND s.origen = 'local'" if only_local else ""
+                sql = f"""
+                    SELECT s.id, s.title, s.track_number, s.artist, s.album,
+                        s.genre, s.date, s.album_art_path_denorm,
+                        ar.id as artist_id, al.id as album_id
+                    FROM songs_fts
+                    JOIN songs s ON s.id = songs_fts.rowid
+                    LEFT JOIN artists ar ON s.artist = ar.name
+                    LEFT JOIN albums al ON s.album = al.name AND al.artist_id = ar.id
+                    WHERE songs_fts MATCH ? {local_filter}
+                    ORDER BY bm25(songs_fts), s.title
+                """
+                try:
+                    cursor.execute(sql, (fts_query,))
+                    results = [self._row_to_dict(row) for row in cursor.fetchall()]
+                    print(f"Encontradas {len(results)} canciones (FTS)")
+                    return results
+                except sqlite3.OperationalError as e:
+                    print(f"Error en búsqueda FTS de canciones, usando LIKE: {e}")
+            
             query_pattern = f"%{query}%"
             
             if only_local:
@@ -0,0 +1,258 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Fila base de cada tipo de entidad: si cambia, los paneles cacheados dejan de valer
+BASE_TABLES = {
+    'song': 'songs',
+    'artist': 'artists',
+    'album': 'albums',
+}
+
+SONG_RELEASE_QUERY = """
+    SELECT s.musicbrainz_recordingid, s.musicbrainz_releasegroupid,
+        mr.title as release_title, mr.status, mr.releasedate,
+        mr.country, mr.annotation, mr.packaging
+    FROM songs s
+    LEFT JOIN mb_release_group mr ON s.musicbrainz_releasegroupid = mr.release_group_id
+    WHERE s.id = ?
+"""
+
+SONG_LABEL_QUERY = """
+    SELECT l.name as label_name, lr.relationship_type, l.country, lr.begin_date, lr.end_date, l.founded_year,
+        lr.release_id, lr.catalog_number, lr.release_status, l.wikipedia_url, l.discogs_url, l.bandcamp_url, l.mb_type
+    FROM songs s
+    JOIN albums a ON s.album = a.name
+    LEFT JOIN label_release_relationships lr ON a.id = lr.release_id
+    LEFT JOIN labels l ON lr.label_id = l.id
+    WHERE s.id = ?
+"""
+
+ARTIST_RELEASES_QUERY = """
+    SELECT DISTINCT mr.*
+    FROM mb_release_group mr
+    JOIN albums a ON mr.release_group_id = a.musicbrainz_releasegroupid
+    WHERE a.artist_id = ?
+    ORDER BY mr.releasedate DESC
+    LIMIT 5
+"""
+
+ARTIST_LABELS_QUERY = """
+    SELECT DISTINCT l.name as label_name, l.type, l.country,
+        l.begin_date, l.end_date, COUNT(lr.release_id) as release_count
+    FROM albums a
+    JOIN label_release_relationships lr ON a.id = lr.release_id
+    JOIN labels l ON lr.label_id = l.id
+    WHERE a.artist_id = ?
+    GROUP BY l.id
+    ORDER BY release_count DESC
+"""
+
+ALBUM_AUDIO_STATS_QUERY = """
+    SELECT AVG(bitrate) as avg_bitrate,
+        MIN(bitrate) as min_bitrate,
+        MAX(bitrate) as max_bitrate,
+        AVG(duration) as avg_duration,
+        SUM(duration) as total_duration,
+        AVG(sample_rate) as avg_sample_rate
+    FROM songs
+    WHERE album_id = ?
+"""
+
+ALBUM_RELEASE_QUERY = """
+    SELECT mr.*
+    FROM mb_release_group mr
+    JOIN albums a ON mr.release_group_id = a.musicbrainz_releasegroupid
+    WHERE a.id = ?
+"""
+
+ALBUM_ALT_RELEASES_QUERY = """
+    SELECT mr.*
+    FROM mb_release_group mr
+    WHERE mr.release_group_id = ? AND mr.id != ?
+    ORDER BY mr.releasedate
+"""
+
+ALBUM_LABEL_QUERY = """
+    SELECT l.name as label_name, l.type, l.country, l.begin_date, l.end_date,
+        lr.catalog_number, lr.release_status, lr.release_id
+    FROM label_release_relationships lr
+    JOIN labels l ON lr.label_id = l.id
+    WHERE lr.release_id = ?
+"""
+
+ALBUM_LABEL_RELATIONS_QUERY = """
+    SELECT lr.relationship_type, lr.entity_type, lr.entity_name
+    FROM label_relationships lr
+    JOIN label_release_relationships lrr ON lr.label_id = lrr.label_id
+    WHERE lrr.release_id = ?
+"""
+
+
+class DetailLoader:
+    """
+    Loads and caches the data of the 'más info' panels.
+
+    All panels of an entity (metadata, release, label) are fetched together
+    on the thread's pooled connection and kept in an LRU keyed by
+    (entity type, id). A cached entry is reused as is while the database has
+    not changed (PRAGMA data_version); after a write by the scanner or the
+    editor, the entity's base row is re-read and the entry is reloaded only
+    if that row differs.
+    """
+
+    def __init__(self, db_manager, max_entries=256):
+        self.db_manager = db_manager
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._prefetch_executor = None
+
+    # --- Caché ---
+
+    def get(self, item_type, item_id):
+        """Return the panel data for an entity, loading it if needed (None if missing)."""
+        if item_type not in BASE_TABLES:
+            return None
+
+        conn = self.db_manager._get_connection()
+        if not conn:
+            return None
+
+        key = (item_type, item_id)
+        version = self._data_version(conn)
+        thread_id = threading.get_ident()
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+
+        if entry is not None:
+            if entry['version'] == (thread_id, version):
+                return entry['details']
+            # La base de datos ha cambiado (o la entrada viene de otro hilo):
+            # sólo se recarga si ha cambiado la fila de esta entidad
+            if self._base_row(conn, item_type, item_id) == entry['base_row']:
+                entry['version'] = (thread_id, version)
+                return entry['details']
+
+        return self._load(conn, item_type, item_id, (thread_id, version))
+
+    def invalidate(self, item_type=None, item_id=None):
+        """Drop cached entries: one entity, every entity of a type, or everything."""
+        with self._lock:
+            if item_type is None:
+                self._cache.clear()
+            elif item_id is not None:
+                self._cache.pop((item_type, item_id), None)
+            else:
+                for key in [key for key in self._cache if key[0] == item_type]:
+                    del self._cache[key]
+
+    def prefetch(self, items):
+        """Load (item_type, item_id) pairs in the background if not cached yet."""
+        with self._lock:
+            pending = [key for key in items if key[0] in BASE_TABLES and key not in self._cache]
+            if not pending:
+                return
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        for item_type, item_id in pending:
+            self._prefetch_executor.submit(self._prefetch_one, item_type, item_id)
+
+    def _prefetch_one(self, item_type, item_id):
+        with self._lock:
+            if (item_type, item_id) in self._cache:
+                return
+        try:
+            self.get(item_type, item_id)
+        except Exception as e:
+            print(f"Error precargando detalles de {item_type} {item_id}: {e}")
+
+    def close(self):
+        """Stop the prefetch thread and drop the cache."""
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=False, cancel_futures=True)
+            self._prefetch_executor = None
+        self.invalidate()
+
+    # --- Consultas ---
+
+    @staticmethod
+    def _data_version(conn):
+        try:
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    @staticmethod
+    def _base_row(conn, item_type, item_id):
+        try:
+            row = conn.execute(f"SELECT * FROM {BASE_TABLES[item_type]} WHERE id = ?", (item_id,)).fetchone()
+        except sqlite3.Error:
+            return None
+        return tuple(row) if row is not None else None
+
+    @staticmethod
+    def _fetch(conn, query, params, many, error_label):
+        """Run one panel query; errors affect only that panel."""
+        try:
+            cursor = conn.execute(query, params)
+            return cursor.fetchall() if many else cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"Error obteniendo {error_label}: {e}")
+            return [] if many else None
+
+    def _load(self, conn, item_type, item_id, version):
+        base_row = self._base_row(conn, item_type, item_id)
+
+        if item_type == 'song':
+            item = self.db_manager.get_song_details(item_id)
+            if not item:
+                return None
+            details = {
+                'item': item,
+                'release': self._fetch(conn, SONG_RELEASE_QUERY, (item_id,), False, "información de release"),
+                'label': self._fetch(conn, SONG_LABEL_QUERY, (item_id,), False, "información de sello"),
+            }
+        elif item_type == 'artist':
+            item = self.db_manager.get_artist_details(item_id)
+            if not item:
+                return None
+            details = {
+                'item': item,
+                'releases': self._fetch(conn, ARTIST_RELEASES_QUERY, (item_id,), True, "información de releases"),
+                'labels': self._fetch(conn, ARTIST_LABELS_QUERY, (item_id,), True, "información de sellos"),
+            }
+        else:
+            item = self.db_manager.get_album_details(item_id)
+            if not item:
+                return None
+            release = self._fetch(conn, ALBUM_RELEASE_QUERY, (item_id,), False, "información de release")
+            label = self._fetch(conn, ALBUM_LABEL_QUERY, (item_id,), False, "información de sello")
+            details = {
+                'item': item,
+                'audio_stats': self._fetch(conn, ALBUM_AUDIO_STATS_QUERY, (item_id,), False,
+                                           "estadísticas de audio"),
+                'release': release,
+                'alt_releases': self._fetch(conn, ALBUM_ALT_RELEASES_QUERY,
+                                            (release['release_group_id'], release['id']), True,
+                                            "información de release") if release else [],
+                'label': label,
+                'label_relations': self._fetch(conn, ALBUM_LABEL_RELATIONS_QUERY, (item_id,), True,
+                                               "información de sello") if label else [],
+            }
+
+        with self._lock:
+            self._cache[(item_type, item_id)] = {
+                'version': version,
+                'base_row': base_row,
+                'details': details,
+            }
+            self._cache.move_to_end((item_type, item_id))
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return details
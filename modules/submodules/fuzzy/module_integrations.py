@@ -18,6 +18,20 @@ class ModuleIntegrator:
         self.parent = parent
         self.setup_buttons()
     
+    def _load_children(self, item):
+        """
+        Create the children of a result node that has not been expanded yet
+
+        Album and song nodes are only created when a node is expanded, so any
+        walk over childCount() must load them first.
+
+        Args:
+            item: The QTreeWidgetItem whose children are about to be read
+        """
+        search_handler = getattr(self.parent, 'search_handler', None)
+        if search_handler is not None:
+            search_handler.load_children(item)
+
     def setup_buttons(self):
         """Connect integration buttons to their handlers"""
         # Find and connect the conciertos_button
@@ -226,6 +240,7 @@ class ModuleIntegrator:
                 self._add_album_with_spotify_url(album_id, item_data, result, cursor)
                 
                 # Process child songs from the tree view
+                self._load_children(item)
                 for i in range(item.childCount()):
                     child_item = item.child(i)
                     self._process_item_for_spotify_urls(child_item, result, cursor, processed_song_ids)
@@ -243,6 +258,7 @@ class ModuleIntegrator:
                 self._add_artist_with_spotify_url(artist_id, item_data, result, cursor)
                 
                 # Process all child albums and their songs from the tree view
+                self._load_children(item)
                 for i in range(item.childCount()):
                     album_item = item.child(i)
                     self._process_item_for_spotify_urls(album_item, result, cursor, processed_song_ids)
@@ -571,6 +587,7 @@ class ModuleIntegrator:
         # For albums and artists, process all children
         elif item_type == 'album' or item_type == 'artist':
             # Process all children
+            self._load_children(item)
             for i in range(item.childCount()):
                 child_item = item.child(i)
                 if self._collect_songs_recursive(child_item, songs_list, processed_song_ids):
@@ -622,6 +639,7 @@ class ModuleIntegrator:
                                                 print(f"Added song: {song.get('title')} - {song.get('file_path')}")
             
             # Process all child albums in the tree
+            self._load_children(item)
             for i in range(item.childCount()):
                 album_item = item.child(i)
                 self._process_item_for_local_songs(album_item, result, processed_song_ids)
@@ -645,6 +663,7 @@ class ModuleIntegrator:
                                     print(f"Added song: {song.get('title')} - {song.get('file_path')}")
             
             # Process all child songs in the tree
+            self._load_children(item)
             for i in range(item.childCount()):
                 song_item = item.child(i)
                 self._process_item_for_local_songs(song_item, result, processed_song_ids)
@@ -685,6 +704,7 @@ class ModuleIntegrator:
             parent_item: The parent QTreeWidgetItem
             songs_list: List to add songs to
         """
+        self._load_children(parent_item)
         for i in range(parent_item.childCount()):
             child_item = parent_item.child(i)
             child_data = child_item.data(0, Qt.ItemDataRole.UserRole)
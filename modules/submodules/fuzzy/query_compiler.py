@@ -0,0 +1,411 @@
+"""Parser y compilador del lenguaje de filtros del buscador musical.
+
+Sintaxis:
+    texto           busca en artista, álbum y título
+    a: d: g: s: t:  artista, disco, género, sello, título
+    y:              año ("1999") o rango ("1990-1999")
+    rs: rm: ra:     añadidos en las últimas N semanas, meses o años
+    x + y           unión (OR)
+    x & y           intersección (AND), con menor precedencia que '+'
+
+La consulta se convierte en un árbol (TextTerm, FilterTerm, AndNode, OrNode)
+y se compila a una única condición SQL parametrizada sobre los alias
+artists ar / albums al / songs s. Cuando todos los resultados posibles salen
+de algún índice FTS, el plan incluye además los conjuntos de candidatos
+(tabla fts, expresión MATCH) para que la consulta parta de ellos en lugar de
+recorrer todos los artistas. Los planes compilados se guardan en una caché
+LRU indexada por la forma normalizada del árbol.
+"""
+
+import datetime
+import re
+from collections import OrderedDict
+
+
+FILTER_PREFIXES = {
+    "a:": "artist",
+    "d:": "album",
+    "g:": "genre",
+    "y:": "year",
+    "s:": "label",
+    "rs:": "recent_weeks",
+    "rm:": "recent_months",
+    "ra:": "recent_years",
+    "t:": "title",
+}
+
+# Filtros que aceptan valores cortos y se ejecutan sin esperar al temporizador
+NUMERIC_FILTERS = {"year", "recent_weeks", "recent_months", "recent_years"}
+
+# filtro -> (tabla fts, columna fts, id de la fila, columna para LIKE)
+TEXT_FILTERS = {
+    "artist": ("artist_fts", "name", "ar.id", "ar.name"),
+    "album": ("album_fts", "name", "al.id", "al.name"),
+    "genre": ("album_fts", "genre", "al.id", "al.genre"),
+    "label": ("album_fts", "label", "al.id", "al.label"),
+    "title": ("songs_fts", "title", "s.id", "s.title"),
+}
+
+# Campos en los que se busca el texto libre
+FREE_TEXT_FIELDS = ("artist", "album", "title")
+
+RECENT_DAYS = {"recent_weeks": 7, "recent_months": 30, "recent_years": 365}
+
+# Pares (artista, álbum) que aporta cada índice FTS; album_id NULL en los de
+# artist_fts significa "cualquier álbum del artista"
+CANDIDATE_SELECTS = {
+    "artist_fts": """
+        SELECT artist_fts.rowid, NULL, bm25(artist_fts)
+        FROM artist_fts WHERE artist_fts MATCH ?""",
+    "album_fts": """
+        SELECT al.artist_id, al.id, bm25(album_fts)
+        FROM album_fts JOIN albums al ON al.id = album_fts.rowid
+        WHERE album_fts MATCH ?""",
+    "songs_fts": """
+        SELECT ar.id, al.id, bm25(songs_fts)
+        FROM songs_fts
+        JOIN songs s ON s.id = songs_fts.rowid
+        JOIN artists ar ON ar.name = s.artist
+        JOIN albums al ON al.artist_id = ar.id AND al.name = s.album
+        WHERE songs_fts MATCH ?""",
+}
+
+OPERATORS = ("+", "&")
+
+# Un prefijo sólo cuenta al principio o tras un espacio; los largos primero
+# para que "rs:" no se lea como "s:"
+_PREFIX_RE = re.compile(
+    r"(?:^|(?<=\s))("
+    + "|".join(re.escape(p) for p in sorted(FILTER_PREFIXES, key=len, reverse=True))
+    + ")"
+)
+
+
+def _normalize_text(text):
+    return " ".join(text.split()).casefold()
+
+
+class TextTerm:
+    """Texto libre."""
+
+    def __init__(self, text):
+        self.text = text.strip()
+
+    def key(self):
+        return f"text:{_normalize_text(self.text)}"
+
+
+class FilterTerm:
+    """Filtro con prefijo, p. ej. g:rock."""
+
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value.strip()
+
+    def key(self):
+        return f"{self.field}:{_normalize_text(self.value)}"
+
+
+class AndNode:
+    def __init__(self, children):
+        self.children = children
+
+    def key(self):
+        return "and(" + ",".join(sorted({c.key() for c in self.children})) + ")"
+
+
+class OrNode:
+    def __init__(self, children):
+        self.children = children
+
+    def key(self):
+        return "or(" + ",".join(sorted({c.key() for c in self.children})) + ")"
+
+
+def _combine(node_class, children):
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    return node_class(children)
+
+
+def _parse_term(term):
+    """Un término sin operadores: texto libre o uno o varios filtros."""
+    matches = list(_PREFIX_RE.finditer(term))
+    if not matches:
+        return TextTerm(term) if term.strip() else None
+
+    filters = []
+    for i, match in enumerate(matches):
+        value_end = matches[i + 1].start() if i + 1 < len(matches) else len(term)
+        value = term[match.end():value_end].strip()
+        if value:
+            filters.append(FilterTerm(FILTER_PREFIXES[match.group(1)], value))
+    return _combine(AndNode, filters)
+
+
+def parse_query(query):
+    """Convierte la consulta en un árbol. Devuelve None si no hay términos."""
+    and_parts = []
+    for and_part in query.split("&"):
+        or_parts = [node for node in (_parse_term(t) for t in and_part.split("+")) if node]
+        node = _combine(OrNode, or_parts)
+        if node:
+            and_parts.append(node)
+    return _combine(AndNode, and_parts)
+
+
+def has_filters(query):
+    """Indica si la consulta usa algún filtro con prefijo."""
+    return _PREFIX_RE.search(query) is not None
+
+
+def query_readiness(query):
+    """Decide si merece la pena lanzar la búsqueda mientras se escribe.
+
+    Returns:
+        tuple: (lista, inmediata). 'inmediata' indica que el último filtro es
+        numérico y la búsqueda no necesita esperar al temporizador.
+    """
+    filter_matches = list(_PREFIX_RE.finditer(query))
+    if not filter_matches:
+        return len(query) >= 3, False
+
+    last_filter = filter_matches[-1]
+    last_field = FILTER_PREFIXES[last_filter.group(1)]
+    last_operator_pos = max(query.rfind(op) for op in OPERATORS)
+
+    if last_operator_pos > last_filter.start():
+        text_after_operator = query[last_operator_pos + 1:].strip()
+        if len(text_after_operator) < 3:
+            return False, False
+        if ":" in text_after_operator and len(text_after_operator.split(":")[-1]) < 2:
+            return False, False
+    else:
+        text_after_filter = query[last_filter.end():].strip()
+        if not text_after_filter:
+            return False, False
+        if len(text_after_filter) < 3 and last_field not in NUMERIC_FILTERS:
+            return False, False
+
+    return True, last_field in NUMERIC_FILTERS
+
+
+def parse_year_range(value):
+    """'1999' -> (1999, 1999); '1990-1999' -> (1990, 1999); None si no es válido."""
+    parts = value.split("-")
+    try:
+        if len(parts) == 1:
+            year = int(parts[0].strip())
+            return year, year
+        if len(parts) == 2:
+            return tuple(sorted((int(parts[0].strip()), int(parts[1].strip()))))
+    except ValueError:
+        pass
+    return None
+
+
+class RecentCutoff:
+    """Parámetro diferido: la fecha límite se calcula al ejecutar, no al compilar."""
+
+    def __init__(self, days):
+        self.days = days
+
+    def resolve(self):
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.days)
+        return cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class CompiledQuery:
+    """Condición SQL compilada y reutilizable.
+
+    'candidates' es None si algún resultado puede no venir de un índice FTS;
+    si no, la lista de (tabla fts, expresión MATCH) cuya unión contiene todos
+    los resultados.
+    """
+
+    def __init__(self, where, params, group_by_label=False, candidates=None):
+        self.where = where
+        self.params = tuple(params)
+        self.group_by_label = group_by_label
+        self.candidates = candidates
+
+    def bind(self):
+        """Parámetros listos para ejecutar (resuelve los diferidos)."""
+        return [p.resolve() if isinstance(p, RecentCutoff) else p for p in self.params]
+
+    def candidates_cte(self):
+        """CTE 'candidates(artist_id, album_id, rank)' con los pares artista/álbum
+        que salen de los índices FTS, uno por par y con su mejor bm25.
+
+        Returns:
+            tuple: (sql, params) o None si la consulta no tiene candidatos.
+        """
+        if not self.candidates:
+            return None
+        selects = [CANDIDATE_SELECTS[fts_table] for fts_table, _ in self.candidates]
+        params = [fts_query for _, fts_query in self.candidates]
+        # MATERIALIZED: si SQLite aplana la CTE, bm25() queda fuera de la
+        # consulta MATCH y falla
+        sql = f"""
+            matches(artist_id, album_id, rank) AS MATERIALIZED ({" UNION ALL ".join(selects)}
+            ),
+            candidates AS (
+                SELECT m.artist_id, al.id AS album_id, MIN(m.rank) AS rank
+                FROM matches m
+                LEFT JOIN albums al ON al.artist_id = m.artist_id
+                    AND (m.album_id IS NULL OR al.id = m.album_id)
+                GROUP BY m.artist_id, al.id
+            )"""
+        return sql, params
+
+
+class QueryCompiler:
+    """Compila consultas del buscador a condiciones SQL con caché de planes."""
+
+    def __init__(self, db_manager, cache_size=128):
+        self.db_manager = db_manager
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, query, only_local=False):
+        """Compila una consulta completa. Devuelve CompiledQuery o None."""
+        return self.compile_node(parse_query(query), only_local)
+
+    def compile_filter(self, field, value, only_local=False):
+        """Compila un único filtro (usado por los botones de año y tiempo)."""
+        return self.compile_node(FilterTerm(field, str(value)), only_local)
+
+    def compile_node(self, node, only_local=False):
+        if node is None:
+            return None
+
+        cache_key = (node.key(), bool(only_local))
+        if cache_key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(cache_key)
+            return self._cache[cache_key]
+
+        self.misses += 1
+        compiled = self._compile_root(node, only_local)
+        self._cache[cache_key] = compiled
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return compiled
+
+    def clear_cache(self):
+        """Vacía la caché (p. ej. si cambian los índices FTS disponibles)."""
+        self._cache.clear()
+
+    def _compile_root(self, node, only_local):
+        compiled = self._compile(node)
+        if compiled is None:
+            return None
+
+        where, params = compiled
+        if only_local:
+            where = f"({where}) AND s.origen = 'local'"
+        return CompiledQuery(where, params, self._is_label_only(node), self._candidates(node))
+
+    def _fts_candidate(self, field, text):
+        fts_table, fts_column = TEXT_FILTERS[field][:2]
+        if not self.db_manager.has_fts(fts_table):
+            return None
+        fts_query = self.db_manager.build_fts_query(text, fts_column)
+        return (fts_table, fts_query) if fts_query else None
+
+    def _candidates(self, node):
+        """Lista de (tabla fts, expresión MATCH) que cubre todos los resultados
+        del nodo, o None si alguno puede salir de un filtro sin índice FTS."""
+        if isinstance(node, AndNode):
+            # Basta con los candidatos de un hijo: el resto se comprueba en el WHERE
+            for child in node.children:
+                candidates = self._candidates(child)
+                if candidates:
+                    return candidates
+            return None
+
+        if isinstance(node, OrNode):
+            candidates = []
+            for child in node.children:
+                child_candidates = self._candidates(child)
+                if not child_candidates:
+                    return None
+                candidates.extend(c for c in child_candidates if c not in candidates)
+            return candidates
+
+        fields = FREE_TEXT_FIELDS if isinstance(node, TextTerm) else (node.field,)
+        text = node.text if isinstance(node, TextTerm) else node.value
+        candidates = []
+        for field in fields:
+            if field not in TEXT_FILTERS:
+                return None
+            candidate = self._fts_candidate(field, text)
+            if candidate is None:
+                return None
+            candidates.append(candidate)
+        return candidates
+
+    def _compile(self, node):
+        """Devuelve (sql, params) para un nodo o None si no genera condición."""
+        if isinstance(node, (AndNode, OrNode)):
+            joiner = " AND " if isinstance(node, AndNode) else " OR "
+            clauses = []
+            params = []
+            for child in node.children:
+                compiled = self._compile(child)
+                if compiled is None:
+                    continue
+                clauses.append(compiled[0])
+                params.extend(compiled[1])
+            if not clauses:
+                return None
+            return "(" + joiner.join(clauses) + ")", params
+
+        if isinstance(node, TextTerm):
+            clauses = []
+            params = []
+            for field in FREE_TEXT_FIELDS:
+                clause, param = self.db_manager.text_match_clause(*TEXT_FILTERS[field], node.text)
+                clauses.append(clause)
+                params.append(param)
+            return "(" + " OR ".join(clauses) + ")", params
+
+        return self._compile_filter(node)
+
+    def _compile_filter(self, node):
+        if node.field in TEXT_FILTERS:
+            clause, param = self.db_manager.text_match_clause(*TEXT_FILTERS[node.field], node.value)
+            return clause, [param]
+
+        if node.field == "year":
+            year_range = parse_year_range(node.value)
+            if year_range is None:
+                print(f"Formato de año inválido: {node.value}")
+                return None
+            min_year, max_year = year_range
+            if min_year == max_year:
+                # El año puede estar guardado como "1999" o como fecha "1999-05-01"
+                return ("(al.year = ? OR (al.year >= ? AND al.year < ?))",
+                        [str(min_year), f"{min_year}-", f"{min_year}."])
+            return ("(CAST(substr(al.year, 1, 4) AS INTEGER) BETWEEN ? AND ?)",
+                    [min_year, max_year])
+
+        if node.field in RECENT_DAYS:
+            try:
+                amount = int(node.value)
+            except ValueError:
+                print(f"Valor de tiempo inválido: {node.value}")
+                return None
+            return "s.added_timestamp >= ?", [RecentCutoff(amount * RECENT_DAYS[node.field])]
+
+        return None
+
+    def _is_label_only(self, node):
+        """True si todos los términos son filtros de sello (agrupar por sello)."""
+        if isinstance(node, (AndNode, OrNode)):
+            return all(self._is_label_only(child) for child in node.children)
+        return isinstance(node, FilterTerm) and node.field == "label"
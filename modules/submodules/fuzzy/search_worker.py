@@ -0,0 +1,75 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from pathlib import Path
+import sqlite3
+
+
+class SearchWorker(QThread):
+    """Ejecuta una consulta de búsqueda fuera del hilo de la interfaz.
+
+    Cada worker abre su propia conexión de solo lectura y envía las filas en
+    bloques. Todas las señales llevan el número de generación de la búsqueda
+    para que el receptor pueda descartar resultados de búsquedas ya superadas.
+    """
+
+    results_ready = pyqtSignal(int, list)   # generación, bloque de filas (dicts)
+    search_finished = pyqtSignal(int, int)  # generación, total de filas
+    search_error = pyqtSignal(int, str)     # generación, mensaje
+
+    def __init__(self, db_path, generation, sql, params=(), chunk_size=200):
+        super().__init__()
+        self.db_path = db_path
+        self.generation = generation
+        self.sql = sql
+        self.params = tuple(params)
+        self.chunk_size = chunk_size
+        self._conn = None
+        self._cancelled = False
+
+    def cancel(self):
+        """Cancela la búsqueda; interrumpe la consulta si aún está en SQLite."""
+        self._cancelled = True
+        conn = self._conn
+        if conn is not None:
+            try:
+                # interrupt() es seguro desde otro hilo
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                # La conexión ya se cerró
+                pass
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def _connect(self):
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def run(self):
+        total = 0
+        try:
+            self._conn = self._connect()
+            if self._cancelled:
+                return
+
+            cursor = self._conn.execute(self.sql, self.params)
+            while not self._cancelled:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                chunk = [dict(row) for row in rows]
+                total += len(chunk)
+                self.results_ready.emit(self.generation, chunk)
+
+            if not self._cancelled:
+                self.search_finished.emit(self.generation, total)
+        except sqlite3.Error as e:
+            # Una consulta interrumpida lanza OperationalError("interrupted")
+            if not self._cancelled:
+                self.search_error.emit(self.generation, str(e))
+        finally:
+            conn = self._conn
+            self._conn = None
+            if conn is not None:
+                conn.close()
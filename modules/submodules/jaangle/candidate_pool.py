@@ -0,0 +1,157 @@
+# candidate_pool.py - Pool de canciones candidatas para el quiz de Jaangle
+import os
+import random
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QuizCandidatePool:
+    """Ids de canciones elegibles para el quiz, materializados una vez por filtro.
+
+    Al construir el pool se ejecuta la consulta filtrada una sola vez y se
+    baraja la lista de ids. Cada extracción avanza por esa lista, así que no
+    hay repeticiones hasta agotar la ronda; al agotarla se vuelve a barajar.
+
+    Si las canciones son locales, un hilo en segundo plano comprueba por lotes
+    que los ficheros existen. Las extracciones saltan los ids marcados como no
+    válidos y comprueban al vuelo los que el hilo todavía no ha revisado.
+    """
+
+    VALIDATION_BATCH = 500
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.signature = None
+        self._ids = []
+        self._paths = {}
+        self._position = 0
+        self._check_files = False
+        self._validated = set()
+        self._invalid = set()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._validator = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids) - len(self._invalid)
+
+    def invalidate(self):
+        """Fuerza a reconstruir el pool en la próxima extracción."""
+        with self._lock:
+            self.signature = None
+            self._generation += 1
+
+    def ensure(self, signature, query, params, check_files=False):
+        """Reconstruye el pool si la combinación de filtros ha cambiado.
+
+        Args:
+            signature: Valor hashable que identifica los filtros activos
+            query (str): Consulta que devuelve (id, file_path) de las canciones elegibles
+            params (list): Parámetros de la consulta
+            check_files (bool): Comprobar que los ficheros existen en disco
+
+        Returns:
+            int: Número de candidatas en el pool
+        """
+        if signature == self.signature:
+            return len(self)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+        ids = [row[0] for row in rows]
+        random.shuffle(ids)
+
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self.signature = signature
+            self._ids = ids
+            self._paths = {row[0]: row[1] for row in rows} if check_files else {}
+            self._position = 0
+            self._check_files = check_files
+            self._validated = set()
+            self._invalid = set()
+
+        logger.info(f"Pool del quiz reconstruido con {len(ids)} canciones candidatas")
+
+        if check_files and ids:
+            self._validator = threading.Thread(
+                target=self._validate_files, args=(generation, list(ids)), daemon=True
+            )
+            self._validator.start()
+
+        return len(ids)
+
+    def draw(self, count):
+        """Devuelve hasta 'count' ids distintos sin repetir los ya servidos."""
+        drawn = []
+        with self._lock:
+            total = len(self._ids)
+            if total == 0:
+                return drawn
+
+            # Como mucho una vuelta completa más el resto de la ronda actual
+            for _ in range(2 * total):
+                if len(drawn) >= count:
+                    break
+
+                if self._position >= total:
+                    # Ronda agotada: barajar de nuevo para el resto de la sesión
+                    random.shuffle(self._ids)
+                    self._position = 0
+
+                song_id = self._ids[self._position]
+                self._position += 1
+
+                if song_id in drawn or song_id in self._invalid:
+                    continue
+                if self._check_files and song_id not in self._validated:
+                    self._validated.add(song_id)
+                    if not self._is_playable(self._paths.get(song_id)):
+                        self._invalid.add(song_id)
+                        continue
+                drawn.append(song_id)
+
+        return drawn
+
+    def discard(self, song_id):
+        """Marca un id como no reproducible (p. ej. si falla al cargarlo)."""
+        with self._lock:
+            self._invalid.add(song_id)
+
+    def _is_playable(self, file_path):
+        return bool(file_path) and os.path.exists(file_path)
+
+    def _validate_files(self, generation, ids):
+        """Comprueba en segundo plano, por lotes, que los ficheros existen."""
+        invalid_count = 0
+        for start in range(0, len(ids), self.VALIDATION_BATCH):
+            batch = ids[start:start + self.VALIDATION_BATCH]
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+                pending = [(song_id, self._paths.get(song_id))
+                           for song_id in batch if song_id not in self._validated]
+
+            # Las comprobaciones de disco se hacen sin el lock
+            results = [(song_id, self._is_playable(path)) for song_id, path in pending]
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+                for song_id, playable in results:
+                    self._validated.add(song_id)
+                    if not playable:
+                        self._invalid.add(song_id)
+                        invalid_count += 1
+
+        logger.info(f"Validación del pool completada: {invalid_count} ficheros no encontrados")
@@ -646,12 +646,13 @@ class ListenBrainzPlayer(QObject):
     
    
     
-    def play(self, song_id):
+    def play(self, song_id, preview_url=None):
         """
         Reproduce una canción usando ListenBrainz/MusicBrainz.
         
         Args:
             song_id: ID de la canción en la base de datos
+            preview_url: URL ya resuelta (p. ej. por el prefetch del quiz); si es None se busca
             
         Returns:
             True si se pudo iniciar la reproducción, False en caso contrario
@@ -671,8 +672,9 @@ class ListenBrainzPlayer(QObject):
                     self.progress_bar.setValue(10)
                 self.container.show()
             
-            # Obtener la URL de previsualización
-            preview_url = self.get_listenbrainz_preview_url(song_id)
+            # Obtener la URL de previsualización si no viene ya resuelta
+            if not preview_url:
+                preview_url = self.get_listenbrainz_preview_url(song_id)
             if not preview_url:
                 if self.message_label:
                     self.message_label.setText("Error: No se encontró URL de previsualización")
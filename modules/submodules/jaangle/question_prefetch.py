@@ -0,0 +1,188 @@
+# question_prefetch.py - Preparación anticipada de las próximas preguntas de Jaangle
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage
+from collections import deque
+import os
+import random
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columnas de cada opción del quiz (mismo orden que espera show_next_question)
+QUIZ_SONG_QUERY = """
+    SELECT s.id, s.title, s.artist, s.album, s.file_path, s.duration,
+        a.album_art_path, s.track_number, s.album_art_path_denorm, s.origen
+    FROM songs s
+    LEFT JOIN albums a ON s.album = a.name AND s.artist = (
+        SELECT name FROM artists WHERE id = a.artist_id
+    )
+    WHERE s.id IN ({placeholders})
+    GROUP BY s.id
+"""
+
+
+def fetch_quiz_songs(cursor, song_ids):
+    """Carga las filas de las canciones indicadas manteniendo el orden de song_ids."""
+    if not song_ids:
+        return []
+    placeholders = ", ".join(["?" for _ in song_ids])
+    cursor.execute(QUIZ_SONG_QUERY.format(placeholders=placeholders), list(song_ids))
+    rows_by_id = {row[0]: tuple(row) for row in cursor.fetchall()}
+    return [rows_by_id[song_id] for song_id in song_ids if song_id in rows_by_id]
+
+
+def get_song_playable_urls(cursor, song_id):
+    """URLs reproducibles de una canción desde song_links, en orden de preferencia
+    (YouTube, Bandcamp, SoundCloud, Spotify)."""
+    if not song_id:
+        return []
+    cursor.execute("""
+        SELECT youtube_url, bandcamp_url, soundcloud_url, spotify_url
+        FROM song_links
+        WHERE song_id = ?
+    """, (song_id,))
+    row = cursor.fetchone()
+    if not row:
+        return []
+    return [url for url in row if url]
+
+
+class QuestionPrefetcher:
+    """Prepara en segundo plano las próximas N preguntas del quiz.
+
+    Cada pregunta preparada contiene las opciones ya elegidas del pool de
+    candidatas, la opción correcta, las portadas decodificadas y escaladas
+    (QImage, que se puede crear fuera del hilo de la interfaz), el fichero
+    local ya leído una vez para que esté en la caché del sistema y, para el
+    modo online, la URL de previsualización resuelta.
+    """
+
+    COVER_SIZE = 80
+    WARMUP_BYTES = 256 * 1024
+
+    def __init__(self, db_path, candidate_pool, depth=3):
+        self.db_path = db_path
+        self.candidate_pool = candidate_pool
+        self.depth = depth
+        self.options_count = 4
+        self.music_origin = 'local'
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._worker = None
+
+    def configure(self, options_count, music_origin):
+        """Actualiza los parámetros; descarta lo preparado si han cambiado."""
+        if options_count != self.options_count or music_origin != self.music_origin:
+            self.options_count = options_count
+            self.music_origin = music_origin
+            self.clear()
+
+    def clear(self):
+        """Descarta las preguntas preparadas y detiene el hilo en curso."""
+        with self._lock:
+            self._generation += 1
+            self._queue.clear()
+
+    def pop(self):
+        """Devuelve la siguiente pregunta preparada o None.
+
+        Se descartan las preguntas preparadas con un pool anterior (filtros
+        distintos a los actuales).
+        """
+        with self._lock:
+            while self._queue:
+                question = self._queue.popleft()
+                if question['signature'] == self.candidate_pool.signature:
+                    return question
+        return None
+
+    def fill(self):
+        """Lanza el hilo de preparación si faltan preguntas en la cola."""
+        with self._lock:
+            if len(self._queue) >= self.depth:
+                return
+            if self._worker is not None and self._worker.is_alive():
+                return
+            generation = self._generation
+            self._worker = threading.Thread(target=self._fill_queue, args=(generation,), daemon=True)
+            self._worker.start()
+
+    def _fill_queue(self, generation):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            failures = 0
+            while failures < 3:
+                with self._lock:
+                    if generation != self._generation or len(self._queue) >= self.depth:
+                        return
+
+                question = self.prepare_question(cursor)
+                if question is None:
+                    failures += 1
+                    continue
+
+                with self._lock:
+                    if generation != self._generation:
+                        return
+                    self._queue.append(question)
+        except Exception as e:
+            logger.error(f"Error preparando preguntas del quiz: {e}")
+        finally:
+            conn.close()
+
+    def prepare_question(self, cursor):
+        """Prepara una pregunta completa. Devuelve un dict o None si no hay canciones."""
+        signature = self.candidate_pool.signature
+        song_ids = self.candidate_pool.draw(self.options_count)
+        if len(song_ids) < self.options_count:
+            return None
+
+        songs = fetch_quiz_songs(cursor, song_ids)
+        if len(songs) < self.options_count:
+            return None
+
+        correct_index = random.randint(0, self.options_count - 1)
+        correct_song = songs[correct_index]
+
+        if self.music_origin == 'local' and not self._warm_up_file(correct_song[4]):
+            self.candidate_pool.discard(correct_song[0])
+            return None
+
+        preview_url = None
+        if self.music_origin == 'online':
+            # La misma resolución que usa el módulo al reproducir
+            urls = get_song_playable_urls(cursor, correct_song[0])
+            preview_url = urls[0] if urls else None
+
+        return {
+            'signature': signature,
+            'songs': songs,
+            'correct_index': correct_index,
+            'covers': [self._load_cover(song) for song in songs],
+            'preview_url': preview_url,
+        }
+
+    def _load_cover(self, song):
+        """Decodifica y escala la portada de una opción (None si no hay)."""
+        cover_path = song[8] or song[6]
+        if not cover_path or not os.path.exists(cover_path):
+            return None
+        image = QImage(cover_path)
+        if image.isNull():
+            return None
+        return image.scaled(self.COVER_SIZE, self.COVER_SIZE, Qt.AspectRatioMode.KeepAspectRatio)
+
+    def _warm_up_file(self, file_path):
+        """Lee el principio del fichero para que la reproducción arranque al momento."""
+        if not file_path:
+            return False
+        try:
+            with open(file_path, 'rb') as f:
+                f.read(self.WARMUP_BYTES)
+            return True
+        except OSError:
+            return False
@@ -1,14 +1,66 @@
 # submodules/muspy/cache_manager.py
 import os
-import json
-import time
+import glob
 from pathlib import Path
 import logging
 
+from tools.api_cache import get_api_cache, import_legacy_json
+
+# Las entradas se conservan una semana; la validez real la decide expiry_hours
+# al leer, y la caché compartida descarta las menos usadas si crece demasiado
+STORED_TTL = 7 * 24 * 3600
+
 class CacheManager:
+    LASTFM_NAMESPACE = "muspy"
+    SPOTIFY_NAMESPACE = "muspy_spotify"
+    
     def __init__(self, project_root):
         self.project_root = project_root
         self.logger = logging.getLogger(__name__)
+        self.cache = get_api_cache(Path(project_root, ".content", "cache", "api_cache.sqlite"))
+        self._import_legacy_files()
+    
+    def _import_legacy_files(self):
+        """Pasa a la caché compartida los ficheros *_cache.json de versiones anteriores"""
+        legacy_dirs = (
+            (self.LASTFM_NAMESPACE, Path(self.project_root, ".content", "cache", "muspy_module")),
+            (self.SPOTIFY_NAMESPACE, Path(self.project_root, ".content", "cache", "muspy", "spotify")),
+        )
+        for namespace, cache_dir in legacy_dirs:
+            for cache_file in glob.glob(str(Path(cache_dir, "*_cache.json"))):
+                key = os.path.basename(cache_file)[:-len("_cache.json")]
+                import_legacy_json(
+                    self.cache, namespace, cache_file,
+                    lambda cache_data, key=key: [(key, cache_data.get("data"), cache_data.get("timestamp"))],
+                    ttl=STORED_TTL
+                )
+    
+    def _cached(self, namespace, key, label, data, force_refresh, expiry_hours):
+        """Guarda data si se indica; si no, devuelve la entrada válida o None"""
+        if data is not None:
+            try:
+                self.cache.set(namespace, key, data, ttl=max(STORED_TTL, expiry_hours * 3600))
+                self.logger.debug(f"Cached {label} data successfully")
+                return True
+            except Exception as e:
+                self.logger.error(f"Error caching {label} data: {e}")
+                return False
+        
+        # If force refresh, don't use cache
+        if force_refresh:
+            return None
+        
+        try:
+            cached = self.cache.get(namespace, key, max_age=expiry_hours * 3600)
+        except Exception as e:
+            self.logger.error(f"Error loading {label} cache: {e}")
+            return None
+        
+        if cached is None:
+            self.logger.debug(f"{label} cache missing or expired")
+        else:
+            self.logger.debug(f"Using cached {label} data")
+        return cached
         
     def cache_manager(self, cache_type, data=None, force_refresh=False, expiry_hours=24):
         """
@@ -23,58 +75,8 @@ class CacheManager:
         Returns:
             dict or None: Cached data if available and not expired, None otherwise
         """
-        # Ensure cache directory exists
-        cache_dir = Path(self.project_root, ".content", "cache", "muspy_module")
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Define cache file path
-        cache_file = Path(cache_dir, f"{cache_type}_cache.json")
-        
-        # If we're storing data
-        if data is not None:
-            cache_data = {
-                "timestamp": time.time(),
-                "data": data
-            }
-            
-            try:
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, ensure_ascii=False, indent=2)
-                self.logger.debug(f"Cached {cache_type} data successfully")
-                return True
-            except Exception as e:
-                self.logger.error(f"Error caching {cache_type} data: {e}")
-                return False
-        
-        # If we're retrieving data
-        else:
-            # If force refresh, don't use cache
-            if force_refresh:
-                return None
-                
-            # Check if cache file exists
-            if not os.path.exists(cache_file):
-                return None
-                
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    
-                # Check if cache is expired
-                timestamp = cache_data.get("timestamp", 0)
-                expiry_time = timestamp + (expiry_hours * 3600)  # Convert hours to seconds
-                
-                if time.time() > expiry_time:
-                    self.logger.debug(f"{cache_type} cache expired")
-                    return None
-                    
-                # Cache is valid
-                self.logger.debug(f"Using cached {cache_type} data")
-                return cache_data.get("data")
-                
-            except Exception as e:
-                self.logger.error(f"Error loading {cache_type} cache: {e}")
-                return None
+        return self._cached(self.LASTFM_NAMESPACE, cache_type, cache_type,
+                            data, force_refresh, expiry_hours)
 
     def spotify_cache_manager(self, cache_key, data=None, force_refresh=False, expiry_hours=24):
         """
@@ -89,123 +91,33 @@ class CacheManager:
         Returns:
             dict or None: Cached data if available and not expired, None otherwise
         """
-        # Ensure cache directory exists
-        cache_dir = Path(self.project_root, ".content", "cache", "muspy", "spotify")
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Define cache file path
-        cache_file = Path(cache_dir, f"{cache_key}_cache.json")
-        
-        # If we're storing data
-        if data is not None:
-            cache_data = {
-                "timestamp": time.time(),
-                "data": data
-            }
-            
-            try:
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, ensure_ascii=False, indent=2)
-                self.logger.debug(f"Cached Spotify {cache_key} data successfully")
-                return True
-            except Exception as e:
-                self.logger.error(f"Error caching Spotify {cache_key} data: {e}")
-                return False
-        
-        # If we're retrieving data
-        else:
-            # If force refresh, don't use cache
-            if force_refresh:
-                return None
-                    
-            # Check if cache file exists
-            if not os.path.exists(cache_file):
-                return None
-                    
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                        
-                # Check if cache is expired
-                timestamp = cache_data.get("timestamp", 0)
-                expiry_time = timestamp + (expiry_hours * 3600)  # Convert hours to seconds
-                    
-                if time.time() > expiry_time:
-                    self.logger.debug(f"Spotify {cache_key} cache expired")
-                    return None
-                        
-                # Cache is valid
-                self.logger.debug(f"Using cached Spotify {cache_key} data")
-                return cache_data.get("data")
-                    
-            except Exception as e:
-                self.logger.error(f"Error loading Spotify {cache_key} cache: {e}")
-                return None
+        return self._cached(self.SPOTIFY_NAMESPACE, cache_key, f"Spotify {cache_key}",
+                            data, force_refresh, expiry_hours)
 
     def clear_lastfm_cache(self):
         """
-        Clear the LastFM cache files
+        Clear the LastFM cache entries
         """
-        import glob
-        from PyQt6.QtWidgets import QMessageBox
-        
-        cache_dir = Path(self.project_root, ".content", "cache", "muspy_module")
-        
-        if not os.path.exists(cache_dir):
-            return
-        
         try:
-            # Find all LastFM cache files
-            lastfm_cache_files = glob.glob(Path(cache_dir, "top_artists_*.json"))
-            lastfm_cache_files.extend(glob.glob(Path(cache_dir, "loved_tracks_*.json")))
-            
-            for cache_file in lastfm_cache_files:
-                try:
-                    os.remove(cache_file)
-                    self.logger.debug(f"Removed cache file: {cache_file}")
-                except Exception as e:
-                    self.logger.error(f"Error removing cache file {cache_file}: {e}")
-            
-            return len(lastfm_cache_files)
+            removed = self.cache.clear(self.LASTFM_NAMESPACE, prefix="top_artists_")
+            removed += self.cache.clear(self.LASTFM_NAMESPACE, prefix="loved_tracks_")
+            self.logger.debug(f"Removed {removed} LastFM cache entries")
+            return removed
         except Exception as e:
             self.logger.error(f"Error clearing LastFM cache: {e}")
             return 0
 
     def clear_spotify_cache(self):
         """
-        Clear all Spotify cache files
+        Clear all Spotify cache entries
         """
-        import glob
-        
-        # Ensure cache directory exists
-        cache_dir = Path(self.project_root, ".content", "cache", "muspy", "spotify")
-        
-        if not os.path.exists(cache_dir):
-            return 0
-        
         try:
-            # Find all Spotify cache files
-            cache_files = glob.glob(Path(cache_dir, "*_cache.json"))
-            
-            if not cache_files:
-                return 0
-            
-            # Delete each cache file
-            count = 0
-            for cache_file in cache_files:
-                try:
-                    os.remove(cache_file)
-                    count += 1
-                except Exception as e:
-                    self.logger.error(f"Error removing cache file {cache_file}: {e}")
-            
-            return count
+            return self.cache.clear(self.SPOTIFY_NAMESPACE)
         except Exception as e:
             self.logger.error(f"Error clearing Spotify cache: {e}")
             return 0
 
 
-
  
     def display_releases_table(self, releases):
         """
@@ -14,24 +14,24 @@ from PyQt6.QtCore import Qt, QThread
 from base_module import PROJECT_ROOT
 from modules.submodules.muspy import progress_utils
 from modules.submodules.muspy.table_widgets import NumericTableWidgetItem, DateTableWidgetItem
+from tools.http_client import host_bucket
+from tools.musicbrainz_client import get_musicbrainz_client
 
 
-# Nueva clase para rate limiting
 class RateLimiter:
-    """Rate limiter para llamadas a la API de MusicBrainz"""
-    def __init__(self, requests_per_second=1):
-        self.min_interval = 1.0 / requests_per_second
-        self.last_request_time = 0
+    """
+    Rate limiter para llamadas a la API de MusicBrainz.
+
+    Usa el TokenBucket compartido del host (tools/http_client.py), así que las
+    llamadas de musicbrainzngs y las del cliente compartido respetan juntas el
+    mismo límite en todo el proceso.
+    """
+    def __init__(self, host="musicbrainz.org"):
+        self.bucket = host_bucket(host)
         
     def wait_if_needed(self):
         """Espera si es necesario para mantener el rate limit"""
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        
-        if elapsed < self.min_interval:
-            time.sleep(self.min_interval - elapsed)
-            
-        self.last_request_time = time.time()
+        self.bucket.adquirir()
 
 
 class MusicBrainzManager:
@@ -48,7 +48,7 @@ class MusicBrainzManager:
         self.ui_callback = ui_callback
         self.progress_utils = progress_utils
         PROJECT_ROOT = self.project_root
-        self.rate_limiter = RateLimiter(requests_per_second=1)
+        self.rate_limiter = RateLimiter()
 
         # Initialize MusicBrainz auth manager
         if self.musicbrainz_enabled:
@@ -348,14 +348,9 @@ class MusicBrainzManager:
                                     self.logger.debug(f"No se pudo obtener info del release-group {rg}: {e}")
                                     # Como fallback, intentar usar la API web directamente
                                     try:
-                                        import requests
-                                        rg_url = f"https://musicbrainz.org/ws/2/release-group/{rg}"
-                                        params = {'fmt': 'json'}
-                                        headers = {"User-Agent": "MuspyReleasesModule/1.0"}
-                                        
-                                        rg_response = requests.get(rg_url, params=params, headers=headers)
-                                        if rg_response.status_code == 200:
-                                            rg_data = rg_response.json()
+                                        rg_data = get_musicbrainz_client("MuspyReleasesModule/1.0").get_entity(
+                                            "release-group", rg)
+                                        if rg_data:
                                             processed_release['type'] = rg_data.get('primary-type', '')
                                     except Exception as e2:
                                         self.logger.debug(f"Fallback API call también falló: {e2}")
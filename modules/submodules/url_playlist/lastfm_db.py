@@ -1,12 +1,12 @@
 import os
 import json
-import time
 import sqlite3
 import datetime
 from pathlib import Path
 import requests
 from urllib.parse import urljoin, urlparse
 import re
+from collections import defaultdict
 
 import threading
 import requests
@@ -1422,14 +1422,40 @@ def fetch_links_for_scrobbles(self, lastfm_username):
     thread.start()
     return True
 
+# Descargas simultáneas de páginas de Last.fm (el ritmo lo limita el host en tools.http_client)
+LINK_CRAWLER_WORKERS = 4
+# Páginas procesadas entre cada escritura en la base de datos
+LINK_CRAWLER_BATCH = 50
+
+LASTFM_PAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+LINK_SERVICES = ['youtube', 'spotify', 'bandcamp', 'soundcloud']
+
+
 def _fetch_links_thread(parent, lastfm_username):
-    """Improved thread function for fetching links with better debugging"""
+    """
+    Crawler of service links for a user's scrobbles.
+
+    Every distinct Last.fm track URL is downloaded and parsed once, no matter
+    how many scrobbles share it, and all missing services are extracted from
+    that single parse. Pages are fetched by a bounded pool of workers through
+    a rate-limited session with retries/backoff, and results are written in
+    batches.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from tools.http_client import RateLimitedSession
+
     try:
         # Emitir señal de inicio
         parent.process_started_signal.emit(f"Fetching links for {lastfm_username}'s scrobbles...")
         
-        # Conectar a la base de datos
-        import sqlite3
         conn = sqlite3.connect(parent.db_path)
         cursor = conn.cursor()
         
@@ -1437,170 +1463,109 @@ def _fetch_links_thread(parent, lastfm_username):
         table_name = f"scrobbles_{lastfm_username}"
         
         # Verificar que la tabla existe
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
         if not cursor.fetchone():
             parent.process_error_signal.emit(f"Table {table_name} does not exist")
             return 0
         
         # Verificar columnas disponibles
         cursor.execute(f"PRAGMA table_info({table_name})")
-        columns_info = cursor.fetchall()
-        columns = [col[1] for col in columns_info]
+        columns = [col[1] for col in cursor.fetchall()]
         parent.log(f"Available columns in {table_name}: {columns}")
         
-        # Verificar si existen URLs de Last.fm
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE lastfm_url IS NOT NULL AND lastfm_url != ''")
-        lastfm_urls_count = cursor.fetchone()[0]
-        parent.log(f"Found {lastfm_urls_count} scrobbles with Last.fm URLs")
-        
-        if lastfm_urls_count == 0:
-            parent.process_error_signal.emit("No scrobbles have Last.fm URLs to extract links from")
-            return 0
-        
         # Obtener prioridad de servicio
         try:
-            from modules.submodules.url_playlist.ui_helpers import get_service_priority
             service_priority = get_service_priority(parent)
-        except:
-            service_priority = ['youtube', 'spotify', 'bandcamp', 'soundcloud']
-        
+        except Exception:
+            service_priority = list(LINK_SERVICES)
         parent.log(f"Service priority: {service_priority}")
         
-        # Contar scrobbles sin enlaces de servicio
-        service_conditions = []
-        for service in service_priority:
-            service_field = f"{service}_url"
-            if service_field in columns:
-                service_conditions.append(f"({service_field} IS NULL OR {service_field} = '')")
-        
-        if not service_conditions:
+        services = [service for service in service_priority
+                    if service in LINK_SERVICES and f"{service}_url" in columns]
+        if not services:
             parent.process_error_signal.emit("No service URL columns found in scrobbles table")
             return 0
         
-        # Modificar la consulta para incluir lastfm_url
-        conditions = " AND ".join(service_conditions)
-        query = f"""
-        SELECT id, artist_name, track_name, name, album_name, lastfm_url, song_id
-        FROM {table_name} 
-        WHERE ({conditions}) 
-        AND lastfm_url IS NOT NULL 
+        # Scrobbles a los que les falta algún servicio, agrupados por URL de Last.fm
+        missing_conditions = " OR ".join(f"({service}_url IS NULL OR {service}_url = '')" for service in services)
+        cursor.execute(f"""
+        SELECT id, lastfm_url, song_id, {', '.join(f'{service}_url' for service in services)}
+        FROM {table_name}
+        WHERE ({missing_conditions})
+        AND lastfm_url IS NOT NULL
         AND lastfm_url != ''
         ORDER BY id DESC
-        LIMIT 100
-        """
+        """)
         
-        parent.log(f"Executing query: {query}")
-        cursor.execute(query)
-        unlinked_rows = cursor.fetchall()
+        pending = {}
+        for row in cursor:
+            scrobble_id, lastfm_url, song_id = row[:3]
+            entry = pending.setdefault(lastfm_url, {'scrobbles': [], 'missing': set()})
+            entry['scrobbles'].append((scrobble_id, song_id))
+            entry['missing'].update(service for service, value in zip(services, row[3:]) if not value)
         
-        parent.log(f"Found {len(unlinked_rows)} scrobbles without service links")
+        total_scrobbles = sum(len(entry['scrobbles']) for entry in pending.values())
+        parent.log(f"Found {total_scrobbles} scrobbles without service links ({len(pending)} distinct Last.fm URLs)")
         
-        if not unlinked_rows:
+        if not pending:
             parent.process_finished_signal.emit("No scrobbles found that need link extraction", 0, 0)
             return 0
         
-        # Procesar scrobbles
+        has_song_links = bool(cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='song_links'"
+        ).fetchone())
+        
+        parent.process_progress_signal.emit(5, f"Processing {len(pending)} Last.fm pages...")
+        
+        session = RateLimitedSession(pool_size=LINK_CRAWLER_WORKERS, headers=LASTFM_PAGE_HEADERS)
         links_found = 0
         processed = 0
+        batch = []
         
-        parent.process_progress_signal.emit(5, f"Processing {len(unlinked_rows)} scrobbles...")
-        
-        for i, row in enumerate(unlinked_rows):
-            scrobble_id, artist_name, track_name, name, album_name, lastfm_url, song_id = row
-            
-            # Usar el campo correcto para el nombre de la pista
-            track_title = track_name if track_name else name
-            
-            # Calcular progreso
-            progress = 5 + int(90 * (i / len(unlinked_rows)))
-            if i % 5 == 0:  # Actualizar cada 5 elementos
-                parent.process_progress_signal.emit(
-                    progress, 
-                    f"Processing {i+1}/{len(unlinked_rows)}: {artist_name} - {track_title} (found {links_found} links)"
-                )
-            
-            parent.log(f"Processing: {artist_name} - {track_title}")
-            parent.log(f"Last.fm URL: {lastfm_url}")
-            
-            # Intentar extraer enlaces para cada servicio
-            found_link_for_this_track = False
-            
-            for service in service_priority:
-                service_field = f"{service}_url"
-                
-                # Verificar si ya tiene enlace para este servicio
-                if service_field in columns:
-                    cursor.execute(f"SELECT {service_field} FROM {table_name} WHERE id = ?", (scrobble_id,))
-                    existing_link = cursor.fetchone()
-                    if existing_link and existing_link[0]:
-                        continue  # Ya tiene enlace para este servicio
+        try:
+            with ThreadPoolExecutor(max_workers=LINK_CRAWLER_WORKERS) as executor:
+                futures = {
+                    executor.submit(extract_links_from_lastfm, parent, lastfm_url,
+                                    [service for service in services if service in entry['missing']],
+                                    session): lastfm_url
+                    for lastfm_url, entry in pending.items()
+                }
                 
-                # Intentar extraer enlace
-                try:
-                    service_url = extract_link_from_lastfm(parent, lastfm_url, service)
+                for future in as_completed(futures):
+                    lastfm_url = futures[future]
+                    try:
+                        links = future.result()
+                    except Exception as e:
+                        parent.log(f"Error extracting links from {lastfm_url}: {str(e)}")
+                        links = {}
                     
-                    if service_url:
-                        parent.log(f"Found {service} link: {service_url}")
-                        
-                        # Actualizar el scrobble
-                        if service_field in columns:
-                            cursor.execute(f"""
-                            UPDATE {table_name}
-                            SET {service_field} = ?
-                            WHERE id = ?
-                            """, (service_url, scrobble_id))
-                            
-                            links_found += 1
-                            found_link_for_this_track = True
-                            
-                            # También actualizar song_links si tenemos song_id
-                            if song_id:
-                                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='song_links'")
-                                if cursor.fetchone():
-                                    cursor.execute("SELECT id FROM song_links WHERE song_id = ?", (song_id,))
-                                    if cursor.fetchone():
-                                        # Actualizar registro existente
-                                        cursor.execute(f"""
-                                        UPDATE song_links
-                                        SET {service_field} = COALESCE(?, {service_field}),
-                                            links_updated = CURRENT_TIMESTAMP
-                                        WHERE song_id = ?
-                                        """, (service_url, song_id))
-                                    else:
-                                        # Insertar nuevo registro
-                                        cursor.execute(f"""
-                                        INSERT INTO song_links (song_id, {service_field}, links_updated)
-                                        VALUES (?, ?, CURRENT_TIMESTAMP)
-                                        """, (song_id, service_url))
-                            
-                            # Hacer commit cada 10 enlaces encontrados
-                            if links_found % 10 == 0:
-                                conn.commit()
-                                parent.log(f"Committed {links_found} links to database")
-                            
-                            # Solo buscar un enlace por pista para ser eficiente
-                            break
-                            
-                except Exception as e:
-                    parent.log(f"Error extracting {service} link for {artist_name} - {track_title}: {str(e)}")
-                    continue
-            
-            processed += 1
-            
-            # Pequeña pausa para no sobrecargar Last.fm
-            if found_link_for_this_track:
-                time.sleep(0.5)  # Pausa más corta si encontramos enlace
-            else:
-                time.sleep(0.1)  # Pausa mínima si no encontramos nada
-        
-        # Commit final
-        conn.commit()
+                    processed += 1
+                    if links:
+                        links_found += len(links)
+                        batch.append((pending[lastfm_url]['scrobbles'], links))
+                    
+                    if len(batch) >= LINK_CRAWLER_BATCH:
+                        _save_link_batch(conn, table_name, batch, has_song_links)
+                        parent.log(f"Committed links for {processed} pages")
+                        batch = []
+                    
+                    if processed % 5 == 0 or processed == len(pending):
+                        progress = 5 + int(90 * (processed / len(pending)))
+                        parent.process_progress_signal.emit(
+                            progress,
+                            f"Processed {processed}/{len(pending)} pages (found {links_found} links)"
+                        )
+        finally:
+            session.close()
+        
+        # Escritura final
+        _save_link_batch(conn, table_name, batch, has_song_links)
         
         # Mensaje final
-        result_message = f"Completed! Found {links_found} links out of {processed} processed scrobbles"
+        result_message = f"Completed! Found {links_found} links out of {processed} processed Last.fm pages"
         parent.process_finished_signal.emit(result_message, links_found, processed)
         
-        parent.log(f"Link extraction complete: {links_found}/{processed} success rate")
+        parent.log(f"Link extraction complete: {links_found} links from {processed} pages")
         
         conn.close()
         return links_found
@@ -1608,78 +1573,148 @@ def _fetch_links_thread(parent, lastfm_username):
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
-        parent.log(f"Error in _fetch_links_thread_improved: {str(e)}")
+        parent.log(f"Error in _fetch_links_thread: {str(e)}")
         parent.log(error_trace)
         parent.process_error_signal.emit(f"Error: {str(e)}")
         return 0
 
 
-def extract_link_from_lastfm(self, lastfm_url, service):
-    """Extract service link from a Last.fm page with improved error handling and debugging"""
+def _save_link_batch(conn, table_name, batch, has_song_links):
+    """
+    Write the links of a batch of Last.fm pages to the scrobbles table and
+    song_links. Links already present in the scrobbles table are kept.
+
+    Args:
+        batch: List of (scrobbles, links) where scrobbles is [(scrobble_id, song_id)]
+               and links is {service: url}
+    """
+    if not batch:
+        return
+    
+    scrobble_updates = defaultdict(list)
+    song_updates = defaultdict(list)
+    for scrobbles, links in batch:
+        for service, url in links.items():
+            for scrobble_id, song_id in scrobbles:
+                scrobble_updates[service].append((url, scrobble_id))
+                if song_id:
+                    song_updates[service].append((song_id, url))
+    
+    cursor = conn.cursor()
+    for service, params in scrobble_updates.items():
+        field = f"{service}_url"
+        cursor.executemany(f"""
+        UPDATE {table_name}
+        SET {field} = ?
+        WHERE id = ? AND ({field} IS NULL OR {field} = '')
+        """, params)
+    
+    if has_song_links:
+        for service, params in song_updates.items():
+            field = f"{service}_url"
+            # Un solo enlace por canción aunque varios scrobbles apunten a ella
+            by_song = dict(params)
+            song_ids = list(by_song)
+            existing = set()
+            for start in range(0, len(song_ids), 500):
+                chunk = song_ids[start:start + 500]
+                cursor.execute(
+                    f"SELECT song_id FROM song_links WHERE song_id IN ({', '.join('?' * len(chunk))})", chunk
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+            
+            cursor.executemany(f"""
+            UPDATE song_links
+            SET {field} = COALESCE(?, {field}),
+                links_updated = CURRENT_TIMESTAMP
+            WHERE song_id = ?
+            """, [(url, song_id) for song_id, url in by_song.items() if song_id in existing])
+            cursor.executemany(f"""
+            INSERT INTO song_links (song_id, {field}, links_updated)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            """, [(song_id, url) for song_id, url in by_song.items() if song_id not in existing])
+    
+    conn.commit()
+
+
+def fetch_lastfm_soup(self, lastfm_url, session=None):
+    """Download a Last.fm page and parse it. Returns the soup or None."""
     if not lastfm_url or not lastfm_url.strip():
-        self.log(f"No Last.fm URL provided for {service} extraction")
+        self.log("No Last.fm URL provided for link extraction")
         return None
-        
+    
+    # Check if we have BeautifulSoup
     try:
-        # Check if we have BeautifulSoup
-        try:
-            from bs4 import BeautifulSoup
-        except ImportError:
-            self.log("BeautifulSoup not installed, cannot extract links. Install with: pip install beautifulsoup4")
-            return None
-            
-        self.log(f"Extracting {service} link from: {lastfm_url}")
-        
-        # Make request to Last.fm page with proper headers
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+        from bs4 import BeautifulSoup
+    except ImportError:
+        self.log("BeautifulSoup not installed, cannot extract links. Install with: pip install beautifulsoup4")
+        return None
+    
+    try:
+        if session is not None:
+            response = session.get(lastfm_url)
+        else:
+            response = requests.get(lastfm_url, headers=LASTFM_PAGE_HEADERS, timeout=15)
+        self.log(f"Last.fm response status: {response.status_code}")
         
-        try:
-            response = requests.get(lastfm_url, headers=headers, timeout=15)
-            self.log(f"Last.fm response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                self.log(f"Failed to fetch Last.fm page: HTTP {response.status_code}")
-                return None
-                
-        except requests.exceptions.Timeout:
-            self.log(f"Timeout fetching Last.fm page: {lastfm_url}")
-            return None
-        except requests.exceptions.RequestException as e:
-            self.log(f"Error fetching Last.fm page: {str(e)}")
+        if response.status_code != 200:
+            self.log(f"Failed to fetch Last.fm page: HTTP {response.status_code}")
             return None
             
-        # Parse the HTML
-        try:
-            soup = BeautifulSoup(response.text, 'html.parser')
-        except Exception as e:
-            self.log(f"Error parsing HTML: {str(e)}")
-            return None
+    except requests.exceptions.Timeout:
+        self.log(f"Timeout fetching Last.fm page: {lastfm_url}")
+        return None
+    except requests.exceptions.RequestException as e:
+        self.log(f"Error fetching Last.fm page: {str(e)}")
+        return None
+    
+    # Parse the HTML
+    try:
+        return BeautifulSoup(response.text, 'html.parser')
+    except Exception as e:
+        self.log(f"Error parsing HTML: {str(e)}")
+        return None
+
+
+def extract_links_from_lastfm(self, lastfm_url, services=None, session=None):
+    """
+    Extract the links of several services from a single download and parse
+    of a Last.fm page.
+
+    Returns:
+        dict: {service: url} for the services found
+    """
+    services = services or LINK_SERVICES
+    try:
+        self.log(f"Extracting {', '.join(services)} links from: {lastfm_url}")
+        soup = fetch_lastfm_soup(self, lastfm_url, session)
+        if soup is None:
+            return {}
+        
+        links = {}
+        for service in services:
+            extractor = LASTFM_SOUP_EXTRACTORS.get(service)
+            if extractor is None:
+                self.log(f"Unknown service for extraction: {service}")
+                continue
+            url = extractor(self, soup, lastfm_url)
+            if url:
+                links[service] = url
+        return links
         
-        # Service-specific extractors
-        if service == 'youtube':
-            return extract_youtube_from_lastfm_soup(self, soup, lastfm_url)
-        elif service == 'spotify':
-            return extract_spotify_from_lastfm_soup(self, soup, lastfm_url)
-        elif service == 'bandcamp':
-            return extract_bandcamp_from_lastfm_soup(self, soup, lastfm_url)
-        elif service == 'soundcloud':
-            return extract_soundcloud_from_lastfm_soup(self, soup, lastfm_url)
-        else:
-            self.log(f"Unknown service for extraction: {service}")
-            return None
-            
     except Exception as e:
-        self.log(f"Unexpected error extracting {service} link from Last.fm: {str(e)}")
+        self.log(f"Unexpected error extracting links from Last.fm: {str(e)}")
         import traceback
         self.log(traceback.format_exc())
+        return {}
+
+
+def extract_link_from_lastfm(self, lastfm_url, service):
+    """Extract service link from a Last.fm page with improved error handling and debugging"""
+    if service not in LASTFM_SOUP_EXTRACTORS:
+        self.log(f"Unknown service for extraction: {service}")
         return None
+    return extract_links_from_lastfm(self, lastfm_url, [service]).get(service)
 
 
 
@@ -1834,3 +1869,11 @@ def extract_soundcloud_from_lastfm_soup(self, soup, lastfm_url):
     except Exception as e:
         self.log(f"Error extracting SoundCloud from soup: {str(e)}")
         return None
+
+
+LASTFM_SOUP_EXTRACTORS = {
+    'youtube': extract_youtube_from_lastfm_soup,
+    'spotify': extract_spotify_from_lastfm_soup,
+    'bandcamp': extract_bandcamp_from_lastfm_soup,
+    'soundcloud': extract_soundcloud_from_lastfm_soup,
+}
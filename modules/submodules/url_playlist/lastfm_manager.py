@@ -11,6 +11,7 @@ from PyQt6.QtWidgets import QMenu, QProgressDialog, QApplication, QMessageBox, Q
 from PyQt6.QtGui import QIcon
 
 from modules.submodules.url_playlist.ui_helpers import get_service_priority
+from tools.api_cache import get_api_cache, import_legacy_json
 from modules.submodules.url_playlist.lastfm_db import (
     save_scrobbles_to_db,
     process_scrobbles,
@@ -18,7 +19,7 @@ from modules.submodules.url_playlist.lastfm_db import (
     create_scrobbles_table,
     integrate_scrobbles_to_songs,
     fetch_links_for_scrobbles,
-    extract_link_from_lastfm
+    extract_links_from_lastfm
 )
 
 # Asegurarse de que PROJECT_ROOT está disponible
@@ -105,7 +106,8 @@ def setup_lastfm_menu_items(self, menu):
 
 def get_lastfm_cache_path(lastfm_username=None):
     """
-    Get the path to the Last.fm scrobbles cache file.
+    Get the path to the old Last.fm scrobbles cache file (the scrobbles are now
+    kept in the shared API cache, see load_scrobbles_cache).
     
     Args:
         lastfm_username: Optional Last.fm username to create user-specific cache files
@@ -129,6 +131,94 @@ def get_lastfm_cache_path(lastfm_username=None):
     else:
         return Path(cache_dir, "lastfm_scrobbles.json")
 
+SCROBBLES_CACHE_NAMESPACE = "url_playlist_scrobbles"
+
+# Scrobbles más recientes que se conservan en caché por usuario
+SCROBBLES_CACHE_LIMIT = 1000
+
+def _scrobbles_cache_prefix(lastfm_username):
+    return f"{lastfm_username or ''}/"
+
+def scrobble_cache_key(lastfm_username, scrobble):
+    """
+    Key of one scrobble in the shared API cache.
+    
+    The zero-padded timestamp goes first so that the keys of a user sort
+    chronologically.
+    """
+    artist = scrobble.get('artist', scrobble.get('artist_name', ''))
+    title = scrobble.get('title', scrobble.get('name', ''))
+    try:
+        timestamp = int(scrobble.get('timestamp') or 0)
+    except (TypeError, ValueError):
+        timestamp = 0
+    return f"{_scrobbles_cache_prefix(lastfm_username)}s/{timestamp:012d}|{artist}|{title}"
+
+def _cache_data_entries(lastfm_username, cache_data):
+    """Entries of an old whole-history cache ({'last_updated', 'scrobbles'})."""
+    entries = [(scrobble_cache_key(lastfm_username, scrobble), scrobble, None)
+               for scrobble in cache_data.get('scrobbles', [])]
+    entries.append((_scrobbles_cache_prefix(lastfm_username) + "meta",
+                    {'last_updated': cache_data.get('last_updated', 0)}, None))
+    return entries
+
+def load_scrobbles_cache(lastfm_username=None):
+    """
+    Load the cached scrobbles of a user from the shared API cache.
+    
+    Each scrobble is its own cache entry; the old per-user JSON file
+    (get_lastfm_cache_path) and the old single entry with the whole history
+    are split into entries the first time.
+    
+    Returns:
+        Dict with 'last_updated' and 'scrobbles' (newest first), or None if nothing is cached
+    """
+    cache = get_api_cache()
+    prefix = _scrobbles_cache_prefix(lastfm_username)
+    import_legacy_json(cache, SCROBBLES_CACHE_NAMESPACE, get_lastfm_cache_path(lastfm_username),
+                       lambda cache_data: _cache_data_entries(lastfm_username, cache_data))
+    old_key = lastfm_username or ""
+    old_data = cache.get(SCROBBLES_CACHE_NAMESPACE, old_key)
+    if old_data:
+        cache.set_many(SCROBBLES_CACHE_NAMESPACE,
+                       [(key, value) for key, value, _ in _cache_data_entries(lastfm_username, old_data)])
+        cache.delete(SCROBBLES_CACHE_NAMESPACE, old_key)
+
+    entries = cache.items(SCROBBLES_CACHE_NAMESPACE, prefix + "s/")
+    if not entries:
+        return None
+    meta = cache.get(SCROBBLES_CACHE_NAMESPACE, prefix + "meta") or {}
+    return {
+        'last_updated': meta.get('last_updated', 0),
+        'scrobbles': [scrobble for _, scrobble in reversed(entries)],
+    }
+
+def save_scrobbles_cache(lastfm_username, scrobbles, last_updated=None):
+    """
+    Store or update scrobbles of a user in the shared API cache, one entry each.
+    
+    Only the given scrobbles are written; beyond SCROBBLES_CACHE_LIMIT the
+    oldest entries of the user are removed.
+    
+    Args:
+        lastfm_username: Last.fm user
+        scrobbles: Scrobbles to add or update
+        last_updated: Newest synced timestamp (kept if greater than the stored one)
+    """
+    cache = get_api_cache()
+    prefix = _scrobbles_cache_prefix(lastfm_username)
+    cache.set_many(SCROBBLES_CACHE_NAMESPACE,
+                   [(scrobble_cache_key(lastfm_username, scrobble), scrobble) for scrobble in scrobbles])
+
+    if last_updated:
+        meta = cache.get(SCROBBLES_CACHE_NAMESPACE, prefix + "meta") or {}
+        if last_updated > meta.get('last_updated', 0):
+            cache.set(SCROBBLES_CACHE_NAMESPACE, prefix + "meta", {'last_updated': last_updated})
+
+    keys = cache.keys(SCROBBLES_CACHE_NAMESPACE, prefix + "s/")
+    if len(keys) > SCROBBLES_CACHE_LIMIT:
+        cache.delete_many(SCROBBLES_CACHE_NAMESPACE, keys[:len(keys) - SCROBBLES_CACHE_LIMIT])
+
 def get_lastfm_usernames(self):
     """Get a list of Last.fm users from existing database tables"""
     try:
@@ -538,9 +628,6 @@ def sync_lastfm_scrobbles(self, show_dialogs=True):
                 import time
                 time.sleep(0.2)
         
-        # Determine cache file path - use user-specific path
-        cache_file = get_lastfm_cache_path(self.lastfm_username)
-        
         # Create necessary tables if they don't exist
         import sqlite3
         conn = sqlite3.connect(self.db_path)
@@ -798,44 +885,10 @@ def sync_lastfm_scrobbles(self, show_dialogs=True):
                 conn.close()
                 self.log(f"Updated last_timestamp in config table to {newest_timestamp}")
             
-            # Update cache if needed
+            # Update cache: only the new scrobbles are written
             try:
-                # Create directory if needed
-                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-                
-                # Load existing cache if available
-                cache_data = {"last_updated": last_updated, "scrobbles": []}
-                if os.path.exists(cache_file):
-                    try:
-                        with open(cache_file, 'r', encoding='utf-8') as f:
-                            cached_content = f.read()
-                            if cached_content.strip():
-                                cache_data = json.loads(cached_content)
-                    except Exception as e:
-                        self.log(f"Error loading cache: {e}, creating new cache")
-                
-                # Update with new max timestamp
-                if newest_timestamp > 0:
-                    cache_data['last_updated'] = max(newest_timestamp, cache_data.get('last_updated', 0))
-                
-                # Instead of merging, just keep the latest cache_data['scrobbles'] 
-                # and append new scrobbles at the start
-                # This keeps cache manageable by not growing indefinitely
-                MAX_CACHE_SIZE = 1000  # Reasonable number to keep in cache
-                
-                # Add new scrobbles at the start of the list
-                updated_scrobbles = all_scrobbles + cache_data.get('scrobbles', [])
-                
-                # Limit the size
-                if len(updated_scrobbles) > MAX_CACHE_SIZE:
-                    updated_scrobbles = updated_scrobbles[:MAX_CACHE_SIZE]
-                
-                cache_data['scrobbles'] = updated_scrobbles
-                
-                # Save updated cache
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, indent=2)
-                    self.log(f"Updated cache with {len(all_scrobbles)} new scrobbles (total cache: {len(updated_scrobbles)})")
+                save_scrobbles_cache(self.lastfm_username, all_scrobbles, newest_timestamp)
+                self.log(f"Updated cache with {len(all_scrobbles)} new scrobbles")
             except Exception as e:
                 self.log(f"Error updating cache: {str(e)}")
                 import traceback
@@ -1521,11 +1574,8 @@ def populate_scrobbles_time_menus(self, scrobbles=None, years_dict=None):
         if not years_dict and not scrobbles:
             try:
                 # Try to load from cache
-                cache_file = get_lastfm_cache_path(getattr(self, 'lastfm_username', None))
-                if os.path.exists(cache_file):
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        cache_data = json.load(f)
-                        
+                cache_data = load_scrobbles_cache(getattr(self, 'lastfm_username', None))
+                if cache_data:
                     scrobbles = cache_data.get('scrobbles', [])
                     self.log(f"Loaded {len(scrobbles)} scrobbles from cache")
             except Exception as e:
@@ -1907,24 +1957,19 @@ def load_lastfm_cache_if_exists(self):
         
         # Si falló la carga desde DB, intentar con caché
         self.lastfm_username = getattr(self, 'lastfm_username', None)
-        cache_file = get_lastfm_cache_path(self.lastfm_username)
         
-        if os.path.exists(cache_file):
-            self.log(f"Encontrado archivo de caché de Last.fm: {cache_file}")
-            
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    scrobbles = cache_data.get('scrobbles', [])
-                    
-                    if scrobbles:
-                        self.log(f"Cargados {len(scrobbles)} scrobbles desde caché")
-                        # Poblar menús
-                        populate_scrobbles_time_menus(self, scrobbles)
-                        self._lastfm_cache_loaded_time = time.time()
-                        return True
-            except Exception as e:
-                self.log(f"Error loading Last.fm cache: {str(e)}")
+        try:
+            cache_data = load_scrobbles_cache(self.lastfm_username)
+            scrobbles = cache_data.get('scrobbles', []) if cache_data else []
+            
+            if scrobbles:
+                self.log(f"Cargados {len(scrobbles)} scrobbles desde caché")
+                # Poblar menús
+                populate_scrobbles_time_menus(self, scrobbles)
+                self._lastfm_cache_loaded_time = time.time()
+                return True
+        except Exception as e:
+            self.log(f"Error loading Last.fm cache: {str(e)}")
         
         return False
     except Exception as e:
@@ -2098,7 +2143,7 @@ def obtener_con_reintentos(url, params, max_reintentos=3, tiempo_espera=1, timeo
     return None
 
 
-def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
+def fetch_youtube_links(self, scrobbles, lastfm_username=None, table_name=None):
     """
     Fetch URLs for scrobbles in a background thread, checking database first
     and updating both the cache and the song_links table.
@@ -2106,7 +2151,7 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
     Args:
         self: The parent instance with logger
         scrobbles: List of scrobbles to check
-        cache_file: Path to the cache file to update
+        lastfm_username: User whose scrobbles cache is updated
         table_name: Optional name of the scrobbles table
     """
     try:
@@ -2114,22 +2159,19 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
         
         # Load the current cache
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+            cache_data = load_scrobbles_cache(lastfm_username)
         except Exception as e:
-            self.log(f"Error loading cache file for link updates: {str(e)}")
+            self.log(f"Error loading cache for link updates: {str(e)}")
+            return
+        if not cache_data:
+            self.log("No scrobbles cache to update with links")
             return
         
         # Track scrobbles by a unique key for efficient updates
         all_scrobbles = cache_data.get('scrobbles', [])
-        scrobbles_dict = {}
-        for s in all_scrobbles:
-            # Support both field naming conventions
-            artist = s.get('artist', s.get('artist_name', ''))
-            title = s.get('title', s.get('name', ''))
-            timestamp = s.get('timestamp', 0)
-            key = f"{artist}|{title}|{timestamp}"
-            scrobbles_dict[key] = s
+        scrobbles_dict = {scrobble_cache_key(lastfm_username, s): s for s in all_scrobbles}
+        # Keys of the cached scrobbles that got a link and still have to be saved
+        changed_keys = set()
         
         # Get service priority from settings
         service_priority = get_service_priority(self) if hasattr(self, 'get_service_priority') else ['youtube', 'spotify', 'bandcamp', 'soundcloud']
@@ -2164,7 +2206,7 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
                 continue
                 
             # Create a unique key
-            key = f"{artist}|{title}|{timestamp}"
+            key = scrobble_cache_key(lastfm_username, scrobble)
             
             # Try to get URL from database first
             links = get_track_links_from_db(self, artist, title, album)
@@ -2179,6 +2221,7 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
                         
                         if key in scrobbles_dict:
                             scrobbles_dict[key][service_url_key] = links[service]
+                            changed_keys.add(key)
                             updated_count += 1
                             
                             # Log successful link retrieval
@@ -2216,9 +2259,10 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
                     # Check if we have a Last.fm URL
                     lastfm_url = scrobble.get('url', scrobble.get('lastfm_url', ''))
                     if lastfm_url:
-                        # Try to extract links from Last.fm page
+                        # Download and parse the Last.fm page once for every service
+                        links = extract_links_from_lastfm(self, lastfm_url, service_priority)
                         for service in service_priority:
-                            service_url = extract_link_from_lastfm(self, lastfm_url, service)
+                            service_url = links.get(service)
                             
                             if service_url:
                                 # Update the scrobble and cache
@@ -2227,6 +2271,7 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
                                 
                                 if key in scrobbles_dict:
                                     scrobbles_dict[key][service_url_key] = service_url
+                                    changed_keys.add(key)
                                     updated_count += 1
                                     
                                     # Log successful link retrieval
@@ -2352,12 +2397,10 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
             if processed_count % 20 == 0:
                 self.log(f"Processed {processed_count}/{len(scrobbles)} scrobbles, found {updated_count} links")
                 
-                # Save intermediate results to cache
+                # Save intermediate results to cache (only the updated scrobbles)
                 try:
-                    # Rebuild the scrobbles list from the dictionary
-                    cache_data['scrobbles'] = list(scrobbles_dict.values())
-                    with open(cache_file, 'w', encoding='utf-8') as f:
-                        json.dump(cache_data, f, indent=2)
+                    save_scrobbles_cache(lastfm_username, [scrobbles_dict[k] for k in changed_keys])
+                    changed_keys.clear()
                 except Exception as e:
                     self.log(f"Error saving intermediate link updates: {str(e)}")
         
@@ -2367,10 +2410,7 @@ def fetch_youtube_links(self, scrobbles, cache_file, table_name=None):
         
         # Final save to cache
         try:
-            # Rebuild the scrobbles list from the dictionary
-            cache_data['scrobbles'] = list(scrobbles_dict.values())
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, indent=2)
+            save_scrobbles_cache(lastfm_username, [scrobbles_dict[k] for k in changed_keys])
                 
             self.log(f"Link fetching complete. Updated {updated_count} scrobbles.")
         except Exception as e:
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools import db_pipeline
+from tools.db_pipeline import WriterConnection, build_dag, critical_path
+
+
+class BuildDagTest(unittest.TestCase):
+    def test_lectura_tras_escritura(self):
+        declarations = {
+            'scan': {'inputs': [], 'outputs': ['songs']},
+            'letras': {'inputs': ['songs'], 'outputs': ['lyrics']},
+        }
+        deps = build_dag(['scan', 'letras'], declarations)
+        self.assertEqual(deps, {'scan': set(), 'letras': {'scan'}})
+
+    def test_escrituras_independientes_en_paralelo(self):
+        declarations = {
+            'sellos': {'inputs': ['albums'], 'outputs': ['labels']},
+            'letras': {'inputs': ['songs'], 'outputs': ['lyrics']},
+        }
+        deps = build_dag(['sellos', 'letras'], declarations)
+        self.assertEqual(deps['letras'], set())
+
+    def test_escritura_de_columna_cubre_tabla(self):
+        # Escribir songs.lyrics afecta a quien lee songs, y al revés
+        declarations = {
+            'letras': {'inputs': ['songs'], 'outputs': ['songs.has_lyrics']},
+            'enlaces': {'inputs': ['songs.has_lyrics'], 'outputs': ['song_links']},
+            'escaner': {'inputs': [], 'outputs': ['songs']},
+        }
+        deps = build_dag(['letras', 'enlaces', 'escaner'], declarations)
+        self.assertEqual(deps['enlaces'], {'letras'})
+        # escritura tras lectura y escritura tras escritura
+        self.assertEqual(deps['escaner'], {'letras', 'enlaces'})
+
+    def test_sin_declaracion_o_exclusivo_depende_de_todo(self):
+        declarations = {
+            'a': {'inputs': [], 'outputs': ['x']},
+            'optimizar': {'exclusive': True},
+            'b': {'inputs': [], 'outputs': ['y']},
+        }
+        deps = build_dag(['a', 'optimizar', 'b', 'desconocido'], declarations)
+        self.assertEqual(deps['optimizar'], {'a'})
+        self.assertEqual(deps['b'], {'optimizar'})
+        self.assertEqual(deps['desconocido'], {'a', 'optimizar', 'b'})
+
+
+class CriticalPathTest(unittest.TestCase):
+    def test_cadena_mas_larga(self):
+        deps = {'scan': set(), 'letras': {'scan'}, 'sellos': {'scan'}, 'stats': {'letras', 'sellos'}}
+        durations = {'scan': 10, 'letras': 5, 'sellos': 30, 'stats': 2}
+        self.assertEqual(critical_path(deps, durations), (42, ['scan', 'sellos', 'stats']))
+
+    def test_sin_scripts(self):
+        self.assertEqual(critical_path({}, {}), (0, []))
+
+
+class WriterConnectionTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.lock = threading.Lock()
+        patcher = mock.patch.multiple(db_pipeline, _writer_lock=self.lock, _writer_owner=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.conn = sqlite3.connect(os.path.join(tmp.name, 'music.db'), factory=WriterConnection)
+        self.addCleanup(self.conn.close)
+        self.conn.execute("CREATE TABLE songs (id INTEGER PRIMARY KEY, title TEXT)")
+
+    def test_bloqueo_retenido_durante_la_transaccion(self):
+        self.conn.execute("INSERT INTO songs (title) VALUES ('a')")
+        self.assertTrue(self.lock.locked())
+        self.conn.execute("SELECT COUNT(*) FROM songs").fetchone()
+        self.assertTrue(self.lock.locked())
+        self.conn.commit()
+        self.assertFalse(self.lock.locked())
+
+    def test_lectura_y_bloque_with(self):
+        self.conn.execute("SELECT * FROM songs").fetchall()
+        self.assertFalse(self.lock.locked())
+        with self.conn:
+            self.conn.cursor().executemany("INSERT INTO songs (title) VALUES (?)", [('a',), ('b',)])
+            self.assertTrue(self.lock.locked())
+        self.assertFalse(self.lock.locked())
+
+    def test_rollback_y_cierre_sueltan_el_bloqueo(self):
+        self.conn.execute("INSERT INTO songs (title) VALUES ('a')")
+        self.conn.rollback()
+        self.assertFalse(self.lock.locked())
+        self.conn.execute("INSERT INTO songs (title) VALUES ('b')")
+        self.conn.close()
+        self.assertFalse(self.lock.locked())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,443 @@
+"""
+API Cache - Caché compartida de respuestas de servicios externos
+
+Un único fichero SQLite guarda las respuestas de Last.fm, Spotify, Twitter,
+etc. separadas por espacio de nombres. Cada entrada se lee y escribe por
+clave, sin cargar ni reescribir el resto de la caché.
+
+    api_cache(namespace, key, value, compressed, created, expires, last_access, size)
+
+- Caducidad por entrada (ttl al guardar) o por antigüedad al leer (max_age),
+  para los llamadores que deciden la validez en el momento de consultar.
+- Tamaño acotado: al superar max_bytes se eliminan primero las caducadas y
+  después las menos usadas recientemente (LRU por last_access).
+- Los valores se guardan como JSON; a partir de compress_threshold bytes se
+  comprimen con zlib.
+- Contadores de aciertos y fallos por espacio de nombres (en memoria).
+- Lecturas y escrituras por lotes (items, set_many, delete_many) para los
+  llamadores que guardan colecciones como una entrada por elemento.
+
+Todas las instancias de un mismo fichero dentro del proceso comparten
+conexión a través de get_api_cache().
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_PATH = Path(PROJECT_ROOT, ".content", "cache", "api_cache.sqlite")
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_COMPRESS_THRESHOLD = 4 * 1024
+
+# Cada cuántas escrituras se vuelve a comprobar el tamaño total en disco
+# (otros procesos pueden escribir en el mismo fichero)
+SIZE_CHECK_INTERVAL = 100
+
+
+class ApiCache:
+    """Caché clave/valor persistente con caducidad, LRU y compresión."""
+
+    _UPSERT = """
+        INSERT INTO api_cache (namespace, key, value, compressed, created, expires, last_access, size)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(namespace, key) DO UPDATE SET
+            value = excluded.value,
+            compressed = excluded.compressed,
+            created = excluded.created,
+            expires = excluded.expires,
+            last_access = excluded.last_access,
+            size = excluded.size
+    """
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES,
+                 compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+        self.db_path = str(db_path or DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        self._lock = threading.RLock()
+        self._counters = {}
+        self._writes_since_check = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._setup()
+
+        with self._lock:
+            self._total_bytes = self._measure()
+        self.purge_expired()
+
+    def _setup(self):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS api_cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    compressed INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    expires REAL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_api_cache_access ON api_cache(last_access)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_api_cache_expires ON api_cache(expires)")
+
+    # --- Serialización ---
+
+    def _encode(self, value):
+        raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(raw) >= self.compress_threshold:
+            packed = zlib.compress(raw, 6)
+            if len(packed) < len(raw):
+                return packed, 1
+        return raw, 0
+
+    @staticmethod
+    def _decode(blob, compressed):
+        if compressed:
+            blob = zlib.decompress(blob)
+        return json.loads(bytes(blob).decode('utf-8'))
+
+    def _count(self, namespace, field):
+        counters = self._counters.setdefault(namespace, {'hits': 0, 'misses': 0})
+        counters[field] += 1
+
+    # --- Operaciones por clave ---
+
+    def get(self, namespace, key, max_age=None):
+        """
+        Devuelve el valor guardado o None si no existe o ha caducado.
+
+        Args:
+            namespace: Espacio de nombres (p. ej. 'lastfm', 'spotify')
+            key: Clave de la entrada
+            max_age: Antigüedad máxima aceptada en segundos (opcional)
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, compressed, created, expires FROM api_cache WHERE namespace = ? AND key = ?",
+                (namespace, str(key))
+            ).fetchone()
+
+            if row is None:
+                self._count(namespace, 'misses')
+                return None
+
+            value, compressed, created, expires = row
+            if (expires is not None and expires <= now) or (max_age is not None and now - created > max_age):
+                self._count(namespace, 'misses')
+                return None
+
+            try:
+                data = self._decode(value, compressed)
+            except (zlib.error, ValueError) as e:
+                logger.warning(f"Entrada de caché corrupta {namespace}/{key}: {e}")
+                self.delete(namespace, key)
+                self._count(namespace, 'misses')
+                return None
+
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE api_cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, str(key))
+                )
+            self._count(namespace, 'hits')
+            return data
+
+    def set(self, namespace, key, value, ttl=None, created=None):
+        """
+        Guarda un valor serializable a JSON.
+
+        Args:
+            namespace: Espacio de nombres
+            key: Clave de la entrada
+            value: Valor a guardar
+            ttl: Segundos de validez (None = sin caducidad propia)
+            created: Momento de creación si no es ahora (importaciones)
+        """
+        blob, compressed = self._encode(value)
+        size = len(blob) + len(namespace) + len(str(key))
+        now = time.time()
+        created = created if created is not None else now
+        expires = created + ttl if ttl is not None else None
+
+        with self._lock:
+            with self._conn:
+                self._upsert((namespace, str(key), sqlite3.Binary(blob), compressed, created, expires, now, size))
+            self._after_writes(1)
+
+    def set_many(self, namespace, items, ttl=None):
+        """
+        Guarda varias entradas en una sola transacción.
+
+        Args:
+            namespace: Espacio de nombres
+            items: Pares (clave, valor)
+            ttl: Segundos de validez (None = sin caducidad propia)
+        """
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        rows = []
+        for key, value in items:
+            blob, compressed = self._encode(value)
+            size = len(blob) + len(namespace) + len(str(key))
+            rows.append((namespace, str(key), sqlite3.Binary(blob), compressed, now, expires, now, size))
+        if not rows:
+            return
+
+        with self._lock:
+            with self._conn:
+                for row in rows:
+                    self._upsert(row)
+            self._after_writes(len(rows))
+
+    def _upsert(self, row):
+        old = self._conn.execute(
+            "SELECT size FROM api_cache WHERE namespace = ? AND key = ?", row[:2]
+        ).fetchone()
+        self._conn.execute(self._UPSERT, row)
+        self._total_bytes += row[-1] - (old[0] if old else 0)
+
+    def _after_writes(self, count):
+        self._writes_since_check += count
+        if self._writes_since_check >= SIZE_CHECK_INTERVAL:
+            self._total_bytes = self._measure()
+            self._writes_since_check = 0
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def keys(self, namespace, prefix=None):
+        """Claves vigentes de un espacio de nombres (opcionalmente con un prefijo), ordenadas."""
+        sql, params = self._prefix_query("SELECT key FROM api_cache", namespace, prefix)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql + " ORDER BY key", params)]
+
+    def items(self, namespace, prefix=None):
+        """
+        Entradas vigentes de un espacio de nombres, ordenadas por clave.
+
+        Returns:
+            list: Pares (clave, valor)
+        """
+        sql, params = self._prefix_query("SELECT key, value, compressed FROM api_cache", namespace, prefix)
+        result = []
+        with self._lock:
+            for key, value, compressed in self._conn.execute(sql + " ORDER BY key", params).fetchall():
+                try:
+                    result.append((key, self._decode(value, compressed)))
+                except (zlib.error, ValueError) as e:
+                    logger.warning(f"Entrada de caché corrupta {namespace}/{key}: {e}")
+            if result:
+                sql, params = self._prefix_query("UPDATE api_cache SET last_access = ?", namespace, prefix)
+                with self._conn:
+                    self._conn.execute(sql, [time.time()] + params)
+            self._count(namespace, 'hits' if result else 'misses')
+        return result
+
+    def _prefix_query(self, sql, namespace, prefix):
+        """Añade a sql la condición de espacio de nombres, prefijo y vigencia."""
+        conditions = ["namespace = ?", "(expires IS NULL OR expires > ?)"]
+        params = [namespace, time.time()]
+        if prefix:
+            # substr en lugar de LIKE para no interpretar '_' y '%' de la clave
+            conditions.append("substr(key, 1, ?) = ?")
+            params.extend([len(prefix), prefix])
+        return sql + " WHERE " + " AND ".join(conditions), params
+
+    def delete(self, namespace, key):
+        """Elimina una entrada. Devuelve True si existía."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM api_cache WHERE namespace = ? AND key = ? RETURNING size",
+                (namespace, str(key))
+            )
+            row = cursor.fetchone()
+            if row:
+                self._total_bytes -= row[0]
+            return row is not None
+
+    def delete_many(self, namespace, keys):
+        """Elimina varias entradas en una sola transacción. Devuelve cuántas existían."""
+        removed = 0
+        with self._lock, self._conn:
+            for key in keys:
+                row = self._conn.execute(
+                    "DELETE FROM api_cache WHERE namespace = ? AND key = ? RETURNING size",
+                    (namespace, str(key))
+                ).fetchone()
+                if row:
+                    self._total_bytes -= row[0]
+                    removed += 1
+        return removed
+
+    def clear(self, namespace=None, prefix=None):
+        """
+        Elimina entradas de la caché.
+
+        Args:
+            namespace: Espacio de nombres a vaciar (None = toda la caché)
+            prefix: Sólo las claves que empiezan por este prefijo
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        sql = "DELETE FROM api_cache"
+        conditions = []
+        params = []
+        if namespace is not None:
+            conditions.append("namespace = ?")
+            params.append(namespace)
+        if prefix:
+            # substr en lugar de LIKE para no interpretar '_' y '%' de la clave
+            conditions.append("substr(key, 1, ?) = ?")
+            params.extend([len(prefix), prefix])
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute(sql, params).rowcount
+            self._total_bytes = self._measure()
+        return removed
+
+    # --- Mantenimiento ---
+
+    def _measure(self):
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM api_cache").fetchone()
+        return row[0]
+
+    def purge_expired(self):
+        """Elimina las entradas con caducidad vencida. Devuelve cuántas."""
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute(
+                    "DELETE FROM api_cache WHERE expires IS NOT NULL AND expires <= ?", (time.time(),)
+                ).rowcount
+            if removed:
+                self._total_bytes = self._measure()
+        return removed
+
+    def _evict(self):
+        """Reduce la caché al 90% de max_bytes empezando por las menos usadas."""
+        target = int(self.max_bytes * 0.9)
+        self.purge_expired()
+        if self._total_bytes <= target:
+            return
+
+        excess = self._total_bytes - target
+        with self._conn:
+            # Suma acumulada por antigüedad de acceso: se borra el prefijo
+            # más corto que libera al menos 'excess' bytes
+            self._conn.execute("""
+                DELETE FROM api_cache WHERE (namespace, key) IN (
+                    SELECT namespace, key FROM (
+                        SELECT namespace, key,
+                               SUM(size) OVER (ORDER BY last_access
+                                               ROWS UNBOUNDED PRECEDING) - size AS freed_before
+                        FROM api_cache
+                    ) WHERE freed_before < ?
+                )
+            """, (excess,))
+        self._total_bytes = self._measure()
+        logger.debug(f"Caché reducida a {self._total_bytes} bytes")
+
+    def stats(self, namespace=None):
+        """
+        Estadísticas de uso.
+
+        Returns:
+            dict: {namespace: {'entries', 'bytes', 'hits', 'misses'}}
+        """
+        sql = "SELECT namespace, COUNT(*), SUM(size) FROM api_cache"
+        params = []
+        if namespace is not None:
+            sql += " WHERE namespace = ?"
+            params.append(namespace)
+        sql += " GROUP BY namespace"
+
+        with self._lock:
+            result = {}
+            for ns, entries, size in self._conn.execute(sql, params):
+                result[ns] = {'entries': entries, 'bytes': size or 0, 'hits': 0, 'misses': 0}
+            for ns, counters in self._counters.items():
+                if namespace is not None and ns != namespace:
+                    continue
+                result.setdefault(ns, {'entries': 0, 'bytes': 0, 'hits': 0, 'misses': 0})
+                result[ns].update(counters)
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_api_cache(db_path=None, **kwargs):
+    """Devuelve la instancia compartida de ApiCache para un fichero."""
+    path = os.path.abspath(str(db_path or DEFAULT_CACHE_PATH))
+    with _instances_lock:
+        cache = _instances.get(path)
+        if cache is None:
+            cache = ApiCache(path, **kwargs)
+            _instances[path] = cache
+        return cache
+
+
+def import_legacy_json(cache, namespace, json_path, entries, ttl=None):
+    """
+    Pasa a la caché compartida el contenido de un fichero de caché JSON antiguo
+    y lo elimina.
+
+    Args:
+        cache: Instancia de ApiCache
+        namespace: Espacio de nombres de destino
+        json_path: Ruta del fichero JSON
+        entries: Función que recibe el JSON cargado y devuelve pares
+                 (clave, valor, timestamp de creación)
+        ttl: Segundos de validez de las entradas importadas
+
+    Returns:
+        int: Número de entradas importadas
+    """
+    if not json_path or not os.path.isfile(json_path):
+        return 0
+
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No se pudo leer la caché antigua {json_path}: {e}")
+        return 0
+
+    imported = 0
+    now = time.time()
+    for key, value, created in entries(data):
+        created = now if created is None else created
+        if ttl is not None and created + ttl <= now:
+            continue
+        cache.set(namespace, key, value, ttl=ttl, created=created)
+        imported += 1
+
+    try:
+        os.remove(json_path)
+    except OSError as e:
+        logger.warning(f"No se pudo eliminar la caché antigua {json_path}: {e}")
+
+    logger.info(f"Importadas {imported} entradas de {json_path} a la caché '{namespace}'")
+    return imported
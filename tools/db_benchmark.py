@@ -0,0 +1,770 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la cadena de creación de la base de datos
+
+Amplía la idea de test_db_creation_time.py (ejecutar cada script por
+separado y comparar la base de datos antes y después) para detectar
+regresiones de rendimiento sin depender de la biblioteca ni de las APIs
+reales:
+
+- Genera una biblioteca sintética de FLAC (sólo cabeceras y etiquetas) y un
+  historial de escuchas para cada escala (1k y 10k canciones por defecto;
+  100k lleva horas y sólo se ejecuta pidiéndolo con --scales).
+- Levanta un servidor HTTP local que sustituye a Last.fm, MusicBrainz,
+  Wikidata y lyrics.ovh; las peticiones de los scripts se redirigen a él, de
+  modo que el benchmark funciona sin conexión y sin límites de peticiones.
+- Ejecuta cada etapa (escáner, importadores, estadísticas...) en un proceso
+  aparte sobre una base de datos nueva y mide su tiempo, el pico de memoria
+  (RSS), el número de sentencias SQL y el crecimiento de la base de datos.
+- Guarda los resultados en JSON y los compara con una línea base guardada.
+
+Bibliotecas, bases de datos y registros (también los que los scripts
+escriben en .content/logs) van al directorio de trabajo, por defecto uno
+temporal fuera del proyecto.
+
+Uso:
+    python tools/db_benchmark.py --scales 1000 10000 --output benchmark.json
+    python tools/db_benchmark.py --scales 100000 --workdir /ruta/con/espacio
+    python tools/db_benchmark.py --scales 1000 --save-baseline benchmark_baseline.json
+    python tools/db_benchmark.py --scales 1000 --baseline benchmark_baseline.json
+
+Con --baseline el proceso termina con código 1 si alguna métrica empeora
+más de la tolerancia, para poder usarlo antes de desplegar.
+"""
+
+import argparse
+import bisect
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.test_db_creation_time import compare_snapshots, format_file_size, format_time, get_db_snapshot
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_SCALES = (1000, 10000)
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / "db_benchmark"
+DEFAULT_CONFIG = PROJECT_ROOT / "config" / "config_database_creator_example.json"
+BENCH_USER = "bench"
+
+# Forma de la biblioteca sintética
+SONGS_PER_ALBUM = 10
+ALBUMS_PER_ARTIST = 4
+LISTENS_PER_SONG = 5
+GENRES = ["Rock", "Pop", "Jazz", "Electronic", "Hip-Hop", "Folk", "Metal", "Soul", "Ambient", "Punk"]
+LABELS = ["Sub Pop", "Warp", "Matador", "4AD", "XL Recordings", "Rough Trade", "Blue Note", "Merge"]
+# Las escuchas se reparten en dos años a partir de esta fecha (UTC)
+LISTENS_START = 1704067200  # 2024-01-01
+LISTENS_SPAN = 2 * 365 * 24 * 3600
+
+# Etapas que se ejecutan en cada escala, en orden, sobre la misma base de datos.
+#   script: script de db/ ejecutado como lo haría db_creator.py con 'config'
+#   stats: db/stats/estadisticas.py para BENCH_USER ('full' o incremental)
+#   seed_listens: preparación (no se mide); copia en listens_<usuario> las
+#                 escuchas sintéticas hasta la fracción 'until' del historial
+DEFAULT_SUITE = [
+    {"name": "scan", "kind": "script", "script": "path/db_musica_path",
+     "config": {"sync_filesystem": False}},
+    {"name": "rescan", "kind": "script", "script": "path/db_musica_path",
+     "config": {"sync_filesystem": False, "incremental_scan": True}},
+    {"name": "lastfm_import", "kind": "script", "script": "lastfm/lastfm_escuchas",
+     "config": {"concurrent_pages": 4, "requests_per_second": 1000}},
+    {"name": "lyrics", "kind": "script", "script": "letras/letras_genius_ovh",
+     "config": {"batch_size": 2000, "no_resume": True}},
+    {"name": "seed_listens", "kind": "seed_listens", "until": 0.99},
+    {"name": "stats_full", "kind": "stats", "full": True},
+    {"name": "seed_new_listens", "kind": "seed_listens", "until": 1.0},
+    {"name": "stats_incremental", "kind": "stats", "full": False},
+]
+
+# Métricas comparadas con la línea base y diferencia absoluta mínima para
+# considerarlas (por debajo es ruido de medida)
+COMPARED_METRICS = {
+    "wall_time": 0.5,
+    "peak_rss_kb": 10 * 1024,
+    "sql_statements": 100,
+    "db_growth": 1024 * 1024,
+}
+DEFAULT_TOLERANCE = 0.25
+
+
+# --- Biblioteca y escuchas sintéticas ---
+
+def synthetic_tracks(n_songs, seed=0):
+    """
+    Metadatos deterministas de una biblioteca de n_songs canciones.
+
+    Returns:
+        list: Un diccionario por canción (artista, álbum, título, etiquetas...)
+    """
+    rng = random.Random(f"library-{seed}")
+    tracks = []
+    for index in range(n_songs):
+        album_index = index // SONGS_PER_ALBUM
+        artist_index = album_index // ALBUMS_PER_ARTIST
+        album_rng = random.Random(f"album-{seed}-{album_index}")
+        tracks.append({
+            "index": index,
+            "artist": f"Artista {artist_index:05d}",
+            "album": f"Álbum {album_index:06d}",
+            "title": f"Canción {index:07d}",
+            "track": index % SONGS_PER_ALBUM + 1,
+            "date": str(1960 + album_rng.randrange(65)),
+            "genre": album_rng.choice(GENRES),
+            "label": album_rng.choice(LABELS),
+            "duration": rng.randint(90, 600),
+            "replaygain": f"{rng.uniform(-12, 2):.2f} dB",
+        })
+    return tracks
+
+
+def _flac_bytes(tags, seconds, sample_rate=44100):
+    """FLAC mínimo: STREAMINFO y VORBIS_COMMENT, sin tramas de audio."""
+    streaminfo = struct.pack(">HH", 4096, 4096) + bytes(6)
+    # frecuencia (20 bits), canales - 1 (3), bits por muestra - 1 (5), muestras totales (36)
+    packed = (sample_rate << 44) | (1 << 41) | (15 << 36) | (seconds * sample_rate)
+    streaminfo += packed.to_bytes(8, "big") + bytes(16)
+
+    vendor = b"mfuzz benchmark"
+    comments = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(tags))
+    for key, value in tags.items():
+        entry = f"{key}={value}".encode("utf-8")
+        comments += struct.pack("<I", len(entry)) + entry
+
+    return (b"fLaC"
+            + bytes([0]) + len(streaminfo).to_bytes(3, "big") + streaminfo
+            + bytes([0x80 | 4]) + len(comments).to_bytes(3, "big") + comments)
+
+
+def generate_library(root, tracks):
+    """
+    Escribe la biblioteca en root/<artista>/<año> - <álbum>/<nº> - <título>.flac.
+
+    Si ya existe una biblioteca generada con el mismo número de canciones se reutiliza.
+    """
+    root = Path(root)
+    marker = root / ".bench_library"
+    if marker.exists() and marker.read_text().strip() == str(len(tracks)):
+        return root
+
+    if root.exists():
+        shutil.rmtree(root)
+    for track in tracks:
+        folder = root / track["artist"] / f"{track['date']} - {track['album']}"
+        folder.mkdir(parents=True, exist_ok=True)
+        tags = {
+            "TITLE": track["title"],
+            "ARTIST": track["artist"],
+            "ALBUMARTIST": track["artist"],
+            "ALBUM": track["album"],
+            "DATE": track["date"],
+            "GENRE": track["genre"],
+            "LABEL": track["label"],
+            "TRACKNUMBER": track["track"],
+            "REPLAYGAIN_TRACK_GAIN": track["replaygain"],
+        }
+        path = folder / f"{track['track']:02d} - {track['title']}.flac"
+        path.write_bytes(_flac_bytes(tags, track["duration"]))
+    marker.write_text(str(len(tracks)))
+    return root
+
+
+def synthetic_listens(tracks, per_song=LISTENS_PER_SONG, seed=0):
+    """
+    Historial de escuchas determinista con popularidad desigual (unas pocas
+    canciones acumulan muchas escuchas, como en un historial real).
+
+    Returns:
+        list: Tuplas (timestamp, canción) en orden cronológico
+    """
+    rng = random.Random(f"listens-{seed}")
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(tracks))]
+    order = list(range(len(tracks)))
+    rng.shuffle(order)
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+
+    count = len(tracks) * per_song
+    picks = rng.choices(order, cum_weights=cum_weights, k=count)
+    timestamps = sorted(LISTENS_START + rng.randrange(LISTENS_SPAN) for _ in range(count))
+    return [(ts, tracks[index]) for ts, index in zip(timestamps, picks)]
+
+
+def seed_listens(db_path, username, listens, until=1.0):
+    """
+    Copia en listens_<usuario> las escuchas sintéticas hasta la fracción
+    'until' del historial, continuando por donde se quedó la anterior.
+
+    Returns:
+        int: Escuchas añadidas
+    """
+    table = f"listens_{username}"
+    conn = sqlite3.connect(db_path)
+    try:
+        # Mismo esquema que crea listenbrainz/listens_listenbrainz
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                track_name TEXT NOT NULL,
+                album_name TEXT,
+                artist_name TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                listen_date TIMESTAMP NOT NULL,
+                listenbrainz_url TEXT,
+                song_id INTEGER,
+                album_id INTEGER,
+                artist_id INTEGER,
+                listen_id TEXT,
+                additional_data TEXT
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_song_id ON {table}(song_id)")
+
+        # Sin escaneo previo las escuchas quedan sin enlazar, como las de canciones que no están
+        song_ids = {}
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='songs'").fetchone():
+            song_ids = {(artist, title): song_id for song_id, artist, title in
+                        conn.execute("SELECT id, artist, title FROM songs")}
+        done = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        pending = listens[done:int(len(listens) * until)]
+
+        with conn:
+            conn.executemany(f"""
+                INSERT INTO {table} (track_name, album_name, artist_name, timestamp, listen_date, song_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, ((track["title"], track["album"], track["artist"], ts,
+                   datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                   song_ids.get((track["artist"], track["title"])))
+                  for ts, track in pending))
+        return len(pending)
+    finally:
+        conn.close()
+
+
+# --- Servicios simulados ---
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Responde a /<host original>/<ruta> con respuestas mínimas de cada API.
+    Cualquier host sin simular devuelve 404, así nada sale a la red.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        host, _, path = parts.path.lstrip("/").partition("/")
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+        handler = {
+            "ws.audioscrobbler.com": self._lastfm,
+            "api.lyrics.ovh": self._lyrics,
+            "musicbrainz.org": self._musicbrainz,
+            "www.wikidata.org": self._wikidata,
+            "query.wikidata.org": self._wikidata_sparql,
+        }.get(host)
+
+        if handler is None:
+            self._send(404, {"error": f"sin servicio simulado para {host}"})
+        else:
+            self._send(*handler("/" + path, params))
+
+    do_POST = do_GET
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _lastfm(self, path, params):
+        method = params.get("method")
+        if method != "user.getrecenttracks":
+            # auth.getSession sin token: error distinto de 10, la API key se da por buena
+            return 200, {"error": 4, "message": "Invalid authentication token supplied"}
+
+        listens, timestamps = self.server.listens, self.server.timestamps
+        start = bisect.bisect_left(timestamps, int(params.get("from") or 0))
+        end = bisect.bisect_right(timestamps, int(params.get("to") or sys.maxsize))
+        limit = max(1, int(params.get("limit", 50)))
+        page = max(1, int(params.get("page", 1)))
+        total = end - start
+
+        # Last.fm devuelve primero las más recientes
+        newest = end - (page - 1) * limit
+        selected = listens[max(start, newest - limit):max(start, newest)]
+        tracks = [{
+            "artist": {"#text": track["artist"], "mbid": ""},
+            "name": track["title"],
+            "album": {"#text": track["album"], "mbid": ""},
+            "date": {"uts": str(ts), "#text": datetime.fromtimestamp(ts, timezone.utc).strftime("%d %b %Y, %H:%M")},
+            "url": f"https://www.last.fm/music/{track['artist']}/_/{track['title']}",
+        } for ts, track in reversed(selected)]
+
+        return 200, {"recenttracks": {
+            "track": tracks,
+            "@attr": {
+                "user": params.get("user", ""),
+                "page": str(page),
+                "perPage": str(limit),
+                "totalPages": str(-(-total // limit)),
+                "total": str(total),
+            },
+        }}
+
+    def _lyrics(self, path, params):
+        return 200, {"lyrics": "La la la\nLa la la la\n" * 8}
+
+    def _musicbrainz(self, path, params):
+        entity = path.strip("/").split("/")[2] if path.count("/") >= 3 else ""
+        if "query" in params:
+            return 200, {"created": "2024-01-01T00:00:00Z", "count": 0, "offset": 0, f"{entity}s": []}
+        return 404, {"error": "Not Found"}
+
+    def _wikidata(self, path, params):
+        return 200, {"entities": {}}
+
+    def _wikidata_sparql(self, path, params):
+        return 200, {"head": {"vars": []}, "results": {"bindings": []}}
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Servidor local con los servicios simulados, en un hilo en segundo plano."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.listens = []
+        self.timestamps = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def set_listens(self, listens):
+        self.listens = listens
+        self.timestamps = [ts for ts, _ in listens]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# --- Proceso de cada etapa ---
+
+def _redirect_requests(port):
+    """Envía todas las peticiones de requests al servidor de servicios simulados."""
+    import requests
+
+    original_request = requests.sessions.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        url = urlunsplit(("http", f"127.0.0.1:{port}", f"/{parts.netloc}{parts.path}", parts.query, ""))
+        return original_request(self, method, url, *args, **kwargs)
+
+    requests.sessions.Session.request = request
+
+
+def _disable_rate_limits():
+    """Sin red real, los límites por host sólo añadirían esperas a las medidas."""
+    from tools import http_client
+
+    http_client.DEFAULT_HOST_RATE = 1e9
+    for host in list(http_client.HOST_RATE_LIMITS):
+        http_client.set_host_rate(host, 1e9)
+
+
+def _count_sql_statements(counter, lock):
+    """Cuenta las sentencias de todas las conexiones SQLite del proceso por tipo."""
+    original_connect = sqlite3.connect
+
+    def trace(statement):
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+        with lock:
+            counter[kind] += 1
+
+    def connect(*args, **kwargs):
+        conn = original_connect(*args, **kwargs)
+        conn.set_trace_callback(trace)
+        return conn
+
+    sqlite3.connect = connect
+
+
+def run_worker(job_path):
+    """Punto de entrada del proceso de una etapa: la ejecuta y guarda sus medidas."""
+    with open(job_path, "r", encoding="utf-8") as f:
+        job = json.load(f)
+
+    from tools import api_cache
+    api_cache.DEFAULT_CACHE_PATH = Path(job["workdir"], "api_cache.sqlite")
+
+    # Los scripts escriben sus registros en PROJECT_ROOT/.content/logs: se
+    # desvían al directorio de trabajo para no dejar nada en el proyecto
+    import base_module
+    base_module.PROJECT_ROOT = Path(job["workdir"])
+    (base_module.PROJECT_ROOT / ".content" / "logs" / "db").mkdir(parents=True, exist_ok=True)
+
+    counter, lock = Counter(), threading.Lock()
+    _redirect_requests(job["port"])
+    _disable_rate_limits()
+    _count_sql_statements(counter, lock)
+
+    from tools.db_pipeline import load_script_module, run_script_module
+
+    error = None
+    start = time.perf_counter()
+    try:
+        if job["kind"] == "stats":
+            module = load_script_module(PROJECT_ROOT / "db" / "stats" / "estadisticas.py")
+            generator = module.MusicStatsGenerator(job["db_path"], job["username"])
+            try:
+                generator.generate_all_stats(full=job["full"])
+            finally:
+                generator.close()
+        else:
+            script_path = PROJECT_ROOT / "db" / f"{job['script']}.py"
+            run_script_module(job["script"], script_path, job["config"])
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+    duration = time.perf_counter() - start
+
+    with open(job["result_path"], "w", encoding="utf-8") as f:
+        json.dump({"duration": duration, "sql": dict(counter), "error": error}, f)
+    return 1 if error else 0
+
+
+# --- Ejecución del benchmark ---
+
+def _quiet_snapshot(db_path):
+    """Snapshot de la BD (con el WAL volcado para medir el tamaño real) sin su salida por pantalla."""
+    if Path(db_path).exists():
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return get_db_snapshot(db_path)
+
+
+def build_script_config(base_config, script, stage_config, db_path, root_path):
+    """Configuración de un script: la del ejemplo, con las rutas y cuentas del benchmark."""
+    from db_creator import build_script_config as db_creator_config
+
+    # Las rutas y cuentas del benchmark prevalecen también sobre las del script
+    overrides = {
+        "db_path": str(db_path),
+        "root_path": str(root_path),
+        "lastfm_user": BENCH_USER,
+        "lastfm_api_key": "benchmark",
+        "user": BENCH_USER,
+        "token": "benchmark",
+    }
+    config = {
+        "common": {**base_config.get("common", {}), **overrides},
+        script: {**base_config.get(script, {}), **overrides, **stage_config},
+    }
+    return db_creator_config(config, script, {})
+
+
+def run_stage(stage, scale, context):
+    """
+    Ejecuta una etapa en un proceso aparte y devuelve sus medidas.
+
+    Returns:
+        dict: Resultado de la etapa (None para las de preparación)
+    """
+    db_path = context["db_path"]
+
+    if stage["kind"] == "seed_listens":
+        added = seed_listens(db_path, BENCH_USER, context["listens"], stage.get("until", 1.0))
+        print(f"  {stage['name']}: {added:,} escuchas añadidas")
+        return None
+
+    workdir = context["workdir"]
+    label = f"{scale}_{stage['name']}"
+    job = {
+        "kind": stage["kind"],
+        "db_path": str(db_path),
+        "workdir": str(workdir),
+        "port": context["port"],
+        "result_path": str(workdir / f"{label}.result.json"),
+    }
+    if stage["kind"] == "stats":
+        job.update({"username": BENCH_USER, "full": stage.get("full", False)})
+    else:
+        job.update({
+            "script": stage["script"],
+            "config": build_script_config(context["base_config"], stage["script"],
+                                          stage.get("config", {}), db_path, context["library"]),
+        })
+
+    job_path = workdir / f"{label}.job.json"
+    with open(job_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+
+    before = _quiet_snapshot(db_path)
+    log_path = workdir / "logs" / f"{label}.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", str(job_path)],
+            stdout=log, stderr=subprocess.STDOUT, cwd=workdir
+        )
+        # wait4 devuelve el uso de recursos de este proceso (pico de RSS en KB en Linux)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    process_time = time.perf_counter() - start
+
+    after = _quiet_snapshot(db_path)
+    changes = compare_snapshots(before, after) or {}
+
+    worker = {}
+    if Path(job["result_path"]).exists():
+        with open(job["result_path"], "r", encoding="utf-8") as f:
+            worker = json.load(f)
+
+    sql = worker.get("sql", {})
+    return {
+        "scale": scale,
+        "stage": stage["name"],
+        "script": stage.get("script", "stats/estadisticas"),
+        "success": process.returncode == 0 and not worker.get("error"),
+        "returncode": process.returncode,
+        "error": worker.get("error"),
+        "wall_time": worker.get("duration", process_time),
+        "process_time": process_time,
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "peak_rss_kb": usage.ru_maxrss,
+        "sql_statements": sum(sql.values()),
+        "sql_by_type": sql,
+        "db_size_before": before.get("file_size", 0),
+        "db_size_after": after.get("file_size", 0),
+        "db_growth": after.get("file_size", 0) - before.get("file_size", 0),
+        "rows_added": changes.get("total_row_change", 0),
+        "new_tables": len(changes.get("new_tables", [])),
+        "log": str(log_path),
+    }
+
+
+def run_scale(scale, suite, server, base_config, workdir, seed=0):
+    """Ejecuta todas las etapas de una escala sobre una base de datos nueva."""
+    scale_dir = workdir / f"scale_{scale}"
+    scale_dir.mkdir(parents=True, exist_ok=True)
+    db_path = scale_dir / "musica.sqlite"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    Path(scale_dir, "api_cache.sqlite").unlink(missing_ok=True)
+
+    print(f"\n{'='*60}")
+    print(f"ESCALA: {scale:,} canciones")
+    print(f"{'='*60}")
+
+    start = time.perf_counter()
+    tracks = synthetic_tracks(scale, seed)
+    library = generate_library(workdir / f"library_{scale}", tracks)
+    listens = synthetic_listens(tracks, seed=seed)
+    server.set_listens(listens)
+    print(f"✓ Biblioteca y {len(listens):,} escuchas sintéticas listas en {format_time(time.perf_counter() - start)}")
+
+    context = {
+        "db_path": db_path,
+        "workdir": scale_dir,
+        "library": library,
+        "listens": listens,
+        "port": server.port,
+        "base_config": base_config,
+    }
+
+    results = []
+    for stage in suite:
+        result = run_stage(stage, scale, context)
+        if result is None:
+            continue
+        results.append(result)
+        status = "✓" if result["success"] else "✗"
+        print(f"  {status} {stage['name']:<20} {format_time(result['wall_time']):>12}  "
+              f"RSS {format_file_size(result['peak_rss_kb'] * 1024):>10}  "
+              f"SQL {result['sql_statements']:>9,}  "
+              f"BD +{format_file_size(max(0, result['db_growth']))}")
+        if not result["success"]:
+            print(f"    Error: {result['error'] or 'código ' + str(result['returncode'])} (ver {result['log']})")
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compara cada métrica con la de la misma etapa y escala en la línea base.
+
+    Returns:
+        tuple: (regresiones, mejoras) como listas de diccionarios
+    """
+    previous = {(r["scale"], r["stage"]): r for r in baseline.get("results", [])}
+    regressions, improvements = [], []
+
+    for result in results:
+        base = previous.get((result["scale"], result["stage"]))
+        if base is None or not base.get("success") or not result["success"]:
+            continue
+        for metric, min_delta in COMPARED_METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            delta = new - old
+            if abs(delta) < min_delta:
+                continue
+            ratio = delta / old if old else float("inf")
+            entry = {"scale": result["scale"], "stage": result["stage"], "metric": metric,
+                     "baseline": old, "current": new, "change": ratio}
+            if ratio > tolerance:
+                regressions.append(entry)
+            elif ratio < -tolerance:
+                improvements.append(entry)
+    return regressions, improvements
+
+
+def _format_metric(metric, value):
+    if metric == "wall_time":
+        return format_time(value)
+    if metric == "peak_rss_kb":
+        return format_file_size(value * 1024)
+    if metric == "db_growth":
+        return format_file_size(abs(value))
+    return f"{value:,}"
+
+
+def print_comparison(regressions, improvements):
+    for title, entries in (("❌ REGRESIONES", regressions), ("🚀 MEJORAS", improvements)):
+        if not entries:
+            continue
+        print(f"\n{title} ({len(entries)}):")
+        print("-" * 80)
+        for e in entries:
+            print(f"{e['scale']:>7,} {e['stage']:<20} {e['metric']:<15} "
+                  f"{_format_metric(e['metric'], e['baseline']):>12} → {_format_metric(e['metric'], e['current']):>12} "
+                  f"({e['change']:+.0%})")
+    if not regressions:
+        print("\n✓ Sin regresiones respecto a la línea base")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=PROJECT_ROOT).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de los scripts de creación de la base de datos')
+    parser.add_argument('--scales', nargs='+', type=int, default=list(DEFAULT_SCALES),
+                        help='Número de canciones de cada biblioteca sintética')
+    parser.add_argument('--stages', nargs='*',
+                        help='Etapas a ejecutar (por defecto todas las de la suite)')
+    parser.add_argument('--suite', help='JSON con la lista de etapas (por defecto DEFAULT_SUITE)')
+    parser.add_argument('--config', default=str(DEFAULT_CONFIG),
+                        help='Configuración de la que se toman los parámetros de cada script')
+    parser.add_argument('--workdir', default=str(DEFAULT_WORKDIR),
+                        help='Directorio para las bibliotecas, bases de datos y registros')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='Archivo JSON con los resultados')
+    parser.add_argument('--baseline', help='Resultados anteriores con los que comparar')
+    parser.add_argument('--save-baseline', help='Guardar también los resultados como línea base')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Empeoramiento relativo permitido antes de marcar una regresión')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla de los datos sintéticos')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(args.worker)
+
+    suite = DEFAULT_SUITE
+    if args.suite:
+        with open(args.suite, 'r', encoding='utf-8') as f:
+            suite = json.load(f)
+    if args.stages:
+        suite = [stage for stage in suite if stage['name'] in args.stages]
+
+    base_config = {}
+    if Path(args.config).exists():
+        with open(args.config, 'r', encoding='utf-8') as f:
+            base_config = json.load(f)
+
+    workdir = Path(args.workdir).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    server = StandInServer().start()
+    results = []
+    total_start = time.perf_counter()
+    try:
+        for scale in args.scales:
+            results.extend(run_scale(scale, suite, server, base_config, workdir, args.seed))
+    finally:
+        server.stop()
+
+    report = {
+        "date": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "total_time": time.perf_counter() - total_start,
+        "results": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n⏱️  TIEMPO TOTAL: {format_time(report['total_time'])}")
+    print(f"📋 Resultados guardados en: {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.save_baseline)
+        print(f"📋 Línea base guardada en: {args.save_baseline}")
+
+    failed = [r for r in results if not r['success']]
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions, improvements = compare_with_baseline(results, baseline, args.tolerance)
+        print_comparison(regressions, improvements)
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
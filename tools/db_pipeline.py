@@ -0,0 +1,638 @@
+"""
+DB Pipeline - Planificador de los scripts de db_creator como grafo de dependencias
+
+Cada script declara qué recursos lee (inputs), cuáles escribe (outputs) y a
+qué hosts remotos llama. Con esas declaraciones y el orden de scripts_order
+se construye un DAG:
+
+- B depende de A (A anterior en el orden) si B lee algo que A escribe, si
+  ambos escriben lo mismo o si B escribe algo que A lee.
+- Los recursos son tablas ('artists') o partes de una tabla ('artists.links').
+  Escribir la tabla completa cubre todas sus partes; escribir una parte no
+  afecta a quien sólo lee las filas base de la tabla.
+- Un script sin declaración, o marcado como exclusive, actúa de barrera:
+  espera a todos los anteriores y todos los posteriores le esperan.
+
+Los scripts independientes se ejecutan a la vez, cada uno en su propio
+proceso, con un máximo de procesos y de scripts simultáneos por host.
+Todos escriben en el mismo fichero SQLite con un único escritor a la vez:
+en WAL los lectores no bloquean al escritor, y cada transacción de
+escritura de cualquier proceso toma antes un bloqueo compartido por todos
+los procesos (WriterConnection), que se suelta al confirmar o deshacer.
+Un script que deje una transacción abierta mientras espera a la red
+retiene ese bloqueo, así que los scripts deben confirmar antes de cada
+llamada remota.
+
+El modo paralelo sólo se activa con --jobs N o con "max_workers": N en la
+sección "pipeline" de la configuración; por defecto los scripts se
+ejecutan uno tras otro. Las declaraciones por defecto están en
+SCRIPT_DECLARATIONS y se pueden ampliar o sustituir desde esa sección:
+
+    "pipeline": {
+        "host_limits": {"musicbrainz.org": 1},
+        "scripts": {"mi/script": {"inputs": [...], "outputs": [...], "hosts": [...]}}
+    }
+"""
+import importlib.util
+import inspect
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Scripts simultáneos por host si la configuración no indica otra cosa
+DEFAULT_HOST_CONCURRENCY = 1
+
+# Segundos que un escritor espera el bloqueo de la base de datos
+WRITER_TIMEOUT = 600
+
+# Bloqueo de escritura compartido por los procesos del planificador y
+# conexión de este proceso que lo tiene tomado
+_writer_lock = None
+_writer_owner = None
+
+SCRIPT_DECLARATIONS = {
+    'path/db_musica_path': {
+        'inputs': [],
+        'outputs': ['artists', 'albums', 'songs', 'genres', 'lyrics', 'song_links'],
+        'hosts': [],
+    },
+    'path/db_musica_spotify': {
+        'inputs': ['artists'],
+        'outputs': ['artists', 'albums', 'songs', 'song_links'],
+        'hosts': ['api.spotify.com'],
+    },
+    'enlaces/enlaces_artista_album': {
+        'inputs': ['artists', 'albums'],
+        'outputs': ['artists.links', 'albums.links'],
+        'hosts': ['musicbrainz.org', 'api.discogs.com'],
+    },
+    'enlaces/redes_sociales': {
+        'inputs': ['artists', 'artists.links'],
+        'outputs': ['artists_networks'],
+        'hosts': ['www.discogs.com'],
+    },
+    'enlaces/yt_song_links': {
+        'inputs': ['songs', 'artists.links', 'albums.links'],
+        'outputs': ['song_links.youtube'],
+        'hosts': ['www.youtube.com'],
+    },
+    'enlaces/enlaces_canciones': {
+        'inputs': ['songs', 'albums.links'],
+        'outputs': ['song_links.stores'],
+        'hosts': ['bandcamp.com', 'boomkat.com'],
+    },
+    'enlaces/enlaces_albumes': {
+        'inputs': ['albums'],
+        'outputs': ['albums.links'],
+        'hosts': [],
+    },
+    'enlaces/spotify_preview_urls': {
+        'inputs': ['songs', 'song_links'],
+        'outputs': ['song_links.preview'],
+        'hosts': ['open.spotify.com'],
+    },
+    'img/portadas_artistas': {
+        'inputs': ['artists', 'albums', 'artists.links', 'albums.links'],
+        'outputs': ['artists.images', 'albums.images', 'image_fingerprints'],
+        'hosts': ['musicbrainz.org', 'coverartarchive.org', 'ws.audioscrobbler.com'],
+    },
+    'letras/letras_genius_ovh': {
+        'inputs': ['songs'],
+        'outputs': ['lyrics', 'songs.lyrics'],
+        'hosts': ['api.lyrics.ovh', 'api.genius.com'],
+    },
+    'wiki/wikilinks_desde_mb': {
+        'inputs': ['artists.links', 'albums.links', 'labels'],
+        'outputs': ['artists.wiki', 'albums.wiki', 'labels.wiki'],
+        'hosts': ['musicbrainz.org', 'en.wikipedia.org'],
+    },
+    'lastfm/lastfm_escuchas': {
+        'inputs': ['songs', 'artists', 'albums'],
+        'outputs': ['scrobbles', 'lastfm_plays'],
+        'hosts': ['ws.audioscrobbler.com'],
+    },
+    'lastfm/lastfm_info': {
+        'inputs': ['artists', 'albums', 'songs'],
+        'outputs': ['artists.lastfm', 'albums.lastfm', 'songs.lastfm'],
+        'hosts': ['ws.audioscrobbler.com'],
+    },
+    'listenbrainz/listens_listenbrainz': {
+        'inputs': ['songs', 'artists', 'albums'],
+        'outputs': ['listens', 'normalized_songs', 'song_links.listenbrainz'],
+        'hosts': ['api.listenbrainz.org'],
+    },
+    'musicbrainz/mb_sellos': {
+        'inputs': ['albums', 'albums.links'],
+        'outputs': ['labels', 'label_release_relationships', 'label_relationships',
+                    'label_artist_relationships', 'label_external_catalog', 'albums.labels'],
+        'hosts': ['musicbrainz.org', 'api.discogs.com'],
+    },
+    'musicbrainz/mb_data_canciones': {
+        'inputs': ['songs'],
+        'outputs': ['mb_data_songs'],
+        'hosts': ['musicbrainz.org'],
+    },
+    'musicbrainz/mb_release_group': {
+        'inputs': ['albums', 'albums.links', 'labels'],
+        'outputs': ['mb_release_group', 'mb_wikidata', 'albums.release_group'],
+        'hosts': ['musicbrainz.org', 'www.wikidata.org'],
+    },
+    'musicbrainz/mb_discografia': {
+        'inputs': ['artists', 'artists.links'],
+        'outputs': ['musicbrainz_discography'],
+        'hosts': ['musicbrainz.org'],
+    },
+    'discogs/discografia_masters': {
+        'inputs': ['artists', 'artists.links'],
+        'outputs': ['discogs_discography'],
+        'hosts': ['api.discogs.com'],
+    },
+    'discogs/artists_info': {
+        'inputs': ['artists', 'artists.links'],
+        'outputs': ['artists_discogs_info'],
+        'hosts': ['api.discogs.com'],
+    },
+    'discogs/discografia_releases_info': {
+        'inputs': ['discogs_discography'],
+        'outputs': ['discogs_discography.releases'],
+        'hosts': ['api.discogs.com'],
+    },
+    'setlistfm/setlists': {
+        'inputs': ['artists'],
+        'outputs': ['artists_setlistfm', 'places_setlistfm', 'artists.setlistfm'],
+        'hosts': ['api.setlist.fm'],
+    },
+    'posts/review_scrapper': {
+        'inputs': ['artists', 'albums'],
+        'outputs': ['album_aoty', 'album_metacritic', 'feeds.reviews'],
+        'hosts': ['www.albumoftheyear.org', 'www.metacritic.com', 'www.anydecentmusic.com'],
+    },
+    'posts/posts_fresh_rss': {
+        'inputs': ['artists', 'albums'],
+        'outputs': ['feeds.rss'],
+        'hosts': [],
+    },
+    'posts/menciones': {
+        'inputs': ['artists', 'feeds.rss', 'feeds.reviews'],
+        'outputs': ['menciones'],
+        'hosts': [],
+    },
+    'rateyourmusic/rym_artists_links': {
+        'inputs': ['artists'],
+        'outputs': ['rym_artists', 'artists.rym'],
+        'hosts': ['rateyourmusic.com'],
+    },
+    'rateyourmusic/rym_artists_info': {
+        'inputs': ['rym_artists'],
+        'outputs': ['rym_artists.info'],
+        'hosts': ['rateyourmusic.com'],
+    },
+    'rateyourmusic/rym_albums_links': {
+        'inputs': ['rym_artists', 'albums'],
+        'outputs': ['rym_albums'],
+        'hosts': ['rateyourmusic.com'],
+    },
+    'charts/uk_csv': {
+        'inputs': ['artists', 'albums', 'songs'],
+        'outputs': ['uk_charts', 'nme_charts', 'uk_indie_charts'],
+        'hosts': ['musicbrainz.org', 'api.discogs.com'],
+    },
+    'charts/billboard_csv': {
+        'inputs': ['artists', 'albums', 'songs'],
+        'outputs': ['billboard_charts'],
+        'hosts': ['musicbrainz.org', 'api.discogs.com'],
+    },
+    'charts/spain_charts': {
+        'inputs': ['artists', 'albums', 'songs'],
+        'outputs': ['spain_charts'],
+        'hosts': [],
+    },
+    'charts/uk_indie_nme': {
+        'inputs': ['artists', 'albums'],
+        'outputs': ['nme_charts', 'uk_indie_charts'],
+        'hosts': ['en.wikipedia.org'],
+    },
+    'posts/equipboard_artists': {
+        'inputs': ['artists'],
+        'outputs': ['equipboard_artists'],
+        'hosts': ['equipboard.com'],
+    },
+    'posts/equipboard_instruments': {
+        'inputs': ['equipboard_artists'],
+        'outputs': ['equipboard_instruments'],
+        'hosts': ['equipboard.com'],
+    },
+    'posts/equipboard_details': {
+        'inputs': ['equipboard_instruments'],
+        'outputs': ['equipboard_details'],
+        'hosts': ['equipboard.com'],
+    },
+    'libros/epubs': {
+        'inputs': ['artists'],
+        'outputs': ['artists_books'],
+        'hosts': [],
+    },
+    'descargas/orpheus': {
+        'inputs': ['artists', 'albums'],
+        'outputs': ['orpheus_torrents'],
+        'hosts': ['orpheus.network'],
+    },
+    'descargas/rutracker': {
+        'inputs': ['artists', 'albums'],
+        'outputs': ['rutracker_torrents'],
+        'hosts': ['rutracker.org'],
+    },
+    'similares/musicmap': {
+        'inputs': ['artists'],
+        'outputs': ['musicmap_recommendations'],
+        'hosts': ['www.music-map.com'],
+    },
+    # Mantenimiento de la base de datos completa: siempre en solitario
+    'optimiza_db_lastpass': {
+        'exclusive': True,
+    },
+}
+
+
+# --- Ejecución de un script ---
+
+def load_script_module(script_path):
+    """Carga dinámicamente un script Python como módulo"""
+    spec = importlib.util.spec_from_file_location("module.name", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_script_module(script_name, script_path, filtered_config):
+    """Carga un script de db/ y llama a su main con la configuración ya filtrada."""
+    script_module = load_script_module(script_path)
+
+    if 'interactive' in filtered_config:
+        setattr(script_module, 'INTERACTIVE_MODE', filtered_config['interactive'])
+
+    if 'force_update' in filtered_config:
+        setattr(script_module, 'force_update', filtered_config['force_update'])
+
+    # Llamar a la función main y pasarle la configuración directamente
+    if hasattr(script_module, 'main'):
+        # Verificar si main acepta argumentos
+        sig = inspect.signature(script_module.main)
+        if len(sig.parameters) > 0:
+            script_module.main(filtered_config)
+        else:
+            # Configurar una variable global en el módulo
+            setattr(script_module, 'CONFIG', filtered_config)
+            script_module.main()
+    else:
+        print(f"Advertencia: El script {script_name} no tiene función main")
+
+
+def _is_read(sql):
+    """True si la sentencia sólo lee (no necesita el bloqueo de escritura)."""
+    return sql.lstrip().upper().startswith(('SELECT', 'EXPLAIN'))
+
+
+class WriterCursor(sqlite3.Cursor):
+    """Cursor que toma el bloqueo de escritura antes de abrir una transacción."""
+
+    def execute(self, sql, parameters=()):
+        if not _is_read(sql):
+            self.connection._acquire_writer()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection._release_writer()
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection._acquire_writer()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection._release_writer()
+
+    def executescript(self, sql_script):
+        self.connection._acquire_writer()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self.connection._release_writer()
+
+
+class WriterConnection(sqlite3.Connection):
+    """
+    Conexión que serializa las transacciones de escritura entre procesos.
+
+    Antes de la primera sentencia que no sea de lectura se toma _writer_lock
+    y se retiene mientras la transacción siga abierta; commit, rollback o
+    close lo sueltan. Si el bloqueo no llega en WRITER_TIMEOUT segundos se
+    lanza el mismo error que daría SQLite.
+    """
+
+    def cursor(self, factory=WriterCursor):
+        return super().cursor(factory)
+
+    # Los atajos de la conexión y el bloque with no pasan por cursor() ni commit()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self._release_writer()
+
+    def _acquire_writer(self):
+        global _writer_owner
+        if _writer_owner is self or _writer_lock is None:
+            return
+        if not _writer_lock.acquire(timeout=WRITER_TIMEOUT):
+            raise sqlite3.OperationalError("database is locked")
+        _writer_owner = self
+
+    def _release_writer(self):
+        if _writer_owner is self and not self.in_transaction:
+            _release_writer_lock()
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self._release_writer()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._release_writer()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if _writer_owner is self:
+                _release_writer_lock()
+
+
+def _release_writer_lock():
+    global _writer_owner
+    if _writer_owner is not None:
+        _writer_owner = None
+        _writer_lock.release()
+
+
+def _init_worker(writer_lock):
+    """Inicializa cada proceso: todas sus conexiones usan WriterConnection."""
+    global _writer_lock
+    _writer_lock = writer_lock
+
+    original_connect = sqlite3.connect
+
+    def connect(database, *args, **kwargs):
+        if args:
+            timeout, args = args[0], args[1:]
+        else:
+            timeout = kwargs.pop('timeout', 5.0)
+        if len(args) < 4:  # factory es el quinto parámetro tras timeout
+            kwargs.setdefault('factory', WriterConnection)
+        return original_connect(database, max(timeout, WRITER_TIMEOUT), *args, **kwargs)
+
+    sqlite3.connect = connect
+
+
+def _run_in_worker(script_name, script_path, filtered_config):
+    """Punto de entrada de cada proceso: ejecuta un script y devuelve su duración."""
+    start = time.monotonic()
+    try:
+        run_script_module(script_name, script_path, filtered_config)
+    finally:
+        # Una transacción que el script no cerró no debe bloquear a los demás
+        _release_writer_lock()
+    return time.monotonic() - start
+
+
+# --- Grafo de dependencias ---
+
+def get_declarations(config):
+    """Declaraciones por defecto combinadas con las de config['pipeline']['scripts']."""
+    declarations = {name: dict(decl) for name, decl in SCRIPT_DECLARATIONS.items()}
+    for name, decl in config.get('pipeline', {}).get('scripts', {}).items():
+        declarations.setdefault(name, {}).update(decl)
+    return declarations
+
+
+def _covers(written, resource):
+    """True si escribir 'written' modifica 'resource'."""
+    return written == resource or resource.startswith(written + '.')
+
+
+def _conflicts(a, b):
+    """True si dos escrituras tocan lo mismo."""
+    return _covers(a, b) or _covers(b, a)
+
+
+def build_dag(scripts, declarations):
+    """
+    Dependencias de cada script respecto a los anteriores en 'scripts'.
+
+    Returns:
+        dict: {script: set de scripts de los que depende}
+    """
+    deps = {}
+    for index, name in enumerate(scripts):
+        decl = declarations.get(name)
+        earlier = scripts[:index]
+        deps[name] = set()
+
+        if decl is None or decl.get('exclusive'):
+            deps[name].update(earlier)
+            continue
+
+        inputs = decl.get('inputs', [])
+        outputs = decl.get('outputs', [])
+        for previous in earlier:
+            prev_decl = declarations.get(previous)
+            if prev_decl is None or prev_decl.get('exclusive'):
+                deps[name].add(previous)
+                continue
+            prev_inputs = prev_decl.get('inputs', [])
+            prev_outputs = prev_decl.get('outputs', [])
+            if (any(_covers(w, r) for w in prev_outputs for r in inputs)          # lectura tras escritura
+                    or any(_conflicts(w, o) for w in prev_outputs for o in outputs)  # escritura tras escritura
+                    or any(_covers(o, r) for o in outputs for r in prev_inputs)):    # escritura tras lectura
+                deps[name].add(previous)
+    return deps
+
+
+def critical_path(deps, durations):
+    """
+    Cadena de dependencias más larga según las duraciones medidas.
+
+    Returns:
+        tuple: (segundos, [scripts de la cadena])
+    """
+    finish = {}
+    previous = {}
+    for name in deps:  # deps está en orden topológico (orden de ejecución)
+        best = max(deps[name], key=lambda dep: finish.get(dep, 0), default=None)
+        finish[name] = durations.get(name, 0) + (finish.get(best, 0) if best else 0)
+        previous[name] = best
+    if not finish:
+        return 0, []
+    end = max(finish, key=finish.get)
+    chain = []
+    while end:
+        chain.append(end)
+        end = previous[end]
+    return finish[chain[0]], list(reversed(chain))
+
+
+# --- Planificador ---
+
+def run_pipeline(jobs_config, config, max_workers):
+    """
+    Ejecuta los scripts respetando el DAG, en procesos independientes.
+
+    Args:
+        jobs_config: Lista ordenada de (script_name, script_path, filtered_config)
+        config: Configuración completa (para la sección 'pipeline')
+        max_workers: Procesos simultáneos
+
+    Returns:
+        list: Resultados {'name', 'start', 'duration', 'status', 'error'} por script
+    """
+    pipeline_config = config.get('pipeline', {})
+    declarations = get_declarations(config)
+    host_limits = pipeline_config.get('host_limits', {})
+
+    scripts = [name for name, _, _ in jobs_config]
+    jobs = {name: (path, cfg) for name, path, cfg in jobs_config}
+
+    # Los scripts interactivos necesitan la terminal: se ejecutan en solitario en este proceso
+    for name, (_, cfg) in jobs.items():
+        if cfg.get('interactive'):
+            declarations[name] = dict(declarations.get(name, {}), exclusive=True)
+
+    deps = build_dag(scripts, declarations)
+
+    # Lectores concurrentes con un único escritor
+    db_path = config.get('common', {}).get('db_path')
+    if db_path and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+    for name in scripts:
+        if name not in declarations:
+            print(f"Aviso: {name} no tiene declaración de entradas/salidas; se ejecuta en solitario")
+
+    pending = list(scripts)
+    done = set()
+    running = {}
+    hosts_in_use = Counter()
+    results = {}
+    pipeline_start = time.monotonic()
+
+    def host_limit(host):
+        return host_limits.get(host, DEFAULT_HOST_CONCURRENCY)
+
+    def finish(name, start, duration, error=None):
+        done.add(name)
+        results[name] = {
+            'name': name,
+            'start': start - pipeline_start,
+            'duration': duration,
+            'status': 'error' if error else 'ok',
+            'error': error,
+        }
+        if error:
+            print(f"Error al ejecutar {name}: {error}")
+        print(f"=== {name} terminado en {duration:.1f}s ===")
+
+    context = multiprocessing.get_context('spawn')
+    pool_options = {'initializer': _init_worker, 'initargs': (context.Lock(),)}
+    if sys.version_info >= (3, 11):
+        # Un proceso nuevo por script; en 3.10 los procesos se reutilizan, pero
+        # cada trabajo vuelve a cargar su módulo desde cero
+        pool_options['max_tasks_per_child'] = 1
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, **pool_options) as executor:
+        while pending or running:
+            launched = True
+            while launched:
+                launched = False
+                for name in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    if deps[name] - done:
+                        continue
+
+                    decl = declarations.get(name) or {}
+                    if decl.get('exclusive') or name not in declarations:
+                        if running:
+                            continue
+                        pending.remove(name)
+                        print(f"\n=== Ejecutando {name} (en solitario) ===")
+                        start = time.monotonic()
+                        try:
+                            run_script_module(name, *jobs[name])
+                            finish(name, start, time.monotonic() - start)
+                        except Exception as e:
+                            finish(name, start, time.monotonic() - start, str(e))
+                        launched = True
+                        break
+
+                    hosts = decl.get('hosts', [])
+                    if any(hosts_in_use[host] >= host_limit(host) for host in hosts):
+                        continue
+
+                    pending.remove(name)
+                    hosts_in_use.update(hosts)
+                    print(f"\n=== Ejecutando {name} ===")
+                    future = executor.submit(_run_in_worker, name, *jobs[name])
+                    running[future] = (name, time.monotonic(), hosts)
+                    launched = True
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, start, hosts = running.pop(future)
+                hosts_in_use.subtract(hosts)
+                try:
+                    duration = future.result()
+                    finish(name, start, duration)
+                except Exception as e:
+                    finish(name, start, time.monotonic() - start, str(e))
+
+    ordered = [results[name] for name in scripts if name in results]
+    print_pipeline_report(ordered, deps, time.monotonic() - pipeline_start)
+    return ordered
+
+
+def print_pipeline_report(results, deps, wall_time):
+    """Muestra la duración de cada etapa, la suma secuencial y el camino crítico."""
+    print("\n" + "=" * 60)
+    print(" INFORME DE LA EJECUCIÓN ")
+    print("=" * 60)
+    for result in sorted(results, key=lambda r: r['start']):
+        status = "✅" if result['status'] == 'ok' else "❌"
+        print(f"{status} {result['name']:<40} inicio +{result['start']:>7.1f}s  duración {result['duration']:>7.1f}s")
+
+    durations = {result['name']: result['duration'] for result in results}
+    path_time, chain = critical_path({name: deps.get(name, set()) & set(durations) for name in durations},
+                                     durations)
+    print(f"\nTiempo total: {wall_time:.1f}s")
+    print(f"Suma de todas las etapas: {sum(durations.values()):.1f}s")
+    print(f"Camino crítico ({path_time:.1f}s): {' → '.join(chain)}")
+    print("=" * 60)
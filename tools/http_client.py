@@ -0,0 +1,124 @@
+"""
+HTTP Client - Sesiones HTTP persistentes con límite de peticiones por host
+
+Cada RateLimitedSession mantiene un requests.Session con su propio pool de
+conexiones keep-alive y reintentos. El ritmo de peticiones no depende de la
+sesión sino del host: todas las sesiones del proceso que llaman a un mismo
+host comparten su TokenBucket, de modo que varios proveedores pueden
+trabajar en paralelo sin que ninguno supere su límite.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Peticiones por segundo permitidas para cada host conocido
+HOST_RATE_LIMITS = {
+    "musicbrainz.org": 1.0,
+    "coverartarchive.org": 5.0,
+    "api.spotify.com": 5.0,
+    "accounts.spotify.com": 1.0,
+    "api.discogs.com": 1.0,
+    "ws.audioscrobbler.com": 4.0,
+    "www.last.fm": 4.0,
+    "www.wikidata.org": 5.0,
+}
+
+# Hosts sin límite conocido (CDN de imágenes, etc.)
+DEFAULT_HOST_RATE = 10.0
+
+
+class TokenBucket:
+    """
+    Limitador de peticiones por cubo de fichas, compartido entre hilos.
+
+    Se reponen 'tasa' fichas por segundo hasta 'capacidad'; cada petición
+    consume una y espera si no quedan.
+    """
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad or max(1, tasa))
+        self.fichas = self.capacidad
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloquea hasta que haya una ficha disponible y la consume."""
+        while True:
+            with self.lock:
+                ahora = time.monotonic()
+                self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultimo) * self.tasa)
+                self.ultimo = ahora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                espera = (1 - self.fichas) / self.tasa
+            time.sleep(espera)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def set_host_rate(host, rate):
+    """Cambia el límite de un host (p. ej. Discogs con token permite más)."""
+    host = host.lower()
+    with _buckets_lock:
+        HOST_RATE_LIMITS[host] = rate
+        _buckets[host] = TokenBucket(rate)
+
+
+def host_bucket(host):
+    """Devuelve el TokenBucket compartido de un host."""
+    host = host.lower()
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(HOST_RATE_LIMITS.get(host, DEFAULT_HOST_RATE))
+            _buckets[host] = bucket
+        return bucket
+
+
+class RateLimitedSession:
+    """
+    Sesión keep-alive de un proveedor con límite de peticiones por host.
+
+    Args:
+        pool_size: Conexiones abiertas por host (igual al número de hilos que la usan)
+        retries: Reintentos ante errores 429/5xx
+        headers: Cabeceras comunes a todas las peticiones
+        timeout: Tiempo máximo por petición en segundos
+    """
+    def __init__(self, pool_size=8, retries=3, headers=None, timeout=15):
+        self.timeout = timeout
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+
+        retry_strategy = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST"],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry_strategy)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        host_bucket(urlparse(url).netloc).adquirir()
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
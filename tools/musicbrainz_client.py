@@ -0,0 +1,382 @@
+"""
+MusicBrainz Client - Cliente compartido de MusicBrainz y Wikidata
+
+Todas las consultas a MusicBrainz y Wikidata de los scripts de db/ y de los
+módulos pasan por aquí:
+
+- Límite de peticiones por proceso: las peticiones salen por una
+  RateLimitedSession (tools/http_client.py), así que todos los hilos y
+  scripts del proceso comparten el TokenBucket de cada host.
+- Peticiones en curso compartidas: si dos hilos piden a la vez la misma
+  entidad, sólo uno hace la petición y el otro espera su resultado.
+- Almacén persistente por MBID (tools/api_cache.py, espacio 'musicbrainz'):
+  cada entidad guarda una única respuesta junto con los inc= con que se
+  pidió. Una consulta cuyos inc= están contenidos en los guardados se sirve
+  del almacén; si no, se pide la unión de ambos (más los inc= habituales de
+  ese tipo de entidad, BATCHED_INCS), de forma que los scripts que piden la
+  misma entidad con distintos inc= no repiten la petición.
+- Caducidad y revalidación: pasado el ttl, la entidad se revalida con
+  If-None-Match / If-Modified-Since cuando el servidor dio ETag o
+  Last-Modified; las entidades de Wikidata se revalidan por lotes
+  comparando lastrevid.
+- Los 404 también se guardan (con caducidad corta) para no repetirlos.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+from tools.api_cache import get_api_cache
+from tools.http_client import RateLimitedSession
+
+MUSICBRAINZ_API_URL = "https://musicbrainz.org/ws/2"
+WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
+WIKIDATA_SPARQL_URL = "https://query.wikidata.org/sparql"
+
+DEFAULT_USER_AGENT = "MusicLibraryEnricher/1.0 (frodobolson@disroot.org)"
+
+DEFAULT_TTL = 30 * 24 * 60 * 60
+SEARCH_TTL = 7 * 24 * 60 * 60
+NOT_FOUND_TTL = 24 * 60 * 60
+
+# Máximo de entidades por petición wbgetentities
+WIKIDATA_BATCH_SIZE = 50
+WIKIDATA_LANGUAGES = "en|es"
+
+# inc= que se piden siempre para cada tipo de entidad: cubren lo que usan
+# mb_sellos, mb_release_group, wikilinks_desde_mb y muspy con una sola petición
+BATCHED_INCS = {
+    "release": {"labels", "label-rels", "release-groups", "url-rels", "genres", "artist-credits"},
+    "release-group": {"url-rels", "artist-credits", "releases", "genres"},
+    "label": {"url-rels", "label-rels", "release-rels", "artist-rels", "aliases"},
+    "artist": {"url-rels", "aliases", "genres"},
+    "recording": {"url-rels", "artist-credits"},
+}
+
+
+class MusicBrainzClient:
+    """
+    Cliente de MusicBrainz y Wikidata con almacén persistente.
+
+    Args:
+        user_agent: User-Agent de las peticiones (MusicBrainz lo exige)
+        cache: Instancia de ApiCache (por defecto la compartida del proyecto)
+        ttl: Segundos que una respuesta se da por buena sin revalidar
+        session: RateLimitedSession a reutilizar (opcional)
+    """
+
+    def __init__(self, user_agent=None, cache=None, ttl=DEFAULT_TTL, session=None):
+        self.ttl = ttl
+        self.cache = cache or get_api_cache()
+        self.session = session or RateLimitedSession(
+            pool_size=4,
+            headers={"User-Agent": user_agent or DEFAULT_USER_AGENT, "Accept": "application/json"},
+            timeout=30
+        )
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'hits': 0, 'revalidated': 0, 'coalesced': 0}
+
+    def _count(self, field):
+        with self._lock:
+            self.counters[field] += 1
+
+    def _coalesce(self, key, fetch):
+        """
+        Ejecuta fetch() una sola vez por clave aunque la pidan varios hilos a la vez.
+
+        Returns:
+            tuple: (resultado, True si lo obtuvo este hilo)
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            self._count('coalesced')
+            return future.result(), False
+
+        try:
+            result = fetch()
+            future.set_result(result)
+            return result, True
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # --- MusicBrainz ---
+
+    def get_entity(self, entity, mbid, inc=None, ttl=None):
+        """
+        Consulta una entidad de MusicBrainz por MBID.
+
+        Args:
+            entity: Tipo de entidad ('release', 'release-group', 'label', 'artist'...)
+            mbid: MusicBrainz ID
+            inc: inc= necesarios, como iterable o cadena 'a+b'
+            ttl: Validez en segundos (por defecto la del cliente)
+
+        Returns:
+            dict: Respuesta JSON, o None si la entidad no existe
+
+        Raises:
+            requests.RequestException: Si la petición falla
+        """
+        if not mbid:
+            return None
+        wanted = _inc_set(inc)
+        ttl = self.ttl if ttl is None else ttl
+        key = f"{entity}/{mbid}"
+
+        while True:
+            stored = self.cache.get("musicbrainz", key)
+            if stored and wanted <= set(stored['inc']) and not self._expired(stored, ttl):
+                self._count('hits')
+                return stored['data']
+
+            result, fetched = self._coalesce(("musicbrainz", key),
+                                             lambda: self._fetch_entity(entity, mbid, wanted, ttl))
+            # Si otro hilo pidió la entidad con otros inc=, se vuelve a mirar el almacén
+            if fetched or wanted <= set(result['inc']):
+                return result['data']
+
+    def _fetch_entity(self, entity, mbid, wanted, ttl):
+        key = f"{entity}/{mbid}"
+        stored = self.cache.get("musicbrainz", key)
+
+        # Otro hilo pudo completarla mientras se esperaba
+        if stored and wanted <= set(stored['inc']) and not self._expired(stored, ttl):
+            self._count('hits')
+            return stored
+
+        headers = {}
+        if stored and wanted <= set(stored['inc']) and not stored.get('missing'):
+            # Mismos inc=, sólo ha caducado: petición condicional
+            inc = set(stored['inc'])
+            if stored.get('etag'):
+                headers['If-None-Match'] = stored['etag']
+            if stored.get('last_modified'):
+                headers['If-Modified-Since'] = stored['last_modified']
+        else:
+            inc = wanted | BATCHED_INCS.get(entity, set())
+            if stored and not stored.get('missing'):
+                inc |= set(stored['inc'])
+
+        params = {"fmt": "json"}
+        if inc:
+            params["inc"] = "+".join(sorted(inc))
+
+        self._count('requests')
+        response = self.session.get(f"{MUSICBRAINZ_API_URL}/{entity}/{mbid}", params=params, headers=headers)
+
+        if response.status_code == 304 and stored:
+            self._count('revalidated')
+            stored['fetched'] = time.time()
+            self.cache.set("musicbrainz", key, stored)
+            return stored
+
+        if response.status_code == 404:
+            record = {'inc': sorted(inc), 'data': None, 'missing': True, 'fetched': time.time()}
+            self.cache.set("musicbrainz", key, record, ttl=NOT_FOUND_TTL)
+            return record
+
+        response.raise_for_status()
+        record = {
+            'inc': sorted(inc),
+            'data': response.json(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched': time.time(),
+        }
+        self.cache.set("musicbrainz", key, record)
+        return record
+
+    @staticmethod
+    def _expired(record, ttl):
+        return time.time() - record.get('fetched', 0) > ttl
+
+    def search(self, entity, query, limit=25, offset=0, ttl=SEARCH_TTL):
+        """
+        Búsqueda en MusicBrainz (p. ej. search('label', 'Warp')).
+
+        Returns:
+            dict: Respuesta JSON de la búsqueda
+        """
+        key = f"{entity}?query={query}&limit={limit}&offset={offset}"
+        data = self.cache.get("musicbrainz_search", key, max_age=ttl)
+        if data is not None:
+            self._count('hits')
+            return data
+
+        def fetch():
+            self._count('requests')
+            response = self.session.get(f"{MUSICBRAINZ_API_URL}/{entity}/", params={
+                "query": query, "limit": limit, "offset": offset, "fmt": "json"
+            })
+            response.raise_for_status()
+            result = response.json()
+            self.cache.set("musicbrainz_search", key, result, ttl=ttl)
+            return result
+
+        return self._coalesce(("musicbrainz_search", key), fetch)[0]
+
+    # --- Wikidata ---
+
+    def get_wikidata_entities(self, ids, props=("claims", "labels", "sitelinks"), ttl=None):
+        """
+        Consulta entidades de Wikidata (Q... o P...) en lotes de WIKIDATA_BATCH_SIZE.
+
+        Returns:
+            dict: {id: entidad} con las entidades que existen
+        """
+        wanted = set(props.split("|") if isinstance(props, str) else props)
+        ttl = self.ttl if ttl is None else ttl
+        result = {}
+        missing = []
+        stale = {}
+
+        for entity_id in dict.fromkeys(i for i in ids if i):
+            stored = self.cache.get("wikidata", f"{WIKIDATA_LANGUAGES}/{entity_id}")
+            if stored and wanted <= set(stored['props']):
+                if not self._expired(stored, ttl):
+                    self._count('hits')
+                    if stored['data'] is not None:
+                        result[entity_id] = stored['data']
+                    continue
+                if stored['data'] is not None and 'lastrevid' in stored['data']:
+                    stale[entity_id] = stored
+                    continue
+            missing.append(entity_id)
+
+        # Entidades caducadas: sólo se vuelven a pedir las que tienen una revisión nueva
+        for chunk in _chunks(list(stale), WIKIDATA_BATCH_SIZE):
+            current = self._wbgetentities(chunk, {"info"})
+            for entity_id in chunk:
+                stored = stale[entity_id]
+                info = current.get(entity_id)
+                if info is not None and info.get('lastrevid') == stored['data'].get('lastrevid'):
+                    self._count('revalidated')
+                    stored['fetched'] = time.time()
+                    self.cache.set("wikidata", f"{WIKIDATA_LANGUAGES}/{entity_id}", stored)
+                    result[entity_id] = stored['data']
+                else:
+                    missing.append(entity_id)
+
+        for chunk in _chunks(missing, WIKIDATA_BATCH_SIZE):
+            fetch_props = set(wanted) | {"info"}
+            for entity_id in chunk:
+                stored = self.cache.get("wikidata", f"{WIKIDATA_LANGUAGES}/{entity_id}")
+                if stored:
+                    fetch_props |= set(stored['props'])
+
+            key = ("wikidata", "|".join(chunk), "|".join(sorted(fetch_props)))
+            entities = self._coalesce(key, lambda: self._wbgetentities(chunk, fetch_props))[0]
+            now = time.time()
+            for entity_id in chunk:
+                entity = entities.get(entity_id)
+                if entity is None or 'missing' in entity:
+                    self.cache.set("wikidata", f"{WIKIDATA_LANGUAGES}/{entity_id}",
+                                   {'props': sorted(fetch_props), 'data': None, 'fetched': now},
+                                   ttl=NOT_FOUND_TTL)
+                    continue
+                self.cache.set("wikidata", f"{WIKIDATA_LANGUAGES}/{entity_id}",
+                               {'props': sorted(fetch_props), 'data': entity, 'fetched': now})
+                result[entity_id] = entity
+
+        return result
+
+    def get_wikidata_entity(self, entity_id, props=("claims", "labels", "sitelinks"), ttl=None):
+        """Consulta una sola entidad de Wikidata. Devuelve None si no existe."""
+        return self.get_wikidata_entities([entity_id], props, ttl).get(entity_id)
+
+    def _wbgetentities(self, ids, props):
+        self._count('requests')
+        response = self.session.get(WIKIDATA_API_URL, params={
+            "action": "wbgetentities",
+            "ids": "|".join(ids),
+            "format": "json",
+            "languages": WIKIDATA_LANGUAGES,
+            "props": "|".join(sorted(props)),
+        })
+        response.raise_for_status()
+        return response.json().get('entities', {})
+
+    def get_wikidata_formatter_urls(self, property_ids, ttl=None):
+        """
+        Formatter URL (P1630) de cada propiedad, con una sola consulta SPARQL
+        para todas las que no estén en el almacén.
+
+        Returns:
+            dict: {property_id: formatter_url}
+        """
+        ttl = self.ttl if ttl is None else ttl
+        result = {}
+        missing = []
+        for property_id in dict.fromkeys(property_ids):
+            stored = self.cache.get("wikidata_formatter", property_id, max_age=ttl)
+            if stored is None:
+                missing.append(property_id)
+                continue
+            self._count('hits')
+            if stored.get('url'):
+                result[property_id] = stored['url']
+
+        if not missing:
+            return result
+
+        query = """
+            SELECT ?property ?formatterURL WHERE {
+            ?property wdt:P1630 ?formatterURL.
+            VALUES ?property { %s }
+            }
+        """ % " ".join(f"wd:{pid}" for pid in missing)
+
+        self._count('requests')
+        response = self.session.get(WIKIDATA_SPARQL_URL, params={"query": query, "format": "json"},
+                                    headers={"Accept": "application/sparql-results+json"})
+        response.raise_for_status()
+
+        found = {}
+        for binding in response.json().get('results', {}).get('bindings', []):
+            if 'property' in binding and 'formatterURL' in binding:
+                property_id = binding['property']['value'].split('/')[-1]
+                found.setdefault(property_id, binding['formatterURL']['value'])
+
+        for property_id in missing:
+            self.cache.set("wikidata_formatter", property_id, {'url': found.get(property_id)}, ttl=ttl)
+        result.update(found)
+        return result
+
+    def close(self):
+        self.session.close()
+
+
+def _inc_set(inc):
+    if not inc:
+        return set()
+    if isinstance(inc, str):
+        return {part for part in inc.split("+") if part}
+    return set(inc)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_musicbrainz_client(user_agent=None):
+    """Devuelve el cliente compartido del proceso (se crea en la primera llamada)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MusicBrainzClient(user_agent=user_agent)
+        return _client
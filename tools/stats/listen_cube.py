@@ -0,0 +1,365 @@
+"""
+Listen Cube - Tablas de resumen de escuchas (Last.fm / ListenBrainz)
+
+Mantiene en listen_stats_cube el número de escuchas por periodo (día, semana,
+mes, año) y por dimensión (total, artista, álbum, género, sello) para cada
+fuente y usuario. Los importadores añaden sólo las escuchas nuevas desde la
+última marca guardada en listen_stats_state, de modo que las páginas de
+estadísticas leen tablas pequeñas en lugar de agrupar todas las escuchas.
+
+Marcas incrementales:
+    listenbrainz  id de la última fila procesada de listens_<usuario>
+                  (cubre también el backfill, que añade escuchas antiguas)
+    lastfm        timestamp del último scrobble añadido; las filas de
+                  scrobbles_<usuario> agrupan varias escuchas por canción, así
+                  que el importador pasa las escuchas nuevas sin agrupar. La
+                  primera vez se parte de lastfm_plays_<usuario> (o de la
+                  lista JSON fecha_reproducciones en tablas sin migrar)
+"""
+import calendar
+import json
+import logging
+import time
+
+# periodo -> formato strftime sobre el timestamp
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-%W",
+    "month": "%Y-%m",
+    "year": "%Y",
+}
+
+# dimensión -> (expresión del elemento, expresión del artista, condición)
+DIMENSIONS = {
+    "total": ("''", "''", "1"),
+    "artist": ("p.artist", "''", "p.artist != ''"),
+    "album": ("p.album", "p.artist", "p.album != ''"),
+    "genre": ("t.genre", "''", "t.genre IS NOT NULL AND t.genre != ''"),
+    "label": ("t.label", "''", "t.label IS NOT NULL AND t.label != ''"),
+}
+
+SOURCE_TABLES = {
+    "lastfm": "scrobbles_{username}",
+    "listenbrainz": "listens_{username}",
+}
+
+_LASTFM_MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+
+STAGING_BATCH = 5000
+
+
+def setup_listen_cube(conn):
+    """Crea las tablas del cubo si no existen."""
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS listen_stats_cube (
+        source TEXT NOT NULL,
+        username TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        period_type TEXT NOT NULL,
+        period TEXT NOT NULL,
+        item TEXT NOT NULL,
+        item_artist TEXT NOT NULL DEFAULT '',
+        listen_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (source, username, dimension, period_type, period, item, item_artist)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS listen_stats_state (
+        source TEXT NOT NULL,
+        username TEXT NOT NULL,
+        last_timestamp INTEGER NOT NULL DEFAULT 0,
+        last_row_id INTEGER NOT NULL DEFAULT 0,
+        last_updated TIMESTAMP,
+        PRIMARY KEY (source, username)
+    )
+    """)
+    conn.commit()
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return cursor.fetchone() is not None
+
+
+def _get_state(cursor, source, username):
+    cursor.execute("""
+        SELECT last_timestamp, last_row_id FROM listen_stats_state
+        WHERE source = ? AND username = ?
+    """, (source, username))
+    return cursor.fetchone()
+
+
+def _save_state(cursor, source, username, last_timestamp, last_row_id):
+    cursor.execute("""
+        INSERT INTO listen_stats_state (source, username, last_timestamp, last_row_id, last_updated)
+        VALUES (?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(source, username) DO UPDATE SET
+            last_timestamp = excluded.last_timestamp,
+            last_row_id = excluded.last_row_id,
+            last_updated = excluded.last_updated
+    """, (source, username, last_timestamp, last_row_id))
+
+
+def parse_lastfm_date(text):
+    """Convierte la fecha de Last.fm ('17 Oct 2024, 21:05', UTC) a timestamp."""
+    try:
+        date_part, time_part = text.split(",")
+        day, month, year = date_part.split()
+        hour, minute = time_part.strip().split(":")
+        return calendar.timegm((int(year), _LASTFM_MONTHS[month], int(day),
+                                int(hour), int(minute), 0, 0, 0, 0))
+    except (ValueError, KeyError, AttributeError):
+        return None
+
+
+def _create_staging(cursor):
+    cursor.execute("DROP TABLE IF EXISTS temp.listen_cube_staging")
+    cursor.execute("""
+        CREATE TEMP TABLE listen_cube_staging (
+            ts INTEGER NOT NULL,
+            artist TEXT NOT NULL,
+            album TEXT NOT NULL,
+            title TEXT NOT NULL,
+            song_id INTEGER
+        )
+    """)
+
+
+def _stage_listenbrainz(cursor, username, last_row_id):
+    """Copia las escuchas con id mayor que la marca. Devuelve (filas, último id)."""
+    table = SOURCE_TABLES["listenbrainz"].format(username=username)
+    cursor.execute(f"""
+        INSERT INTO temp.listen_cube_staging (ts, artist, album, title, song_id)
+        SELECT timestamp, COALESCE(artist_name, ''), COALESCE(album_name, ''),
+               COALESCE(track_name, ''), song_id
+        FROM {table}
+        WHERE id > ?
+    """, (last_row_id,))
+    staged = cursor.rowcount
+    cursor.execute(f"SELECT COALESCE(MAX(id), ?) FROM {table}", (last_row_id,))
+    return staged, cursor.fetchone()[0]
+
+
+def _stage_rows(cursor, rows):
+    """Inserta escuchas (timestamp, artista, álbum, título) por lotes."""
+    staged = 0
+    batch = []
+    for ts, artist, album, title in rows:
+        batch.append((ts, artist or '', album or '', title or ''))
+        if len(batch) >= STAGING_BATCH:
+            cursor.executemany(
+                "INSERT INTO temp.listen_cube_staging (ts, artist, album, title) VALUES (?, ?, ?, ?)",
+                batch)
+            staged += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(
+            "INSERT INTO temp.listen_cube_staging (ts, artist, album, title) VALUES (?, ?, ?, ?)",
+            batch)
+        staged += len(batch)
+    return staged
+
+
+def _stage_lastfm_table(cursor, username):
+    """Copia una escucha por reproducción guardada de Last.fm. Devuelve las filas."""
+    table = SOURCE_TABLES["lastfm"].format(username=username)
+    plays_table = f"lastfm_plays_{username}"
+    staged = 0
+
+    if _table_exists(cursor, plays_table):
+        cursor.execute(f"""
+            INSERT INTO temp.listen_cube_staging (ts, artist, album, title)
+            SELECT p.timestamp, COALESCE(s.artist_name, ''), COALESCE(s.album_name, ''),
+                   COALESCE(s.name, '')
+            FROM {plays_table} p
+            JOIN {table} s ON s.id = p.scrobble_id
+            WHERE p.timestamp IS NOT NULL
+        """)
+        staged += cursor.rowcount
+        # Filas que aún guardan las fechas en la lista JSON (sin migrar)
+        legacy_filter = "WHERE fecha_reproducciones IS NOT NULL"
+    else:
+        legacy_filter = ""
+
+    rows = cursor.execute(f"""
+        SELECT artist_name, album_name, name, timestamp, reproducciones, fecha_reproducciones
+        FROM {table}
+        {legacy_filter}
+    """).fetchall()
+    return staged + _stage_rows(cursor, _expand_lastfm_rows(rows))
+
+
+def _expand_lastfm_rows(rows):
+    """Genera una escucha por fecha de la lista JSON fecha_reproducciones."""
+    for artist, album, title, ts, plays, dates_json in rows:
+        timestamps = []
+        if dates_json:
+            try:
+                timestamps = [parse_lastfm_date(d) for d in json.loads(dates_json)]
+            except (ValueError, TypeError):
+                timestamps = []
+            timestamps = [t for t in timestamps if t is not None]
+        if not timestamps:
+            # Sin fechas legibles: contar las reproducciones en el último scrobble
+            timestamps = [ts] * max(plays or 1, 1)
+        for play_ts in timestamps:
+            yield play_ts, artist, album, title
+
+
+def _aggregate_staging(cursor, source, username):
+    """Suma las escuchas de la tabla temporal al cubo."""
+    # Género y sello se resuelven una sola vez por canción distinta
+    cursor.execute("DROP TABLE IF EXISTS temp.listen_cube_tracks")
+    cursor.execute("""
+        CREATE TEMP TABLE listen_cube_tracks AS
+        SELECT DISTINCT artist, title, song_id, NULL AS genre, NULL AS label
+        FROM temp.listen_cube_staging
+    """)
+    if _table_exists(cursor, "songs"):
+        cursor.execute("""
+            UPDATE temp.listen_cube_tracks SET
+                genre = COALESCE(
+                    (SELECT s.genre FROM songs s WHERE s.id = listen_cube_tracks.song_id),
+                    (SELECT s.genre FROM songs s
+                     WHERE s.artist = listen_cube_tracks.artist AND s.title = listen_cube_tracks.title
+                       AND s.genre IS NOT NULL AND s.genre != ''
+                     LIMIT 1))
+        """)
+        if _table_exists(cursor, "albums"):
+            # Dos búsquedas separadas: con un OR SQLite no puede usar ningún índice de songs
+            cursor.execute("""
+                UPDATE temp.listen_cube_tracks SET
+                    label = COALESCE(
+                        (SELECT a.label FROM songs s JOIN albums a ON a.name = s.album
+                         WHERE s.id = listen_cube_tracks.song_id
+                           AND a.label IS NOT NULL AND a.label != ''
+                         LIMIT 1),
+                        (SELECT a.label FROM songs s JOIN albums a ON a.name = s.album
+                         WHERE s.artist = listen_cube_tracks.artist AND s.title = listen_cube_tracks.title
+                           AND a.label IS NOT NULL AND a.label != ''
+                         LIMIT 1))
+            """)
+
+    for dimension, (item_expr, artist_expr, condition) in DIMENSIONS.items():
+        join = ""
+        if dimension in ("genre", "label"):
+            join = """
+                JOIN temp.listen_cube_tracks t
+                  ON t.artist = p.artist AND t.title = p.title AND t.song_id IS p.song_id
+            """
+        for period_type, period_format in PERIOD_FORMATS.items():
+            cursor.execute(f"""
+                INSERT INTO listen_stats_cube
+                    (source, username, dimension, period_type, period, item, item_artist, listen_count)
+                SELECT ?, ?, ?, ?, strftime(?, p.ts, 'unixepoch') AS period,
+                       {item_expr} AS item, {artist_expr} AS item_artist, COUNT(*)
+                FROM temp.listen_cube_staging p
+                {join}
+                WHERE {condition}
+                GROUP BY period, item, item_artist
+                ON CONFLICT(source, username, dimension, period_type, period, item, item_artist)
+                DO UPDATE SET listen_count = listen_count + excluded.listen_count
+            """, (source, username, dimension, period_type, period_format))
+
+    cursor.execute("DROP TABLE IF EXISTS temp.listen_cube_tracks")
+    cursor.execute("DROP TABLE IF EXISTS temp.listen_cube_staging")
+
+
+def update_listen_cube(conn, source, username, new_listens=None):
+    """Añade al cubo las escuchas nuevas de una fuente.
+
+    Args:
+        conn: Conexión a la base de datos
+        source (str): 'lastfm' o 'listenbrainz'
+        username (str): Usuario de la fuente
+        new_listens: Para Last.fm, escuchas recién descargadas como
+            (timestamp, artista, álbum, título). Si el cubo aún no tiene
+            marca se ignoran y se construye desde la tabla completa.
+
+    Returns:
+        int: Número de escuchas añadidas al cubo
+    """
+    if source not in SOURCE_TABLES or not username:
+        return 0
+
+    setup_listen_cube(conn)
+    cursor = conn.cursor()
+    table = SOURCE_TABLES[source].format(username=username)
+    if not _table_exists(cursor, table):
+        return 0
+
+    state = _get_state(cursor, source, username)
+    last_timestamp, last_row_id = state if state else (0, 0)
+    start = time.time()
+
+    try:
+        _create_staging(cursor)
+
+        if source == "listenbrainz":
+            staged, last_row_id = _stage_listenbrainz(cursor, username, last_row_id)
+            cursor.execute("SELECT COALESCE(MAX(ts), ?) FROM temp.listen_cube_staging", (last_timestamp,))
+            last_timestamp = max(last_timestamp, cursor.fetchone()[0])
+        elif state is None:
+            staged = _stage_lastfm_table(cursor, username)
+            cursor.execute(f"SELECT COALESCE(MAX(timestamp), 0) FROM {table}")
+            table_timestamp = cursor.fetchone()[0]
+            cursor.execute("SELECT COALESCE(MAX(ts), 0) FROM temp.listen_cube_staging")
+            last_timestamp = max(table_timestamp, cursor.fetchone()[0])
+        else:
+            fresh = [listen for listen in (new_listens or []) if listen[0] > last_timestamp]
+            staged = _stage_rows(cursor, fresh)
+            if fresh:
+                last_timestamp = max(listen[0] for listen in fresh)
+
+        if staged:
+            _aggregate_staging(cursor, source, username)
+        _save_state(cursor, source, username, last_timestamp, last_row_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if staged:
+        logging.info(f"Cubo de escuchas {source}/{username}: {staged} escuchas añadidas "
+                     f"en {time.time() - start:.2f}s")
+    return staged
+
+
+def rebuild_listen_cube(conn, source, username):
+    """Borra el cubo de una fuente y lo vuelve a construir desde su tabla."""
+    setup_listen_cube(conn)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM listen_stats_cube WHERE source = ? AND username = ?", (source, username))
+    cursor.execute("DELETE FROM listen_stats_state WHERE source = ? AND username = ?", (source, username))
+    conn.commit()
+    return update_listen_cube(conn, source, username)
+
+
+def get_top_items(conn, source, username, dimension, limit=None):
+    """Elementos más escuchados de una dimensión: [(elemento, artista, escuchas)]."""
+    sql = """
+        SELECT item, item_artist, SUM(listen_count) AS total
+        FROM listen_stats_cube
+        WHERE source = ? AND username = ? AND dimension = ? AND period_type = 'year'
+        GROUP BY item, item_artist
+        ORDER BY total DESC
+    """
+    params = [source, username, dimension]
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def get_listen_timeline(conn, source, username, period_type):
+    """Escuchas totales por periodo: [(periodo, escuchas)] ordenado por periodo."""
+    return conn.execute("""
+        SELECT period, listen_count
+        FROM listen_stats_cube
+        WHERE source = ? AND username = ? AND dimension = 'total' AND period_type = ?
+        ORDER BY period
+    """, (source, username, period_type)).fetchall()
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Script para medir el tiempo de ejecución individual de cada script del config_database_creator.json
+
+Para medir rendimiento sobre datos sintéticos y sin conexión, y compararlo
+con una línea base, ver tools/db_benchmark.py.
 """
 
 import json
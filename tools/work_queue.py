@@ -0,0 +1,210 @@
+"""
+Work Queue - Cola de trabajo compartida por los scripts de enriquecimiento
+
+Cada script registra en la tabla work_queue las entidades que tiene que
+procesar y las va reclamando por lotes:
+
+    work_queue(script, entity_type, entity_id, status, attempts,
+               next_retry_at, last_error, claimed_at, claimed_by, updated)
+
+- pending: pendiente de procesar.
+- claimed: reclamada por una ejecución en curso. Si esa ejecución muere, la
+  reclamación caduca pasado lease_seconds y otra ejecución la recupera.
+- done: procesada; no se vuelve a reclamar salvo con reset().
+- failed: falló; se reintenta cuando llega next_retry_at (espera exponencial)
+  hasta max_attempts intentos.
+
+Así una ejecución interrumpida continúa exactamente donde se quedó y las
+entidades ya procesadas no se vuelven a pedir a la API.
+"""
+import sqlite3
+import time
+import uuid
+
+DEFAULT_LEASE_SECONDS = 30 * 60
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 60 * 60
+MAX_RETRY_DELAY = 30 * 24 * 60 * 60
+
+
+class WorkQueue:
+    """
+    Cola de trabajo de un script sobre la tabla compartida work_queue.
+
+    Args:
+        db_path: Base de datos donde vive la tabla
+        script: Nombre del script propietario de la cola (p. ej. 'letras/letras_genius_ovh')
+        lease_seconds: Tiempo tras el que una reclamación sin terminar se considera abandonada
+        max_attempts: Intentos fallidos antes de abandonar una entidad
+        retry_delay: Espera base antes del primer reintento (se duplica en cada fallo)
+    """
+
+    def __init__(self, db_path, script, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, retry_delay=DEFAULT_RETRY_DELAY):
+        self.script = script
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.worker_id = uuid.uuid4().hex
+        self.conn = sqlite3.connect(str(db_path), timeout=60)
+        self._setup()
+
+    def _setup(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_queue (
+                    id INTEGER PRIMARY KEY,
+                    script TEXT NOT NULL,
+                    entity_type TEXT NOT NULL,
+                    entity_id TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_retry_at REAL,
+                    last_error TEXT,
+                    claimed_at REAL,
+                    claimed_by TEXT,
+                    updated REAL,
+                    UNIQUE (script, entity_type, entity_id)
+                )
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_work_queue_claim
+                ON work_queue(script, entity_type, status, next_retry_at)
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    # --- Alta de trabajo ---
+
+    def enqueue(self, entity_type, entity_ids):
+        """
+        Añade entidades a la cola. Las que ya estaban conservan su estado
+        (las terminadas no se vuelven a procesar).
+
+        Returns:
+            int: Número de entidades nuevas
+        """
+        now = time.time()
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("""
+                INSERT INTO work_queue (script, entity_type, entity_id, status, updated)
+                VALUES (?, ?, ?, 'pending', ?)
+                ON CONFLICT (script, entity_type, entity_id) DO NOTHING
+            """, ((self.script, entity_type, str(entity_id), now) for entity_id in entity_ids))
+            return self.conn.total_changes - before
+
+    def reset(self, entity_type=None):
+        """Vuelve a poner como pendientes todas las entidades (p. ej. con force_update)."""
+        sql = """
+            UPDATE work_queue
+            SET status = 'pending', attempts = 0, next_retry_at = NULL, last_error = NULL,
+                claimed_at = NULL, claimed_by = NULL, updated = ?
+            WHERE script = ?
+        """
+        params = [time.time(), self.script]
+        if entity_type is not None:
+            sql += " AND entity_type = ?"
+            params.append(entity_type)
+        with self.conn:
+            return self.conn.execute(sql, params).rowcount
+
+    # --- Reclamar y cerrar trabajo ---
+
+    def claim(self, entity_type, limit=100):
+        """
+        Reclama hasta 'limit' entidades disponibles en el orden en que se
+        encolaron: pendientes, fallidas cuyo reintento ya toca y reclamaciones
+        caducadas de ejecuciones que murieron.
+
+        Returns:
+            list: ids de las entidades reclamadas (como texto)
+        """
+        now = time.time()
+        with self.conn:
+            rows = self.conn.execute("""
+                UPDATE work_queue
+                SET status = 'claimed', claimed_at = ?, claimed_by = ?, updated = ?
+                WHERE id IN (
+                    SELECT id FROM work_queue
+                    WHERE script = ? AND entity_type = ?
+                      AND (status = 'pending'
+                           OR (status = 'failed' AND next_retry_at <= ? AND attempts < ?)
+                           OR (status = 'claimed' AND claimed_at <= ?))
+                    ORDER BY id
+                    LIMIT ?
+                )
+                RETURNING id, entity_id
+            """, (now, self.worker_id, now, self.script, entity_type,
+                  now, self.max_attempts, now - self.lease_seconds, limit)).fetchall()
+        # RETURNING no garantiza orden
+        return [entity_id for _, entity_id in sorted(rows)]
+
+    def complete(self, entity_type, entity_ids):
+        """Marca entidades como terminadas."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE work_queue
+                SET status = 'done', last_error = NULL, claimed_at = NULL, claimed_by = NULL, updated = ?
+                WHERE script = ? AND entity_type = ? AND entity_id = ?
+            """, ((now, self.script, entity_type, str(entity_id)) for entity_id in entity_ids))
+
+    def fail(self, entity_type, entity_id, error=None, retry_delay=None):
+        """
+        Registra un fallo. El siguiente intento espera retry_delay * 2^(intentos - 1),
+        con un máximo de MAX_RETRY_DELAY.
+        """
+        base = self.retry_delay if retry_delay is None else retry_delay
+        now = time.time()
+        with self.conn:
+            self.conn.execute("""
+                UPDATE work_queue
+                SET status = 'failed',
+                    attempts = attempts + 1,
+                    next_retry_at = ? + MIN(? * (1 << attempts), ?),
+                    last_error = ?,
+                    claimed_at = NULL, claimed_by = NULL, updated = ?
+                WHERE script = ? AND entity_type = ? AND entity_id = ?
+            """, (now, base, MAX_RETRY_DELAY, str(error)[:1000] if error else None, now,
+                  self.script, entity_type, str(entity_id)))
+
+    def release(self, entity_type, entity_ids):
+        """Devuelve a pendientes entidades reclamadas que no se llegaron a procesar."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE work_queue
+                SET status = 'pending', claimed_at = NULL, claimed_by = NULL, updated = ?
+                WHERE script = ? AND entity_type = ? AND entity_id = ? AND claimed_by = ?
+            """, ((now, self.script, entity_type, str(entity_id), self.worker_id) for entity_id in entity_ids))
+
+    # --- Consultas ---
+
+    def has_pending(self, entity_type):
+        """True si queda trabajo que se podría reclamar ahora o más adelante."""
+        row = self.conn.execute("""
+            SELECT 1 FROM work_queue
+            WHERE script = ? AND entity_type = ?
+              AND (status IN ('pending', 'claimed') OR (status = 'failed' AND attempts < ?))
+            LIMIT 1
+        """, (self.script, entity_type, self.max_attempts)).fetchone()
+        return row is not None
+
+    def stats(self, entity_type=None):
+        """
+        Returns:
+            dict: {status: número de entidades}; los fallos definitivos aparecen como 'abandoned'
+        """
+        sql = """
+            SELECT CASE WHEN status = 'failed' AND attempts >= ? THEN 'abandoned' ELSE status END, COUNT(*)
+            FROM work_queue
+            WHERE script = ?
+        """
+        params = [self.max_attempts, self.script]
+        if entity_type is not None:
+            sql += " AND entity_type = ?"
+            params.append(entity_type)
+        sql += " GROUP BY 1"
+        return dict(self.conn.execute(sql, params).fetchall())